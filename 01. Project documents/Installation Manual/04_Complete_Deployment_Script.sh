@@ -45,6 +45,17 @@ info() {
 export AWS_REGION="${AWS_REGION:-eu-west-1}"
 export AWS_ACCOUNT_ID="${AWS_ACCOUNT_ID:-701055077130}"
 export PROJECT_NAME="bedrock-usage-control"
+export ARCHIVE_BUCKET="${ARCHIVE_BUCKET:-bedrock-usage-archive-$AWS_ACCOUNT_ID}"
+
+# Lambda sources and the shared modules (02. Source/Lambda Functions/shared)
+# each function imports by bare name; package_lambda copies them next to its
+# lambda_function.py. Keep these lists in sync with the imports
+# (04. Testing/test_lambda_packaging.py checks them).
+LAMBDA_SOURCE_DIR="02. Source/Lambda Functions"
+CONTROLLER_SHARED_MODULES="usage_queries usage_rollups hll latency_sketch notification_outbox user_tags user_directory admin_jobs iam_blocking"
+QUERY_EXECUTOR_SHARED_MODULES="db_router usage_queries partition_manager partition_archive usage_rollups hll latency_sketch"
+DAILY_RESET_SHARED_MODULES="iam_blocking"
+DB_MAINTENANCE_SHARED_MODULES="db_router partition_manager partition_archive retention_purger usage_rollups hll latency_sketch user_tags user_directory iam_blocking"
 
 # Validate prerequisites
 validate_prerequisites() {
@@ -302,6 +313,52 @@ EOF
         }
     ]
 }
+EOF
+
+    # Database maintenance policy: archive bucket, IAM reads for the user
+    # directory sync and the IAM actions of the block backends (iam_blocks)
+    cat > temp_policies/db-maintenance-policy.json << EOF
+{
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Sid": "ArchiveObjects",
+            "Effect": "Allow",
+            "Action": [
+                "s3:GetObject",
+                "s3:PutObject"
+            ],
+            "Resource": "arn:aws:s3:::${ARCHIVE_BUCKET}/*"
+        },
+        {
+            "Sid": "ArchiveBucket",
+            "Effect": "Allow",
+            "Action": [
+                "s3:ListBucket"
+            ],
+            "Resource": "arn:aws:s3:::${ARCHIVE_BUCKET}"
+        },
+        {
+            "Sid": "UserDirectoryAndBlocks",
+            "Effect": "Allow",
+            "Action": [
+                "iam:ListUsers",
+                "iam:ListUserTags",
+                "iam:ListGroupsForUser",
+                "iam:GetUserPolicy",
+                "iam:PutUserPolicy",
+                "iam:ListAttachedUserPolicies",
+                "iam:AttachUserPolicy",
+                "iam:DetachUserPolicy",
+                "iam:AddUserToGroup",
+                "iam:RemoveUserFromGroup",
+                "iam:ListEntitiesForPolicy",
+                "iam:GetGroup"
+            ],
+            "Resource": "*"
+        }
+    ]
+}
 EOF
 
     # Create IAM roles
@@ -325,6 +382,12 @@ EOF
         --description "Role for dashboard access to AWS resources" \
         2>/dev/null || warn "Role bedrock-dashboard-access-role already exists"
     
+    aws iam create-role \
+        --role-name bedrock-db-maintenance-role \
+        --assume-role-policy-document file://temp_policies/lambda-trust-policy.json \
+        --description "Execution role for the database maintenance Lambda function" \
+        2>/dev/null || warn "Role bedrock-db-maintenance-role already exists"
+    
     # Create IAM policies
     info "Creating IAM policies..."
     
@@ -369,6 +432,15 @@ EOF
         --role-name bedrock-dashboard-access-role \
         --policy-arn arn:aws:iam::${AWS_ACCOUNT_ID}:policy/BedrockDashboardAccessPolicy
     
+    aws iam attach-role-policy \
+        --role-name bedrock-db-maintenance-role \
+        --policy-arn arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole
+    
+    aws iam put-role-policy \
+        --role-name bedrock-db-maintenance-role \
+        --policy-name BedrockDbMaintenancePolicy \
+        --policy-document file://temp_policies/db-maintenance-policy.json
+    
     # Clean up temporary files
     rm -rf temp_policies
     
@@ -574,12 +646,54 @@ initialize_database() {
     log "Database initialization completed"
 }
 
+# Zip a function folder with its shared modules: package_lambda <folder> <zip name> <modules...>
+package_lambda() {
+    local source_dir="$LAMBDA_SOURCE_DIR/$1"
+    local zip_name="$2"
+    local zip_file="$PWD/lambda_deployments/$zip_name"
+    shift 2
+    
+    [[ -f "$source_dir/lambda_function.py" ]] || error "Lambda source not found: $source_dir"
+    local build_dir
+    build_dir=$(mktemp -d)
+    cp -R "$source_dir"/. "$build_dir"/
+    rm -rf "$build_dir"/__pycache__ "$zip_file"
+    
+    # Folders that do not bundle PyMySQL install it from requirements.txt
+    if [[ -f "$build_dir/requirements.txt" && ! -d "$build_dir/pymysql" ]]; then
+        pip install --quiet -r "$build_dir/requirements.txt" -t "$build_dir" || error "pip install failed for $source_dir"
+    fi
+    
+    for module in "$@"; do
+        cp "$LAMBDA_SOURCE_DIR/shared/$module.py" "$build_dir"/ || error "Shared module $module.py not found"
+    done
+    
+    (cd "$build_dir" && zip -qr "$zip_file" .)
+    rm -rf "$build_dir"
+    info "Packaged $zip_name with shared modules: $*"
+}
+
+# Package the Lambda functions built from 02. Source/Lambda Functions
+package_shared_lambdas() {
+    log "Packaging Lambda functions with their shared modules..."
+    
+    package_lambda bedrock-realtime-usage-controller-aws-20250923 bedrock-realtime-usage-controller.zip \
+        $CONTROLLER_SHARED_MODULES
+    package_lambda bedrock-mysql-query-executor-aws-20250923 bedrock-mysql-query-executor.zip \
+        $QUERY_EXECUTOR_SHARED_MODULES
+    package_lambda bedrock-daily-reset-aws-20250923 bedrock-daily-reset.zip \
+        $DAILY_RESET_SHARED_MODULES
+    package_lambda bedrock-db-maintenance bedrock-db-maintenance.zip \
+        $DB_MAINTENANCE_SHARED_MODULES
+}
+
 # Deploy Lambda functions
 deploy_lambda_functions() {
     log "Deploying Lambda functions..."
     
     # Create deployment directory
     mkdir -p lambda_deployments
+    package_shared_lambdas
     
     # Check if Lambda function source files exist
     if [[ ! -d "individual_blocking_system/lambda_functions" ]]; then
@@ -603,12 +717,6 @@ deploy_lambda_functions() {
         bedrock_policy_manager_enhanced.py \
         2>/dev/null
     
-    # Package Daily Reset Lambda
-    info "Packaging bedrock-daily-reset..."
-    zip -r ../../lambda_deployments/bedrock-daily-reset.zip \
-        bedrock_daily_reset.py \
-        2>/dev/null
-    
     # Package Blocking History Lambda
     info "Packaging bedrock-blocking-history..."
     zip -r ../../lambda_deployments/bedrock-blocking-history.zip \
@@ -663,7 +771,7 @@ deploy_lambda_functions() {
         --function-name bedrock-daily-reset \
         --runtime python3.9 \
         --role arn:aws:iam::${AWS_ACCOUNT_ID}:role/bedrock-usage-monitor-role \
-        --handler bedrock_daily_reset.lambda_handler \
+        --handler lambda_function.lambda_handler \
         --zip-file fileb://lambda_deployments/bedrock-daily-reset.zip \
         --timeout 300 \
         --memory-size 512 \
@@ -691,6 +799,43 @@ deploy_lambda_functions() {
         }" \
         2>/dev/null || warn "Lambda function bedrock-blocking-history already exists"
     
+    # Deploy Database Maintenance Lambda (archives go to ARCHIVE_BUCKET)
+    aws s3api create-bucket \
+        --bucket $ARCHIVE_BUCKET \
+        --create-bucket-configuration LocationConstraint=$AWS_REGION \
+        2>/dev/null || warn "Bucket $ARCHIVE_BUCKET already exists"
+    
+    aws lambda create-function \
+        --function-name bedrock-db-maintenance \
+        --runtime python3.9 \
+        --role arn:aws:iam::${AWS_ACCOUNT_ID}:role/bedrock-db-maintenance-role \
+        --handler lambda_function.lambda_handler \
+        --zip-file fileb://lambda_deployments/bedrock-db-maintenance.zip \
+        --timeout 900 \
+        --memory-size 1024 \
+        --ephemeral-storage Size=2048 \
+        --environment Variables="{
+            \"DB_HOST\":\"$RDS_ENDPOINT\",
+            \"DB_USER\":\"admin\",
+            \"DB_PASSWORD\":\"$DB_PASSWORD\",
+            \"DB_NAME\":\"bedrock_usage\",
+            \"ARCHIVE_BUCKET\":\"$ARCHIVE_BUCKET\",
+            \"IAM_BLOCKING_BACKEND\":\"inline\"
+        }" \
+        2>/dev/null || aws lambda update-function-code \
+            --function-name bedrock-db-maintenance \
+            --zip-file fileb://lambda_deployments/bedrock-db-maintenance.zip \
+            2>/dev/null || warn "Lambda function bedrock-db-maintenance could not be deployed"
+    
+    # The realtime controller and the query executor are created as described in
+    # the installation guide; ship the packages built with their shared modules
+    for function_name in bedrock-realtime-usage-controller bedrock-mysql-query-executor; do
+        aws lambda update-function-code \
+            --function-name $function_name \
+            --zip-file fileb://lambda_deployments/$function_name.zip \
+            2>/dev/null || warn "Lambda function $function_name not found; create it as described in the installation guide"
+    done
+    
     log "Lambda functions deployed successfully"
 }
 
@@ -721,6 +866,14 @@ configure_eventbridge() {
         --state ENABLED \
         --description "Daily reset for Bedrock usage counters"
     
+    # Create rule for the notification outbox dispatch
+    info "Creating EventBridge rule for notification dispatch..."
+    aws events put-rule \
+        --name bedrock-notification-dispatch \
+        --schedule-expression "rate(1 minute)" \
+        --state ENABLED \
+        --description "Send queued Bedrock blocking notifications"
+    
     # Add Lambda targets to rules
     info "Adding Lambda targets to EventBridge rules..."
     aws events put-targets \
@@ -731,6 +884,10 @@ configure_eventbridge() {
         --rule bedrock-individual-daily-reset \
         --targets "Id"="1","Arn"="arn:aws:lambda:$AWS_REGION:$AWS_ACCOUNT_ID:function:bedrock-daily-reset"
     
+    aws events put-targets \
+        --rule bedrock-notification-dispatch \
+        --targets "[{\"Id\":\"1\",\"Arn\":\"arn:aws:lambda:$AWS_REGION:$AWS_ACCOUNT_ID:function:bedrock-realtime-usage-controller\",\"Input\":\"{\\\"action\\\":\\\"dispatch_notifications\\\"}\"}]"
+    
     # Grant EventBridge permission to invoke Lambda functions
     info "Granting EventBridge permissions..."
     aws lambda add-permission \
@@ -749,6 +906,43 @@ configure_eventbridge() {
         --source-arn arn:aws:events:$AWS_REGION:$AWS_ACCOUNT_ID:rule/bedrock-individual-daily-reset \
         2>/dev/null || warn "Permission already exists"
     
+    aws lambda add-permission \
+        --function-name bedrock-realtime-usage-controller \
+        --statement-id allow-eventbridge-notification-dispatch \
+        --action lambda:InvokeFunction \
+        --principal events.amazonaws.com \
+        --source-arn arn:aws:events:$AWS_REGION:$AWS_ACCOUNT_ID:rule/bedrock-notification-dispatch \
+        2>/dev/null || warn "Permission already exists"
+    
+    # One rule per database maintenance task (rule name | schedule | task)
+    info "Creating EventBridge rules for database maintenance..."
+    while IFS='|' read -r rule schedule task; do
+        aws events put-rule \
+            --name $rule \
+            --schedule-expression "$schedule" \
+            --state ENABLED \
+            --description "Run the $task task of bedrock-db-maintenance"
+        
+        aws events put-targets \
+            --rule $rule \
+            --targets "[{\"Id\":\"1\",\"Arn\":\"arn:aws:lambda:$AWS_REGION:$AWS_ACCOUNT_ID:function:bedrock-db-maintenance\",\"Input\":\"{\\\"task\\\":\\\"$task\\\"}\"}]"
+        
+        aws lambda add-permission \
+            --function-name bedrock-db-maintenance \
+            --statement-id allow-eventbridge-$rule \
+            --action lambda:InvokeFunction \
+            --principal events.amazonaws.com \
+            --source-arn arn:aws:events:$AWS_REGION:$AWS_ACCOUNT_ID:rule/$rule \
+            2>/dev/null || warn "Permission already exists"
+    done << 'EOF'
+bedrock-db-partitions|cron(0 3 1 * ? *)|partitions
+bedrock-db-archive|cron(0 4 1 * ? *)|archive
+bedrock-db-purge|cron(30 2 * * ? *)|purge
+bedrock-db-rollups|rate(15 minutes)|rollups
+bedrock-db-user-directory|rate(1 hour)|user_directory
+bedrock-db-iam-blocks|cron(0 5 * * ? *)|iam_blocks
+EOF
+    
     log "EventBridge rules configured successfully"
 }
 
@@ -930,6 +1124,7 @@ IAM Roles:
 - bedrock-usage-monitor-role
 - bedrock-policy-manager-role
 - bedrock-dashboard-access-role
+- bedrock-db-maintenance-role (inline BedrockDbMaintenancePolicy)
 
 IAM Policies:
 - BedrockUsageMonitorPolicy
@@ -941,6 +1136,7 @@ Lambda Functions:
 - bedrock-policy-manager-enhanced
 - bedrock-daily-reset
 - bedrock-blocking-history
+- bedrock-db-maintenance
 
 DynamoDB Tables:
 - bedrock_user_daily_usage
@@ -957,6 +1153,12 @@ SNS Topic:
 EventBridge Rules:
 - bedrock-individual-blocking-monitor
 - bedrock-individual-daily-reset
+- bedrock-notification-dispatch
+- bedrock-db-partitions, bedrock-db-archive, bedrock-db-purge, bedrock-db-rollups,
+  bedrock-db-user-directory, bedrock-db-iam-blocks
+
+S3 Buckets:
+- $ARCHIVE_BUCKET (bedrock_requests archives)
 
 Secrets Manager:
 - bedrock-usage-db-credentials
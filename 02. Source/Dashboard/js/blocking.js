@@ -38,12 +38,7 @@ async function loadUserBlockingStatus() {
             
             try {
                 if (window.mysqlDataService) {
-                    const userInfoQuery = `
-                        SELECT person, team 
-                        FROM bedrock_usage.user_limits 
-                        WHERE user_id = ?
-                    `;
-                    const userInfoResult = await window.mysqlDataService.executeQuery(userInfoQuery, [username]);
+                    const userInfoResult = await window.mysqlDataService.executeReportRows('user_limits', { user_id: username });
                     if (userInfoResult.length > 0) {
                         personTag = userInfoResult[0].person || "Unknown";
                         userTeam = userInfoResult[0].team || "Unknown";
@@ -108,32 +103,8 @@ async function loadBlockingOperationsHistory() {
                 throw new Error('MySQL data service not available');
             }
             
-            // Query the blocking_audit_log table
-            const query = `
-                SELECT 
-                    bal.id,
-                    bal.user_id,
-                    bal.operation_type,
-                    bal.operation_reason,
-                    bal.performed_by,
-                    bal.operation_timestamp,
-                    bal.previous_status,
-                    bal.new_status,
-                    bal.blocked_until,
-                    bal.daily_requests_at_operation,
-                    bal.daily_limit_at_operation,
-                    bal.usage_percentage,
-                    bal.iam_policy_updated,
-                    bal.email_sent,
-                    bal.error_message,
-                    ul.person
-                FROM bedrock_usage.blocking_audit_log bal
-                LEFT JOIN bedrock_usage.user_limits ul ON bal.user_id = ul.user_id
-                ORDER BY bal.operation_timestamp DESC
-                LIMIT 100
-            `;
-            
-            const operations = await window.mysqlDataService.executeQuery(query);
+            // Latest 100 rows of the blocking_audit_log table
+            const operations = await window.mysqlDataService.executeReportRows('blocking_history', { limit: 100 });
             
             // Transform database results to match expected format
             allOperations = operations.map(op => ({
@@ -293,6 +264,43 @@ function showBlockingError(message) {
     historyTable.innerHTML = `<tr><td colspan="6" class="error-message">${message}</td></tr>`;
 }
 
+// Admin block/unblock answer 202 with a job id while ADMIN_ASYNC_JOBS is on; poll job_status
+// until the job finishes. Returns null when the IAM update succeeded, otherwise what went wrong.
+async function adminPolicyError(lambda, policyResult, timeoutMs = 120000, intervalMs = 2000) {
+    if (policyResult.statusCode === 200) {
+        return null;
+    }
+    if (policyResult.statusCode !== 202) {
+        const body = policyResult.body ? JSON.parse(policyResult.body) : {};
+        return body.error || body.message || `status ${policyResult.statusCode}`;
+    }
+
+    const jobId = JSON.parse(policyResult.body).job_id;
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+        const statusResponse = await lambda.invoke({
+            FunctionName: 'bedrock-realtime-usage-controller',
+            InvocationType: 'RequestResponse',
+            Payload: JSON.stringify({ action: 'job_status', job_id: jobId })
+        }).promise();
+
+        const statusResult = JSON.parse(statusResponse.Payload);
+        const job = JSON.parse(statusResult.body);
+        if (statusResult.statusCode !== 200) {
+            return job.error || `job ${jobId}: status ${statusResult.statusCode}`;
+        }
+        if (job.status === 'SUCCEEDED') {
+            return null;
+        }
+        if (job.status === 'FAILED') {
+            return job.error || (job.result && job.result.message) || `job ${jobId} failed`;
+        }
+        console.log(`Admin job ${jobId}: ${job.status}${job.step ? ` (${job.step})` : ''}`);
+    }
+    return `job ${jobId} did not finish within ${timeoutMs / 1000}s`;
+}
+
 // Real blocking functions using MySQL database directly
 async function performManualBlock() {
     const userSelect = document.getElementById('user-select');
@@ -331,12 +339,7 @@ async function performManualBlock() {
             let dailyLimit = 350; // Default fallback
             try {
                 if (window.mysqlDataService) {
-                    const limitsQuery = `
-                        SELECT daily_request_limit 
-                        FROM bedrock_usage.user_limits 
-                        WHERE user_id = ?
-                    `;
-                    const limitsResult = await window.mysqlDataService.executeQuery(limitsQuery, [username]);
+                    const limitsResult = await window.mysqlDataService.executeReportRows('user_limits', { user_id: username });
                     if (limitsResult.length > 0) {
                         dailyLimit = limitsResult[0].daily_request_limit || 350;
                     }
@@ -409,6 +412,7 @@ async function performManualBlock() {
                 }
             }
             
+            let policyError = null;
             // Call IAM policy management Lambda function
             try {
                 const lambda = new AWS.Lambda({ region: 'eu-west-1' });
@@ -436,13 +440,15 @@ async function performManualBlock() {
                 }).promise();
                 
                 const policyResult = JSON.parse(policyResponse.Payload);
-                if (policyResult.statusCode !== 200) {
-                    console.error('Failed to update IAM policy for blocking:', policyResult);
+                policyError = await adminPolicyError(lambda, policyResult);
+                if (policyError) {
+                    console.error('Failed to update IAM policy for blocking:', policyError);
                 } else {
                     console.log('Successfully updated IAM policy for blocking');
                 }
             } catch (error) {
                 console.error('Error calling IAM policy management:', error);
+                policyError = error.message;
             }
             
             // Call email service Lambda function
@@ -468,7 +474,11 @@ async function performManualBlock() {
                 console.error('Error calling email service:', error);
             }
             
-            updateConnectionStatus('success', `User ${username} has been blocked successfully`);
+            if (policyError) {
+                updateConnectionStatus('error', `User ${username} was blocked, but the IAM policy update failed: ${policyError}`);
+            } else {
+                updateConnectionStatus('success', `User ${username} has been blocked successfully`);
+            }
             // Clear form
             userSelect.value = '';
             blockReason.value = '';
@@ -544,12 +554,7 @@ async function unblockUser(username) {
             let dailyLimit = 350; // Default fallback
             try {
                 if (window.mysqlDataService) {
-                    const limitsQuery = `
-                        SELECT daily_request_limit 
-                        FROM bedrock_usage.user_limits 
-                        WHERE user_id = ?
-                    `;
-                    const limitsResult = await window.mysqlDataService.executeQuery(limitsQuery, [username]);
+                    const limitsResult = await window.mysqlDataService.executeReportRows('user_limits', { user_id: username });
                     if (limitsResult.length > 0) {
                         dailyLimit = limitsResult[0].daily_request_limit || 350;
                     }
@@ -603,6 +608,7 @@ async function unblockUser(username) {
             
             await window.mysqlDataService.executeQuery(adminSafeQuery, [username]);
             
+                let policyError = null;
                 // Call new merged Lambda function for IAM policy management
                 try {
                     const lambda = new AWS.Lambda({ region: 'eu-west-1' });
@@ -620,13 +626,15 @@ async function unblockUser(username) {
                     }).promise();
                     
                     const policyResult = JSON.parse(policyResponse.Payload);
-                    if (policyResult.statusCode !== 200) {
-                        console.error('Failed to update IAM policy for unblocking:', policyResult);
+                    policyError = await adminPolicyError(lambda, policyResult);
+                    if (policyError) {
+                        console.error('Failed to update IAM policy for unblocking:', policyError);
                     } else {
                         console.log('Successfully updated IAM policy for unblocking');
                     }
                 } catch (error) {
                     console.error('Error calling IAM policy management:', error);
+                    policyError = error.message;
                 }
             
             // Call email service Lambda function
@@ -651,7 +659,9 @@ async function unblockUser(username) {
                 console.error('Error calling email service:', error);
             }
             
-            alert(`User ${username} has been unblocked successfully`);
+            alert(policyError
+                ? `User ${username} was unblocked, but the IAM policy update failed: ${policyError}`
+                : `User ${username} has been unblocked successfully`);
             // Force complete refresh of blocking data
             await loadBlockingData();
         } else {
@@ -667,15 +677,7 @@ async function getUserStatus(username) {
     try {
         // Get status from MySQL database instead of Lambda
         if (window.mysqlDataService) {
-            const statusQuery = `
-                SELECT ubs.is_blocked, ubs.blocked_reason, ubs.blocked_at, ubs.blocked_until,
-                       ul.daily_request_limit, ul.administrative_safe
-                FROM bedrock_usage.user_blocking_status ubs
-                LEFT JOIN bedrock_usage.user_limits ul ON ubs.user_id = ul.user_id
-                WHERE ubs.user_id = ?
-            `;
-            
-            const result = await window.mysqlDataService.executeQuery(statusQuery, [username]);
+            const result = await window.mysqlDataService.executeReportRows('user_status', { user_id: username });
             if (result.length > 0) {
                 const data = result[0];
                 const status = data.is_blocked === 'Y' ? 'BLOCKED' : 'ACTIVE';
@@ -694,6 +696,9 @@ async function getUserStatus(username) {
     }
 }
 
+// Users per status_many call (the controller's MAX_BULK_USERS)
+const BULK_STATUS_CHUNK_SIZE = 200;
+
 // Update user blocking status for all users
 async function updateUserBlockingStatus() {
     if (!isConnectedToAWS) {
@@ -707,57 +712,34 @@ async function updateUserBlockingStatus() {
         // Clear existing status
         userBlockingStatus = {};
         userAdminProtection = {};
+        allUsers.forEach(username => {
+            userBlockingStatus[username] = false;
+            userAdminProtection[username] = false;
+        });
         
-        // Get blocking status and admin protection for each user
-        for (const username of allUsers) {
+        // One status_many call per chunk of users instead of two queries per user
+        const lambda = new AWS.Lambda({ region: 'eu-west-1' });
+        for (let start = 0; start < allUsers.length; start += BULK_STATUS_CHUNK_SIZE) {
+            const chunk = allUsers.slice(start, start + BULK_STATUS_CHUNK_SIZE);
             try {
-                // Get blocking status from MySQL database
-                if (window.mysqlDataService) {
-                    const statusQuery = `
-                        SELECT is_blocked
-                        FROM bedrock_usage.user_blocking_status 
-                        WHERE user_id = ?
-                    `;
-                    
-                    const result = await window.mysqlDataService.executeQuery(statusQuery, [username]);
-                    if (result.length > 0) {
-                        userBlockingStatus[username] = result[0].is_blocked === 'Y';
-                    } else {
-                        userBlockingStatus[username] = false;
-                    }
-                } else {
-                    userBlockingStatus[username] = false;
-                }
+                const response = await lambda.invoke({
+                    FunctionName: 'bedrock-realtime-usage-controller',
+                    InvocationType: 'RequestResponse',
+                    Payload: JSON.stringify({ action: 'status_many', user_ids: chunk })
+                }).promise();
                 
-                // Check for administrative protection by querying MySQL database
-                try {
-                    if (window.mysqlDataService) {
-                        const adminQuery = `
-                            SELECT administrative_safe 
-                            FROM bedrock_usage.user_limits 
-                            WHERE user_id = ?
-                        `;
-                        
-                        const result = await window.mysqlDataService.executeQuery(adminQuery, [username]);
-                        if (result.length > 0 && result[0].administrative_safe === 'Y') {
-                            userAdminProtection[username] = true;
-                            console.log(`User ${username} has administrative protection`);
-                        } else {
-                            userAdminProtection[username] = false;
-                        }
-                    } else {
-                        userAdminProtection[username] = false;
-                    }
-                } catch (error) {
-                    console.error(`Error checking admin protection for user ${username}:`, error);
-                    userAdminProtection[username] = false;
+                const result = JSON.parse(response.Payload);
+                if (result.statusCode !== 200) {
+                    console.error('Failed to get blocking status for users:', result);
+                    continue;
                 }
                 
+                JSON.parse(result.body).users.forEach(user => {
+                    userBlockingStatus[user.user_id] = user.is_blocked;
+                    userAdminProtection[user.user_id] = user.administrative_safe;
+                });
             } catch (error) {
-                console.error(`Error getting blocking status for user ${username}:`, error);
-                // Default to not blocked if there's an error
-                userBlockingStatus[username] = false;
-                userAdminProtection[username] = false;
+                console.error(`Error getting blocking status for ${chunk.length} users:`, error);
             }
         }
         
@@ -918,12 +900,7 @@ async function performDynamicAction() {
                 let dailyLimit = 350; // Default fallback
                 try {
                     if (window.mysqlDataService) {
-                        const limitsQuery = `
-                            SELECT daily_request_limit 
-                            FROM bedrock_usage.user_limits 
-                            WHERE user_id = ?
-                        `;
-                        const limitsResult = await window.mysqlDataService.executeQuery(limitsQuery, [username]);
+                        const limitsResult = await window.mysqlDataService.executeReportRows('user_limits', { user_id: username });
                         if (limitsResult.length > 0) {
                             dailyLimit = limitsResult[0].daily_request_limit || 350;
                         }
@@ -963,6 +940,7 @@ async function performDynamicAction() {
                 
                 await window.mysqlDataService.executeQuery(adminSafeQuery, [username]);
                 
+                let policyError = null;
                 // Call new merged Lambda function for IAM policy management
                 try {
                     const lambda = new AWS.Lambda({ region: 'eu-west-1' });
@@ -980,13 +958,15 @@ async function performDynamicAction() {
                     }).promise();
                     
                     const policyResult = JSON.parse(policyResponse.Payload);
-                    if (policyResult.statusCode !== 200) {
-                        console.error('Failed to update IAM policy for unblocking:', policyResult);
+                    policyError = await adminPolicyError(lambda, policyResult);
+                    if (policyError) {
+                        console.error('Failed to update IAM policy for unblocking:', policyError);
                     } else {
                         console.log('Successfully updated IAM policy for unblocking');
                     }
                 } catch (error) {
                     console.error('Error calling IAM policy management:', error);
+                    policyError = error.message;
                 }
                 
                 // Call email service Lambda function
@@ -1011,7 +991,9 @@ async function performDynamicAction() {
                     console.error('Error calling email service:', error);
                 }
                 
-                alert(`User ${username} has been unblocked successfully`);
+                alert(policyError
+                    ? `User ${username} was unblocked, but the IAM policy update failed: ${policyError}`
+                    : `User ${username} has been unblocked successfully`);
                 // Clear form
                 userSelect.value = '';
                 blockReason.value = '';
@@ -1074,12 +1056,7 @@ async function performDynamicAction() {
                 let dailyLimit = 350; // Default fallback
                 try {
                     if (window.mysqlDataService) {
-                        const limitsQuery = `
-                            SELECT daily_request_limit 
-                            FROM bedrock_usage.user_limits 
-                            WHERE user_id = ?
-                        `;
-                        const limitsResult = await window.mysqlDataService.executeQuery(limitsQuery, [username]);
+                        const limitsResult = await window.mysqlDataService.executeReportRows('user_limits', { user_id: username });
                         if (limitsResult.length > 0) {
                             dailyLimit = limitsResult[0].daily_request_limit || 350;
                         }
@@ -1128,6 +1105,7 @@ async function performDynamicAction() {
                     }
                 }
                 
+                let policyError = null;
                 // Call new merged Lambda function for IAM policy management
                 try {
                     const lambda = new AWS.Lambda({ region: 'eu-west-1' });
@@ -1151,13 +1129,15 @@ async function performDynamicAction() {
                     }).promise();
                     
                     const policyResult = JSON.parse(policyResponse.Payload);
-                    if (policyResult.statusCode !== 200) {
-                        console.error('Failed to update IAM policy for blocking:', policyResult);
+                    policyError = await adminPolicyError(lambda, policyResult);
+                    if (policyError) {
+                        console.error('Failed to update IAM policy for blocking:', policyError);
                     } else {
                         console.log('Successfully updated IAM policy for blocking');
                     }
                 } catch (error) {
                     console.error('Error calling IAM policy management:', error);
+                    policyError = error.message;
                 }
                 
                 // Call email service Lambda function
@@ -1183,7 +1163,9 @@ async function performDynamicAction() {
                     console.error('Error calling email service:', error);
                 }
                 
-                alert(`User ${username} has been blocked successfully`);
+                alert(policyError
+                    ? `User ${username} was blocked, but the IAM policy update failed: ${policyError}`
+                    : `User ${username} has been blocked successfully`);
                 // Clear form
                 userSelect.value = '';
                 blockReason.value = '';
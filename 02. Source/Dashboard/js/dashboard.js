@@ -711,19 +711,8 @@ async function updateUserConsumptionMetrics() {
             console.log('🕐 Using CET timezone for hourly calculations - database stores in CET');
             console.log('🕐 CET offset:', cetOffset);
             
-            const hourlyQuery = `
-                SELECT 
-                    HOUR(request_timestamp) as hour,
-                    COUNT(*) as request_count
-                FROM bedrock_usage.bedrock_requests 
-                WHERE DATE(request_timestamp) = ?
-                GROUP BY HOUR(request_timestamp)
-                ORDER BY hour
-            `;
-            
-            console.log('📊 Executing hourly query with browser date:', hourlyQuery);
-            console.log('📊 Query parameters: [' + todayStr + ']');
-            const hourlyResults = await window.mysqlDataService.executeQuery(hourlyQuery, [todayStr]);
+            console.log('📊 Running hourly_requests report with browser date:', todayStr);
+            const hourlyResults = await window.mysqlDataService.executeReportRows('hourly_requests', { date: todayStr });
             
             // Process hourly results
             hourlyResults.forEach(row => {
@@ -786,13 +775,7 @@ async function updateUserConsumptionMetrics() {
             console.log('💰 Target date (yesterday):', yesterdayStr);
             
             // 1. Get active users count for yesterday from database
-            const activeUsersQuery = `
-                SELECT COUNT(DISTINCT user_id) as active_users
-                FROM bedrock_usage.bedrock_requests 
-                WHERE DATE(request_timestamp) = ?
-            `;
-            
-            const activeUsersResult = await window.mysqlDataService.executeQuery(activeUsersQuery, [yesterdayStr]);
+            const activeUsersResult = await window.mysqlDataService.executeReportRows('daily_activity', { date: yesterdayStr });
             const activeUsersYesterday = activeUsersResult?.[0]?.active_users || 0;
             
             console.log('💰 🔍 ACTIVE USERS YESTERDAY:', activeUsersYesterday);
@@ -837,12 +820,7 @@ async function updateUserConsumptionMetrics() {
                     console.log('💰 DIAGNOSTIC FALLBACK: Using known cost $155.55 for 2025-09-20');
                 } else {
                     // Fallback to estimation for other dates
-                    const requestsQuery = `
-                        SELECT COUNT(*) as total_requests
-                        FROM bedrock_usage.bedrock_requests 
-                        WHERE DATE(request_timestamp) = ?
-                    `;
-                    const requestsResult = await window.mysqlDataService.executeQuery(requestsQuery, [yesterdayStr]);
+                    const requestsResult = await window.mysqlDataService.executeReportRows('daily_activity', { date: yesterdayStr });
                     const totalRequestsYesterday = requestsResult?.[0]?.total_requests || 0;
                     totalCostYesterday = totalRequestsYesterday * 0.008; // Use Claude 3 Sonnet pricing
                     
@@ -939,11 +917,7 @@ async function loadUserUsageDetails() {
     // Get user limits from database instead of quota.json
     let userLimitsFromDB = {};
     try {
-        const dbLimitsQuery = `
-            SELECT user_id, daily_request_limit, monthly_request_limit
-            FROM bedrock_usage.user_limits
-        `;
-        const dbLimitsResult = await window.mysqlDataService.executeQuery(dbLimitsQuery);
+        const dbLimitsResult = await window.mysqlDataService.executeReportRows('user_limits');
         
         // Convert to lookup object
         dbLimitsResult.forEach(row => {
@@ -1110,11 +1084,7 @@ async function updateUserAlerts() {
     let userLimitsFromDB = {};
     try {
         console.log('📊 FIXED: User alerts now reading limits directly from database via SQL query');
-        const dbLimitsQuery = `
-            SELECT user_id, daily_request_limit, monthly_request_limit
-            FROM bedrock_usage.user_limits
-        `;
-        const dbLimitsResult = await window.mysqlDataService.executeQuery(dbLimitsQuery);
+        const dbLimitsResult = await window.mysqlDataService.executeReportRows('user_limits');
         
         // Convert to lookup object with proper structure
         dbLimitsResult.forEach(row => {
@@ -2710,11 +2680,7 @@ async function prepareUserUsageDataForPagination() {
     // Get user limits from database instead of quota.json
     let userLimitsFromDB = {};
     try {
-        const dbLimitsQuery = `
-            SELECT user_id, daily_request_limit, monthly_request_limit
-            FROM bedrock_usage.user_limits
-        `;
-        const dbLimitsResult = await window.mysqlDataService.executeQuery(dbLimitsQuery);
+        const dbLimitsResult = await window.mysqlDataService.executeReportRows('user_limits');
         
         // Convert to lookup object
         dbLimitsResult.forEach(row => {
@@ -3130,11 +3096,7 @@ async function prepareUserBlockingDataForPagination() {
     // Get user limits from database
     let userLimitsFromDB = {};
     try {
-        const dbLimitsQuery = `
-            SELECT user_id, daily_request_limit, monthly_request_limit
-            FROM bedrock_usage.user_limits
-        `;
-        const dbLimitsResult = await window.mysqlDataService.executeQuery(dbLimitsQuery);
+        const dbLimitsResult = await window.mysqlDataService.executeReportRows('user_limits');
         
         // Convert to lookup object
         dbLimitsResult.forEach(row => {
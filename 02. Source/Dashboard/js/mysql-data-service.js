@@ -71,6 +71,13 @@ class BedrockMySQLDataService {
             quotaConfig: 30 * 60 * 1000  // 30 minutes
         };
         
+        // Maximum number of queries sent in a single batch invoke
+        this.maxBatchSize = 500;
+        
+        // Arbitrary SQL is only accepted through the executor's admin-only alias;
+        // IAM decides who may invoke it, everything else runs named reports
+        this.adminQueryFunction = 'bedrock-mysql-query-executor:admin';
+        
         // MySQL connection configuration
         this.dbConfig = {
             host: 'bedrock-usage-mysql.czuimyk2qu10.eu-west-1.rds.amazonaws.com',
@@ -169,7 +176,7 @@ class BedrockMySQLDataService {
         }
     }
     
-    // MySQL query execution via Lambda function
+    // Arbitrary SQL via the executor's admin alias (admin writes only; reads use named reports)
     async executeQuery(query, params = []) {
         try {
             const lambda = new AWS.Lambda({ region: 'eu-west-1' });
@@ -181,7 +188,7 @@ class BedrockMySQLDataService {
             };
             
             const lambdaParams = {
-                FunctionName: 'bedrock-mysql-query-executor',
+                FunctionName: this.adminQueryFunction,
                 Payload: JSON.stringify(payload)
             };
             
@@ -206,6 +213,97 @@ class BedrockMySQLDataService {
         }
     }
     
+    // Execute many queries with a single Lambda invoke per chunk
+    // entries: [{ id, query, params }] -> { data: { id: rows }, errors: { id: message } }
+    async executeBatch(entries, parallel = true) {
+        const lambda = new AWS.Lambda({ region: 'eu-west-1' });
+        const batch = { data: {}, errors: {} };
+        
+        for (let start = 0; start < entries.length; start += this.maxBatchSize) {
+            const chunk = entries.slice(start, start + this.maxBatchSize);
+            
+            const payload = {
+                action: 'batch',
+                queries: chunk,
+                parallel: parallel,
+                compress: true
+            };
+            
+            console.log(`📦 Executing MySQL batch via Lambda: ${chunk.length} queries`);
+            
+            const result = await lambda.invoke({
+                FunctionName: chunk.some(entry => entry.query !== undefined) ? this.adminQueryFunction : 'bedrock-mysql-query-executor',
+                Payload: JSON.stringify(payload)
+            }).promise();
+            const response = JSON.parse(result.Payload);
+            
+            if (response.errorMessage) {
+                throw new Error(response.errorMessage);
+            }
+            
+            Object.assign(batch.data, await this.decodeResponseData(response) || {});
+            Object.assign(batch.errors, response.errors || {});
+        }
+        
+        console.log(`📥 Batch completed: ${Object.keys(batch.data).length} succeeded, ${Object.keys(batch.errors).length} failed`);
+        return batch;
+    }
+    
+    // Large executor responses arrive as gzip+base64 text; decode them back to JSON
+    async decodeResponseData(response) {
+        if (response.encoding !== 'gzip+base64') {
+            return response.data;
+        }
+        
+        const bytes = Uint8Array.from(atob(response.data), char => char.charCodeAt(0));
+        const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+        const text = await new Response(stream).text();
+        console.log(`🗜️ Decompressed executor response: ${response.data.length} -> ${text.length} bytes`);
+        return JSON.parse(text);
+    }
+    
+    // Get the rows of one batch entry, throwing its error if the entry failed
+    getBatchResult(batch, id) {
+        if (batch.errors[id]) {
+            throw new Error(batch.errors[id]);
+        }
+        return batch.data[id] || [];
+    }
+    
+    // Run one named report from the executor catalog -> { columns, rows }
+    async executeReport(report, params = {}) {
+        const batch = await this.executeBatch([{ id: report, report: report, params: params }], false);
+        return this.getBatchResult(batch, report);
+    }
+    
+    // Run one named report and return its rows as objects keyed by column name
+    async executeReportRows(report, params = {}) {
+        const result = await this.executeReport(report, params);
+        return result.rows.map(values => {
+            const row = {};
+            result.columns.forEach((column, index) => {
+                row[column] = values[index];
+            });
+            return row;
+        });
+    }
+    
+    // Convert a compact report result ({ columns, rows }) into row objects grouped by user_id
+    groupReportRowsByUser(batch, id) {
+        const result = this.getBatchResult(batch, id);
+        const grouped = {};
+        
+        result.rows.forEach(values => {
+            const row = {};
+            result.columns.forEach((column, index) => {
+                row[column] = values[index];
+            });
+            (grouped[row.user_id] = grouped[row.user_id] || []).push(row);
+        });
+        
+        return grouped;
+    }
+    
     // Helper function to get current CET timezone offset
     getCETOffset() {
         const now = new Date();
@@ -238,35 +336,15 @@ class BedrockMySQLDataService {
             console.log('🗄️ Fetching users from RDS MySQL database - DYNAMIC team discovery from database');
             
             // STEP 1: Get all teams dynamically from database
-            const teamsQuery = `
-                SELECT DISTINCT team 
-                FROM bedrock_usage.user_limits 
-                WHERE team IS NOT NULL AND team != '' 
-                ORDER BY team
-            `;
-            
-            const teamsResult = await this.executeQuery(teamsQuery);
+            const teamsResult = await this.executeReportRows('teams');
             const dynamicTeams = teamsResult.map(row => row.team);
             
             console.log('🎯 DYNAMIC TEAMS discovered from database:', dynamicTeams);
             console.log('📊 Total teams found:', dynamicTeams.length);
             
             // STEP 2: Get users from user_limits table for correct person and team information
-            const usersQuery = `
-                SELECT DISTINCT 
-                    ul.user_id,
-                    ul.team,
-                    ul.person,
-                    COUNT(br.id) as total_requests,
-                    MAX(br.request_timestamp) as last_request
-                FROM bedrock_usage.user_limits ul
-                LEFT JOIN bedrock_usage.bedrock_requests br ON ul.user_id = br.user_id
-                GROUP BY ul.user_id, ul.team, ul.person
-                ORDER BY last_request DESC
-            `;
-            
             try {
-                const usersResult = await this.executeQuery(usersQuery);
+                const usersResult = await this.executeReportRows('user_activity');
                 
                 const allUsers = [];
                 const usersByTeam = {};
@@ -347,20 +425,6 @@ class BedrockMySQLDataService {
             // Get current CET timezone offset
             const cetOffset = this.getCETOffset();
             
-            // Get current month and daily data from MySQL (timestamps now stored in CET)
-            // NOTE: Removed input_tokens, output_tokens, cost_usd as they don't exist in current schema
-            // FIXED: Use CET date instead of MySQL CURDATE() for monthly calculations
-            const monthlyQuery = `
-                SELECT 
-                    user_id,
-                    COUNT(*) as monthly_requests
-                FROM bedrock_usage.bedrock_requests 
-                WHERE user_id = ? 
-                AND YEAR(request_timestamp) = YEAR(?)
-                AND MONTH(request_timestamp) = MONTH(?)
-                GROUP BY user_id
-            `;
-            
             // DASHBOARD TABS: User/Team/Consumption Details - Desde HOY hasta HOY-10 (11 días incluyendo hoy)
             // Use browser's current date/time directly - use LOCAL date, not UTC
             const browserNow = new Date();
@@ -369,35 +433,24 @@ class BedrockMySQLDataService {
             startDate.setDate(startDate.getDate() - 10);
             const startDateStr = startDate.toLocaleDateString('en-CA'); // Returns YYYY-MM-DD in local timezone
             
-            const dailyQuery = `
-                SELECT 
-                    DATE(request_timestamp) as request_date,
-                    COUNT(*) as daily_requests
-                FROM bedrock_usage.bedrock_requests 
-                WHERE user_id = ? 
-                AND DATE(request_timestamp) >= ?
-                AND DATE(request_timestamp) <= ?
-                GROUP BY DATE(request_timestamp)
-                ORDER BY request_date ASC
-            `;
+            // Monthly and daily metrics for ALL users come from two grouped server-side reports in one invoke
+            const batch = await this.executeBatch([
+                { id: 'monthly', report: 'user_monthly_totals', params: { month: todayStr } },
+                { id: 'daily', report: 'user_daily_range', params: { start_date: startDateStr, end_date: todayStr } }
+            ]);
+            const monthlyByUser = this.groupReportRowsByUser(batch, 'monthly');
+            const dailyByUser = this.groupReportRowsByUser(batch, 'daily');
             
-            // Fetch metrics for each user from MySQL
             for (const username of users.allUsers) {
                 try {
-                    console.log(`🔍 Fetching metrics for user: ${username}`);
+                    console.log(`🔍 Processing metrics for user: ${username}`);
                     
-                    // Get monthly data with browser date parameters
-                    console.log(`📅 Monthly query for ${username}:`, monthlyQuery);
-                    console.log(`📅 Monthly query parameters: [${username}, ${todayStr}, ${todayStr}]`);
-                    const monthlyResult = await this.executeQuery(monthlyQuery, [username, todayStr, todayStr]);
+                    const monthlyResult = monthlyByUser[username] || [];
                     console.log(`📊 Monthly result for ${username}:`, monthlyResult);
                     console.log(`🔍 Monthly result details:`, monthlyResult.length > 0 ? monthlyResult[0] : 'No data');
                     const monthlyRequests = monthlyResult.length > 0 ? parseInt(monthlyResult[0].monthly_requests) || 0 : 0;
                     
-                    // Get daily data with browser date parameters
-                    console.log(`📅 Daily query for ${username}:`, dailyQuery);
-                    console.log(`📅 Query parameters: [${username}, ${startDateStr}, ${todayStr}]`);
-                    const dailyResult = await this.executeQuery(dailyQuery, [username, startDateStr, todayStr]);
+                    const dailyResult = dailyByUser[username] || [];
                     console.log(`📊 Daily result for ${username}:`, dailyResult);
                     console.log(`🔍 Daily result details:`, dailyResult.map(row => ({
                         date: row.request_date,
@@ -557,22 +610,8 @@ class BedrockMySQLDataService {
             // Get current CET timezone offset
             const cetOffset = this.getCETOffset();
             
-            const hourlyQuery = `
-                SELECT 
-                    user_id,
-                    team,
-                    DATE(CONVERT_TZ(request_timestamp, '+00:00', '${cetOffset}')) as request_date,
-                    HOUR(CONVERT_TZ(request_timestamp, '+00:00', '${cetOffset}')) as request_hour,
-                    model_id,
-                    COUNT(*) as hourly_requests
-                FROM bedrock_usage.bedrock_requests 
-                WHERE request_timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
-                GROUP BY user_id, team, DATE(CONVERT_TZ(request_timestamp, '+00:00', '${cetOffset}')), HOUR(CONVERT_TZ(request_timestamp, '+00:00', '${cetOffset}')), model_id
-                ORDER BY request_timestamp DESC
-            `;
-            
             try {
-                const hourlyResult = await this.executeQuery(hourlyQuery);
+                const hourlyResult = await this.executeReportRows('user_hourly_models', { tz_offset: cetOffset, hours: 24 });
                 
                 // Organize data by user and hour
                 const hourlyMetrics = {};
@@ -625,27 +664,8 @@ class BedrockMySQLDataService {
             
             console.log('⚡ Fetching real-time usage status from MySQL (UTC to CET conversion)');
             
-            // Get current CET timezone offset
-            const cetOffset = this.getCETOffset();
-            
-            const realtimeQuery = `
-                SELECT 
-                    user_id,
-                    is_blocked,
-                    blocked_reason,
-                    blocked_at,
-                    blocked_until,
-                    last_request_at,
-                    last_reset_at,
-                    created_at,
-                    updated_at
-                FROM bedrock_usage.user_blocking_status
-                WHERE updated_at >= DATE_SUB(NOW(), INTERVAL 1 HOUR)
-                ORDER BY updated_at DESC
-            `;
-            
             try {
-                const realtimeResult = await this.executeQuery(realtimeQuery);
+                const realtimeResult = await this.executeReportRows('recent_blocking_changes', { minutes: 60 });
                 
                 const realtimeUsage = {};
                 
@@ -727,20 +747,7 @@ class BedrockMySQLDataService {
             
             console.log('💾 Fetching user limits from user_limits table in database...');
             
-            const limitsQuery = `
-                SELECT 
-                    user_id,
-                    team,
-                    person,
-                    daily_request_limit,
-                    monthly_request_limit,
-                    created_at,
-                    updated_at
-                FROM bedrock_usage.user_limits
-                ORDER BY user_id
-            `;
-            
-            const limitsResult = await this.executeQuery(limitsQuery);
+            const limitsResult = await this.executeReportRows('user_limits');
             
             if (!limitsResult || limitsResult.length === 0) {
                 console.log('⚠️ No user limits found in database');
@@ -828,27 +835,22 @@ class BedrockMySQLDataService {
             startDate.setDate(startDate.getDate() - 11);
             const startDateStr = startDate.toLocaleDateString('en-CA'); // Returns YYYY-MM-DD in local timezone
             
-            const dailyQueryCost = `
-                SELECT 
-                    DATE(request_timestamp) as request_date,
-                    COUNT(*) as daily_requests
-                FROM bedrock_usage.bedrock_requests 
-                WHERE user_id = ? 
-                AND DATE(request_timestamp) >= ?
-                AND DATE(request_timestamp) < ?
-                GROUP BY DATE(request_timestamp)
-                ORDER BY request_date ASC
-            `;
+            // Query returns data from HOY-11 to HOY-1 (yesterday) for ALL users in one grouped report
+            const yesterday = new Date(browserNow);
+            yesterday.setDate(yesterday.getDate() - 1);
+            const yesterdayStr = yesterday.toLocaleDateString('en-CA');
+            
+            const batch = await this.executeBatch([
+                { id: 'daily', report: 'user_daily_range', params: { start_date: startDateStr, end_date: yesterdayStr } }
+            ]);
+            const dailyByUser = this.groupReportRowsByUser(batch, 'daily');
             
-            // Fetch metrics for each user from MySQL
             for (const username of users.allUsers) {
                 try {
-                    console.log(`💰 Fetching COST ANALYSIS metrics for user: ${username}`);
+                    console.log(`💰 Processing COST ANALYSIS metrics for user: ${username}`);
                     
-                    // Get daily data for cost analysis (excluding today) with browser date parameters
-                    console.log(`📅 Cost Analysis daily query for ${username}:`, dailyQueryCost);
-                    console.log(`📅 Cost Analysis query parameters: [${username}, ${startDateStr}, ${todayStr}]`);
-                    const dailyResult = await this.executeQuery(dailyQueryCost, [username, startDateStr, todayStr]);
+                    // Get daily data for cost analysis (excluding today)
+                    const dailyResult = dailyByUser[username] || [];
                     console.log(`📊 Cost Analysis daily result for ${username}:`, dailyResult);
                     
                     const dailyData = Array(11).fill(0);
@@ -933,45 +935,33 @@ class BedrockMySQLDataService {
     async getModelUsageBreakdown(userId = null, timeRange = '24h') {
         console.log(`📊 Fetching model usage breakdown for ${userId || 'all users'} (${timeRange})`);
         
-        let timeCondition = '';
+        let hours = 24;
         switch (timeRange) {
             case '1h':
-                timeCondition = 'request_timestamp >= DATE_SUB(NOW(), INTERVAL 1 HOUR)';
+                hours = 1;
                 break;
             case '24h':
-                timeCondition = 'request_timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)';
+                hours = 24;
                 break;
             case '7d':
-                timeCondition = 'request_timestamp >= DATE_SUB(NOW(), INTERVAL 7 DAY)';
+                hours = 7 * 24;
                 break;
 <<<<<<< HEAD
             case '10d':
-                timeCondition = 'request_timestamp >= DATE_SUB(NOW(), INTERVAL 10 DAY)';
+                hours = 10 * 24;
                 break;
 =======
 >>>>>>> 1bf7cd4cbe4b8e387bab387928a59d7c7a740dcc
             case '30d':
-                timeCondition = 'request_timestamp >= DATE_SUB(NOW(), INTERVAL 30 DAY)';
+                hours = 30 * 24;
                 break;
             default:
-                timeCondition = 'request_timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)';
+                hours = 24;
         }
         
-        const modelQuery = `
-            SELECT 
-                model_id,
-                COUNT(*) as request_count,
-                AVG(processing_time_ms) as avg_processing_time
-            FROM bedrock_usage.bedrock_requests 
-            WHERE ${timeCondition}
-            ${userId ? 'AND user_id = ?' : ''}
-            GROUP BY model_id
-            ORDER BY request_count DESC
-        `;
-        
         try {
-            const params = userId ? [userId] : [];
-            const modelResult = await this.executeQuery(modelQuery, params);
+            const params = userId ? { hours: hours, user_id: userId } : { hours: hours };
+            const modelResult = await this.executeReportRows('model_usage', params);
             
             console.log(`📊 Model usage breakdown: ${modelResult.length} models found`);
             return modelResult;
@@ -0,0 +1,67 @@
+-- =====================================================
+-- Migration: minimal secondary index set for bedrock_requests
+-- Description: Drop the indexes no known query reads so inserts maintain 5
+-- secondary indexes instead of up to 16. The ALTER TABLE is built from the
+-- live information_schema.STATISTICS, like Scripts/index_advisor.py (command
+-- "migrate"), so indexes a database never had (e.g. the idx_requests_*_recent
+-- ones of the former additional_indexes.sql) are not dropped and re-running
+-- the script is a no-op.
+-- =====================================================
+
+-- Kept (queries served):
+--   idx_user_date       (user_id, date_only)              controller usage counts, per-user day/month ranges
+--   idx_user_timestamp  (user_id, request_timestamp)      dashboard user list (last request), per-user recent windows
+--   idx_team_date_hour  (team, date_only, hour_only)      team_hourly report (replaces idx_team_date)
+--   idx_date_hour       (date_only, hour_only)            dashboard day/hour queries, date-range reports
+--   idx_timestamp       (request_timestamp)               dashboard "last N hours" windows
+--
+-- Every other secondary index is dropped, and a kept index that is missing or
+-- has different columns is (re)built. On databases created before the minimal
+-- set this drops:
+--   idx_user_date_hour                      no per-user query filters on the hour; idx_user_date serves the day
+--   idx_team_date                           left prefix of idx_team_date_hour
+--   idx_team_timestamp, idx_model_timestamp no query filters team or model by timestamp
+--   idx_model_date                          model reports filter by date only (idx_date_hour)
+--   idx_cost, idx_tokens                    never used in a WHERE or ORDER BY
+--   idx_requests_*_recent                   DESC duplicates, where additional_indexes.sql was applied
+
+SET SESSION group_concat_max_len = 8192;
+
+WITH minimal_indexes (index_name, index_columns) AS (
+    SELECT 'idx_user_date', 'user_id, date_only'
+    UNION ALL SELECT 'idx_user_timestamp', 'user_id, request_timestamp'
+    UNION ALL SELECT 'idx_team_date_hour', 'team, date_only, hour_only'
+    UNION ALL SELECT 'idx_date_hour', 'date_only, hour_only'
+    UNION ALL SELECT 'idx_timestamp', 'request_timestamp'
+),
+live_indexes AS (
+    SELECT INDEX_NAME AS index_name,
+           GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX SEPARATOR ', ') AS index_columns
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'bedrock_requests' AND INDEX_NAME <> 'PRIMARY'
+    GROUP BY INDEX_NAME
+),
+clauses (step, index_name, clause) AS (
+    SELECT 1, l.index_name, CONCAT('DROP INDEX ', l.index_name)
+    FROM live_indexes l
+    LEFT JOIN minimal_indexes m ON m.index_name = l.index_name
+    WHERE m.index_columns IS NULL OR m.index_columns <> l.index_columns
+    UNION ALL
+    SELECT 2, m.index_name, CONCAT('ADD INDEX ', m.index_name, ' (', m.index_columns, ')')
+    FROM minimal_indexes m
+    LEFT JOIN live_indexes l ON l.index_name = m.index_name
+    WHERE l.index_columns IS NULL OR l.index_columns <> m.index_columns
+)
+SELECT CONCAT('ALTER TABLE bedrock_requests ',
+              GROUP_CONCAT(clause ORDER BY step, index_name SEPARATOR ', '),
+              ', ALGORITHM=INPLACE, LOCK=NONE')
+FROM clauses
+INTO @minimal_index_migration;
+
+SET @minimal_index_migration = COALESCE(@minimal_index_migration,
+    'SELECT ''bedrock_requests already has the minimal index set'' AS status');
+SELECT @minimal_index_migration AS migration;
+
+PREPARE minimal_index_migration FROM @minimal_index_migration;
+EXECUTE minimal_index_migration;
+DEALLOCATE PREPARE minimal_index_migration;
@@ -0,0 +1,43 @@
+-- =====================================================
+-- Migration: V001 backfill model_name
+-- Description: The realtime controller did not insert model_name, so older
+-- rows have it NULL. Fill it the way the controller now does: first the
+-- model id, with Bedrock ARNs reduced as in parse_bedrock_event, then the
+-- friendly name from MODEL_NAME_MAPPING (keep the WHEN list in sync with
+-- it); ids without a friendly name keep the id. Deploy the controller
+-- writing model_name before running this, so rows inserted meanwhile are not
+-- left NULL. Runs in primary-key chunks (Scripts/migrate_schema.py).
+-- =====================================================
+
+UPDATE bedrock_requests
+SET model_name = CASE
+    WHEN LEFT(model_id, 16) = 'arn:aws:bedrock:' AND LOCATE('/eu.anthropic.claude-sonnet-4-', model_id) > 0
+        THEN 'anthropic.claude-3-5-sonnet-20240620-v1:0'
+    WHEN LEFT(model_id, 16) = 'arn:aws:bedrock:' AND LOCATE('/anthropic.claude-', model_id) > 0
+        THEN IF(LEFT(SUBSTRING_INDEX(model_id, '/', -1), 3) = 'eu.',
+                SUBSTRING(SUBSTRING_INDEX(model_id, '/', -1), 4),
+                SUBSTRING_INDEX(model_id, '/', -1))
+    ELSE model_id
+END
+WHERE {id_range} AND model_name IS NULL;
+
+UPDATE bedrock_requests
+SET model_name = CASE model_name
+    WHEN 'anthropic.claude-3-opus-20240229-v1:0' THEN 'Claude 3 Opus'
+    WHEN 'anthropic.claude-3-sonnet-20240229-v1:0' THEN 'Claude 3 Sonnet'
+    WHEN 'anthropic.claude-3-haiku-20240307-v1:0' THEN 'Claude 3 Haiku'
+    WHEN 'anthropic.claude-3-5-sonnet-20240620-v1:0' THEN 'Claude 3.5 Sonnet'
+    WHEN 'anthropic.claude-sonnet-4-20250514-v1:0' THEN 'Claude 3.5 Sonnet'
+    WHEN 'amazon.titan-text-express-v1' THEN 'Amazon Titan Text Express'
+    WHEN 'amazon.titan-text-lite-v1' THEN 'Amazon Titan Text Lite'
+    ELSE model_name
+END
+WHERE {id_range} AND model_name IN (
+    'anthropic.claude-3-opus-20240229-v1:0',
+    'anthropic.claude-3-sonnet-20240229-v1:0',
+    'anthropic.claude-3-haiku-20240307-v1:0',
+    'anthropic.claude-3-5-sonnet-20240620-v1:0',
+    'anthropic.claude-sonnet-4-20250514-v1:0',
+    'amazon.titan-text-express-v1',
+    'amazon.titan-text-lite-v1'
+);
@@ -23,6 +23,10 @@ BEGIN
     DECLARE v_monthly_percent DECIMAL(5,2) DEFAULT 0;
     DECLARE v_should_block BOOLEAN DEFAULT FALSE;
     DECLARE v_block_reason VARCHAR(500) DEFAULT NULL;
+    -- Half-open ranges on date_only (no function on the column) so the
+    -- counts seek on idx_user_date and prune to the current month's partition
+    DECLARE v_today DATE DEFAULT CURDATE();
+    DECLARE v_month_start DATE DEFAULT DATE_FORMAT(CURDATE(), '%Y-%m-01');
 
     -- Get user limits and current status from user_limits table
     SELECT daily_request_limit, monthly_request_limit
@@ -41,14 +45,14 @@ BEGIN
     INTO v_daily_requests_used
     FROM bedrock_requests
     WHERE user_id = p_user_id
-    AND DATE(request_timestamp) = CURDATE();
+    AND date_only >= v_today AND date_only < v_today + INTERVAL 1 DAY;
 
     -- Get current monthly usage (requests this month)
     SELECT COUNT(*)
     INTO v_monthly_requests_used
     FROM bedrock_requests
     WHERE user_id = p_user_id
-    AND DATE(request_timestamp) >= DATE_FORMAT(NOW(), '%Y-%m-01');
+    AND date_only >= v_month_start AND date_only < v_today + INTERVAL 1 DAY;
 
     -- Calculate usage percentages
     SET v_daily_percent = (v_daily_requests_used / v_daily_request_limit) * 100;
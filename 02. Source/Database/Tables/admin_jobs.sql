@@ -0,0 +1,25 @@
+-- =====================================================
+-- Table: admin_jobs
+-- Description: Admin block/unblock requests accepted by the realtime
+--              controller (HTTP 202) and run by an asynchronous
+--              self-invocation (shared/admin_jobs.py). step is the
+--              workflow step the job has reached; result holds the final
+--              response. Polled with the controller's "job_status" action.
+-- =====================================================
+
+CREATE TABLE admin_jobs (
+    job_id CHAR(32) NOT NULL PRIMARY KEY,
+    action ENUM('block', 'unblock') NOT NULL,
+    user_id VARCHAR(255) NOT NULL,
+    params JSON NOT NULL,
+    status ENUM('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED') NOT NULL DEFAULT 'QUEUED',
+    step VARCHAR(50) NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    result JSON NULL,
+    error VARCHAR(1000) NULL,
+    created_at DATETIME NOT NULL,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    updated_at DATETIME NOT NULL,
+    INDEX idx_user_created (user_id, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
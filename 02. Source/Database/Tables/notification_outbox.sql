@@ -0,0 +1,29 @@
+-- =====================================================
+-- Table: notification_outbox
+-- Description: Blocking/unblocking notifications written in the same
+--              transaction as the user_blocking_status change and
+--              delivered by the controller's dispatch_notifications action
+--              (SELECT ... FOR UPDATE SKIP LOCKED, requires MySQL 8.0).
+--              Older notifications of a recipient are SUPERSEDED by the
+--              newest one, which is sent as a digest of all of them.
+--              sent_at is the delivery time, or the hand-off time of a
+--              SENDING row given to the email service asynchronously
+-- =====================================================
+
+CREATE TABLE notification_outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    notification_type ENUM('BLOCK', 'UNBLOCK', 'ADMIN_BLOCK', 'ADMIN_UNBLOCK') NOT NULL,
+    payload JSON NOT NULL,
+    audit_log_id BIGINT NULL,
+    status ENUM('PENDING', 'SENDING', 'SENT', 'FAILED', 'SUPERSEDED') NOT NULL DEFAULT 'PENDING',
+    superseded_by BIGINT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL,
+    last_error VARCHAR(1000) NULL,
+    created_at DATETIME NOT NULL,
+    sent_at DATETIME NULL,
+    INDEX idx_status_next_attempt (status, next_attempt_at),
+    INDEX idx_user_status_sent (user_id, status, sent_at),
+    INDEX idx_superseded_by (superseded_by)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
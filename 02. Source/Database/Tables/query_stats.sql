@@ -0,0 +1,21 @@
+-- =====================================================
+-- Table: query_stats
+-- Description: Slow queries captured by the MySQL query executor,
+--              with their fingerprint and EXPLAIN FORMAT=JSON plan
+-- =====================================================
+
+CREATE TABLE query_stats (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    fingerprint CHAR(16) NOT NULL,
+    normalized_query TEXT NOT NULL,
+    source VARCHAR(100) NOT NULL,
+    duration_ms DECIMAL(12,3) NOT NULL,
+    rows_returned INT NULL,
+    rows_examined BIGINT NULL,
+    index_used VARCHAR(500) NULL,
+    access_types VARCHAR(255) NULL,
+    plan_json JSON NULL,
+    captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_captured_fingerprint (captured_at, fingerprint),
+    INDEX idx_fingerprint (fingerprint)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
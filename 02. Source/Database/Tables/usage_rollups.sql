@@ -0,0 +1,49 @@
+-- =====================================================
+-- Tables: usage_rollup_hourly, usage_rollup_daily, latency_rollup_hourly
+-- Description: Per-bucket usage totals with HyperLogLog sketches
+--              (shared/hll.py) so distinct users/models compose across
+--              hours, days and teams. Rebuilt by the bedrock-db-maintenance
+--              Lambda (task "rollups"), read by the query executor
+--              (action "distinct_counts").
+-- =====================================================
+
+CREATE TABLE usage_rollup_hourly (
+    date_only DATE NOT NULL,
+    hour_only TINYINT NOT NULL,
+    team VARCHAR(100) NOT NULL,
+    model_id VARCHAR(255) NOT NULL,
+    request_count INT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd DECIMAL(14,6) NOT NULL DEFAULT 0.000000,
+    users_hll VARBINARY(8192) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (date_only, hour_only, team, model_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE usage_rollup_daily (
+    date_only DATE NOT NULL,
+    team VARCHAR(100) NOT NULL,
+    request_count INT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd DECIMAL(14,6) NOT NULL DEFAULT 0.000000,
+    users_hll VARBINARY(8192) NOT NULL,
+    models_hll VARBINARY(8192) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (date_only, team)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Latency quantile sketches (shared/latency_sketch.py, DDSketch with 1%
+-- relative accuracy) per model and CET hour. Merged in by the realtime
+-- controller after each batch of requests, read by the query executor
+-- (action "latency_quantiles").
+CREATE TABLE latency_rollup_hourly (
+    date_only DATE NOT NULL,
+    hour_only TINYINT NOT NULL,
+    model_id VARCHAR(255) NOT NULL,
+    request_count INT NOT NULL DEFAULT 0,
+    latency_sketch VARBINARY(16384) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (date_only, hour_only, model_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
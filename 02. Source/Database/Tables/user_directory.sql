@@ -0,0 +1,19 @@
+-- =====================================================
+-- Table: user_directory
+-- Description: IAM users with their Team/Person/Email tags and groups,
+--              mirrored by the bedrock-db-maintenance Lambda (task
+--              "user_directory", shared/user_directory.py). Rows are only
+--              rewritten when tags_hash (SHA-256 of tags and groups)
+--              changes; synced_at is the time of the last rewrite. The
+--              realtime controller reads this table instead of IAM.
+-- =====================================================
+
+CREATE TABLE user_directory (
+    user_id VARCHAR(255) NOT NULL PRIMARY KEY,
+    team VARCHAR(100) NOT NULL DEFAULT 'unknown',
+    person VARCHAR(255) NOT NULL DEFAULT 'Unknown',
+    email VARCHAR(255) NULL,
+    `groups` JSON NOT NULL,
+    tags_hash CHAR(64) NOT NULL,
+    synced_at DATETIME NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -11,6 +11,10 @@ This Lambda function performs daily reset operations including:
 
 Triggered by CloudWatch Events cron schedule at 00:00 CET daily.
 
+IAM access is restored with the realtime controller's blocking backend
+(IAM_BLOCKING_BACKEND and related settings, shared/iam_blocking.py), so
+both functions must be configured alike.
+
 Author: AWS Bedrock Usage Control System
 Version: 3.0.0 (Simplified RDS MySQL)
 """
@@ -24,6 +28,8 @@ import logging
 from typing import Dict, Any, List, Optional
 import pytz
 
+from iam_blocking import IamBlocker
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -45,6 +51,13 @@ ACCOUNT_ID = os.environ.get('ACCOUNT_ID', '701055077130')
 SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', f'arn:aws:sns:{REGION}:{ACCOUNT_ID}:bedrock-usage-alerts')
 EMAIL_SERVICE_FUNCTION = os.environ.get('EMAIL_SERVICE_FUNCTION', 'bedrock-email-service')
 
+# IAM blocking backend, same settings as the realtime controller
+IAM_BLOCKING_BACKEND = os.environ.get('IAM_BLOCKING_BACKEND', 'inline').lower()
+IAM_DENY_POLICY_ARN = os.environ.get('IAM_DENY_POLICY_ARN') or None
+IAM_BLOCKED_GROUP = os.environ.get('IAM_BLOCKED_GROUP') or None
+IAM_BLOCKING_CLEAR_INLINE = os.environ.get('IAM_BLOCKING_CLEAR_INLINE', 'true').lower() == 'true'
+iam_blocker = IamBlocker(iam, IAM_BLOCKING_BACKEND, IAM_DENY_POLICY_ARN, IAM_BLOCKED_GROUP, IAM_BLOCKING_CLEAR_INLINE)
+
 # CET timezone
 CET = pytz.timezone('Europe/Madrid')
 
@@ -350,43 +363,10 @@ def implement_iam_unblocking(user_id: str) -> bool:
         True if successful, False otherwise
     """
     try:
-        policy_name = f"{user_id}_BedrockPolicy"
-        
-        try:
-            response = iam.get_user_policy(UserName=user_id, PolicyName=policy_name)
-            current_policy = response['PolicyDocument']
-            
-            # Remove deny statements
-            current_policy['Statement'] = [
-                stmt for stmt in current_policy['Statement'] 
-                if stmt.get('Sid') != 'DailyLimitBlock'
-            ]
-            
-            # Ensure there's at least an allow statement
-            has_allow = any(stmt.get('Effect') == 'Allow' for stmt in current_policy['Statement'])
-            if not has_allow:
-                current_policy['Statement'].append({
-                    "Sid": "BedrockAccess",
-                    "Effect": "Allow",
-                    "Action": [
-                        "bedrock:InvokeModel",
-                        "bedrock:InvokeModelWithResponseStream"
-                    ],
-                    "Resource": "*"
-                })
-            
-            iam.put_user_policy(
-                UserName=user_id,
-                PolicyName=policy_name,
-                PolicyDocument=json.dumps(current_policy, separators=(',', ':'))
-            )
-            
+        success = iam_blocker.unblock(user_id)
+        if success:
             logger.info(f"✅ Successfully removed IAM deny policy for user {user_id}")
-            return True
-            
-        except iam.exceptions.NoSuchEntityException:
-            logger.info(f"No existing policy found for user {user_id}, no action needed")
-            return True
+        return success
         
     except Exception as e:
         logger.error(f"❌ Failed to remove IAM deny policy for user {user_id}: {str(e)}")
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+AWS Bedrock Usage Control System - Database Maintenance Lambda
+==============================================================
+
+This Lambda function runs scheduled maintenance on the RDS MySQL database:
+1. Partition maintenance for bedrock_requests (task "partitions"): splits
+   monthly partitions out of the empty p_future ahead of time and detaches or
+   drops partitions past the retention window; a p_future that already holds
+   rows is only split when the event sets allow_populated_future (a one-time
+   catch-up for a maintenance window)
+2. Cold-storage archive (task "archive"): exports closed months older than
+   ARCHIVE_AFTER_MONTHS to gzip NDJSON in ARCHIVE_BUCKET (or ARCHIVE_DIR),
+   verifies row counts and checksums and drops the partition / detached table
+3. Retention purge (task "purge"): deletes rows past PURGE_RETENTION_DAYS from
+   blocking_audit_log, blocking_operations and (opt-in) bedrock_requests in
+   small primary-key chunks, backing off on replica lag or lock waits, and
+   publishes progress as CloudWatch embedded metrics (namespace
+   BedrockUsageControl/Maintenance); bedrock_requests only loses whole
+   partitions whose month has a verified archive
+4. Usage rollups (task "rollups"): rebuilds usage_rollup_hourly and
+   usage_rollup_daily, with their HyperLogLog user/model sketches, for the
+   last ROLLUP_HOURS hours (CET), or for a day range when backfilling
+5. User directory sync (task "user_directory"): pages through IAM list_users,
+   fetches tags and groups concurrently and rewrites only the user_directory
+   rows whose tags changed, so request paths never have to call IAM
+6. IAM block reconcile (task "iam_blocks"): moves every block to the
+   configured IAM_BLOCKING_BACKEND according to user_blocking_status and
+   clears blocks left by the other backends (run after switching backends)
+
+Triggered by one EventBridge rule per task (bedrock-db-partitions
+cron(0 3 1 * ? *), bedrock-db-archive cron(0 4 1 * ? *), bedrock-db-purge
+cron(30 2 * * ? *), bedrock-db-rollups rate(15 minutes),
+bedrock-db-user-directory rate(1 hour) and bedrock-db-iam-blocks
+cron(0 5 * * ? *)), each with {"task": ...} as input; the installation guide
+creates them with the function and its role. Shared modules (db_router,
+partition_manager, partition_archive, retention_purger, hll, latency_sketch,
+usage_rollups, user_tags, user_directory, iam_blocking) are packaged next to
+this file.
+
+Event options:
+{
+    "task": "partitions",
+    "dry_run": true,              # only log and return the DDL
+    "months_ahead": 3,
+    "retention_months": 13,       # omit to keep every partition
+    "retention_action": "detach", # or "drop"
+    "allow_populated_future": false   # true splits a p_future holding rows (maintenance window)
+}
+{
+    "task": "archive",
+    "dry_run": true,
+    "archive_after_months": 13,   # or "month": "2025-01" for a single month
+    "drop": true                  # false keeps the rows after archiving
+}
+{
+    "task": "purge",
+    "dry_run": true,
+    "retention_days": {"blocking_audit_log": 730},   # defaults to PURGE_RETENTION_DAYS
+    "chunk_size": 1000,
+    "max_chunks": 500
+}
+{
+    "task": "rollups",
+    "hours": 3                    # or "start_date"/"end_date" (inclusive) to backfill days
+}
+{
+    "task": "user_directory",
+    "dry_run": true,              # count changes without writing
+    "remove_missing": false       # keep rows of users no longer in IAM
+}
+{
+    "task": "iam_blocks",
+    "dry_run": true               # count users whose active backend is out of line
+}
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import date, datetime
+from typing import Dict, Any, Optional
+from zoneinfo import ZoneInfo
+
+from db_router import build_db_config, connect, router_from_environment
+from partition_manager import run_partition_maintenance
+from partition_archive import LocalArchiveStore, S3ArchiveStore, archive_month, run_archiving
+from retention_purger import purge_tables
+from usage_rollups import rebuild_days, run_rollups
+from user_directory import sync_user_directory
+from iam_blocking import IamBlocker, reconcile_blocks
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Database configuration (maintenance always runs on the primary)
+DB_CONFIG = build_db_config(default_host='bedrock-usage-mysql.czuimyk2qu10.eu-west-1.rds.amazonaws.com')
+
+# Partition maintenance defaults
+PARTITION_TABLE = os.environ.get('PARTITION_TABLE', 'bedrock_requests')
+PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', '3'))
+PARTITION_RETENTION_MONTHS = os.environ.get('PARTITION_RETENTION_MONTHS')
+PARTITION_RETENTION_ACTION = os.environ.get('PARTITION_RETENTION_ACTION', 'detach')
+
+# Cold-storage archive: S3 when ARCHIVE_BUCKET is set, otherwise ARCHIVE_DIR
+ARCHIVE_BUCKET = os.environ.get('ARCHIVE_BUCKET')
+ARCHIVE_PREFIX = os.environ.get('ARCHIVE_PREFIX', 'archive')
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', '/tmp/archive')
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', '13'))
+ARCHIVE_ROWS_PER_PART = int(os.environ.get('ARCHIVE_ROWS_PER_PART', '500000'))
+
+# Retention purge: days kept per table (bedrock_requests is only purged when
+# listed), chunking and the limits that make the purge back off and stop
+PURGE_RETENTION_DAYS = json.loads(os.environ.get(
+    'PURGE_RETENTION_DAYS', '{"blocking_audit_log": 730, "blocking_operations": 730}'))
+PURGE_CHUNK_SIZE = int(os.environ.get('PURGE_CHUNK_SIZE', '1000'))
+PURGE_SLEEP_SECONDS = float(os.environ.get('PURGE_SLEEP_SECONDS', '0.2'))
+PURGE_MAX_CHUNKS = int(os.environ.get('PURGE_MAX_CHUNKS', '2000'))
+PURGE_MAX_LOCK_WAITS = int(os.environ.get('PURGE_MAX_LOCK_WAITS', '2'))
+PURGE_MAX_REPLICA_LAG = float(os.environ.get('PURGE_MAX_REPLICA_LAG', '5'))
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'BedrockUsageControl/Maintenance')
+
+# Rollups rebuild the current CET hour and the ones before it
+ROLLUP_HOURS = int(os.environ.get('ROLLUP_HOURS', '3'))
+CET = ZoneInfo('Europe/Madrid')
+
+# User directory sync: list_users page size and concurrent tag lookups
+USER_DIRECTORY_PAGE_SIZE = int(os.environ.get('USER_DIRECTORY_PAGE_SIZE', '100'))
+USER_DIRECTORY_SYNC_WORKERS = int(os.environ.get('USER_DIRECTORY_SYNC_WORKERS', '8'))
+
+# IAM block reconcile: same backend settings as the realtime controller
+IAM_BLOCKING_BACKEND = os.environ.get('IAM_BLOCKING_BACKEND', 'inline').lower()
+IAM_DENY_POLICY_ARN = os.environ.get('IAM_DENY_POLICY_ARN') or None
+IAM_BLOCKED_GROUP = os.environ.get('IAM_BLOCKED_GROUP') or None
+IAM_BLOCKING_CLEAR_INLINE = os.environ.get('IAM_BLOCKING_CLEAR_INLINE', 'true').lower() == 'true'
+IAM_RECONCILE_WORKERS = int(os.environ.get('IAM_RECONCILE_WORKERS', '8'))
+
+# Replica lag is checked through DB_READER_HOST when it is set
+REPLICA_ROUTER = router_from_environment()
+
+def get_db_connection(autocommit: bool = True):
+    """Create and return a connection to the primary database"""
+    try:
+        connection = connect(DB_CONFIG, autocommit=autocommit)
+        logger.info("✅ Successfully connected to MySQL database")
+        return connection
+    except Exception as e:
+        logger.error(f"❌ Failed to connect to MySQL database: {str(e)}")
+        raise
+
+def optional_int(value: Any) -> Optional[int]:
+    return None if value in (None, '') else int(value)
+
+def handle_partitions(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Run partition maintenance for bedrock_requests"""
+    connection = get_db_connection()
+    try:
+        return run_partition_maintenance(
+            connection,
+            today=date.fromisoformat(event['today']) if event.get('today') else None,
+            table=PARTITION_TABLE,
+            months_ahead=int(event.get('months_ahead', PARTITION_MONTHS_AHEAD)),
+            retention_months=optional_int(event.get('retention_months', PARTITION_RETENTION_MONTHS)),
+            retention_action=event.get('retention_action', PARTITION_RETENTION_ACTION),
+            dry_run=bool(event.get('dry_run', False)),
+            allow_populated_future=bool(event.get('allow_populated_future', False))
+        )
+    finally:
+        connection.close()
+
+def get_archive_store():
+    """Archive store for the configured bucket or local directory"""
+    if ARCHIVE_BUCKET:
+        return S3ArchiveStore(ARCHIVE_BUCKET, ARCHIVE_PREFIX)
+    return LocalArchiveStore(ARCHIVE_DIR)
+
+def handle_archive(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Archive closed months of bedrock_requests to cold storage"""
+    today = date.fromisoformat(event['today']) if event.get('today') else None
+    options = {'dry_run': bool(event.get('dry_run', False)), 'rows_per_part': ARCHIVE_ROWS_PER_PART}
+    store = get_archive_store()
+    connection = get_db_connection()
+    try:
+        if event.get('month'):
+            month = date.fromisoformat(f"{str(event['month'])[:7]}-01")
+            return archive_month(connection, store, month, PARTITION_TABLE, today,
+                                 drop=bool(event.get('drop', True)), **options)
+        return run_archiving(
+            connection, store, today=today, table=PARTITION_TABLE,
+            archive_after_months=int(event.get('archive_after_months', ARCHIVE_AFTER_MONTHS)),
+            drop=bool(event.get('drop', True)), **options
+        )
+    finally:
+        connection.close()
+
+def emit_purge_metrics(stats: Dict[str, Any]) -> None:
+    """Publish purge progress as a CloudWatch embedded metric format log line"""
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Table']],
+                'Metrics': [{'Name': 'RowsDeleted', 'Unit': 'Count'},
+                            {'Name': 'ChunkDuration', 'Unit': 'Milliseconds'},
+                            {'Name': 'Backoffs', 'Unit': 'Count'}]
+            }]
+        },
+        'Table': stats['table'],
+        'RowsDeleted': stats['rows_deleted'],
+        'ChunkDuration': stats['chunk_ms'],
+        'Backoffs': stats['backoffs'],
+        'LastId': stats['last_id']
+    }))
+
+def handle_purge(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Purge rows past their retention from the audit and request tables"""
+    retention_days = event.get('retention_days', PURGE_RETENTION_DAYS)
+    if not isinstance(retention_days, dict) or not retention_days:
+        raise ValueError("retention_days must map table names to days")
+    
+    replica_connect = None
+    if REPLICA_ROUTER.enabled:
+        replica_connect = lambda: connect(REPLICA_ROUTER.replica_config)
+    
+    # Chunks commit explicitly so each DELETE is its own short transaction
+    connection = get_db_connection(autocommit=False)
+    try:
+        results = purge_tables(
+            connection,
+            {table: int(days) for table, days in retention_days.items()},
+            today=date.fromisoformat(event['today']) if event.get('today') else None,
+            chunk_size=int(event.get('chunk_size', PURGE_CHUNK_SIZE)),
+            sleep_seconds=float(event.get('sleep_seconds', PURGE_SLEEP_SECONDS)),
+            max_chunks=int(event.get('max_chunks', PURGE_MAX_CHUNKS)),
+            max_lock_waits=PURGE_MAX_LOCK_WAITS,
+            max_replica_lag=PURGE_MAX_REPLICA_LAG,
+            replica_connect=replica_connect,
+            progress=emit_purge_metrics,
+            dry_run=bool(event.get('dry_run', False)),
+            archive_store=get_archive_store()
+        )
+    finally:
+        connection.close()
+    return {'tables': results, 'rows_deleted': sum(result['rows_deleted'] for result in results)}
+
+def handle_rollups(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the hourly/daily usage rollups of recent hours or of a day range"""
+    connection = get_db_connection(autocommit=False)
+    try:
+        if event.get('start_date'):
+            start = date.fromisoformat(event['start_date'])
+            end = date.fromisoformat(event.get('end_date', event['start_date']))
+            return rebuild_days(connection, start, end)
+        now = datetime.fromisoformat(event['now']) if event.get('now') else datetime.now(CET)
+        return run_rollups(connection, now, int(event.get('hours', ROLLUP_HOURS)))
+    finally:
+        connection.close()
+
+def handle_user_directory(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Mirror IAM user tags and groups into user_directory"""
+    import boto3
+    iam_client = boto3.client('iam')
+    connection = get_db_connection()
+    try:
+        return sync_user_directory(
+            connection, iam_client, datetime.now(CET).replace(tzinfo=None),
+            page_size=USER_DIRECTORY_PAGE_SIZE,
+            max_workers=USER_DIRECTORY_SYNC_WORKERS,
+            remove_missing=bool(event.get('remove_missing', True)),
+            dry_run=bool(event.get('dry_run', False))
+        )
+    finally:
+        connection.close()
+
+def handle_iam_blocks(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Hold IAM blocks in the configured backend only, as user_blocking_status says"""
+    import boto3
+    blocker = IamBlocker(boto3.client('iam'), IAM_BLOCKING_BACKEND, IAM_DENY_POLICY_ARN, IAM_BLOCKED_GROUP,
+                         IAM_BLOCKING_CLEAR_INLINE)
+    connection = get_db_connection()
+    try:
+        return reconcile_blocks(connection, blocker, max_workers=IAM_RECONCILE_WORKERS,
+                                dry_run=bool(event.get('dry_run', False)))
+    finally:
+        connection.close()
+
+TASKS = {
+    'partitions': handle_partitions,
+    'archive': handle_archive,
+    'purge': handle_purge,
+    'rollups': handle_rollups,
+    'user_directory': handle_user_directory,
+    'iam_blocks': handle_iam_blocks
+}
+
+def lambda_handler(event, context):
+    """Run the maintenance task named in the event"""
+    logger.info(f"🚀 Database maintenance started: {json.dumps(event, default=str)}")
+    
+    try:
+        event = event or {}
+        task = event.get('task', 'partitions')
+        handler = TASKS.get(task)
+        if handler is None:
+            raise ValueError(f"Unsupported task: {task}. Use one of {', '.join(TASKS)}")
+        
+        result = handler(event)
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'task': task, 'result': result}, default=str)
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Database maintenance failed: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
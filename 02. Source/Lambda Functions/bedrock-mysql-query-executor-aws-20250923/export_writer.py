@@ -0,0 +1,177 @@
+"""
+Streaming exports for the MySQL query executor
+
+Rows are read through an unbuffered SSCursor in fetchmany() chunks and written
+straight into NDJSON or CSV part files under /tmp. A part is handed to the
+export target and deleted from /tmp as soon as it reaches `rows_per_part`, so
+memory and disk use stay bounded by one fetch chunk and one part no matter how
+many rows the export has.
+
+Targets:
+- S3ExportTarget uploads parts to s3://bucket/prefix/<export_id>/
+- LocalExportTarget copies parts into a directory (stand-in for S3 when
+  running locally or in tests)
+
+Every export finishes by storing a manifest.json next to its parts; the same
+manifest is returned to the caller.
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import pymysql
+
+from result_encoding import to_json_value
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+
+class LocalExportTarget:
+    """Store export parts in a local directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def store(self, local_path: str, export_id: str, name: str) -> str:
+        export_dir = os.path.join(self.directory, export_id)
+        os.makedirs(export_dir, exist_ok=True)
+        destination = os.path.join(export_dir, name)
+        shutil.move(local_path, destination)
+        return destination
+
+
+class S3ExportTarget:
+    """Store export parts in S3"""
+
+    def __init__(self, bucket: str, prefix: str = '', s3_client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        if s3_client is None:
+            import boto3
+            s3_client = boto3.client('s3')
+        self.s3_client = s3_client
+
+    def store(self, local_path: str, export_id: str, name: str) -> str:
+        key = '/'.join(part for part in (self.prefix, export_id, name) if part)
+        self.s3_client.upload_file(local_path, self.bucket, key)
+        os.remove(local_path)
+        return f"s3://{self.bucket}/{key}"
+
+
+class PartWriter:
+    """Write rows into one NDJSON or CSV part file, tracking its row count and checksum"""
+
+    def __init__(self, columns: List[str], export_format: str, compress: bool, work_dir: str):
+        self.columns = columns
+        self.export_format = export_format
+        self.rows = 0
+        handle, self.path = tempfile.mkstemp(dir=work_dir)
+        os.close(handle)
+        self.file = gzip.open(self.path, 'wt', encoding='utf-8', newline='') if compress \
+            else open(self.path, 'w', encoding='utf-8', newline='')
+        if export_format == 'csv':
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(columns)
+
+    def write(self, row: tuple) -> None:
+        values = [to_json_value(value) for value in row]
+        if self.export_format == 'csv':
+            self.csv_writer.writerow(values)
+        else:
+            self.file.write(json.dumps(dict(zip(self.columns, values)), separators=(',', ':')))
+            self.file.write('\n')
+        self.rows += 1
+
+    def close(self) -> Dict[str, Any]:
+        self.file.close()
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as part:
+            for block in iter(lambda: part.read(1024 * 1024), b''):
+                digest.update(block)
+        return {'rows': self.rows, 'bytes': os.path.getsize(self.path), 'sha256': digest.hexdigest()}
+
+
+def part_name(number: int, export_format: str, compress: bool) -> str:
+    return f"part-{number:05d}.{export_format}" + ('.gz' if compress else '')
+
+
+def stream_export(connection, query: str, params: List[Any], target, export_id: str,
+                  export_format: str = 'ndjson', rows_per_part: int = 100000,
+                  fetch_size: int = 5000, compress: bool = True,
+                  work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stream a query result into parts on the target and return the export manifest
+
+    The connection must not be used for anything else until the export returns,
+    since an unbuffered cursor keeps the result set open on the server.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}. Use one of {', '.join(EXPORT_FORMATS)}")
+    if rows_per_part <= 0 or fetch_size <= 0:
+        raise ValueError("rows_per_part and fetch_size must be positive")
+
+    work_dir = work_dir or tempfile.gettempdir()
+    started_at = datetime.now(timezone.utc).isoformat()
+    parts = []
+    total_rows = 0
+    writer = None
+
+    def finish_part():
+        summary = writer.close()
+        name = part_name(len(parts) + 1, export_format, compress)
+        summary['location'] = target.store(writer.path, export_id, name)
+        summary['name'] = name
+        parts.append(summary)
+
+    try:
+        with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(query, params or None)
+            columns = [column[0] for column in cursor.description] if cursor.description else []
+
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if writer is None:
+                        writer = PartWriter(columns, export_format, compress, work_dir)
+                    writer.write(row)
+                    if writer.rows >= rows_per_part:
+                        finish_part()
+                        writer = None
+                total_rows += len(rows)
+
+        if writer is not None:
+            finish_part()
+            writer = None
+    finally:
+        if writer is not None:
+            writer.file.close()
+            if os.path.exists(writer.path):
+                os.remove(writer.path)
+
+    manifest = {
+        'export_id': export_id,
+        'format': export_format,
+        'compression': 'gzip' if compress else None,
+        'columns': columns,
+        'total_rows': total_rows,
+        'parts': parts,
+        'started_at': started_at,
+        'completed_at': datetime.now(timezone.utc).isoformat()
+    }
+
+    handle, manifest_path = tempfile.mkstemp(dir=work_dir)
+    with io.open(handle, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    manifest['manifest_location'] = target.store(manifest_path, export_id, 'manifest.json')
+
+    return manifest
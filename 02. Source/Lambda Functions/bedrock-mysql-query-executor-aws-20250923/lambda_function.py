@@ -2,61 +2,131 @@ import json
 import pymysql
 import os
 import logging
-from datetime import datetime, date
-from decimal import Decimal
-from typing import Dict, List, Any, Optional
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Any, Optional, Tuple, Callable
+
+from db_router import build_db_config, connect, router_from_environment, validate_consistency
+from usage_queries import range_predicate, month_bounds
+from partition_archive import LocalArchiveStore, S3ArchiveStore, aggregate_archived
+from usage_rollups import as_hour, distinct_counts, latency_quantiles, DEFAULT_QUANTILES
+from report_catalog import REPORTS, run_report, list_reports, build_report_query, date_bounds
+from export_writer import LocalExportTarget, S3ExportTarget, stream_export
+from query_stats import observe_query, top_queries
+from result_cache import ResultCache, WATERMARK_QUERIES, is_cacheable_query, make_cache_key, referenced_tables
+from result_encoding import encode_results, compress_payload, build_page_query, split_page
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Database configuration from environment variables
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'bedrock-usage-mysql.czuimyk2qu10.eu-west-1.rds.amazonaws.com'),
-    'port': 3306,
-    'database': os.environ.get('DB_NAME', 'bedrock_usage'),
-    'user': os.environ.get('DB_USER', 'admin'),
-    'password': os.environ.get('DB_PASSWORD'),
-    'charset': 'utf8mb4',
-    'connect_timeout': 10,
-    'read_timeout': 30,
-    'write_timeout': 30
-}
+# Database configuration from environment variables (primary instance)
+DB_CONFIG = build_db_config(default_host='bedrock-usage-mysql.czuimyk2qu10.eu-west-1.rds.amazonaws.com')
+
+# Reads go to DB_READER_HOST when it is set and its lag is acceptable
+REPLICA_ROUTER = router_from_environment()
+
+# Arbitrary SQL is off unless RAW_SQL_ENABLED=true, and even then it is only
+# accepted when the function was invoked through its RAW_SQL_ADMIN_ALIAS alias.
+# Who may invoke that alias is decided by IAM, and the invoked ARN comes from the
+# Lambda context, so nothing in the event can grant access.
+RAW_SQL_ENABLED = os.environ.get('RAW_SQL_ENABLED', 'false').lower() == 'true'
+RAW_SQL_ADMIN_ALIAS = os.environ.get('RAW_SQL_ADMIN_ALIAS', 'admin')
+
+# Batch execution limits
+MAX_BATCH_QUERIES = int(os.environ.get('MAX_BATCH_QUERIES', '1000'))
+MAX_BATCH_WORKERS = int(os.environ.get('MAX_BATCH_WORKERS', '4'))
+
+# Response encoding: payloads above this size are gzip+base64 encoded when
+# the request sets "compress"; pages are capped to keep under 6 MB responses
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', str(64 * 1024)))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '50000'))
+RESULT_FORMATS = ('rows', 'columnar')
+
+# Streaming exports go to S3 when EXPORT_BUCKET is set, otherwise to EXPORT_DIR
+EXPORT_BUCKET = os.environ.get('EXPORT_BUCKET')
+EXPORT_PREFIX = os.environ.get('EXPORT_PREFIX', 'exports')
+EXPORT_DIR = os.environ.get('EXPORT_DIR', '/tmp/exports')
+EXPORT_ROWS_PER_PART = int(os.environ.get('EXPORT_ROWS_PER_PART', '250000'))
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', '5000'))
+
+# Archived months (see shared/partition_archive.py) are read from ARCHIVE_BUCKET
+# when it is set, otherwise from ARCHIVE_DIR
+ARCHIVE_BUCKET = os.environ.get('ARCHIVE_BUCKET')
+ARCHIVE_PREFIX = os.environ.get('ARCHIVE_PREFIX', 'archive')
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', '/tmp/archive')
+MAX_ARCHIVE_MONTHS = int(os.environ.get('MAX_ARCHIVE_MONTHS', '12'))
+
+# Distinct counts and latency quantiles merge the rollup sketches (see shared/usage_rollups.py)
+MAX_DISTINCT_RANGE_DAYS = int(os.environ.get('MAX_DISTINCT_RANGE_DAYS', '400'))
+
+# Queries slower than SLOW_QUERY_MS are explained and recorded in query_stats
+# (QUERY_STATS_SINK=table) or the log stream (log); a negative value disables it
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '500'))
+QUERY_STATS_SINK = os.environ.get('QUERY_STATS_SINK', 'table')
+
+# Result cache, shared by all invocations of a warm container
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', '60'))
+RESULT_CACHE = ResultCache(
+    max_bytes=int(os.environ.get('CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    watermark_interval=float(os.environ.get('CACHE_WATERMARK_INTERVAL', '15'))
+)
 
 def get_db_connection():
-    """Create and return a database connection"""
+    """Create and return a connection to the primary database"""
     try:
-        connection = pymysql.connect(
-            host=DB_CONFIG['host'],
-            port=DB_CONFIG['port'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            database=DB_CONFIG['database'],
-            charset=DB_CONFIG['charset'],
-            connect_timeout=DB_CONFIG['connect_timeout'],
-            read_timeout=DB_CONFIG['read_timeout'],
-            write_timeout=DB_CONFIG['write_timeout'],
-            cursorclass=pymysql.cursors.DictCursor,
-            autocommit=True
-        )
+        connection = connect(DB_CONFIG)
         logger.info("✅ Successfully connected to MySQL database")
         return connection
     except Exception as e:
         logger.error(f"❌ Failed to connect to MySQL database: {str(e)}")
         raise
 
-def json_serializer(obj):
-    """JSON serializer for objects not serializable by default json code"""
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+class LazyConnection:
+    """
+    Database connection opened on first use, so cache hits never connect
+    
+    Reads are routed to the replica unless they ask for strong consistency or
+    the replica is lagging; everything else goes to the primary.
+    """
+    
+    def __init__(self, read: bool = False, consistency: str = 'eventual'):
+        self.read = read
+        self.consistency = consistency
+        self.connection = None
+        self.role = None
+    
+    def get(self):
+        if self.connection is None:
+            replica = REPLICA_ROUTER.connect_for_read(self.consistency) if self.read else None
+            if replica is not None:
+                logger.info("📖 Routing read to the replica")
+                self.connection, self.role = replica, 'replica'
+            else:
+                self.connection, self.role = get_db_connection(), 'primary'
+        return self.connection
+    
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.close()
+            logger.info("🔌 Database connection closed")
+        except Exception as e:
+            logger.error(f"Error closing database connection: {str(e)}")
+        self.connection = None
 
-def execute_query(connection, query: str, params: List[Any] = None) -> List[Dict[str, Any]]:
-    """Execute a SQL query and return results"""
+def execute_query(connection, query: str, params: List[Any] = None, columnar: bool = False) -> Any:
+    """Execute a SQL query and return results, as {columns, rows} when columnar"""
     try:
-        with connection.cursor() as cursor:
+        # A tuple cursor avoids building one dict per row for columnar results
+        with connection.cursor(pymysql.cursors.Cursor if columnar else None) as cursor:
             logger.info(f"🔍 Executing query: {query[:100]}...")
             
             # Convert ? placeholders to %s for PyMySQL compatibility
@@ -74,6 +144,9 @@ def execute_query(connection, query: str, params: List[Any] = None) -> List[Dict
             if query.strip().upper().startswith('SELECT'):
                 results = cursor.fetchall()
                 logger.info(f"📊 Query returned {len(results)} rows")
+                if columnar:
+                    columns = [column[0] for column in cursor.description] if cursor.description else []
+                    return {'columns': columns, 'rows': results}
                 return results
             else:
                 # For INSERT/UPDATE/DELETE queries, return affected rows
@@ -85,6 +158,488 @@ def execute_query(connection, query: str, params: List[Any] = None) -> List[Dict
         logger.error(f"❌ Error executing query: {str(e)}")
         raise
 
+def invoked_qualifier(context: Any) -> Optional[str]:
+    """Alias or version the function was invoked with, from the ARN in the Lambda context"""
+    arn = getattr(context, 'invoked_function_arn', None) or ''
+    parts = arn.split(':')
+    return parts[7] if len(parts) == 8 else None
+
+def require_raw_sql_access(context: Any) -> None:
+    """Reject arbitrary SQL unless it is enabled and the call came through the admin alias"""
+    if not RAW_SQL_ENABLED:
+        raise PermissionError("Arbitrary SQL is disabled, use a named report")
+    if invoked_qualifier(context) != RAW_SQL_ADMIN_ALIAS:
+        raise PermissionError(f"Arbitrary SQL is only accepted through the '{RAW_SQL_ADMIN_ALIAS}' alias")
+
+def parse_format(value: Any) -> str:
+    """Validate the requested result format"""
+    value = value or 'rows'
+    if value not in RESULT_FORMATS:
+        raise ValueError(f"Unsupported format: {value}. Use one of {', '.join(RESULT_FORMATS)}")
+    return value
+
+def parse_cache_ttl(value: Any) -> Optional[float]:
+    """Validate an optional cache_ttl in seconds; 0 disables caching for the query"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError("cache_ttl must be a non-negative number of seconds")
+    return float(value)
+
+def load_watermarks(connection, tables: List[str]) -> Dict[str, Any]:
+    """Read the current watermark of each table: the whole row of its watermark query"""
+    watermarks = {}
+    with connection.cursor(pymysql.cursors.Cursor) as cursor:
+        for table in tables:
+            cursor.execute(WATERMARK_QUERIES[table])
+            row = cursor.fetchone()
+            watermarks[table] = list(row) if row else None
+    logger.info(f"💧 Loaded cache watermarks for {', '.join(tables)}")
+    return watermarks
+
+def resolve_entry_sql(entry: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Return the SQL and params a report or raw query entry runs"""
+    if 'report' in entry:
+        return build_report_query(entry['report'], entry['params'])
+    return entry['query'], entry['params']
+
+def run_entry(connection, entry: Dict[str, Any]) -> Any:
+    """Run a report or raw query entry on the given connection, recording it when slow"""
+    started = time.perf_counter()
+    if 'report' in entry:
+        result = run_report(connection, entry['report'], entry['params'])
+        source = f"report:{entry['report']}"
+    else:
+        result = execute_query(connection, entry['query'], entry['params'],
+                               columnar=entry.get('format') == 'columnar')
+        source = 'query'
+    duration_ms = (time.perf_counter() - started) * 1000
+    
+    rows = result['rows'] if isinstance(result, dict) else result
+    logger.info(f"⏱️ {source} took {duration_ms:.1f} ms for {len(rows)} rows")
+    
+    query, params = resolve_entry_sql(entry)
+    observe_query(connection, query, params, duration_ms, len(rows), source,
+                  SLOW_QUERY_MS, QUERY_STATS_SINK, store_connect=get_db_connection)
+    return result
+
+def execute_cached(connect: Callable[[], Any], entry: Dict[str, Any]) -> Tuple[Any, str]:
+    """
+    Serve an entry from the result cache or run it
+    
+    Returns the serialized data and the cache status: 'hit', 'miss' or 'bypass'.
+    """
+    query, params = resolve_entry_sql(entry)
+    if 'report' in entry:
+        default_ttl = REPORTS[entry['report']].get('cache_ttl', CACHE_TTL_SECONDS)
+    else:
+        default_ttl = CACHE_TTL_SECONDS
+    
+    ttl = entry.get('cache_ttl')
+    ttl = default_ttl if ttl is None else ttl
+    
+    # Strongly consistent reads must not be answered from (possibly replica-fed) cache
+    if not CACHE_ENABLED or ttl <= 0 or not is_cacheable_query(query) or entry.get('consistency') == 'strong':
+        data, _ = encode_results(run_entry(connect(), entry))
+        if not is_cacheable_query(query):
+            # Writes through the executor make every cached result suspect
+            RESULT_CACHE.clear()
+        return data, 'bypass'
+    
+    key = make_cache_key(query, params, entry.get('format', 'rows'))
+    tables = referenced_tables(query)
+    loader = lambda stale: load_watermarks(connect(), stale)
+    
+    cached = RESULT_CACHE.get(key, tables, loader)
+    if cached is not None:
+        return cached, 'hit'
+    
+    data, size_bytes = encode_results(run_entry(connect(), entry))
+    RESULT_CACHE.put(key, data, tables, ttl, loader, size_bytes)
+    return data, 'miss'
+
+def validate_batch_entries(entries: Any) -> List[Dict[str, Any]]:
+    """Validate the entries of a batch request and return them normalized"""
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("Queries must be a non-empty list")
+    
+    if len(entries) > MAX_BATCH_QUERIES:
+        raise ValueError(f"Batch contains {len(entries)} queries, maximum is {MAX_BATCH_QUERIES}")
+    
+    normalized = []
+    seen_ids = set()
+    
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Batch entry {position} must be a dictionary")
+        
+        entry_id = str(entry.get('id', position))
+        if entry_id in seen_ids:
+            raise ValueError(f"Duplicate batch entry id: {entry_id}")
+        seen_ids.add(entry_id)
+        
+        if entry.get('report'):
+            params = entry.get('params', {})
+            if not isinstance(params, dict):
+                raise ValueError(f"Report params must be a dictionary for batch entry {entry_id}")
+            normalized.append({'id': entry_id, 'report': entry['report'], 'params': params,
+                               'cache_ttl': parse_cache_ttl(entry.get('cache_ttl'))})
+            continue
+        
+        if not entry.get('query'):
+            raise ValueError(f"Query or report is required for batch entry {entry_id}")
+        
+        params = entry.get('params', [])
+        if not isinstance(params, list):
+            raise ValueError(f"Params must be a list for batch entry {entry_id}")
+        
+        normalized.append({'id': entry_id, 'query': entry['query'], 'params': params,
+                           'format': parse_format(entry.get('format')),
+                           'cache_ttl': parse_cache_ttl(entry.get('cache_ttl'))})
+    
+    return normalized
+
+def execute_batch_entry(connect: Callable[[], Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Execute one batch entry, capturing its error instead of raising"""
+    try:
+        data, cache_status = execute_cached(connect, entry)
+        return {'id': entry['id'], 'data': data, 'cache': cache_status}
+    except Exception as e:
+        return {'id': entry['id'], 'error': str(e)}
+
+def execute_batch(entries: List[Dict[str, Any]], parallel: bool = False,
+                  max_workers: int = MAX_BATCH_WORKERS, read: bool = False,
+                  consistency: str = 'eventual') -> List[Dict[str, Any]]:
+    """
+    Execute a list of batch entries
+    
+    Sequential batches share a single connection. Parallel batches run on a
+    small pool where every worker thread owns one connection, since PyMySQL
+    connections are not thread-safe. Connections are only opened once an
+    entry misses the result cache.
+    """
+    workers = max(1, min(max_workers, MAX_BATCH_WORKERS, len(entries)))
+    
+    if not parallel or workers == 1:
+        connection = LazyConnection(read, consistency)
+        try:
+            return [execute_batch_entry(connection.get, entry) for entry in entries]
+        finally:
+            connection.close()
+    
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+    
+    def run_batch_entry(entry):
+        if not hasattr(local, 'connection'):
+            local.connection = LazyConnection(read, consistency)
+            with connections_lock:
+                connections.append(local.connection)
+        return execute_batch_entry(local.connection.get, entry)
+    
+    logger.info(f"🧵 Executing {len(entries)} batch queries on up to {workers} connections")
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run_batch_entry, entries))
+    finally:
+        for connection in connections:
+            connection.close()
+
+def compress_response(response: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    """Gzip+base64 encode the response data when the caller accepts it and it is large enough"""
+    if event.get('compress') is not True:
+        return response
+    
+    compressed = compress_payload(response['data'], COMPRESS_MIN_BYTES)
+    if compressed is None:
+        return response
+    
+    payload, raw_bytes, compressed_bytes = compressed
+    logger.info(f"🗜️ Compressed response data from {raw_bytes} to {compressed_bytes} bytes")
+    return dict(response, data=payload, encoding='gzip+base64')
+
+def handle_batch(event: Dict[str, Any], context: Any = None) -> Dict[str, Any]:
+    """Run every query of a batch request and return results keyed by entry id"""
+    entries = validate_batch_entries(event.get('queries'))
+    if any('query' in entry for entry in entries):
+        require_raw_sql_access(context)
+    
+    parallel = bool(event.get('parallel', False))
+    max_workers = int(event.get('max_workers', MAX_BATCH_WORKERS))
+    consistency = validate_consistency(event.get('consistency'))
+    for entry in entries:
+        entry['consistency'] = consistency
+    
+    # Batches containing any write run entirely on the primary
+    read = all('report' in entry or is_cacheable_query(entry['query']) for entry in entries)
+    
+    logger.info(f"📦 Executing batch of {len(entries)} queries (parallel={parallel})")
+    
+    outcomes = execute_batch(entries, parallel, max_workers, read, consistency)
+    
+    data = {}
+    errors = {}
+    cache = {'hit': 0, 'miss': 0, 'bypass': 0}
+    for outcome in outcomes:
+        if 'error' in outcome:
+            logger.error(f"❌ Batch entry {outcome['id']} failed: {outcome['error']}")
+            errors[outcome['id']] = outcome['error']
+        else:
+            data[outcome['id']] = outcome['data']
+            cache[outcome['cache']] += 1
+    
+    logger.info(f"🗄️ Batch cache: {cache['hit']} hits, {cache['miss']} misses, {cache['bypass']} bypassed")
+    
+    return compress_response({
+        'statusCode': 200,
+        'data': data,
+        'errors': errors,
+        'cache': cache,
+        'message': f'Batch executed: {len(data)} succeeded, {len(errors)} failed'
+    }, event)
+
+def handle_report(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one named report from the catalog"""
+    name = event.get('report')
+    if not name:
+        raise ValueError("Report name is required")
+    
+    params = event.get('params', {})
+    if not isinstance(params, dict):
+        raise ValueError("Report params must be a dictionary")
+    
+    consistency = validate_consistency(event.get('consistency'))
+    entry = {'report': name, 'params': params, 'consistency': consistency,
+             'cache_ttl': parse_cache_ttl(event.get('cache_ttl'))}
+    connection = LazyConnection(read=True, consistency=consistency)
+    try:
+        result, cache_status = execute_cached(connection.get, entry)
+    finally:
+        connection.close()
+    
+    logger.info(f"📊 Report {name} returned {len(result['rows'])} rows (cache {cache_status})")
+    
+    return compress_response({
+        'statusCode': 200,
+        'data': result,
+        'cache': cache_status,
+        'routed_to': connection.role,
+        'message': f"Report {name} returned {len(result['rows'])} rows"
+    }, event)
+
+def handle_query(event: Dict[str, Any], context: Any = None) -> Dict[str, Any]:
+    """Run one arbitrary SQL query, optionally columnar and keyset-paginated"""
+    require_raw_sql_access(context)
+    
+    query = event.get('query')
+    if not query:
+        raise ValueError("Query is required")
+    
+    params = event.get('params', [])
+    if not isinstance(params, list):
+        raise ValueError("Params must be a list")
+    
+    consistency = validate_consistency(event.get('consistency'))
+    entry = {'query': query, 'params': params, 'format': parse_format(event.get('format')),
+             'consistency': consistency, 'cache_ttl': parse_cache_ttl(event.get('cache_ttl'))}
+    
+    page_size = event.get('page_size')
+    if page_size is not None:
+        if not isinstance(page_size, int) or page_size > MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be an integer up to {MAX_PAGE_SIZE}")
+        key_column = event.get('key_column', 'id')
+        entry['query'], entry['params'] = build_page_query(query, params, key_column, page_size,
+                                                           event.get('page_token'))
+    
+    # Execute query, or serve it from the result cache; SELECTs may use the replica
+    connection = LazyConnection(read=is_cacheable_query(query), consistency=consistency)
+    try:
+        results, cache_status = execute_cached(connection.get, entry)
+    finally:
+        connection.close()
+    
+    response = {'statusCode': 200, 'cache': cache_status, 'routed_to': connection.role}
+    if page_size is not None:
+        results, response['next_page_token'] = split_page(results, query, params, key_column, page_size)
+    
+    row_count = len(results['rows']) if entry['format'] == 'columnar' else len(results)
+    response['data'] = results
+    response['message'] = f'Query executed successfully, returned {row_count} rows'
+    return compress_response(response, event)
+
+def get_export_target():
+    """Return the configured export target"""
+    if EXPORT_BUCKET:
+        return S3ExportTarget(EXPORT_BUCKET, EXPORT_PREFIX)
+    return LocalExportTarget(EXPORT_DIR)
+
+def build_export_query(event: Dict[str, Any], context: Any = None) -> Tuple[str, List[Any], str]:
+    """Return the SQL, params and a name for an export request"""
+    if event.get('query'):
+        require_raw_sql_access(context)
+        params = event.get('params', [])
+        if not isinstance(params, list):
+            raise ValueError("Params must be a list")
+        query = event['query'].replace('?', '%s') if params else event['query']
+        return query, params, 'query'
+    
+    columns = event.get('columns') or ['*']
+    if not isinstance(columns, list) or not all(column == '*' or re.match(r'^\w+$', str(column)) for column in columns):
+        raise ValueError("Columns must be a list of plain column names")
+    
+    start, end = date_bounds(event)
+    predicate, params = range_predicate(start, end)
+    query = f"SELECT {', '.join(columns)} FROM bedrock_requests WHERE {predicate}"
+    return query, params, f"bedrock_requests-{start.isoformat()}"
+
+def handle_export(event: Dict[str, Any], context: Any = None) -> Dict[str, Any]:
+    """Stream a bedrock_requests date range (or an admin query) into export parts"""
+    query, params, name = build_export_query(event, context)
+    export_format = event.get('format', 'ndjson')
+    rows_per_part = int(event.get('rows_per_part', EXPORT_ROWS_PER_PART))
+    export_id = f"{name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    
+    logger.info(f"📤 Starting export {export_id} ({export_format}, {rows_per_part} rows per part)")
+    
+    connection = LazyConnection(read=True, consistency=validate_consistency(event.get('consistency'))).get()
+    try:
+        # Unbuffered reads pause the server while parts are uploaded
+        with connection.cursor() as cursor:
+            cursor.execute("SET SESSION net_write_timeout = 600")
+        manifest = stream_export(
+            connection, query, params, get_export_target(), export_id,
+            export_format=export_format,
+            rows_per_part=rows_per_part,
+            fetch_size=EXPORT_FETCH_SIZE,
+            compress=event.get('compress', True) is not False
+        )
+    finally:
+        connection.close()
+    
+    logger.info(f"✅ Export {export_id} wrote {manifest['total_rows']} rows in {len(manifest['parts'])} parts")
+    
+    return {
+        'statusCode': 200,
+        'data': manifest,
+        'message': f"Exported {manifest['total_rows']} rows in {len(manifest['parts'])} parts"
+    }
+
+def handle_query_stats(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the slow-query fingerprints with the highest total time"""
+    limit = int(event.get('limit', 20))
+    hours = int(event.get('hours', 24))
+    if limit <= 0 or hours <= 0:
+        raise ValueError("limit and hours must be positive")
+    
+    connection = LazyConnection(read=True).get()
+    try:
+        stats = top_queries(connection, limit, hours)
+    finally:
+        connection.close()
+    
+    data, _ = encode_results(stats)
+    return {
+        'statusCode': 200,
+        'data': data,
+        'message': f'Top {len(data)} slow query fingerprints of the last {hours} hours'
+    }
+
+def get_archive_store():
+    """Archive store the maintenance Lambda writes closed months to"""
+    if ARCHIVE_BUCKET:
+        return S3ArchiveStore(ARCHIVE_BUCKET, ARCHIVE_PREFIX)
+    return LocalArchiveStore(ARCHIVE_DIR)
+
+def archive_months(event: Dict[str, Any]) -> List[Any]:
+    """Months from an inclusive start_month/end_month (or single month) range"""
+    start, _ = month_bounds(event.get('start_month', event.get('month')))
+    end, _ = month_bounds(event.get('end_month', event.get('month', start)))
+    if end < start:
+        raise ValueError("end_month must not be before start_month")
+    
+    months = [start]
+    while months[-1] < end:
+        months.append(month_bounds(months[-1])[1])
+    if len(months) > MAX_ARCHIVE_MONTHS:
+        raise ValueError(f"At most {MAX_ARCHIVE_MONTHS} archived months per request")
+    return months
+
+def handle_archive(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregate requests of archived months for historical reports"""
+    if not event.get('month') and not event.get('start_month'):
+        raise ValueError("month or start_month is required")
+    group_by = event.get('group_by', ['user_id'])
+    filters = event.get('filters', {})
+    if not isinstance(group_by, list) or not isinstance(filters, dict):
+        raise ValueError("group_by must be a list and filters a dictionary")
+    
+    months = archive_months(event)
+    result = aggregate_archived(get_archive_store(), 'bedrock_requests', months, group_by, filters)
+    logger.info(f"📦 Archive report over {len(months)} months returned {len(result['rows'])} rows")
+    
+    return compress_response({
+        'statusCode': 200,
+        'data': result,
+        'message': f"Archived months {months[0].strftime('%Y-%m')} to {months[-1].strftime('%Y-%m')} "
+                   f"returned {len(result['rows'])} rows"
+    }, event)
+
+def parse_rollup_request(event: Dict[str, Any], filter_key: str, group_key: str) -> Tuple[Any, Any, Any, bool]:
+    """Validated range, filter list and grouping flag of a rollup sketch request"""
+    if not event.get('start') or not event.get('end'):
+        raise ValueError("start and end are required")
+    values = event.get(filter_key)
+    if values is not None and (not isinstance(values, list) or not values):
+        raise ValueError(f"{filter_key} must be a non-empty list")
+    group_by = event.get('group_by')
+    if group_by not in (None, group_key):
+        raise ValueError(f"group_by must be '{group_key}' or omitted")
+    start, end = as_hour(event['start']), as_hour(event['end'])
+    if (end - start).days > MAX_DISTINCT_RANGE_DAYS:
+        raise ValueError(f"Ranges are limited to {MAX_DISTINCT_RANGE_DAYS} days")
+    return start, end, values, group_by == group_key
+
+def handle_distinct_counts(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Active users and unique models over a range, merged from the rollup sketches"""
+    start, end, teams, by_team = parse_rollup_request(event, 'teams', 'team')
+    
+    consistency = validate_consistency(event.get('consistency'))
+    connection = LazyConnection(read=True, consistency=consistency)
+    try:
+        result = distinct_counts(connection.get(), start, end, teams, by_team)
+    finally:
+        connection.close()
+    
+    return {
+        'statusCode': 200,
+        'data': result,
+        'routed_to': connection.role,
+        'message': f"Distinct counts from {result['start']} to {result['end']} ({len(result['rows'])} rows)"
+    }
+
+def handle_latency_quantiles(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Latency percentiles over a range, merged from the per (model, hour) sketches"""
+    start, end, models, by_model = parse_rollup_request(event, 'models', 'model')
+    quantiles = event.get('quantiles', list(DEFAULT_QUANTILES))
+    if not isinstance(quantiles, list) or not quantiles:
+        raise ValueError("quantiles must be a non-empty list")
+    
+    consistency = validate_consistency(event.get('consistency'))
+    connection = LazyConnection(read=True, consistency=consistency)
+    try:
+        result = latency_quantiles(connection.get(), start, end, models, by_model, [float(q) for q in quantiles])
+    finally:
+        connection.close()
+    
+    return {
+        'statusCode': 200,
+        'data': result,
+        'routed_to': connection.role,
+        'message': f"Latency quantiles from {result['start']} to {result['end']} ({len(result['rows'])} rows)"
+    }
+
 def lambda_handler(event, context):
     """
     Lambda function handler for MySQL query execution
@@ -95,49 +650,136 @@ def lambda_handler(event, context):
         "query": "SELECT * FROM table WHERE column = ?",
         "params": ["value1", "value2"]
     }
+    
+    Named report (see report_catalog.REPORTS):
+    {
+        "action": "report",
+        "report": "user_daily_range",
+        "params": {"start_date": "2025-09-10", "end_date": "2025-09-20"}
+    }
+    
+    Batch event structure (one invoke, results keyed by id):
+    {
+        "action": "batch",
+        "queries": [{"id": "q1", "report": "user_monthly_totals", "params": {"month": "2025-09"}},
+                    {"id": "q2", "query": "SELECT ...", "params": []}],
+        "parallel": false,
+        "max_workers": 4
+    }
+    
+    Arbitrary SQL ("query" actions, batch entries and query exports) needs
+    RAW_SQL_ENABLED=true and an invocation through the admin-only alias
+    (bedrock-mysql-query-executor:admin); the dashboard's loaders use named reports.
+    
+    Streaming export (bedrock_requests by inclusive date range, or an admin
+    "query"), written as NDJSON or CSV parts to S3/EXPORT_DIR; returns the manifest:
+    {
+        "action": "export",
+        "start_date": "2025-09-01",
+        "end_date": "2025-09-30",
+        "format": "csv"
+    }
+    
+    Historical months archived to cold storage (requests, tokens and cost grouped
+    by columns of bedrock_requests, optionally filtered):
+    {
+        "action": "archive",
+        "start_month": "2024-01",
+        "end_month": "2024-03",
+        "group_by": ["user_id", "model_id"],
+        "filters": {"team": "team_a"}
+    }
+    
+    Active users and unique models over any hour-aligned [start, end) range,
+    merged from the HyperLogLog sketches of the usage rollups (optionally per team):
+    {
+        "action": "distinct_counts",
+        "start": "2025-09-01",
+        "end": "2025-09-15T12:00",
+        "teams": ["team_a", "team_b"],
+        "group_by": "team"
+    }
+    
+    Latency percentiles (ms) over the same kind of range, merged from the
+    per (model, hour) DDSketches written by the realtime controller:
+    {
+        "action": "latency_quantiles",
+        "start": "2025-09-01",
+        "end": "2025-09-08",
+        "models": ["anthropic.claude-3-haiku-20240307-v1:0"],
+        "group_by": "model",
+        "quantiles": [0.5, 0.95, 0.99]
+    }
+    
+    Slow-query statistics (top fingerprints by total time):
+    {"action": "query_stats", "limit": 20, "hours": 24}
+    
+    Reads (SELECTs, reports, exports) use the read replica when DB_READER_HOST is
+    set and its lag is acceptable; "consistency": "strong" sends them to the
+    primary and skips the result cache.
+    
+    Large results: "format": "columnar" returns {"columns": [...], "rows": [[...]]}
+    (reports always do), "compress": true gzip+base64 encodes data above
+    COMPRESS_MIN_BYTES (the response then carries "encoding": "gzip+base64"), and
+    "page_size" with "key_column" (default "id") pages a query by keyset; pass the
+    returned "next_page_token" as "page_token" until it is null.
+    
+    SELECT results are cached per container; "cache_ttl" (seconds, 0 disables)
+    overrides the default TTL per event or batch entry, and responses report
+    the cache status.
     """
     
     logger.info(f"🚀 MySQL Query Executor Lambda started")
     logger.info(f"📥 Received event: {json.dumps(event, default=str)}")
     
-    connection = None
-    
     try:
         # Validate input
         if not isinstance(event, dict):
             raise ValueError("Event must be a dictionary")
         
         action = event.get('action')
-        if action != 'query':
-            raise ValueError(f"Unsupported action: {action}")
+        if action == 'batch':
+            response = handle_batch(event, context)
+            logger.info(f"✅ {response['message']}")
+            return response
         
-        query = event.get('query')
-        if not query:
-            raise ValueError("Query is required")
+        if action == 'report':
+            return handle_report(event)
         
-        params = event.get('params', [])
-        if not isinstance(params, list):
-            raise ValueError("Params must be a list")
+        if action == 'export':
+            return handle_export(event, context)
         
-        # Connect to database
-        connection = get_db_connection()
+        if action == 'query_stats':
+            return handle_query_stats(event)
         
-        # Execute query
-        results = execute_query(connection, query, params)
+        if action == 'archive':
+            return handle_archive(event)
         
-        # Convert results to JSON-serializable format
-        serialized_results = json.loads(json.dumps(results, default=json_serializer))
+        if action == 'distinct_counts':
+            return handle_distinct_counts(event)
         
-        # Return success response
-        response = {
-            'statusCode': 200,
-            'data': serialized_results,
-            'message': f'Query executed successfully, returned {len(results)} rows'
-        }
+        if action == 'latency_quantiles':
+            return handle_latency_quantiles(event)
+        
+        if action == 'list_reports':
+            return {'statusCode': 200, 'data': list_reports(), 'message': 'Available reports'}
+        
+        if action != 'query':
+            raise ValueError(f"Unsupported action: {action}")
+        
+        response = handle_query(event, context)
         
         logger.info(f"✅ Query execution completed successfully")
         return response
         
+    except PermissionError as e:
+        logger.warning(f"⛔ Rejected request: {str(e)}")
+        return {
+            'statusCode': 403,
+            'errorMessage': str(e),
+            'data': []
+        }
+        
     except Exception as e:
         error_message = f"Error executing MySQL query: {str(e)}"
         logger.error(f"❌ {error_message}")
@@ -147,15 +789,6 @@ def lambda_handler(event, context):
             'errorMessage': error_message,
             'data': []
         }
-        
-    finally:
-        # Clean up database connection
-        if connection:
-            try:
-                connection.close()
-                logger.info("🔌 Database connection closed")
-            except Exception as e:
-                logger.error(f"Error closing database connection: {str(e)}")
 
 def test_connection():
     """Test function to verify database connectivity"""
@@ -190,7 +823,10 @@ if __name__ == "__main__":
         "query": "SELECT COUNT(*) as total_requests FROM bedrock_requests WHERE request_timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)",
         "params": []
     }
+    # Raw SQL is accepted through the admin alias only (and with RAW_SQL_ENABLED=true)
+    admin_context = SimpleNamespace(
+        invoked_function_arn=f"arn:aws:lambda:eu-west-1:000000000000:function:bedrock-mysql-query-executor:{RAW_SQL_ADMIN_ALIAS}")
     
     print("\nTesting query execution...")
-    result = lambda_handler(test_event, None)
+    result = lambda_handler(test_event, admin_context)
     print(f"Result: {json.dumps(result, indent=2, default=str)}")
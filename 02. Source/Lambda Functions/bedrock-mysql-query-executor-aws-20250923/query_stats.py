@@ -0,0 +1,178 @@
+"""
+Slow-query log for the MySQL query executor
+
+Every query run by the executor is timed. Queries slower than the configured
+threshold are explained with EXPLAIN FORMAT=JSON on the same connection and
+recorded under a fingerprint, i.e. the SQL with literals replaced by `?`, so
+all executions of one dashboard query aggregate together regardless of the
+user or date they were run for.
+
+Records go to the query_stats table (Database/Tables/query_stats.sql) or, with
+the 'log' sink, to the Lambda log stream as one JSON line per slow query.
+Recording problems are logged and never fail the query itself.
+"""
+
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import pymysql
+
+logger = logging.getLogger()
+
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|\?')
+IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+TOP_QUERIES_SQL = """
+    SELECT fingerprint,
+           MAX(normalized_query) AS normalized_query,
+           COUNT(*) AS slow_executions,
+           SUM(duration_ms) AS total_ms,
+           AVG(duration_ms) AS avg_ms,
+           MAX(duration_ms) AS max_ms,
+           MAX(rows_examined) AS max_rows_examined,
+           MAX(index_used) AS index_used
+    FROM query_stats
+    WHERE captured_at >= NOW() - INTERVAL %s HOUR
+    GROUP BY fingerprint
+    ORDER BY total_ms DESC
+    LIMIT %s
+"""
+
+
+def normalize_fingerprint(query: str) -> str:
+    """Replace literals and placeholders with ? and collapse whitespace and IN lists"""
+    text = STRING_LITERAL.sub('?', query)
+    text = NUMBER_LITERAL.sub('?', text)
+    text = PLACEHOLDER.sub('?', text)
+    text = IN_LIST.sub('IN (?)', text)
+    return re.sub(r'\s+', ' ', text).strip().rstrip(';').strip()
+
+
+def fingerprint(query: str) -> str:
+    """Short stable hash of the normalized query"""
+    return hashlib.sha256(normalize_fingerprint(query).lower().encode('utf-8')).hexdigest()[:16]
+
+
+def summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Collect the chosen indexes, access types and examined rows from an EXPLAIN FORMAT=JSON plan"""
+    indexes = []
+    access_types = []
+    rows_examined = 0
+
+    def walk(node):
+        nonlocal rows_examined
+        if isinstance(node, dict):
+            table = node.get('table')
+            if isinstance(table, dict) and 'table_name' in table:
+                key = table.get('key')
+                indexes.append(f"{table['table_name']}.{key}" if key else f"{table['table_name']}.<none>")
+                access_types.append(table.get('access_type', 'unknown'))
+                rows_examined += int(table.get('rows_examined_per_scan', 0) or 0)
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return {
+        'index_used': ', '.join(indexes) or None,
+        'access_types': ', '.join(sorted(set(access_types))) or None,
+        'rows_examined': rows_examined
+    }
+
+
+def explain_query(connection, query: str, params: Optional[List[Any]]) -> Optional[Dict[str, Any]]:
+    """Run EXPLAIN FORMAT=JSON for a SELECT; returns None when it cannot be explained"""
+    if not query.strip().upper().startswith('SELECT'):
+        return None
+    if params and '?' in query:
+        query = query.replace('?', '%s')
+    with connection.cursor(pymysql.cursors.Cursor) as cursor:
+        cursor.execute(f"EXPLAIN FORMAT=JSON {query}", params or None)
+        row = cursor.fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def build_record(connection, query: str, params: Optional[List[Any]], duration_ms: float,
+                 rows_returned: Optional[int], source: str) -> Dict[str, Any]:
+    """Build the slow-query record, including the plan summary when EXPLAIN works"""
+    record = {
+        'fingerprint': fingerprint(query),
+        'normalized_query': normalize_fingerprint(query),
+        'source': source,
+        'duration_ms': round(duration_ms, 3),
+        'rows_returned': rows_returned,
+        'rows_examined': None,
+        'index_used': None,
+        'access_types': None,
+        'plan': None
+    }
+    try:
+        plan = explain_query(connection, query, params)
+        if plan:
+            record.update(summarize_plan(plan))
+            record['plan'] = plan
+    except Exception as e:
+        logger.warning(f"⚠️ Could not explain slow query {record['fingerprint']}: {str(e)}")
+    return record
+
+
+def store_record(connection, record: Dict[str, Any], sink: str) -> None:
+    """Write a slow-query record to the query_stats table or the log stream"""
+    if sink == 'table':
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO query_stats
+                (fingerprint, normalized_query, source, duration_ms, rows_returned,
+                 rows_examined, index_used, access_types, plan_json)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [record['fingerprint'], record['normalized_query'], record['source'],
+                  record['duration_ms'], record['rows_returned'], record['rows_examined'],
+                  record['index_used'], record['access_types'],
+                  json.dumps(record['plan']) if record['plan'] else None])
+    else:
+        logger.warning(f"🐢 SLOW_QUERY {json.dumps(record, default=str)}")
+
+
+def observe_query(connection, query: str, params: Optional[List[Any]], duration_ms: float,
+                  rows_returned: Optional[int], source: str, threshold_ms: float,
+                  sink: str = 'table',
+                  store_connect: Optional[Callable[[], Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Record a query when it ran longer than the threshold; returns the record, if any
+
+    The plan is captured on the connection that ran the query. `store_connect`
+    opens the connection records are written with, since the query may have
+    run on a read-only replica.
+    """
+    if threshold_ms < 0 or duration_ms < threshold_ms:
+        return None
+
+    record = build_record(connection, query, params, duration_ms, rows_returned, source)
+    logger.warning(f"🐢 Slow query {record['fingerprint']} took {record['duration_ms']} ms "
+                   f"(index: {record['index_used']}, rows examined: {record['rows_examined']})")
+    try:
+        if store_connect is None or sink != 'table':
+            store_record(connection, record, sink)
+        else:
+            store_connection = store_connect()
+            try:
+                store_record(store_connection, record, sink)
+            finally:
+                store_connection.close()
+    except Exception as e:
+        logger.error(f"❌ Could not store slow query {record['fingerprint']}: {str(e)}")
+    return record
+
+
+def top_queries(connection, limit: int = 20, hours: int = 24) -> List[Dict[str, Any]]:
+    """Return the slow-query fingerprints with the highest total time in the last hours"""
+    with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+        cursor.execute(TOP_QUERIES_SQL, [hours, limit])
+        return list(cursor.fetchall())
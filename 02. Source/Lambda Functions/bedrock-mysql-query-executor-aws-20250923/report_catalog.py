@@ -0,0 +1,371 @@
+"""
+Named report catalog for the MySQL query executor
+
+Every report is a single set-based query across all users, so the dashboard
+asks for one grouped result instead of issuing one query per user. Reports
+filter on `date_only` with half-open ranges, which lets MySQL prune the
+monthly partitions of bedrock_requests and seek on the (x, date_only)
+secondary indexes listed in `index_path`. The predicates come from the
+shared usage_queries builders.
+
+Results are compact: column names are returned once and rows as arrays.
+"""
+
+import re
+import pymysql
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Tuple
+
+from usage_queries import month_bounds, range_predicate, day_range
+
+TZ_OFFSET_PATTERN = re.compile(r'^[+-](0\d|1[0-4]):[0-5]\d$')
+
+
+def parse_date(value: Any, name: str) -> date:
+    """Parse a YYYY-MM-DD report parameter"""
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Parameter '{name}' must be a date in YYYY-MM-DD format")
+
+
+def parse_int(params: Dict[str, Any], name: str, default: int, low: int, high: int) -> int:
+    """Parse an integer report parameter within [low, high]"""
+    value = params.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        raise ValueError(f"Parameter '{name}' must be an integer between {low} and {high}")
+    return value
+
+
+def parse_user_id(params: Dict[str, Any], required: bool = False) -> Any:
+    """Return the user_id parameter, None when it is optional and missing"""
+    user_id = params.get('user_id')
+    if user_id is None and not required:
+        return None
+    if not isinstance(user_id, str) or not user_id:
+        raise ValueError("Parameter 'user_id' must be a non-empty string")
+    return user_id
+
+
+def date_bounds(params: Dict[str, Any]) -> Tuple[date, date]:
+    """Return the half-open range for inclusive start_date/end_date parameters"""
+    start = parse_date(params.get('start_date'), 'start_date')
+    end = parse_date(params.get('end_date', start), 'end_date')
+    if end < start:
+        raise ValueError("Parameter 'end_date' must not be before 'start_date'")
+    return start, end + timedelta(days=1)
+
+
+def build_user_monthly_totals(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    start, end = month_bounds(params.get('month', date.today().strftime('%Y-%m')))
+    predicate, predicate_params = range_predicate(start, end)
+    return f"""
+        SELECT user_id, COUNT(*) AS monthly_requests
+        FROM bedrock_requests
+        WHERE {predicate}
+        GROUP BY user_id
+    """, predicate_params
+
+
+def build_user_daily_range(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    start, end = date_bounds(params)
+    predicate, predicate_params = range_predicate(start, end)
+    return f"""
+        SELECT user_id, date_only AS request_date, COUNT(*) AS daily_requests
+        FROM bedrock_requests
+        WHERE {predicate}
+        GROUP BY user_id, date_only
+    """, predicate_params
+
+
+def build_team_hourly(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    start, end = date_bounds(params)
+    predicate, predicate_params = range_predicate(start, end)
+    return f"""
+        SELECT team, date_only AS request_date, hour_only AS request_hour,
+               COUNT(*) AS hourly_requests, COUNT(DISTINCT user_id) AS active_users
+        FROM bedrock_requests
+        WHERE {predicate}
+        GROUP BY team, date_only, hour_only
+    """, predicate_params
+
+
+def build_model_breakdown(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    start, end = date_bounds(params)
+    predicate, predicate_params = range_predicate(start, end)
+    return f"""
+        SELECT user_id, model_id, COUNT(*) AS request_count,
+               AVG(processing_time_ms) AS avg_processing_time
+        FROM bedrock_requests
+        WHERE {predicate}
+        GROUP BY user_id, model_id
+    """, predicate_params
+
+
+def build_blocking_overview(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    today = parse_date(params.get('date', date.today()), 'date')
+    predicate, predicate_params = day_range(None, today)
+    return f"""
+        SELECT ul.user_id, ul.team, ul.person,
+               ul.daily_request_limit, ul.monthly_request_limit, ul.administrative_safe,
+               COALESCE(ubs.is_blocked, 'N') AS is_blocked, ubs.blocked_reason,
+               ubs.blocked_at, ubs.blocked_until,
+               COALESCE(usage_today.daily_requests, 0) AS daily_requests
+        FROM user_limits ul
+        LEFT JOIN user_blocking_status ubs ON ubs.user_id = ul.user_id
+        LEFT JOIN (
+            SELECT user_id, COUNT(*) AS daily_requests
+            FROM bedrock_requests
+            WHERE {predicate}
+            GROUP BY user_id
+        ) usage_today ON usage_today.user_id = ul.user_id
+    """, predicate_params
+
+
+def build_teams(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    return """
+        SELECT DISTINCT team
+        FROM user_limits
+        WHERE team IS NOT NULL AND team != ''
+        ORDER BY team
+    """, []
+
+
+def build_user_limits(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    user_id = parse_user_id(params)
+    return f"""
+        SELECT user_id, team, person, daily_request_limit, monthly_request_limit,
+               administrative_safe, created_at, updated_at
+        FROM user_limits
+        {'WHERE user_id = %s' if user_id else ''}
+        ORDER BY user_id
+    """, [user_id] if user_id else []
+
+
+def build_user_activity(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    return """
+        SELECT ul.user_id, ul.team, ul.person,
+               COUNT(br.id) AS total_requests, MAX(br.request_timestamp) AS last_request
+        FROM user_limits ul
+        LEFT JOIN bedrock_requests br ON br.user_id = ul.user_id
+        GROUP BY ul.user_id, ul.team, ul.person
+        ORDER BY last_request DESC
+    """, []
+
+
+def build_user_hourly_models(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    tz_offset = params.get('tz_offset', '+01:00')
+    if not isinstance(tz_offset, str) or not TZ_OFFSET_PATTERN.match(tz_offset):
+        raise ValueError("Parameter 'tz_offset' must look like +01:00")
+    hours = parse_int(params, 'hours', 24, 1, 24 * 7)
+    local_time = "CONVERT_TZ(request_timestamp, '+00:00', %s)"
+    return f"""
+        SELECT user_id, team, DATE({local_time}) AS request_date, HOUR({local_time}) AS request_hour,
+               model_id, COUNT(*) AS hourly_requests
+        FROM bedrock_requests
+        WHERE request_timestamp >= DATE_SUB(NOW(), INTERVAL %s HOUR)
+        GROUP BY user_id, team, DATE({local_time}), HOUR({local_time}), model_id
+    """, [tz_offset, tz_offset, hours, tz_offset, tz_offset]
+
+
+def build_hourly_requests(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    predicate, predicate_params = day_range(None, parse_date(params.get('date'), 'date'))
+    return f"""
+        SELECT hour_only AS hour, COUNT(*) AS request_count
+        FROM bedrock_requests
+        WHERE {predicate}
+        GROUP BY hour_only
+        ORDER BY hour_only
+    """, predicate_params
+
+
+def build_daily_activity(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    predicate, predicate_params = day_range(None, parse_date(params.get('date'), 'date'))
+    return f"""
+        SELECT COUNT(DISTINCT user_id) AS active_users, COUNT(*) AS total_requests
+        FROM bedrock_requests
+        WHERE {predicate}
+    """, predicate_params
+
+
+def build_model_usage(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    hours = parse_int(params, 'hours', 24, 1, 24 * 31)
+    user_id = parse_user_id(params)
+    return f"""
+        SELECT model_id, COUNT(*) AS request_count, AVG(processing_time_ms) AS avg_processing_time
+        FROM bedrock_requests
+        WHERE request_timestamp >= DATE_SUB(NOW(), INTERVAL %s HOUR)
+        {'AND user_id = %s' if user_id else ''}
+        GROUP BY model_id
+        ORDER BY request_count DESC
+    """, [hours, user_id] if user_id else [hours]
+
+
+def build_recent_blocking_changes(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    minutes = parse_int(params, 'minutes', 60, 1, 24 * 60)
+    return """
+        SELECT user_id, is_blocked, blocked_reason, blocked_at, blocked_until,
+               last_request_at, last_reset_at, created_at, updated_at
+        FROM user_blocking_status
+        WHERE updated_at >= DATE_SUB(NOW(), INTERVAL %s MINUTE)
+        ORDER BY updated_at DESC
+    """, [minutes]
+
+
+def build_user_status(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    return """
+        SELECT ubs.is_blocked, ubs.blocked_reason, ubs.blocked_at, ubs.blocked_until,
+               ul.daily_request_limit, ul.administrative_safe
+        FROM user_blocking_status ubs
+        LEFT JOIN user_limits ul ON ul.user_id = ubs.user_id
+        WHERE ubs.user_id = %s
+    """, [parse_user_id(params, required=True)]
+
+
+def build_blocking_history(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    limit = parse_int(params, 'limit', 100, 1, 1000)
+    return """
+        SELECT bal.id, bal.user_id, bal.operation_type, bal.operation_reason, bal.performed_by,
+               bal.operation_timestamp, bal.previous_status, bal.new_status, bal.blocked_until,
+               bal.daily_requests_at_operation, bal.daily_limit_at_operation, bal.usage_percentage,
+               bal.iam_policy_updated, bal.email_sent, bal.error_message, ul.person
+        FROM blocking_audit_log bal
+        LEFT JOIN user_limits ul ON ul.user_id = bal.user_id
+        ORDER BY bal.operation_timestamp DESC
+        LIMIT %s
+    """, [limit]
+
+
+# Report name -> definition. `index_path` documents the access path each
+# query is written for; keep it in sync with Database/Tables and Indexes.
+# `cache_ttl` overrides the executor's default result cache TTL.
+REPORTS: Dict[str, Dict[str, Any]] = {
+    'user_monthly_totals': {
+        'description': 'Requests per user for one calendar month',
+        'params': ['month'],
+        'index_path': 'partition pruning on date_only, covering scan of idx_user_date (user_id, date_only)',
+        'build': build_user_monthly_totals
+    },
+    'user_daily_range': {
+        'description': 'Requests per user and day for an inclusive date range',
+        'params': ['start_date', 'end_date'],
+        'index_path': 'partition pruning on date_only, covering scan of idx_user_date (user_id, date_only)',
+        'build': build_user_daily_range
+    },
+    'team_hourly': {
+        'description': 'Requests and active users per team, day and hour',
+        'params': ['start_date', 'end_date'],
+        'index_path': 'partition pruning on date_only, idx_team_date_hour (team, date_only, hour_only)',
+        'build': build_team_hourly
+    },
+    'model_breakdown': {
+        'description': 'Requests and average processing time per user and model',
+        'params': ['start_date', 'end_date'],
+        'index_path': 'partition pruning on date_only, idx_date_hour (date_only, hour_only) range',
+        'build': build_model_breakdown
+    },
+    'blocking_overview': {
+        'description': 'Limits, blocking status and requests of the day for every user',
+        'params': ['date'],
+        'index_path': 'PRIMARY of user_limits and user_blocking_status, idx_user_date for the daily counts',
+        'cache_ttl': 15,
+        'build': build_blocking_overview
+    },
+    'teams': {
+        'description': 'Teams that have users in user_limits',
+        'params': [],
+        'index_path': 'scan of user_limits (one row per user)',
+        'build': build_teams
+    },
+    'user_limits': {
+        'description': 'Team, person and limits of every user, or of one user_id',
+        'params': ['user_id'],
+        'index_path': 'PRIMARY of user_limits',
+        'build': build_user_limits
+    },
+    'user_activity': {
+        'description': 'Team, person, total requests and last request of every user',
+        'params': [],
+        'index_path': 'PRIMARY of user_limits, idx_user_date (user_id, date_only) per user',
+        'build': build_user_activity
+    },
+    'user_hourly_models': {
+        'description': 'Requests per user, team, local hour and model over the last hours',
+        'params': ['tz_offset', 'hours'],
+        'index_path': 'range on idx_timestamp (request_timestamp)',
+        'build': build_user_hourly_models
+    },
+    'hourly_requests': {
+        'description': 'Requests per hour of one day',
+        'params': ['date'],
+        'index_path': 'partition pruning on date_only, idx_date_hour (date_only, hour_only)',
+        'build': build_hourly_requests
+    },
+    'daily_activity': {
+        'description': 'Active users and total requests of one day',
+        'params': ['date'],
+        'index_path': 'partition pruning on date_only, covering scan of idx_user_date (user_id, date_only)',
+        'build': build_daily_activity
+    },
+    'model_usage': {
+        'description': 'Requests and average processing time per model over the last hours, optionally for one user',
+        'params': ['hours', 'user_id'],
+        'index_path': 'range on idx_timestamp, or idx_user_timestamp (user_id, request_timestamp) with user_id',
+        'build': build_model_usage
+    },
+    'recent_blocking_changes': {
+        'description': 'Blocking status rows updated in the last minutes',
+        'params': ['minutes'],
+        'index_path': 'scan of user_blocking_status (one row per user)',
+        'cache_ttl': 15,
+        'build': build_recent_blocking_changes
+    },
+    'user_status': {
+        'description': 'Blocking status, daily limit and administrative protection of one user',
+        'params': ['user_id'],
+        'index_path': 'PRIMARY of user_blocking_status and user_limits',
+        'cache_ttl': 15,
+        'build': build_user_status
+    },
+    'blocking_history': {
+        'description': 'Latest blocking operations from the audit log',
+        'params': ['limit'],
+        'index_path': 'blocking_audit_log ordered by operation_timestamp, PRIMARY of user_limits',
+        'build': build_blocking_history
+    }
+}
+
+
+def list_reports() -> List[Dict[str, Any]]:
+    """Describe the available reports without their builders"""
+    return [
+        {'name': name, 'description': report['description'],
+         'params': report['params'], 'index_path': report['index_path']}
+        for name, report in REPORTS.items()
+    ]
+
+
+def build_report_query(name: str, params: Dict[str, Any] = None) -> Tuple[str, List[Any]]:
+    """Return the SQL and bound parameters for a named report"""
+    report = REPORTS.get(name)
+    if not report:
+        raise ValueError(f"Unknown report: {name}")
+    if params is not None and not isinstance(params, dict):
+        raise ValueError("Report params must be a dictionary")
+    return report['build'](params or {})
+
+
+def run_report(connection, name: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Run a named report and return its result as columns plus row arrays"""
+    query, query_params = build_report_query(name, params)
+
+    # A tuple cursor avoids building one dict per row only to flatten it again
+    with connection.cursor(pymysql.cursors.Cursor) as cursor:
+        cursor.execute(query, query_params)
+        rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description] if cursor.description else []
+
+    # Rows stay tuples here; the executor's encoder turns them into arrays in one pass
+    return {'report': name, 'columns': columns, 'rows': list(rows)}
@@ -0,0 +1,174 @@
+"""
+In-container result cache for the MySQL query executor
+
+Dashboard tabs issue the same SELECTs within seconds of each other while the
+underlying data only changes when requests arrive or users are (un)blocked.
+Results are cached per warm Lambda container, keyed on the normalized SQL plus
+its parameters, with a TTL per entry and an LRU cap on the serialized size.
+
+Every entry also records a watermark for each table it reads. Watermarks are
+re-read at most once per `watermark_interval` seconds and shared by all
+entries, so refreshing the dashboard within that interval does not touch RDS;
+after it a single cheap watermark query decides whether cached results are
+still current.
+
+The append-mostly tables use MIN(id) plus MAX(id), both read from the end of
+the primary key. An INSERT raises MAX(id). Rows only leave these tables
+oldest-first (partition drops and the id-ordered chunked purge of
+retention_purger), which raises MIN(id). The small per-user tables are updated
+in place, often several times within a second, which MAX(updated_at) cannot
+see; they use CHECKSUM TABLE, which changes with the content of any row. A
+cached result can still be stale:
+- for up to `watermark_interval` seconds after any write,
+- until its TTL after an in-place UPDATE of bedrock_requests or the audit
+  tables (e.g. a backfill migration),
+- until its TTL after rows other than the oldest are deleted, e.g. a
+  bedrock_requests partition dropped while an older, unarchived one is kept.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Table -> query returning a row that changes whenever the table is written
+# (see the module docstring for what each kind misses). All of them are
+# answered from the ends of the primary key or read a small table.
+WATERMARK_QUERIES = {
+    'bedrock_requests': 'SELECT MIN(id), MAX(id) FROM bedrock_requests',
+    'user_blocking_status': 'CHECKSUM TABLE user_blocking_status',
+    'user_limits': 'CHECKSUM TABLE user_limits',
+    'blocking_audit_log': 'SELECT MIN(id), MAX(id) FROM blocking_audit_log',
+    'blocking_operations': 'SELECT MIN(id), MAX(id) FROM blocking_operations'
+}
+
+TABLE_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?', re.IGNORECASE)
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and trailing semicolons so equivalent SQL shares a key"""
+    return re.sub(r'\s+', ' ', query).strip().rstrip(';').strip()
+
+
+def is_cacheable_query(query: str) -> bool:
+    """Only plain SELECT statements are cached"""
+    normalized = normalize_query(query).upper()
+    return normalized.startswith('SELECT') and ' FOR UPDATE' not in normalized
+
+
+def make_cache_key(query: str, params: Any = None, variant: str = '') -> str:
+    """Build the cache key from the normalized SQL, its parameters and the result format"""
+    payload = json.dumps([normalize_query(query), params or [], variant], default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def referenced_tables(query: str) -> List[str]:
+    """
+    Return the watermark tables a query depends on
+
+    Queries on views or tables without a watermark depend on every watermark,
+    which keeps them correct at the cost of more invalidations.
+    """
+    tables = {name.lower() for name in TABLE_PATTERN.findall(query)}
+    if not tables or not tables.issubset(WATERMARK_QUERIES):
+        return sorted(WATERMARK_QUERIES)
+    return sorted(tables)
+
+
+class ResultCache:
+    """Thread-safe LRU result cache with TTLs and watermark invalidation"""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, watermark_interval: float = 15.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.watermark_interval = watermark_interval
+        self.clock = clock
+        self.entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.watermarks: Dict[str, Dict[str, Any]] = {}
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def current_watermarks(self, tables: Iterable[str],
+                           load_watermarks: Callable[[List[str]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return watermarks for the tables, reloading the ones older than the interval"""
+        now = self.clock()
+        with self.lock:
+            stale = [table for table in tables
+                     if table not in self.watermarks
+                     or now - self.watermarks[table]['checked_at'] >= self.watermark_interval]
+
+        if stale:
+            loaded = load_watermarks(stale)
+            with self.lock:
+                for table in stale:
+                    self.watermarks[table] = {'value': loaded.get(table), 'checked_at': now}
+
+        with self.lock:
+            return {table: self.watermarks[table]['value'] for table in tables}
+
+    def get(self, key: str, tables: List[str],
+            load_watermarks: Callable[[List[str]], Dict[str, Any]]) -> Optional[Any]:
+        """Return the cached value, or None when it is missing, expired or outdated"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry['expires_at'] <= self.clock():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+        if self.current_watermarks(tables, load_watermarks) != entry['watermarks']:
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    self._remove(key)
+                self.misses += 1
+            return None
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            self.hits += 1
+            return entry['value']
+
+    def put(self, key: str, value: Any, tables: List[str], ttl: float,
+            load_watermarks: Callable[[List[str]], Dict[str, Any]], size_bytes: int) -> bool:
+        """Store a value; values larger than the whole cache are not stored"""
+        if ttl <= 0 or size_bytes > self.max_bytes:
+            return False
+
+        watermarks = self.current_watermarks(tables, load_watermarks)
+
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = {
+                'value': value,
+                'watermarks': watermarks,
+                'expires_at': self.clock() + ttl,
+                'size_bytes': size_bytes
+            }
+            self.size_bytes += size_bytes
+            while self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+        return True
+
+    def clear(self) -> None:
+        """Drop every entry and watermark, e.g. after a write through the executor"""
+        with self.lock:
+            self.entries.clear()
+            self.watermarks.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {'entries': len(self.entries), 'size_bytes': self.size_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key)
+        self.size_bytes -= entry['size_bytes']
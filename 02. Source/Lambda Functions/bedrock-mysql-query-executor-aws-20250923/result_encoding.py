@@ -0,0 +1,170 @@
+"""
+Response encoding for the MySQL query executor
+
+Large result sets are expensive in three ways: DictCursor rows repeat every
+column name, the old `json.loads(json.dumps(...))` round trip walked the data
+twice, and wide date ranges can exceed the 6 MB Lambda response limit.
+
+This module provides:
+- a single-pass conversion of rows into JSON-compatible values (Decimal,
+  datetime, date, timedelta) that also estimates the encoded size,
+- gzip+base64 compression of a response payload,
+- keyset pagination with an opaque continuation token, wrapping the query
+  in a derived table filtered and ordered on the key column.
+
+MySQL only merges that derived table into the outer query, and so seeks on
+the key column, for plain SELECTs. A query with GROUP BY, DISTINCT,
+aggregates, UNION or its own LIMIT is materialized and re-run in full for every
+page. Paginating such a query bounds the response size but not the work;
+narrow its date range instead.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import re
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import Any, List, Optional, Tuple
+
+COLUMN_PATTERN = re.compile(r'^\w+$')
+
+CONVERTERS = {
+    Decimal: float,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    timedelta: str
+}
+
+
+def to_json_value(value: Any) -> Any:
+    """Convert one database value into a JSON-compatible value"""
+    converter = CONVERTERS.get(type(value))
+    return converter(value) if converter else value
+
+
+def encode_value(value: Any) -> Tuple[Any, int]:
+    """Return a JSON-compatible copy of a value and its approximate encoded size"""
+    if isinstance(value, dict):
+        encoded = {}
+        size = 2
+        for key, item in value.items():
+            encoded[key], item_size = encode_value(item)
+            size += len(key) + 4 + item_size
+        return encoded, size
+
+    if isinstance(value, (list, tuple)):
+        encoded = []
+        size = 2
+        for item in value:
+            item_encoded, item_size = encode_value(item)
+            encoded.append(item_encoded)
+            size += item_size + 1
+        return encoded, size
+
+    value = to_json_value(value)
+    if isinstance(value, str):
+        return value, len(value) + 2
+    return value, 8
+
+
+def encode_results(results: Any) -> Tuple[Any, int]:
+    """Convert query results in a single pass; returns the data and its approximate size"""
+    return encode_value(results)
+
+
+def compress_payload(data: Any, min_bytes: int = 0) -> Optional[Tuple[str, int, int]]:
+    """
+    Gzip and base64 encode a JSON payload
+
+    Returns the encoded text with the raw and compressed sizes, or None when
+    the payload is smaller than `min_bytes` and not worth compressing.
+    """
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    if len(raw) < min_bytes:
+        return None
+    compressed = base64.b64encode(gzip.compress(raw, compresslevel=6)).decode('ascii')
+    return compressed, len(raw), len(compressed)
+
+
+def decompress_payload(payload: str) -> Any:
+    """Inverse of compress_payload"""
+    return json.loads(gzip.decompress(base64.b64decode(payload)).decode('utf-8'))
+
+
+def query_fingerprint(query: str, params: List[Any]) -> str:
+    """Short hash binding a page token to the query it was issued for"""
+    text = json.dumps([re.sub(r'\s+', ' ', query).strip(), params], default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def make_page_token(query: str, params: List[Any], key_column: str, last_key: Any) -> str:
+    """Create the continuation token for the page after `last_key`"""
+    token = {'q': query_fingerprint(query, params), 'k': key_column, 'after': to_json_value(last_key)}
+    return base64.urlsafe_b64encode(json.dumps(token).encode('utf-8')).decode('ascii')
+
+
+def read_page_token(token: str, query: str, params: List[Any], key_column: str) -> Any:
+    """Return the key value a token continues after, rejecting tokens of other queries"""
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError("Invalid page token")
+    if decoded.get('q') != query_fingerprint(query, params) or decoded.get('k') != key_column:
+        raise ValueError("Page token does not belong to this query")
+    return decoded.get('after')
+
+
+def build_page_query(query: str, params: List[Any], key_column: str, page_size: int,
+                     page_token: Optional[str] = None) -> Tuple[str, List[Any]]:
+    """
+    Wrap a SELECT for keyset pagination on a unique, selected key column
+
+    Only plain SELECTs seek on the key; others are re-run for every page (see
+    the module docstring). One extra row is fetched so the caller can tell whether another page exists.
+    """
+    if not query.strip().upper().startswith('SELECT'):
+        raise ValueError("Only SELECT queries can be paginated")
+    if not COLUMN_PATTERN.match(key_column or ''):
+        raise ValueError("key_column must be a plain column name")
+    if not isinstance(page_size, int) or isinstance(page_size, bool) or page_size <= 0:
+        raise ValueError("page_size must be a positive integer")
+
+    inner = query.strip().rstrip(';')
+    if params and '?' in inner:
+        inner = inner.replace('?', '%s')
+
+    page_params = list(params or [])
+    where = ''
+    if page_token:
+        page_params.append(read_page_token(page_token, query, params or [], key_column))
+        where = f'WHERE keyset_page.`{key_column}` > %s '
+
+    page_query = (f'SELECT * FROM ({inner}) AS keyset_page {where}'
+                  f'ORDER BY keyset_page.`{key_column}` LIMIT %s')
+    page_params.append(page_size + 1)
+    return page_query, page_params
+
+
+def split_page(data: Any, query: str, params: List[Any], key_column: str,
+               page_size: int) -> Tuple[Any, Optional[str]]:
+    """Trim the look-ahead row and return the page with its next token (None on the last page)"""
+    columnar = isinstance(data, dict)
+    rows = data['rows'] if columnar else data
+    if len(rows) <= page_size:
+        return data, None
+
+    rows = rows[:page_size]
+    if columnar:
+        if key_column not in data['columns']:
+            raise ValueError(f"key_column '{key_column}' is not part of the result")
+        last_key = rows[-1][data['columns'].index(key_column)]
+        page = dict(data, rows=rows)
+    else:
+        if key_column not in rows[-1]:
+            raise ValueError(f"key_column '{key_column}' is not part of the result")
+        last_key = rows[-1][key_column]
+        page = rows
+
+    return page, make_page_token(query, params or [], key_column, last_key)
@@ -14,6 +14,15 @@ ENHANCED FEATURES:
 - Status checking endpoint for dashboard integration
 - Proper CET timezone handling throughout
 - Complete blocking/unblocking audit trail
+- Block/unblock emails queued in notification_outbox and delivered by the
+  scheduled "dispatch_notifications" action, never on the ingest path
+- Team/Person/Email read from the user_directory table instead of IAM
+- Bulk admin actions (block_many, unblock_many, status_many) with batched DB
+  work and IAM changes fanned out to a bounded thread pool
+- Admin block/unblock accepted as admin_jobs (HTTP 202) and run by an
+  asynchronous self-invocation; progress via the "job_status" action
+- IAM blocking backend selectable with IAM_BLOCKING_BACKEND: inline
+  <user>_BedrockPolicy statement, managed deny policy or bedrock-blocked group
 
 Function Name: bedrock-realtime-usage-controller
 Author: AWS Bedrock Usage Control System
@@ -27,12 +36,22 @@ import os
 from datetime import datetime, timezone, timedelta
 import logging
 import re
-from typing import Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 import pytz
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from usage_queries import usage_counts_many_query, usage_counts_query
+from usage_rollups import add_latency, merge_latency_sketches
+from notification_outbox import (DELIVERY_ACCEPTED, SmtpSession, attach_audit_log, dispatch_notifications,
+                                 enqueue_notification, record_delivery)
+from user_tags import UserTagResolver
+from user_directory import DirectorySnapshot, load_directory, recipient_from_entry
+from admin_jobs import claim_job, create_job, finish_job, get_job, job_view, set_step
+from iam_blocking import IamBlocker
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -54,6 +73,42 @@ SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', f'arn:aws:sns:eu-west-1:70105507
 # Enhanced email service configuration
 EMAIL_SERVICE_LAMBDA_NAME = os.environ.get('EMAIL_SERVICE_LAMBDA_NAME', 'bedrock-email-service')
 EMAIL_NOTIFICATIONS_ENABLED = os.environ.get('EMAIL_NOTIFICATIONS_ENABLED', 'true').lower() == 'true'
+# 'sync' waits for the email service's answer; 'async' invokes it with InvocationType='Event'
+# and the service reports delivery back through the "email_delivery_status" action
+EMAIL_INVOCATION_MODE = os.environ.get('EMAIL_INVOCATION_MODE', 'sync').lower()
+STATUS_CALLBACK_FUNCTION = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'bedrock-realtime-usage-controller')
+
+# Admin block/unblock answer 202 with a job id and run in an asynchronous self-invocation
+# (see shared/admin_jobs.py); callers that need the final result can pass "wait": true
+ADMIN_ASYNC_JOBS = os.environ.get('ADMIN_ASYNC_JOBS', 'true').lower() == 'true'
+ADMIN_JOB_LEASE_SECONDS = int(os.environ.get('ADMIN_JOB_LEASE_SECONDS', '900'))
+
+# IAM tags are cached per warm container (see shared/user_tags.py)
+USER_TAG_CACHE_TTL_SECONDS = int(os.environ.get('USER_TAG_CACHE_TTL_SECONDS', '300'))
+tag_resolver = UserTagResolver(iam, USER_TAG_CACHE_TTL_SECONDS)
+
+# Team/Person/Email come from the user_directory table (shared/user_directory.py),
+# kept in sync with IAM by the bedrock-db-maintenance "user_directory" task. Only
+# users the sync has not seen yet fall back to IAM; 'false' keeps IAM off the
+# request path entirely (such users count as 'unknown' until the next sync)
+USER_DIRECTORY_TTL_SECONDS = int(os.environ.get('USER_DIRECTORY_TTL_SECONDS', '300'))
+USER_DIRECTORY_IAM_FALLBACK = os.environ.get('USER_DIRECTORY_IAM_FALLBACK', 'true').lower() == 'true'
+user_directory = DirectorySnapshot(lambda: load_directory(get_mysql_connection()), USER_DIRECTORY_TTL_SECONDS)
+
+# Notification outbox dispatcher (see shared/notification_outbox.py)
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', '25'))
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', '6'))
+NOTIFICATION_HOLD_SECONDS = int(os.environ.get('NOTIFICATION_HOLD_SECONDS', '120'))
+NOTIFICATION_RECIPIENT_LIMIT = int(os.environ.get('NOTIFICATION_RECIPIENT_LIMIT', '3'))
+NOTIFICATION_RECIPIENT_WINDOW_SECONDS = int(os.environ.get('NOTIFICATION_RECIPIENT_WINDOW_SECONDS', '3600'))
+NOTIFICATION_GLOBAL_LIMIT_PER_MINUTE = int(os.environ.get('NOTIFICATION_GLOBAL_LIMIT_PER_MINUTE', '60'))
+
+NOTIFICATION_LABELS = {
+    'BLOCK': 'Bloqueo automático',
+    'UNBLOCK': 'Desbloqueo automático',
+    'ADMIN_BLOCK': 'Bloqueo por administrador',
+    'ADMIN_UNBLOCK': 'Desbloqueo por administrador'
+}
 
 # CET timezone
 CET = pytz.timezone('Europe/Madrid')
@@ -73,9 +128,19 @@ EMAIL_SETTINGS = {
     "reply_to": "cline.aws.noreply@gmail.com"
 }
 
-# Policy configuration for manual operations
-BEDROCK_POLICY_SUFFIX = "_BedrockPolicy"
-DENY_STATEMENT_SID = "DailyLimitBlock"
+# Bulk admin actions: users per request and concurrent IAM policy updates
+MAX_BULK_USERS = int(os.environ.get('MAX_BULK_USERS', '200'))
+BULK_IAM_WORKERS = int(os.environ.get('BULK_IAM_WORKERS', '8'))
+
+# IAM blocking backend (see shared/iam_blocking.py): "inline" rewrites <user>_BedrockPolicy,
+# "managed_policy" attaches IAM_DENY_POLICY_ARN, "group" adds the user to IAM_BLOCKED_GROUP.
+# Unblocking also clears the other configured mechanisms (and inline statements while
+# IAM_BLOCKING_CLEAR_INLINE is on), so switching backends does not strand blocks
+IAM_BLOCKING_BACKEND = os.environ.get('IAM_BLOCKING_BACKEND', 'inline').lower()
+IAM_DENY_POLICY_ARN = os.environ.get('IAM_DENY_POLICY_ARN') or None
+IAM_BLOCKED_GROUP = os.environ.get('IAM_BLOCKED_GROUP') or None
+IAM_BLOCKING_CLEAR_INLINE = os.environ.get('IAM_BLOCKING_CLEAR_INLINE', 'true').lower() == 'true'
+iam_blocker = IamBlocker(iam, IAM_BLOCKING_BACKEND, IAM_DENY_POLICY_ARN, IAM_BLOCKED_GROUP, IAM_BLOCKING_CLEAR_INLINE)
 
 # Connection pool
 connection_pool = None
@@ -88,6 +153,10 @@ def get_cet_timestamp_string() -> str:
     """Get current CET timestamp as string for database"""
     return get_current_cet_time().strftime('%Y-%m-%d %H:%M:%S')
 
+def get_cet_naive_time() -> datetime:
+    """Get current CET time without tzinfo, as stored in DATETIME columns"""
+    return get_current_cet_time().replace(tzinfo=None, microsecond=0)
+
 def convert_utc_to_cet(utc_timestamp_str: str) -> str:
     """Convert UTC timestamp string to CET timestamp string"""
     try:
@@ -164,15 +233,18 @@ def extract_user_from_arn(user_arn: str) -> Optional[str]:
     return None
 
 def get_user_team(user_id: str) -> str:
-    """Get user's team from IAM tags"""
+    """Get user's team from the user directory, or from IAM tags"""
+    entry = user_directory.get(user_id)
+    if entry:
+        return entry['team']
+    if not USER_DIRECTORY_IAM_FALLBACK:
+        return 'unknown'
+    
     try:
-        response = iam.list_user_tags(UserName=user_id)
-        
-        for tag in response['Tags']:
-            if tag['Key'].lower() in ['team', 'Team']:
-                team_value = tag['Value']
-                logger.info(f"Found Team tag for user {user_id}: {team_value}")
-                return team_value
+        team_value = tag_resolver.get_tag(user_id, 'Team')
+        if team_value:
+            logger.info(f"Found Team tag for user {user_id}: {team_value}")
+            return team_value
         
         logger.warning(f"No Team tag found for user {user_id}, trying groups as fallback")
         try:
@@ -195,15 +267,18 @@ def get_user_team(user_id: str) -> str:
         return 'unknown'
 
 def get_user_person_tag(user_id: str) -> str:
-    """Get user's person tag from IAM tags"""
+    """Get user's person tag from the user directory, or from IAM tags"""
+    entry = user_directory.get(user_id)
+    if entry:
+        return entry['person']
+    if not USER_DIRECTORY_IAM_FALLBACK:
+        return 'Unknown'
+    
     try:
-        response = iam.list_user_tags(UserName=user_id)
-        
-        for tag in response['Tags']:
-            if tag['Key'].lower() in ['person', 'Person']:
-                person_value = tag['Value']
-                logger.info(f"Found Person tag for user {user_id}: {person_value}")
-                return person_value
+        person_value = tag_resolver.get_tag(user_id, 'Person')
+        if person_value:
+            logger.info(f"Found Person tag for user {user_id}: {person_value}")
+            return person_value
         
         logger.warning(f"No Person tag found for user {user_id}, using 'Unknown'")
         return 'Unknown'
@@ -213,15 +288,18 @@ def get_user_person_tag(user_id: str) -> str:
         return 'Unknown'
 
 def get_user_email(user_id: str) -> Optional[str]:
-    """Get user's email from IAM tags"""
+    """Get user's email from the user directory, or from IAM tags"""
+    entry = user_directory.get(user_id)
+    if entry:
+        return entry['email']
+    if not USER_DIRECTORY_IAM_FALLBACK:
+        return None
+    
     try:
-        response = iam.list_user_tags(UserName=user_id)
-        
-        for tag in response['Tags']:
-            if tag['Key'].lower() in ['email', 'Email']:
-                email_value = tag['Value']
-                logger.info(f"Found Email tag for user {user_id}: {email_value}")
-                return email_value
+        email_value = tag_resolver.get_tag(user_id, 'Email')
+        if email_value:
+            logger.info(f"Found Email tag for user {user_id}: {email_value}")
+            return email_value
         
         logger.warning(f"No Email tag found for user {user_id}")
         return None
@@ -230,8 +308,24 @@ def get_user_email(user_id: str) -> Optional[str]:
         logger.error(f"Failed to get email tag for user {user_id}: {str(e)}")
         return None
 
-def send_gmail_email(to_email: str, subject: str, body_text: str, body_html: str) -> bool:
-    """Send email using Gmail SMTP"""
+def get_email_recipient(user_id: str) -> Optional[Dict[str, Optional[str]]]:
+    """Email and display name for the email service, so it does not query IAM again"""
+    entry = user_directory.get(user_id)
+    if entry:
+        return recipient_from_entry(entry) if entry['email'] else None
+    if not USER_DIRECTORY_IAM_FALLBACK:
+        return None
+    
+    try:
+        recipient = tag_resolver.get_recipient(user_id)
+        return recipient if recipient['email'] else None
+    except Exception as e:
+        logger.warning(f"⚠️ Could not resolve recipient for {user_id}, the email service will look it up: {str(e)}")
+        return None
+
+def send_gmail_email(to_email: str, subject: str, body_text: str, body_html: str,
+                     smtp_session: Optional[SmtpSession] = None) -> bool:
+    """Send email using Gmail SMTP, over the dispatcher's shared session when given"""
     try:
         logger.info(f"📧 Attempting to send Gmail email to {to_email}")
         
@@ -249,6 +343,11 @@ def send_gmail_email(to_email: str, subject: str, body_text: str, body_html: str
         msg.attach(text_part)
         msg.attach(html_part)
         
+        if smtp_session is not None:
+            smtp_session.send(msg)
+            logger.info(f"✅ Successfully sent Gmail email to {to_email}")
+            return True
+        
         # Connect to Gmail SMTP server
         server = smtplib.SMTP(GMAIL_SMTP_CONFIG['server'], GMAIL_SMTP_CONFIG['port'])
         
@@ -267,6 +366,18 @@ def send_gmail_email(to_email: str, subject: str, body_text: str, body_html: str
         logger.error(f"❌ Failed to send Gmail email to {to_email}: {str(e)}")
         return False
 
+# Friendly names stored in bedrock_requests.model_name; ids without one keep the id.
+# Database/Migrations/V001__backfill_model_name.sql applies the same mapping to old rows.
+MODEL_NAME_MAPPING = {
+    'anthropic.claude-3-opus-20240229-v1:0': 'Claude 3 Opus',
+    'anthropic.claude-3-sonnet-20240229-v1:0': 'Claude 3 Sonnet',
+    'anthropic.claude-3-haiku-20240307-v1:0': 'Claude 3 Haiku',
+    'anthropic.claude-3-5-sonnet-20240620-v1:0': 'Claude 3.5 Sonnet',
+    'anthropic.claude-sonnet-4-20250514-v1:0': 'Claude 3.5 Sonnet',
+    'amazon.titan-text-express-v1': 'Amazon Titan Text Express',
+    'amazon.titan-text-lite-v1': 'Amazon Titan Text Lite'
+}
+
 def parse_bedrock_event(event: Dict[str, Any]) -> Dict[str, Any]:
     """Parse CloudTrail event for Bedrock API call"""
     try:
@@ -316,17 +427,7 @@ def parse_bedrock_event(event: Dict[str, Any]) -> Dict[str, Any]:
         
         logger.info(f"Original model ID: {model_id}, Processed model ID: {actual_model_id}")
         
-        model_name_mapping = {
-            'anthropic.claude-3-opus-20240229-v1:0': 'Claude 3 Opus',
-            'anthropic.claude-3-sonnet-20240229-v1:0': 'Claude 3 Sonnet',
-            'anthropic.claude-3-haiku-20240307-v1:0': 'Claude 3 Haiku',
-            'anthropic.claude-3-5-sonnet-20240620-v1:0': 'Claude 3.5 Sonnet',
-            'anthropic.claude-sonnet-4-20250514-v1:0': 'Claude 3.5 Sonnet',
-            'amazon.titan-text-express-v1': 'Amazon Titan Text Express',
-            'amazon.titan-text-lite-v1': 'Amazon Titan Text Lite'
-        }
-        
-        model_name = model_name_mapping.get(actual_model_id, actual_model_id)
+        model_name = MODEL_NAME_MAPPING.get(actual_model_id, actual_model_id)
         
         request_type = 'invoke'
         if 'stream' in event_name.lower():
@@ -457,27 +558,13 @@ def check_user_limits_with_protection(connection, user_id: str) -> Tuple[bool, s
                     'administrative_safe': True
                 }
             
-            # Get current daily usage
-            cursor.execute("""
-                SELECT COUNT(*) as daily_requests_used
-                FROM bedrock_requests 
-                WHERE user_id = %s 
-                AND DATE(request_timestamp) = CURDATE()
-            """, [user_id])
-            
-            daily_result = cursor.fetchone()
-            daily_requests_used = int(daily_result['daily_requests_used']) if daily_result else 0
-            
-            # Get current monthly usage
-            cursor.execute("""
-                SELECT COUNT(*) as monthly_requests_used
-                FROM bedrock_requests 
-                WHERE user_id = %s 
-                AND DATE(request_timestamp) >= DATE_FORMAT(NOW(), '%%Y-%%m-01')
-            """, [user_id])
+            # Get current daily and monthly usage with one range seek on idx_user_date
+            # (CET calendar, the timezone request_timestamp is stored in)
+            cursor.execute(*usage_counts_query(user_id, get_current_cet_time().date()))
             
-            monthly_result = cursor.fetchone()
-            monthly_requests_used = int(monthly_result['monthly_requests_used']) if monthly_result else 0
+            usage_result = cursor.fetchone()
+            daily_requests_used = int(usage_result['daily_requests_used']) if usage_result else 0
+            monthly_requests_used = int(usage_result['monthly_requests_used']) if usage_result else 0
             
             # Check if blocking is needed
             should_block = False
@@ -529,10 +616,10 @@ def execute_user_blocking(connection, user_id: str, block_reason: str, usage_inf
         db_success = False
         audit_success = False
         iam_success = False
-        email_success = False
         
-        # 1. Update USER_BLOCKING_STATUS table
+        # 1. Update USER_BLOCKING_STATUS table and queue the notification in the same transaction
         try:
+            connection.begin()
             with connection.cursor() as cursor:
                 cursor.execute("""
                     INSERT INTO user_blocking_status 
@@ -551,9 +638,15 @@ def execute_user_blocking(connection, user_id: str, block_reason: str, usage_inf
                     user_id, block_reason, current_cet_string, blocked_until_string,
                     usage_info['daily_requests_used'], current_cet_string, current_cet_string, current_cet_string
                 ])
-            logger.info(f"✅ Step 1: Updated USER_BLOCKING_STATUS for {user_id}")
+            outbox_id = enqueue_notification(connection, user_id, 'BLOCK', {
+                'reason': block_reason, 'usage_info': usage_info, 'blocked_at': current_cet_string,
+                'blocked_until': blocked_until_string
+            }, get_cet_naive_time(), NOTIFICATION_HOLD_SECONDS)
+            connection.commit()
+            logger.info(f"✅ Step 1: Updated USER_BLOCKING_STATUS and queued notification for {user_id}")
             db_success = True
         except Exception as e:
+            connection.rollback()
             logger.error(f"❌ Step 1 FAILED: USER_BLOCKING_STATUS update for {user_id}: {str(e)}")
             return False
         
@@ -568,18 +661,8 @@ def execute_user_blocking(connection, user_id: str, block_reason: str, usage_inf
             logger.error(f"❌ Step 3 EXCEPTION: IAM policy creation for {user_id}: {str(e)}")
             iam_success = False
         
-        # 4. Send Gmail notification
-        try:
-            email_success = send_blocking_email_gmail(user_id, block_reason, usage_info, blocked_until_cet)
-            if email_success:
-                logger.info(f"✅ Step 4: Sent blocking Gmail for {user_id}")
-            else:
-                logger.error(f"❌ Step 4 FAILED: Gmail sending for {user_id}")
-        except Exception as e:
-            logger.error(f"❌ Step 4 EXCEPTION: Gmail sending for {user_id}: {str(e)}")
-            email_success = False
-        
         # 2. Log to BLOCKING_AUDIT_LOG (moved after other operations to record actual results)
+        #    email_sent stays 'N' until the outbox dispatcher delivers the notification
         try:
             with connection.cursor() as cursor:
                 # Calculate usage percentage
@@ -596,9 +679,11 @@ def execute_user_blocking(connection, user_id: str, block_reason: str, usage_inf
                     usage_info['daily_requests_used'], usage_info['daily_limit'], 
                     round(usage_percentage, 2), 
                     'Y' if iam_success else 'N',
-                    'Y' if email_success else 'N',
+                    'N',
                     current_cet_string
                 ])
+                audit_log_id = cursor.lastrowid
+            attach_audit_log(connection, outbox_id, audit_log_id)
             logger.info(f"✅ Step 2: Created BLOCKING_AUDIT_LOG entry for {user_id}")
             audit_success = True
         except Exception as e:
@@ -624,8 +709,9 @@ def execute_user_unblocking(connection, user_id: str) -> bool:
         
         current_cet_string = get_cet_timestamp_string()
         
-        # 1. Update USER_BLOCKING_STATUS table
+        # 1. Update USER_BLOCKING_STATUS table and queue the notification in the same transaction
         try:
+            connection.begin()
             with connection.cursor() as cursor:
                 cursor.execute("""
                     UPDATE user_blocking_status 
@@ -638,8 +724,12 @@ def execute_user_unblocking(connection, user_id: str) -> bool:
                         updated_at = %s
                     WHERE user_id = %s
                 """, [current_cet_string, current_cet_string, current_cet_string, user_id])
+            outbox_id = enqueue_notification(connection, user_id, 'UNBLOCK', {'reason': 'Automatic unblock'},
+                                             get_cet_naive_time(), NOTIFICATION_HOLD_SECONDS)
+            connection.commit()
             logger.info(f"✅ Step 1: Updated USER_BLOCKING_STATUS for unblocking {user_id}")
         except Exception as e:
+            connection.rollback()
             logger.error(f"❌ Step 1 FAILED: USER_BLOCKING_STATUS update for unblocking {user_id}: {str(e)}")
             return False
         
@@ -664,6 +754,8 @@ def execute_user_unblocking(connection, user_id: str) -> bool:
                     (user_id, operation_type, operation_reason, performed_by, operation_timestamp, created_at)
                     VALUES (%s, 'UNBLOCK', 'Automatic unblock', 'system', %s, %s)
                 """, [user_id, current_cet_string, current_cet_string])
+                audit_log_id = cursor.lastrowid
+            attach_audit_log(connection, outbox_id, audit_log_id)
             logger.info(f"✅ Step 2: Created BLOCKING_AUDIT_LOG entry for unblocking {user_id}")
         except Exception as e:
             logger.error(f"❌ Step 2 FAILED: BLOCKING_AUDIT_LOG creation for unblocking {user_id}: {str(e)}")
@@ -678,16 +770,6 @@ def execute_user_unblocking(connection, user_id: str) -> bool:
         except Exception as e:
             logger.error(f"❌ Step 3 EXCEPTION: IAM policy modification for unblocking {user_id}: {str(e)}")
         
-        # 4. Send unblocking Gmail
-        try:
-            success = send_unblocking_email_gmail(user_id)
-            if success:
-                logger.info(f"✅ Step 4: Sent unblocking Gmail for {user_id}")
-            else:
-                logger.error(f"❌ Step 4 FAILED: Gmail sending for unblocking {user_id}")
-        except Exception as e:
-            logger.error(f"❌ Step 4 EXCEPTION: Gmail sending for unblocking {user_id}: {str(e)}")
-        
         logger.info(f"✅ Successfully executed complete unblocking for user {user_id}")
         return True
         
@@ -696,151 +778,41 @@ def execute_user_unblocking(connection, user_id: str) -> bool:
         return False
 
 def implement_iam_blocking(user_id: str) -> bool:
-    """Create IAM deny policy for user blocking"""
+    """Block the user's Bedrock access with the configured IAM backend"""
     try:
-        policy_name = f"{user_id}_BedrockPolicy"
-        
-        # FIXED: Remove the problematic condition that was preventing the policy from working
-        deny_statement = {
-            "Sid": "DailyLimitBlock",
-            "Effect": "Deny",
-            "Action": [
-                "bedrock:InvokeModel",
-                "bedrock:InvokeModelWithResponseStream",
-                "bedrock:Converse",
-                "bedrock:ConverseStream"
-            ],
-            "Resource": "*"
-        }
-        
-        try:
-            # Get existing policy
-            response = iam.get_user_policy(UserName=user_id, PolicyName=policy_name)
-            current_policy = response['PolicyDocument']
-            
-            logger.info(f"🔍 Found existing policy for user {user_id}: {json.dumps(current_policy, indent=2)}")
-            
-            # Remove any existing deny statements with the same Sid
-            original_count = len(current_policy['Statement'])
-            current_policy['Statement'] = [
-                stmt for stmt in current_policy['Statement'] 
-                if stmt.get('Sid') != 'DailyLimitBlock'
-            ]
-            
-            removed_count = original_count - len(current_policy['Statement'])
-            if removed_count > 0:
-                logger.info(f"🗑️ Removed {removed_count} existing deny statements for user {user_id}")
-            
-            # Add new deny statement at the beginning (highest priority)
-            current_policy['Statement'].insert(0, deny_statement)
-            
-        except iam.exceptions.NoSuchEntityException:
-            logger.info(f"📝 No existing policy found for user {user_id}, creating new policy")
-            # Create new policy with deny statement first, then allow statement
-            current_policy = {
-                "Version": "2012-10-17",
-                "Statement": [
-                    deny_statement,
-                    {
-                        "Sid": "BedrockAccess",
-                        "Effect": "Allow",
-                        "Action": [
-                            "bedrock:InvokeModel",
-                            "bedrock:InvokeModelWithResponseStream",
-                            "bedrock:Converse",
-                            "bedrock:ConverseStream"
-                        ],
-                        "Resource": "*"
-                    }
-                ]
-            }
-        
-        # Apply the updated policy
-        policy_document = json.dumps(current_policy, separators=(',', ':'))
-        logger.info(f"📋 Applying policy for user {user_id}: {policy_document}")
-        
-        iam.put_user_policy(
-            UserName=user_id,
-            PolicyName=policy_name,
-            PolicyDocument=policy_document
-        )
-        
-        # Verify the policy was applied correctly
-        try:
-            verify_response = iam.get_user_policy(UserName=user_id, PolicyName=policy_name)
-            applied_policy = verify_response['PolicyDocument']
-            
-            # Check if deny statement exists
-            deny_statements = [stmt for stmt in applied_policy['Statement'] if stmt.get('Sid') == 'DailyLimitBlock']
-            if deny_statements:
-                logger.info(f"✅ Successfully created and verified IAM deny policy for user {user_id}")
-                return True
-            else:
-                logger.error(f"❌ Deny statement not found in applied policy for user {user_id}")
-                return False
-                
-        except Exception as verify_error:
-            logger.error(f"❌ Failed to verify applied policy for user {user_id}: {str(verify_error)}")
-            return False
+        if iam_blocker.block(user_id):
+            logger.info(f"✅ Successfully blocked IAM access for user {user_id} ({iam_blocker.backend})")
+            return True
+        logger.error(f"❌ IAM block not in place for user {user_id} ({iam_blocker.backend})")
+        return False
         
     except Exception as e:
         logger.error(f"❌ Failed to create IAM deny policy for user {user_id}: {str(e)}")
         return False
 
 def implement_iam_unblocking(user_id: str) -> bool:
-    """Modify IAM policy to allow access for user unblocking"""
+    """Restore the user's Bedrock access, clearing every configured blocking mechanism"""
     try:
-        policy_name = f"{user_id}_BedrockPolicy"
-        
-        try:
-            response = iam.get_user_policy(UserName=user_id, PolicyName=policy_name)
-            current_policy = response['PolicyDocument']
-            
-            # Remove deny statements
-            current_policy['Statement'] = [
-                stmt for stmt in current_policy['Statement'] 
-                if stmt.get('Sid') != 'DailyLimitBlock'
-            ]
-            
-            # Ensure there's at least an allow statement
-            has_allow = any(stmt.get('Effect') == 'Allow' for stmt in current_policy['Statement'])
-            if not has_allow:
-                current_policy['Statement'].append({
-                    "Sid": "BedrockAccess",
-                    "Effect": "Allow",
-                    "Action": [
-                        "bedrock:InvokeModel",
-                        "bedrock:InvokeModelWithResponseStream"
-                    ],
-                    "Resource": "*"
-                })
-            
-            iam.put_user_policy(
-                UserName=user_id,
-                PolicyName=policy_name,
-                PolicyDocument=json.dumps(current_policy, separators=(',', ':'))
-            )
-            
+        success = iam_blocker.unblock(user_id)
+        if success:
             logger.info(f"✅ Successfully modified IAM policy to allow access for user {user_id}")
-            return True
-            
-        except iam.exceptions.NoSuchEntityException:
-            logger.info(f"No existing policy found for user {user_id}, no action needed")
-            return True
+        return success
         
     except Exception as e:
         logger.error(f"❌ Failed to modify IAM policy for user {user_id}: {str(e)}")
         return False
 
-def send_blocking_email_gmail(user_id: str, block_reason: str, usage_info: Dict[str, Any], blocked_until: datetime) -> bool:
-    """Send blocking notification email using Gmail SMTP"""
+def send_blocking_email_gmail(user_id: str, block_reason: str, usage_info: Dict[str, Any], blocked_until: datetime,
+                              smtp_session: Optional[SmtpSession] = None, blocked_at: Optional[str] = None) -> bool:
+    """Send blocking notification email using Gmail SMTP; `blocked_at` is the CET time the block was applied"""
     try:
         user_email = get_user_email(user_id)
         if not user_email:
             logger.warning(f"No email found for user {user_id}, skipping email notification")
             return False
         
-        current_cet_string = get_cet_timestamp_string()
+        # Queued notifications go out after the hold window; older rows have no blocked_at
+        blocked_at_string = blocked_at or get_cet_timestamp_string()
         blocked_until_string = blocked_until.strftime('%Y-%m-%d %H:%M:%S')
         
         subject = f"🚫 AWS Bedrock Access Blocked - {user_id}"
@@ -856,7 +828,7 @@ def send_blocking_email_gmail(user_id: str, block_reason: str, usage_info: Dict[
             <h3>Detalles del Bloqueo:</h3>
             <ul>
                 <li><strong>Motivo:</strong> {block_reason}</li>
-                <li><strong>Bloqueado el:</strong> {current_cet_string} CET</li>
+                <li><strong>Bloqueado el:</strong> {blocked_at_string} CET</li>
                 <li><strong>Bloqueado hasta:</strong> {blocked_until_string} CET</li>
             </ul>
             
@@ -884,7 +856,7 @@ def send_blocking_email_gmail(user_id: str, block_reason: str, usage_info: Dict[
         
         Detalles del Bloqueo:
         - Motivo: {block_reason}
-        - Bloqueado el: {current_cet_string} CET
+        - Bloqueado el: {blocked_at_string} CET
         - Bloqueado hasta: {blocked_until_string} CET
         
         Uso Actual:
@@ -899,13 +871,13 @@ def send_blocking_email_gmail(user_id: str, block_reason: str, usage_info: Dict[
         Sistema de Control de Uso de AWS Bedrock
         """
         
-        return send_gmail_email(user_email, subject, body_text, body_html)
+        return send_gmail_email(user_email, subject, body_text, body_html, smtp_session)
         
     except Exception as e:
         logger.error(f"Failed to send blocking Gmail for user {user_id}: {str(e)}")
         return False
 
-def send_unblocking_email_gmail(user_id: str) -> bool:
+def send_unblocking_email_gmail(user_id: str, smtp_session: Optional[SmtpSession] = None) -> bool:
     """Send unblocking notification email using Gmail SMTP"""
     try:
         user_email = get_user_email(user_id)
@@ -959,22 +931,101 @@ def send_unblocking_email_gmail(user_id: str) -> bool:
         Sistema de Control de Uso de AWS Bedrock
         """
         
-        return send_gmail_email(user_email, subject, body_text, body_html)
+        return send_gmail_email(user_email, subject, body_text, body_html, smtp_session)
         
     except Exception as e:
         logger.error(f"Failed to send unblocking Gmail for user {user_id}: {str(e)}")
         return False
 
+def send_digest_email_gmail(user_id: str, row: Dict[str, Any], smtp_session: Optional[SmtpSession] = None) -> bool:
+    """Send one email summarizing a recipient's coalesced blocking changes, ending with the current state"""
+    try:
+        user_email = get_user_email(user_id)
+        if not user_email:
+            logger.warning(f"No email found for user {user_id}, skipping email notification")
+            return False
+        
+        events = row['superseded'] + [row]
+        blocked = row['notification_type'] in ('BLOCK', 'ADMIN_BLOCK')
+        current_state = 'Bloqueado' if blocked else 'Activo'
+        
+        lines = []
+        for event in events:
+            payload = event['payload']
+            detail = payload.get('reason', '')
+            if payload.get('performed_by'):
+                detail += f" ({payload['performed_by']})"
+            lines.append((str(event['created_at']), NOTIFICATION_LABELS.get(event['notification_type'],
+                                                                        event['notification_type']), detail))
+        
+        subject = f"📋 AWS Bedrock - Resumen de cambios de acceso - {user_id}"
+        
+        items_html = ''.join(f"<li><strong>{moment} CET:</strong> {label} - {detail}</li>" for moment, label, detail in lines)
+        until_html = ''
+        until_text = ''
+        if blocked and row['payload'].get('blocked_until'):
+            until_html = f"<p>Su acceso será automáticamente restaurado el {row['payload']['blocked_until']} CET.</p>"
+            until_text = f"Su acceso será automáticamente restaurado el {row['payload']['blocked_until']} CET."
+        
+        body_html = f"""
+        <html>
+        <body>
+            <h2>📋 AWS Bedrock - Resumen de cambios de acceso</h2>
+            <p>Estimado/a {user_id},</p>
+            
+            <p>Su acceso a los servicios de AWS Bedrock ha cambiado varias veces en los últimos minutos.</p>
+            
+            <h3>Estado actual: {current_state}</h3>
+            {until_html}
+            
+            <h3>Cambios:</h3>
+            <ul>
+                {items_html}
+            </ul>
+            
+            <p>Si tiene alguna pregunta, por favor contacte con su administrador del sistema.</p>
+            
+            <p>Saludos cordiales,<br>Sistema de Control de Uso de AWS Bedrock</p>
+        </body>
+        </html>
+        """
+        
+        items_text = '\n'.join(f"        - {moment} CET: {label} - {detail}" for moment, label, detail in lines)
+        body_text = f"""
+        📋 AWS Bedrock - Resumen de cambios de acceso
+        
+        Estimado/a {user_id},
+        
+        Su acceso a los servicios de AWS Bedrock ha cambiado varias veces en los últimos minutos.
+        
+        Estado actual: {current_state}
+        {until_text}
+        
+        Cambios:
+{items_text}
+        
+        Si tiene alguna pregunta, por favor contacte con su administrador del sistema.
+        
+        Saludos cordiales,
+        Sistema de Control de Uso de AWS Bedrock
+        """
+        
+        return send_gmail_email(user_email, subject, body_text, body_html, smtp_session)
+        
+    except Exception as e:
+        logger.error(f"Failed to send digest Gmail for user {user_id}: {str(e)}")
+        return False
+
 def log_bedrock_request_cet(connection, request_data: Dict[str, Any], team: str, person: str):
     """Log the Bedrock request to database with CET timestamp"""
     try:
         with connection.cursor() as cursor:
             insert_query = """
                 INSERT INTO bedrock_requests (
-                    user_id, team, person, model_id, request_id, source_ip, user_agent, aws_region, 
+                    user_id, team, person, model_id, model_name, request_id, source_ip, user_agent, aws_region, 
                     response_status, error_message, processing_time_ms, request_timestamp, created_at
                 ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
                 )
             """
             
@@ -993,6 +1044,7 @@ def log_bedrock_request_cet(connection, request_data: Dict[str, Any], team: str,
                 team,
                 person,
                 request_data['model_id'],
+                request_data.get('model_name') or request_data['model_id'],
                 request_id,
                 source_ip,
                 user_agent[:1000] if user_agent else 'unknown',
@@ -1011,6 +1063,17 @@ def log_bedrock_request_cet(connection, request_data: Dict[str, Any], team: str,
         # CORRECCIÓN: Don't raise exception to prevent blocking the entire process
         logger.warning(f"⚠️ Continuing processing despite logging failure for user {request_data.get('user_id', 'unknown')}")
 
+def flush_latency_sketches(connection, latency_sketches: Dict[Any, Any]):
+    """Merge the batch's per (model, hour) latency sketches into latency_rollup_hourly"""
+    if not latency_sketches:
+        return
+    try:
+        merged = merge_latency_sketches(connection, latency_sketches)
+        logger.info(f"📈 Merged {merged} latency sketches")
+    except Exception as e:
+        # Latency quantiles are best effort; never fail the batch over them
+        logger.error(f"Failed to merge latency sketches: {str(e)}")
+
 def ensure_user_exists(connection, user_id: str, team: str, person: str):
     """Ensure user exists in user_limits table, create if not"""
     try:
@@ -1047,8 +1110,23 @@ def lambda_handler(event, context):
     """
     logger.info(f"🚀 Processing event with ENHANCED MERGED FUNCTIONALITY: {json.dumps(event, default=str)}")
     
+    # Scheduled delivery of queued block/unblock notifications
+    if event.get('action') == 'dispatch_notifications':
+        logger.info("📬 Processing notification outbox")
+        return handle_notification_dispatch(event, context)
+    
+    # Delivery outcome reported by the email service for an asynchronous send
+    if event.get('action') == 'email_delivery_status':
+        return handle_email_delivery_status(event)
+    
+    # Admin jobs: asynchronous execution and progress polling
+    if event.get('action') == 'run_admin_job':
+        return handle_admin_job(event)
+    if event.get('action') == 'job_status':
+        return check_job_status(event)
+    
     # NEW: Check if this is an API event (manual operation)
-    if 'action' in event and 'user_id' in event:
+    if 'action' in event and ('user_id' in event or 'user_ids' in event):
         logger.info("🔧 Processing API event (manual operation)")
         return handle_api_event(event, context)
     
@@ -1056,11 +1134,112 @@ def lambda_handler(event, context):
     logger.info("📊 Processing CloudTrail event (automatic blocking)")
     return handle_cloudtrail_event(event, context)
 
+def deliver_notification(row: Dict[str, Any], smtp_session: SmtpSession) -> Union[bool, str]:
+    """Send one notification_outbox row with the existing email workflows"""
+    user_id = row['user_id']
+    payload = row['payload']
+    notification_type = row['notification_type']
+    delivery = {'outbox_id': row['id'], 'audit_log_id': row.get('audit_log_id')}
+    
+    if row.get('superseded'):
+        # Several changes within the hold window: one digest ending with the current state
+        return send_digest_email_gmail(user_id, row, smtp_session)
+    
+    if notification_type == 'BLOCK':
+        blocked_until = CET.localize(datetime.strptime(payload['blocked_until'], '%Y-%m-%d %H:%M:%S'))
+        return send_blocking_email_gmail(user_id, payload['reason'], payload['usage_info'], blocked_until, smtp_session,
+                                         payload.get('blocked_at'))
+    if notification_type == 'UNBLOCK':
+        return send_unblocking_email_gmail(user_id, smtp_session)
+    if notification_type == 'ADMIN_BLOCK':
+        return send_enhanced_blocking_email(user_id, payload['reason'], payload['usage_info'],
+                                            payload['performed_by'], smtp_session, delivery, payload.get('blocked_at'),
+                                            payload.get('blocked_until'))
+    if notification_type == 'ADMIN_UNBLOCK':
+        return send_enhanced_unblocking_email(user_id, payload['reason'], payload['performed_by'],
+                                              smtp_session, delivery)
+    raise ValueError(f"Unknown notification type: {notification_type}")
+
+def handle_notification_dispatch(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Deliver due notification_outbox rows over one pooled SMTP session"""
+    try:
+        connection = get_mysql_connection()
+        
+        def should_stop() -> bool:
+            # Leave time to release the last claimed batch before the Lambda timeout
+            return context is not None and context.get_remaining_time_in_millis() < 30000
+        
+        with SmtpSession(GMAIL_SMTP_CONFIG) as smtp_session:
+            stats = dispatch_notifications(
+                connection,
+                lambda row: deliver_notification(row, smtp_session),
+                get_cet_naive_time,
+                batch_size=int(event.get('batch_size', NOTIFICATION_BATCH_SIZE)),
+                max_attempts=NOTIFICATION_MAX_ATTEMPTS,
+                recipient_limit=NOTIFICATION_RECIPIENT_LIMIT,
+                recipient_window=NOTIFICATION_RECIPIENT_WINDOW_SECONDS,
+                global_limit_per_minute=NOTIFICATION_GLOBAL_LIMIT_PER_MINUTE,
+                should_stop=should_stop
+            )
+        
+        logger.info(f"📬 Notification dispatch: {stats}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps(stats)
+        }
+        
+    except Exception as e:
+        logger.error(f"Error dispatching notifications: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def handle_email_delivery_status(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Record the outcome the email service reports for an asynchronous send"""
+    try:
+        connection = get_mysql_connection()
+        success = bool(event.get('success'))
+        status = None
+        
+        if event.get('outbox_id'):
+            status = record_delivery(connection, int(event['outbox_id']), success, event.get('error'),
+                                     get_cet_naive_time(), NOTIFICATION_MAX_ATTEMPTS)
+        elif event.get('audit_log_id') and success:
+            with connection.cursor() as cursor:
+                cursor.execute("UPDATE blocking_audit_log SET email_sent = 'Y' WHERE id = %s", [event['audit_log_id']])
+            status = 'SENT'
+        
+        logger.info(f"📨 Email delivery for {event.get('user_id')}: success={success}, status={status}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'status': status})
+        }
+        
+    except Exception as e:
+        logger.error(f"Error recording email delivery status: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
 def handle_api_event(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Handle manual admin operations from dashboard"""
     try:
         logger.info(f"Processing API event: {json.dumps(event, default=str)}")
         
+        # Bulk actions take a list of users instead of a user_id
+        if event.get('action') in BULK_API_ACTIONS:
+            try:
+                user_ids = parse_bulk_user_ids(event)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': str(e)})
+                }
+            logger.info(f"Processing {event['action']} action for {len(user_ids)} users")
+            return BULK_API_ACTIONS[event['action']](event, user_ids)
+        
         # Validate required parameters
         if 'action' not in event or 'user_id' not in event:
             logger.error("Missing required parameters: action and user_id")
@@ -1099,7 +1278,13 @@ def handle_api_event(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
 
 def manual_block_user(event: Dict[str, Any]) -> Dict[str, Any]:
-    """Handle manual admin blocking"""
+    """Handle manual admin blocking (queued as an admin job unless the caller waits)"""
+    if ADMIN_ASYNC_JOBS and not event.get('wait'):
+        return submit_admin_job('block', event)
+    return perform_manual_block(event)
+
+def perform_manual_block(event: Dict[str, Any], progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Run the admin blocking workflow"""
     try:
         user_id = event['user_id']
         reason = event.get('reason', 'Manual admin block')
@@ -1113,7 +1298,7 @@ def manual_block_user(event: Dict[str, Any]) -> Dict[str, Any]:
         usage_info = get_user_current_usage(connection, user_id)
         
         # Execute blocking with admin expiration (24 hours)
-        success = execute_admin_blocking(connection, user_id, reason, performed_by, usage_info)
+        success = execute_admin_blocking(connection, user_id, reason, performed_by, usage_info, progress)
         
         return {
             'statusCode': 200 if success else 500,
@@ -1138,7 +1323,13 @@ def manual_block_user(event: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 def manual_unblock_user(event: Dict[str, Any]) -> Dict[str, Any]:
-    """Handle manual admin unblocking"""
+    """Handle manual admin unblocking (queued as an admin job unless the caller waits)"""
+    if ADMIN_ASYNC_JOBS and not event.get('wait'):
+        return submit_admin_job('unblock', event)
+    return perform_manual_unblock(event)
+
+def perform_manual_unblock(event: Dict[str, Any], progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Run the admin unblocking workflow"""
     try:
         user_id = event['user_id']
         reason = event.get('reason', 'Manual admin unblock')
@@ -1149,7 +1340,7 @@ def manual_unblock_user(event: Dict[str, Any]) -> Dict[str, Any]:
         connection = get_mysql_connection()
         
         # Execute unblocking with admin protection
-        success = execute_admin_unblocking(connection, user_id, reason, performed_by)
+        success = execute_admin_unblocking(connection, user_id, reason, performed_by, progress)
         
         return {
             'statusCode': 200 if success else 500,
@@ -1173,6 +1364,155 @@ def manual_unblock_user(event: Dict[str, Any]) -> Dict[str, Any]:
             })
         }
 
+ADMIN_JOB_RUNNERS = {
+    'block': perform_manual_block,
+    'unblock': perform_manual_unblock
+}
+
+def submit_admin_job(action: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    """Persist an admin job and hand it to an asynchronous invocation of this function"""
+    user_id = event['user_id']
+    try:
+        connection = get_mysql_connection()
+        params = {key: value for key, value in event.items() if key not in ('action', 'user_id')}
+        job_id = create_job(connection, action, user_id, params, get_cet_naive_time())
+    except Exception as e:
+        logger.error(f"Error queueing {action} job for {user_id}: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': f'Error queueing {action} for user {user_id}: {str(e)}',
+                                'action': action, 'user_id': user_id})
+        }
+    
+    try:
+        response = lambda_client.invoke(
+            FunctionName=STATUS_CALLBACK_FUNCTION,
+            InvocationType='Event',
+            Payload=json.dumps({'action': 'run_admin_job', 'job_id': job_id})
+        )
+        if response.get('StatusCode') != 202:
+            raise RuntimeError(f"Invocation not accepted (status {response.get('StatusCode')})")
+    except Exception as e:
+        logger.error(f"❌ Could not start {action} job {job_id} for {user_id}: {str(e)}")
+        finish_job(connection, job_id, False, None, get_cet_naive_time(), str(e))
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': f'Could not start {action} for user {user_id}: {str(e)}',
+                                'action': action, 'user_id': user_id, 'job_id': job_id})
+        }
+    
+    logger.info(f"📋 Queued {action} job {job_id} for {user_id}")
+    return {
+        'statusCode': 202,
+        'body': json.dumps({
+            'message': f'{action.capitalize()} of user {user_id} accepted',
+            'action': action,
+            'user_id': user_id,
+            'job_id': job_id,
+            'status': 'QUEUED'
+        })
+    }
+
+def handle_admin_job(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a queued admin job (asynchronous self-invocation)"""
+    job_id = event.get('job_id')
+    try:
+        connection = get_mysql_connection()
+        job = claim_job(connection, job_id, get_cet_naive_time(), ADMIN_JOB_LEASE_SECONDS)
+        if not job:
+            # Finished already, or another invocation holds it (duplicate event delivery)
+            logger.info(f"📋 Admin job {job_id} is not claimable, skipping")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'job_id': job_id, 'skipped': True})
+            }
+        
+        def progress(step: str) -> None:
+            try:
+                set_step(connection, job_id, step, get_cet_naive_time())
+            except Exception as e:
+                logger.warning(f"⚠️ Could not record step {step} of admin job {job_id}: {str(e)}")
+        
+        logger.info(f"📋 Running {job['action']} job {job_id} for {job['user_id']}")
+        runner = ADMIN_JOB_RUNNERS[job['action']]
+        response = runner(dict(job['params'], action=job['action'], user_id=job['user_id']), progress)
+        
+        body = json.loads(response['body'])
+        finish_job(connection, job_id, response['statusCode'] == 200, body, get_cet_naive_time(), body.get('error'))
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error running admin job {job_id}: {str(e)}", exc_info=True)
+        try:
+            finish_job(get_mysql_connection(), job_id, False, None, get_cet_naive_time(), str(e))
+        except Exception:
+            logger.error(f"Could not record failure of admin job {job_id}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e), 'job_id': job_id})
+        }
+
+def check_job_status(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Progress and result of an admin job for the dashboard"""
+    job_id = event.get('job_id')
+    if not job_id:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing required parameter: job_id'})
+        }
+    
+    try:
+        job = get_job(get_mysql_connection(), job_id)
+        if not job:
+            return {
+                'statusCode': 404,
+                'body': json.dumps({'error': f'Unknown job: {job_id}', 'job_id': job_id})
+            }
+        return {
+            'statusCode': 200,
+            'body': json.dumps(job_view(job), default=str)
+        }
+        
+    except Exception as e:
+        logger.error(f"Error checking admin job {job_id}: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e), 'job_id': job_id})
+        }
+
+def describe_user_status(user_id: str, status_result: Optional[Dict[str, Any]],
+                         limits_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Dashboard status of a user from its user_blocking_status and user_limits rows"""
+    # CORRECCIÓN: Determine block type and performed_by more accurately
+    block_type = 'None'
+    performed_by = None
+    
+    if status_result and status_result['is_blocked'] == 'Y':
+        # Check if it's an automatic block (expires at midnight) or manual block
+        if status_result['blocked_until']:
+            blocked_until_str = status_result['blocked_until'].strftime('%H:%M:%S') if hasattr(status_result['blocked_until'], 'strftime') else str(status_result['blocked_until'])
+            if '00:00:00' in blocked_until_str:
+                block_type = 'AUTO'  # Automatic blocks expire at midnight
+                performed_by = 'system'  # System performed automatic block
+            else:
+                block_type = 'Manual'  # Manual blocks expire at other times
+                performed_by = 'dashboard_admin'  # Admin performed manual block
+        else:
+            block_type = 'Manual'  # No expiration time means manual
+            performed_by = 'dashboard_admin'
+    
+    return {
+        'user_id': user_id,
+        'is_blocked': status_result['is_blocked'] == 'Y' if status_result else False,
+        'block_reason': status_result['blocked_reason'] if status_result else None,
+        'blocked_since': status_result['blocked_at'].isoformat() if status_result and status_result['blocked_at'] else None,
+        'expires_at': status_result['blocked_until'].isoformat() if status_result and status_result['blocked_until'] else None,
+        'block_type': block_type,
+        'performed_by': performed_by,
+        'administrative_safe': limits_result['administrative_safe'] == 'Y' if limits_result else False,
+        'checked_at': datetime.utcnow().isoformat()
+    }
+
 def check_user_status(event: Dict[str, Any]) -> Dict[str, Any]:
     """Check user blocking status for dashboard"""
     try:
@@ -1201,37 +1541,9 @@ def check_user_status(event: Dict[str, Any]) -> Dict[str, Any]:
             
             limits_result = cursor.fetchone()
             
-            # CORRECCIÓN: Determine block type and performed_by more accurately
-            block_type = 'None'
-            performed_by = None
-            
-            if status_result and status_result['is_blocked'] == 'Y':
-                # Check if it's an automatic block (expires at midnight) or manual block
-                if status_result['blocked_until']:
-                    blocked_until_str = status_result['blocked_until'].strftime('%H:%M:%S') if hasattr(status_result['blocked_until'], 'strftime') else str(status_result['blocked_until'])
-                    if '00:00:00' in blocked_until_str:
-                        block_type = 'AUTO'  # Automatic blocks expire at midnight
-                        performed_by = 'system'  # System performed automatic block
-                    else:
-                        block_type = 'Manual'  # Manual blocks expire at other times
-                        performed_by = 'dashboard_admin'  # Admin performed manual block
-                else:
-                    block_type = 'Manual'  # No expiration time means manual
-                    performed_by = 'dashboard_admin'
-            
             return {
                 'statusCode': 200,
-                'body': json.dumps({
-                    'user_id': user_id,
-                    'is_blocked': status_result['is_blocked'] == 'Y' if status_result else False,
-                    'block_reason': status_result['blocked_reason'] if status_result else None,
-                    'blocked_since': status_result['blocked_at'].isoformat() if status_result and status_result['blocked_at'] else None,
-                    'expires_at': status_result['blocked_until'].isoformat() if status_result and status_result['blocked_until'] else None,
-                    'block_type': block_type,
-                    'performed_by': performed_by,
-                    'administrative_safe': limits_result['administrative_safe'] == 'Y' if limits_result else False,
-                    'checked_at': datetime.utcnow().isoformat()
-                })
+                'body': json.dumps(describe_user_status(user_id, status_result, limits_result))
             }
             
     except Exception as e:
@@ -1241,12 +1553,120 @@ def check_user_status(event: Dict[str, Any]) -> Dict[str, Any]:
             'body': json.dumps({'error': str(e), 'user_id': user_id})
         }
 
+def parse_bulk_user_ids(event: Dict[str, Any]) -> List[str]:
+    """Distinct user IDs of a bulk action, in request order"""
+    user_ids = event.get('user_ids')
+    if not isinstance(user_ids, list) or not user_ids or not all(isinstance(user_id, str) and user_id for user_id in user_ids):
+        raise ValueError('user_ids must be a non-empty list of user IDs')
+    user_ids = list(dict.fromkeys(user_ids))
+    if len(user_ids) > MAX_BULK_USERS:
+        raise ValueError(f'At most {MAX_BULK_USERS} users per request, got {len(user_ids)}')
+    return user_ids
+
+def bulk_response(action: str, performed_by: Optional[str], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-user results of a bulk action with summary counts"""
+    succeeded = sum(1 for result in results if result['success'])
+    return {
+        'statusCode': 200 if succeeded == len(results) else 500,
+        'body': json.dumps({
+            'action': action,
+            'performed_by': performed_by,
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results,
+            'completed_at': get_cet_timestamp_string()
+        }, default=str)
+    }
+
+def manual_block_users(event: Dict[str, Any], user_ids: List[str]) -> Dict[str, Any]:
+    """Handle bulk admin blocking (action block_many)"""
+    reason = event.get('reason', 'Manual admin block')
+    performed_by = event.get('performed_by', 'admin')
+    
+    logger.info(f"🚫 Manual blocking {len(user_ids)} users by {performed_by}")
+    
+    try:
+        connection = get_mysql_connection()
+        usage_by_user = get_users_current_usage(connection, user_ids)
+        iam_results = execute_admin_blocking_many(connection, user_ids, reason, performed_by, usage_by_user)
+    except Exception as e:
+        logger.error(f"Error in manual_block_users: {str(e)}", exc_info=True)
+        return bulk_response('block_many', performed_by,
+                             [{'user_id': user_id, 'success': False, 'error': str(e)} for user_id in user_ids])
+    
+    return bulk_response('block_many', performed_by, [
+        {'user_id': user_id, 'success': True, 'iam_updated': iam_results[user_id]} for user_id in user_ids
+    ])
+
+def manual_unblock_users(event: Dict[str, Any], user_ids: List[str]) -> Dict[str, Any]:
+    """Handle bulk admin unblocking (action unblock_many)"""
+    reason = event.get('reason', 'Manual admin unblock')
+    performed_by = event.get('performed_by', 'admin')
+    
+    logger.info(f"🔓 Manual unblocking {len(user_ids)} users by {performed_by}")
+    
+    try:
+        connection = get_mysql_connection()
+        iam_results = execute_admin_unblocking_many(connection, user_ids, reason, performed_by)
+    except Exception as e:
+        logger.error(f"Error in manual_unblock_users: {str(e)}", exc_info=True)
+        return bulk_response('unblock_many', performed_by,
+                             [{'user_id': user_id, 'success': False, 'error': str(e)} for user_id in user_ids])
+    
+    return bulk_response('unblock_many', performed_by, [
+        {'user_id': user_id, 'success': True, 'iam_updated': iam_results[user_id]} for user_id in user_ids
+    ])
+
+def check_users_status(event: Dict[str, Any], user_ids: List[str]) -> Dict[str, Any]:
+    """Blocking status of many users for the dashboard (action status_many)"""
+    try:
+        connection = get_mysql_connection()
+        in_list = ', '.join(['%s'] * len(user_ids))
+        
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT user_id, is_blocked, blocked_reason, blocked_at, blocked_until
+                FROM user_blocking_status 
+                WHERE user_id IN ({in_list})
+            """, user_ids)
+            statuses = {row['user_id']: row for row in cursor.fetchall()}
+            
+            cursor.execute(f"""
+                SELECT user_id, daily_request_limit, administrative_safe
+                FROM user_limits 
+                WHERE user_id IN ({in_list})
+            """, user_ids)
+            limits = {row['user_id']: row for row in cursor.fetchall()}
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'users': [describe_user_status(user_id, statuses.get(user_id), limits.get(user_id))
+                          for user_id in user_ids]
+            })
+        }
+        
+    except Exception as e:
+        logger.error(f"Error checking users status: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e), 'user_ids': user_ids})
+        }
+
+BULK_API_ACTIONS = {
+    'block_many': manual_block_users,
+    'unblock_many': manual_unblock_users,
+    'status_many': check_users_status
+}
+
 def handle_cloudtrail_event(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Handle CloudTrail events (automatic blocking) - Fixed version"""
     connection = None
     processed_requests = 0
     blocked_requests = 0
     unblocked_requests = 0
+    latency_sketches = {}
     
     try:
         connection = get_mysql_connection()
@@ -1353,6 +1773,8 @@ def handle_cloudtrail_event(event: Dict[str, Any], context: Any) -> Dict[str, An
                 
                 # 3. Log the request normally
                 log_bedrock_request_cet(connection, request_data, team, person)
+                add_latency(latency_sketches, request_data['model_id'], request_data['cet_timestamp'],
+                            request_data.get('response_time_ms'))
                 processed_requests += 1
                 
                 logger.info(f"User {user_id} usage: {usage_info['daily_requests_used']}/{usage_info['daily_limit']} daily requests ({usage_info['daily_percent']:.1f}%), "
@@ -1362,6 +1784,8 @@ def handle_cloudtrail_event(event: Dict[str, Any], context: Any) -> Dict[str, An
                 logger.error(f"Failed to process record: {str(record_error)}")
                 continue
         
+        flush_latency_sketches(connection, latency_sketches)
+        
         logger.info(f"✅ Processed {processed_requests} requests, BLOCKED {blocked_requests} users, UNBLOCKED {unblocked_requests} users")
         
         return {
@@ -1390,6 +1814,48 @@ def handle_cloudtrail_event(event: Dict[str, Any], context: Any) -> Dict[str, An
 
 # NEW FUNCTIONS FOR MANUAL OPERATIONS
 
+def build_usage_info(limits_result: Optional[Dict[str, Any]], usage_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Usage summary from a user_limits row and a usage counts row (either may be missing)"""
+    if not limits_result:
+        daily_limit = 350
+        monthly_limit = 5000
+        administrative_safe = 'N'
+    else:
+        daily_limit = int(limits_result['daily_request_limit'])
+        monthly_limit = int(limits_result['monthly_request_limit'])
+        administrative_safe = limits_result.get('administrative_safe', 'N')
+    
+    daily_requests_used = int(usage_result['daily_requests_used']) if usage_result else 0
+    monthly_requests_used = int(usage_result['monthly_requests_used']) if usage_result else 0
+    
+    daily_percent = (daily_requests_used / daily_limit) * 100 if daily_limit > 0 else 0
+    monthly_percent = (monthly_requests_used / monthly_limit) * 100 if monthly_limit > 0 else 0
+    
+    return {
+        'daily_requests_used': daily_requests_used,
+        'monthly_requests_used': monthly_requests_used,
+        'daily_percent': daily_percent,
+        'monthly_percent': monthly_percent,
+        'daily_limit': daily_limit,
+        'monthly_limit': monthly_limit,
+        'administrative_safe': administrative_safe == 'Y'
+    }
+
+def get_users_current_usage(connection, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """get_user_current_usage for many users with one limits query and one usage query"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT user_id, daily_request_limit, monthly_request_limit, administrative_safe
+            FROM user_limits 
+            WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})
+        """, user_ids)
+        limits = {row['user_id']: row for row in cursor.fetchall()}
+        
+        cursor.execute(*usage_counts_many_query(user_ids, get_current_cet_time().date()))
+        usage = {row['user_id']: row for row in cursor.fetchall()}
+    
+    return {user_id: build_usage_info(limits.get(user_id), usage.get(user_id)) for user_id in user_ids}
+
 def get_user_current_usage(connection, user_id: str) -> Dict[str, Any]:
     """Get current usage information for user"""
     try:
@@ -1402,49 +1868,12 @@ def get_user_current_usage(connection, user_id: str) -> Dict[str, Any]:
             """, [user_id])
             
             limits_result = cursor.fetchone()
-            if not limits_result:
-                daily_limit = 350
-                monthly_limit = 5000
-                administrative_safe = 'N'
-            else:
-                daily_limit = int(limits_result['daily_request_limit'])
-                monthly_limit = int(limits_result['monthly_request_limit'])
-                administrative_safe = limits_result.get('administrative_safe', 'N')
             
-            # Get current daily usage
-            cursor.execute("""
-                SELECT COUNT(*) as daily_requests_used
-                FROM bedrock_requests 
-                WHERE user_id = %s 
-                AND DATE(request_timestamp) = CURDATE()
-            """, [user_id])
+            # Get current daily and monthly usage with one range seek on idx_user_date
+            # (CET calendar, the timezone request_timestamp is stored in)
+            cursor.execute(*usage_counts_query(user_id, get_current_cet_time().date()))
             
-            daily_result = cursor.fetchone()
-            daily_requests_used = int(daily_result['daily_requests_used']) if daily_result else 0
-            
-            # Get current monthly usage
-            cursor.execute("""
-                SELECT COUNT(*) as monthly_requests_used
-                FROM bedrock_requests 
-                WHERE user_id = %s 
-                AND DATE(request_timestamp) >= DATE_FORMAT(NOW(), '%%Y-%%m-01')
-            """, [user_id])
-            
-            monthly_result = cursor.fetchone()
-            monthly_requests_used = int(monthly_result['monthly_requests_used']) if monthly_result else 0
-            
-            daily_percent = (daily_requests_used / daily_limit) * 100 if daily_limit > 0 else 0
-            monthly_percent = (monthly_requests_used / monthly_limit) * 100 if monthly_limit > 0 else 0
-            
-            return {
-                'daily_requests_used': daily_requests_used,
-                'monthly_requests_used': monthly_requests_used,
-                'daily_percent': daily_percent,
-                'monthly_percent': monthly_percent,
-                'daily_limit': daily_limit,
-                'monthly_limit': monthly_limit,
-                'administrative_safe': administrative_safe == 'Y'
-            }
+            return build_usage_info(limits_result, cursor.fetchone())
             
     except Exception as e:
         logger.error(f"Failed to get user current usage: {str(e)}")
@@ -1458,8 +1887,10 @@ def get_user_current_usage(connection, user_id: str) -> Dict[str, Any]:
             'administrative_safe': False
         }
 
-def execute_admin_blocking(connection, user_id: str, reason: str, performed_by: str, usage_info: Dict[str, Any]) -> bool:
-    """Execute admin blocking with 24-hour expiration"""
+def execute_admin_blocking(connection, user_id: str, reason: str, performed_by: str, usage_info: Dict[str, Any],
+                           progress: Optional[Callable[[str], None]] = None) -> bool:
+    """Execute admin blocking with 24-hour expiration; `progress` is told each step as it starts"""
+    report = progress or (lambda step: None)
     try:
         current_cet_time = get_current_cet_time()
         current_cet_string = get_cet_timestamp_string()
@@ -1470,39 +1901,51 @@ def execute_admin_blocking(connection, user_id: str, reason: str, performed_by:
         
         logger.info(f"🚫 Admin blocking {user_id} until {blocked_until_string} CET")
         
-        # Update blocking status with admin info - CORRECCIÓN: Use expected SQL structure
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO user_blocking_status 
-                (user_id, is_blocked, blocked_reason, blocked_at, blocked_until, 
-                 requests_at_blocking, last_request_at, created_at, updated_at)
-                VALUES (%s, 'Y', %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                is_blocked = 'Y',
-                blocked_reason = VALUES(blocked_reason),
-                blocked_at = VALUES(blocked_at),
-                blocked_until = VALUES(blocked_until),
-                requests_at_blocking = VALUES(requests_at_blocking),
-                last_request_at = VALUES(last_request_at),
-                updated_at = VALUES(updated_at)
-            """, [user_id, reason, current_cet_string, blocked_until_string,
-                  usage_info['daily_requests_used'], current_cet_string, 
-                  current_cet_string, current_cet_string])
+        # Update blocking status with admin info and queue the notification in one transaction
+        report('blocking_status')
+        connection.begin()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO user_blocking_status 
+                    (user_id, is_blocked, blocked_reason, blocked_at, blocked_until, 
+                     requests_at_blocking, last_request_at, created_at, updated_at)
+                    VALUES (%s, 'Y', %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                    is_blocked = 'Y',
+                    blocked_reason = VALUES(blocked_reason),
+                    blocked_at = VALUES(blocked_at),
+                    blocked_until = VALUES(blocked_until),
+                    requests_at_blocking = VALUES(requests_at_blocking),
+                    last_request_at = VALUES(last_request_at),
+                    updated_at = VALUES(updated_at)
+                """, [user_id, reason, current_cet_string, blocked_until_string,
+                      usage_info['daily_requests_used'], current_cet_string, 
+                      current_cet_string, current_cet_string])
+            outbox_id = enqueue_notification(connection, user_id, 'ADMIN_BLOCK', {
+                'reason': reason, 'usage_info': usage_info, 'performed_by': performed_by,
+                'blocked_at': current_cet_string, 'blocked_until': blocked_until_string
+            }, get_cet_naive_time(), NOTIFICATION_HOLD_SECONDS)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
         
         # Log to audit
+        report('audit_log')
         with connection.cursor() as cursor:
             cursor.execute("""
                 INSERT INTO blocking_audit_log 
                 (user_id, operation_type, operation_reason, performed_by, operation_timestamp, created_at)
                 VALUES (%s, 'BLOCK', %s, %s, %s, %s)
             """, [user_id, reason, performed_by, current_cet_string, current_cet_string])
+            audit_log_id = cursor.lastrowid
+        attach_audit_log(connection, outbox_id, audit_log_id)
         
         # Create IAM deny policy
+        report('iam_policy')
         implement_iam_blocking(user_id)
         
-        # Send enhanced email notification
-        send_enhanced_blocking_email(user_id, reason, usage_info, performed_by)
-        
         logger.info(f"✅ Successfully executed admin blocking for user {user_id}")
         return True
         
@@ -1510,8 +1953,10 @@ def execute_admin_blocking(connection, user_id: str, reason: str, performed_by:
         logger.error(f"❌ Failed to execute admin blocking for {user_id}: {str(e)}")
         return False
 
-def execute_admin_unblocking(connection, user_id: str, reason: str, performed_by: str) -> bool:
-    """Execute admin unblocking with protection flag"""
+def execute_admin_unblocking(connection, user_id: str, reason: str, performed_by: str,
+                             progress: Optional[Callable[[str], None]] = None) -> bool:
+    """Execute admin unblocking with protection flag; `progress` is told each step as it starts"""
+    report = progress or (lambda step: None)
     try:
         current_cet_string = get_cet_timestamp_string()
         
@@ -1522,10 +1967,11 @@ def execute_admin_unblocking(connection, user_id: str, reason: str, performed_by
         protection_success = False
         audit_success = False
         iam_success = False
-        email_success = False
         
-        # 1. Update blocking status
+        # 1. Update blocking status and queue the notification in the same transaction
+        report('blocking_status')
         try:
+            connection.begin()
             with connection.cursor() as cursor:
                 result = cursor.execute("""
                     UPDATE user_blocking_status 
@@ -1537,12 +1983,18 @@ def execute_admin_unblocking(connection, user_id: str, reason: str, performed_by
                     WHERE user_id = %s
                 """, [reason, current_cet_string, user_id])
                 logger.info(f"✅ Step 1: Updated blocking status for {user_id} (affected rows: {cursor.rowcount})")
-                db_success = True
+            outbox_id = enqueue_notification(connection, user_id, 'ADMIN_UNBLOCK', {
+                'reason': reason, 'performed_by': performed_by
+            }, get_cet_naive_time(), NOTIFICATION_HOLD_SECONDS)
+            connection.commit()
+            db_success = True
         except Exception as e:
+            connection.rollback()
             logger.error(f"❌ Step 1 FAILED: Blocking status update for {user_id}: {str(e)}")
             return False
         
         # 2. CORRECCIÓN CRÍTICA: Set administrative protection to prevent automatic re-blocking
+        report('administrative_protection')
         try:
             with connection.cursor() as cursor:
                 # First ensure user exists in user_limits table
@@ -1573,6 +2025,7 @@ def execute_admin_unblocking(connection, user_id: str, reason: str, performed_by
             protection_success = False
         
         # 3. Log to audit
+        report('audit_log')
         try:
             with connection.cursor() as cursor:
                 cursor.execute("""
@@ -1580,13 +2033,16 @@ def execute_admin_unblocking(connection, user_id: str, reason: str, performed_by
                     (user_id, operation_type, operation_reason, performed_by, operation_timestamp, created_at)
                     VALUES (%s, 'UNBLOCK', %s, %s, %s, %s)
                 """, [user_id, reason, performed_by, current_cet_string, current_cet_string])
-                logger.info(f"✅ Step 3: Created audit log entry for {user_id}")
-                audit_success = True
+                audit_log_id = cursor.lastrowid
+            attach_audit_log(connection, outbox_id, audit_log_id)
+            logger.info(f"✅ Step 3: Created audit log entry for {user_id}")
+            audit_success = True
         except Exception as e:
             logger.error(f"❌ Step 3 FAILED: Audit log creation for {user_id}: {str(e)}")
             audit_success = False
         
         # 4. Remove IAM deny policy
+        report('iam_policy')
         try:
             iam_success = implement_iam_unblocking(user_id)
             if iam_success:
@@ -1597,17 +2053,6 @@ def execute_admin_unblocking(connection, user_id: str, reason: str, performed_by
             logger.error(f"❌ Step 4 EXCEPTION: IAM policy update for {user_id}: {str(e)}")
             iam_success = False
         
-        # 5. Send enhanced email notification
-        try:
-            email_success = send_enhanced_unblocking_email(user_id, reason, performed_by)
-            if email_success:
-                logger.info(f"✅ Step 5: Email sent for {user_id}")
-            else:
-                logger.error(f"❌ Step 5 FAILED: Email sending for {user_id}")
-        except Exception as e:
-            logger.error(f"❌ Step 5 EXCEPTION: Email sending for {user_id}: {str(e)}")
-            email_success = False
-        
         # CORRECCIÓN CRÍTICA: Return False if critical steps failed
         if not db_success or not protection_success:
             logger.error(f"❌ CRITICAL: Admin unblocking failed for {user_id} - db_success={db_success}, protection_success={protection_success}")
@@ -1620,17 +2065,159 @@ def execute_admin_unblocking(connection, user_id: str, reason: str, performed_by
         logger.error(f"❌ Failed to execute admin unblocking for {user_id}: {str(e)}")
         return False
 
-def send_enhanced_blocking_email(user_id: str, reason: str, usage_info: Dict[str, Any], performed_by: str) -> bool:
+def run_iam_parallel(operation: Callable[[str], bool], user_ids: List[str]) -> Dict[str, bool]:
+    """Run an IAM policy change for many users on a bounded thread pool"""
+    def run(user_id: str) -> bool:
+        try:
+            return bool(operation(user_id))
+        except Exception as e:
+            logger.error(f"❌ IAM update failed for {user_id}: {str(e)}")
+            return False
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(BULK_IAM_WORKERS, len(user_ids)))) as pool:
+        return dict(zip(user_ids, pool.map(run, user_ids)))
+
+def execute_admin_blocking_many(connection, user_ids: List[str], reason: str, performed_by: str,
+                                usage_by_user: Dict[str, Dict[str, Any]]) -> Dict[str, bool]:
+    """
+    Admin-block many users: one transaction for the status rows, audit entries
+    and notifications, then the IAM deny policies in parallel
+    
+    Returns whether the IAM policy of each user was updated.
+    """
+    current_cet_time = get_current_cet_time()
+    current_cet_string = get_cet_timestamp_string()
+    blocked_until_string = (current_cet_time + timedelta(hours=24)).strftime('%Y-%m-%d %H:%M:%S')
+    queued_at = get_cet_naive_time()
+    
+    logger.info(f"🚫 Admin blocking {len(user_ids)} users until {blocked_until_string} CET")
+    
+    connection.begin()
+    try:
+        with connection.cursor() as cursor:
+            cursor.executemany("""
+                INSERT INTO user_blocking_status 
+                (user_id, is_blocked, blocked_reason, blocked_at, blocked_until, 
+                 requests_at_blocking, last_request_at, created_at, updated_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                is_blocked = 'Y',
+                blocked_reason = VALUES(blocked_reason),
+                blocked_at = VALUES(blocked_at),
+                blocked_until = VALUES(blocked_until),
+                requests_at_blocking = VALUES(requests_at_blocking),
+                last_request_at = VALUES(last_request_at),
+                updated_at = VALUES(updated_at)
+            """, [[user_id, 'Y', reason, current_cet_string, blocked_until_string,
+                   usage_by_user[user_id]['daily_requests_used'], current_cet_string,
+                   current_cet_string, current_cet_string] for user_id in user_ids])
+            
+            for user_id in user_ids:
+                cursor.execute("""
+                    INSERT INTO blocking_audit_log 
+                    (user_id, operation_type, operation_reason, performed_by, operation_timestamp, created_at)
+                    VALUES (%s, 'BLOCK', %s, %s, %s, %s)
+                """, [user_id, reason, performed_by, current_cet_string, current_cet_string])
+                enqueue_notification(connection, user_id, 'ADMIN_BLOCK', {
+                    'reason': reason, 'usage_info': usage_by_user[user_id], 'performed_by': performed_by,
+                    'blocked_at': current_cet_string, 'blocked_until': blocked_until_string
+                }, queued_at, NOTIFICATION_HOLD_SECONDS, audit_log_id=cursor.lastrowid)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    
+    return run_iam_parallel(implement_iam_blocking, user_ids)
+
+def execute_admin_unblocking_many(connection, user_ids: List[str], reason: str, performed_by: str) -> Dict[str, bool]:
+    """
+    Admin-unblock many users: one transaction for the status rows,
+    administrative protection, audit entries and notifications, then the IAM
+    policies in parallel
+    
+    Returns whether the IAM policy of each user was updated.
+    """
+    current_cet_string = get_cet_timestamp_string()
+    queued_at = get_cet_naive_time()
+    
+    logger.info(f"🔓 Admin unblocking {len(user_ids)} users")
+    
+    connection.begin()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE user_blocking_status 
+                SET is_blocked = 'N',
+                    blocked_reason = %s,
+                    blocked_at = NULL,
+                    blocked_until = NULL,
+                    updated_at = %s
+                WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})
+            """, [reason, current_cet_string] + user_ids)
+            
+            # Administrative protection, creating missing user_limits rows like the single-user path
+            cursor.executemany("""
+                INSERT INTO user_limits (user_id, team, person, daily_request_limit, monthly_request_limit, administrative_safe, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                administrative_safe = 'Y',
+                updated_at = VALUES(created_at)
+            """, [[user_id, 'unknown', 'Unknown', 350, 5000, 'Y', current_cet_string] for user_id in user_ids])
+            
+            for user_id in user_ids:
+                cursor.execute("""
+                    INSERT INTO blocking_audit_log 
+                    (user_id, operation_type, operation_reason, performed_by, operation_timestamp, created_at)
+                    VALUES (%s, 'UNBLOCK', %s, %s, %s, %s)
+                """, [user_id, reason, performed_by, current_cet_string, current_cet_string])
+                enqueue_notification(connection, user_id, 'ADMIN_UNBLOCK', {
+                    'reason': reason, 'performed_by': performed_by
+                }, queued_at, NOTIFICATION_HOLD_SECONDS, audit_log_id=cursor.lastrowid)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    
+    return run_iam_parallel(implement_iam_unblocking, user_ids)
+
+def invoke_email_service_async(email_payload: Dict[str, Any], delivery: Optional[Dict[str, Any]]) -> Union[bool, str]:
+    """Hand an email to the email service without waiting for SMTP"""
+    if delivery:
+        email_payload['status_callback'] = dict(delivery, function=STATUS_CALLBACK_FUNCTION)
+    
+    response = lambda_client.invoke(
+        FunctionName=EMAIL_SERVICE_LAMBDA_NAME,
+        InvocationType='Event',
+        Payload=json.dumps(email_payload, default=str)
+    )
+    if response.get('StatusCode') != 202:
+        raise RuntimeError(f"Email service did not accept the event (status {response.get('StatusCode')})")
+    
+    logger.info(f"📨 Queued {email_payload['action']} for {email_payload['user_id']} with the email service")
+    # With a delivery reference the outcome is reported back later
+    return DELIVERY_ACCEPTED if delivery else True
+
+def send_enhanced_blocking_email(user_id: str, reason: str, usage_info: Dict[str, Any], performed_by: str,
+                                 smtp_session: Optional[SmtpSession] = None,
+                                 delivery: Optional[Dict[str, Any]] = None,
+                                 blocked_at: Optional[str] = None,
+                                 blocked_until: Optional[str] = None) -> Union[bool, str]:
     """Send enhanced blocking email via separate Lambda service"""
+    # Admin blocks expire after 24 hours; rows queued without blocked_until only know the send time
+    if blocked_until:
+        blocked_until_cet = CET.localize(datetime.strptime(blocked_until, '%Y-%m-%d %H:%M:%S'))
+    else:
+        blocked_until_cet = get_current_cet_time() + timedelta(hours=24)
     try:
         if performed_by != 'system':
-            # Admin blocking email
+            # Admin blocking email; the email service reads the expiration from expires_at
             email_payload = {
                 'action': 'send_admin_blocking_email',
                 'user_id': user_id,
                 'performed_by': performed_by,
                 'reason': reason,
-                'usage_record': usage_info
+                'usage_record': dict(usage_info, expires_at=blocked_until_cet.isoformat()),
+                'blocked_at': blocked_at
             }
         else:
             # Automatic blocking email
@@ -1642,6 +2229,13 @@ def send_enhanced_blocking_email(user_id: str, reason: str, usage_info: Dict[str
             }
         
         if EMAIL_NOTIFICATIONS_ENABLED:
+            recipient = get_email_recipient(user_id)
+            if recipient:
+                email_payload['recipient'] = recipient
+            
+            if EMAIL_INVOCATION_MODE == 'async':
+                return invoke_email_service_async(email_payload, delivery)
+            
             response = lambda_client.invoke(
                 FunctionName=EMAIL_SERVICE_LAMBDA_NAME,
                 InvocationType='RequestResponse',
@@ -1656,8 +2250,8 @@ def send_enhanced_blocking_email(user_id: str, reason: str, usage_info: Dict[str
             else:
                 logger.warning(f"⚠️ Enhanced email failed for {user_id}, falling back to Gmail")
                 # Fallback to existing Gmail functionality
-                return send_blocking_email_gmail(user_id, reason, usage_info, 
-                                               get_current_cet_time() + timedelta(hours=24))
+                return send_blocking_email_gmail(user_id, reason, usage_info, blocked_until_cet, smtp_session,
+                                                 blocked_at)
             
             return success
         else:
@@ -1667,10 +2261,11 @@ def send_enhanced_blocking_email(user_id: str, reason: str, usage_info: Dict[str
     except Exception as e:
         logger.error(f"Enhanced email service failed, falling back to Gmail: {str(e)}")
         # Fallback to existing Gmail functionality
-        return send_blocking_email_gmail(user_id, reason, usage_info, 
-                                       get_current_cet_time() + timedelta(hours=24))
+        return send_blocking_email_gmail(user_id, reason, usage_info, blocked_until_cet, smtp_session, blocked_at)
 
-def send_enhanced_unblocking_email(user_id: str, reason: str, performed_by: str) -> bool:
+def send_enhanced_unblocking_email(user_id: str, reason: str, performed_by: str,
+                                   smtp_session: Optional[SmtpSession] = None,
+                                   delivery: Optional[Dict[str, Any]] = None) -> Union[bool, str]:
     """Send enhanced unblocking email via separate Lambda service"""
     try:
         if performed_by != 'system' and performed_by != 'daily_reset':
@@ -1690,6 +2285,13 @@ def send_enhanced_unblocking_email(user_id: str, reason: str, performed_by: str)
             }
         
         if EMAIL_NOTIFICATIONS_ENABLED:
+            recipient = get_email_recipient(user_id)
+            if recipient:
+                email_payload['recipient'] = recipient
+            
+            if EMAIL_INVOCATION_MODE == 'async':
+                return invoke_email_service_async(email_payload, delivery)
+            
             response = lambda_client.invoke(
                 FunctionName=EMAIL_SERVICE_LAMBDA_NAME,
                 InvocationType='RequestResponse',
@@ -1704,7 +2306,7 @@ def send_enhanced_unblocking_email(user_id: str, reason: str, performed_by: str)
             else:
                 logger.warning(f"⚠️ Enhanced email failed for {user_id}, falling back to Gmail")
                 # Fallback to existing Gmail functionality
-                return send_unblocking_email_gmail(user_id)
+                return send_unblocking_email_gmail(user_id, smtp_session)
             
             return success
         else:
@@ -1714,4 +2316,4 @@ def send_enhanced_unblocking_email(user_id: str, reason: str, performed_by: str)
     except Exception as e:
         logger.error(f"Enhanced email service failed, falling back to Gmail: {str(e)}")
         # Fallback to existing Gmail functionality
-        return send_unblocking_email_gmail(user_id)
+        return send_unblocking_email_gmail(user_id, smtp_session)
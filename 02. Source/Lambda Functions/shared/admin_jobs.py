@@ -0,0 +1,105 @@
+"""
+Asynchronous admin jobs
+
+Admin block/unblock used to run entirely inside the dashboard's request. The
+DB writes, the IAM read-modify-write-verify and the email hand-off all
+finished before the response, so buttons hung and API Gateway timeouts
+sometimes cut a workflow off halfway. Now the request only inserts an
+admin_jobs row (QUEUED) and invokes the controller again with
+InvocationType='Event'. It then answers 202 with the job id.
+
+The asynchronous invocation claims the job (QUEUED -> RUNNING). It records
+each workflow step as it starts, and stores the final response as the job's
+result (SUCCEEDED / FAILED). The controller's "job_status" action reads the
+row back.
+
+Lambda retries failed asynchronous invocations, and a duplicated event must
+not run a job twice. claim_job only takes QUEUED jobs, plus RUNNING jobs
+whose last update is older than `lease_seconds`. That covers invocations
+that died mid-workflow; the admin workflows are upserts, so re-running one
+is safe.
+"""
+
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger()
+
+JOBS_TABLE = 'admin_jobs'
+DEFAULT_LEASE_SECONDS = 900
+
+
+def create_job(conn, action: str, user_id: str, params: Dict[str, Any], now: datetime) -> str:
+    """Insert a QUEUED job and return its id"""
+    job_id = uuid.uuid4().hex
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {JOBS_TABLE} (job_id, action, user_id, params, status, attempts, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, 'QUEUED', 0, %s, %s)
+        """, [job_id, action, user_id, json.dumps(params, default=str), now, now])
+    return job_id
+
+
+def claim_job(conn, job_id: str, now: datetime, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+    """Mark a job RUNNING for this invocation; None if it is done or held by another one"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {JOBS_TABLE}
+            SET status = 'RUNNING', step = NULL, attempts = attempts + 1, started_at = %s, updated_at = %s
+            WHERE job_id = %s
+              AND (status = 'QUEUED' OR (status = 'RUNNING' AND updated_at < %s))
+        """, [now, now, job_id, now - timedelta(seconds=lease_seconds)])
+        if cursor.rowcount != 1:
+            return None
+    return get_job(conn, job_id)
+
+
+def set_step(conn, job_id: str, step: str, now: datetime) -> None:
+    """Record the workflow step a RUNNING job has reached"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {JOBS_TABLE} SET step = %s, updated_at = %s
+            WHERE job_id = %s AND status = 'RUNNING'
+        """, [step, now, job_id])
+
+
+def finish_job(conn, job_id: str, succeeded: bool, result: Optional[Dict[str, Any]], now: datetime,
+               error: Optional[str] = None) -> None:
+    """Store the outcome of a job"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {JOBS_TABLE}
+            SET status = %s, result = %s, error = %s, finished_at = %s, updated_at = %s
+            WHERE job_id = %s
+        """, ['SUCCEEDED' if succeeded else 'FAILED', json.dumps(result, default=str) if result is not None else None,
+              error[:1000] if error else None, now, now, job_id])
+
+
+def get_job(conn, job_id: str) -> Optional[Dict[str, Any]]:
+    """One job with its params and result decoded"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT job_id, action, user_id, params, status, step, attempts, result, error,
+                   created_at, started_at, finished_at, updated_at
+            FROM {JOBS_TABLE}
+            WHERE job_id = %s
+        """, [job_id])
+        row = cursor.fetchone()
+    if not row:
+        return None
+    for column in ('params', 'result'):
+        if isinstance(row.get(column), (str, bytes)):
+            row[column] = json.loads(row[column])
+    return row
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """job_status response body for a job"""
+    view = {key: value for key, value in job.items() if key != 'params'}
+    for column in ('created_at', 'started_at', 'finished_at', 'updated_at'):
+        if hasattr(view.get(column), 'isoformat'):
+            view[column] = view[column].isoformat()
+    return view
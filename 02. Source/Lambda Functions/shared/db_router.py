@@ -0,0 +1,170 @@
+"""
+Shared MySQL connection layer with read-replica routing
+
+Writes and strongly consistent reads go to the primary instance, the one the
+realtime controller inserts into. Other reads (dashboard reports, exports)
+can go to a reader endpoint so analytical load does not compete with ingest.
+
+The replica is only used while it is healthy: its lag is measured with
+SHOW REPLICA STATUS (SHOW SLAVE STATUS on older servers) at most once per
+`lag_check_interval` seconds, and reads fall back to the primary when the lag
+exceeds `max_lag_seconds`, when replication is stopped or when the replica
+cannot be reached.
+
+Configuration comes from the environment:
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD   primary
+    DB_READER_HOST, DB_READER_PORT                    replica (optional)
+    REPLICA_MAX_LAG_SECONDS, REPLICA_LAG_CHECK_INTERVAL
+
+Pointing DB_HOST and DB_READER_HOST at two local MySQL instances is enough to
+exercise the routing; an instance without replication configured reports no
+replica status and is treated as a reader with zero lag.
+
+This module is shared by several Lambda functions and is deployed next to
+their lambda_function.py (or in a layer under /opt/python).
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import pymysql
+
+logger = logging.getLogger()
+
+CONSISTENCY_LEVELS = ('eventual', 'strong')
+
+
+def build_db_config(host_variable: str = 'DB_HOST', port_variable: str = 'DB_PORT',
+                    default_host: Optional[str] = None) -> Dict[str, Any]:
+    """Build a connection configuration from the environment"""
+    return {
+        'host': os.environ.get(host_variable, default_host),
+        'port': int(os.environ.get(port_variable, '3306')),
+        'database': os.environ.get('DB_NAME', 'bedrock_usage'),
+        'user': os.environ.get('DB_USER', 'admin'),
+        'password': os.environ.get('DB_PASSWORD'),
+        'charset': 'utf8mb4',
+        'connect_timeout': 10,
+        'read_timeout': 30,
+        'write_timeout': 30
+    }
+
+
+def connect(config: Dict[str, Any], cursorclass=pymysql.cursors.DictCursor, autocommit: bool = True):
+    """Open a PyMySQL connection for a configuration built by build_db_config"""
+    return pymysql.connect(
+        host=config['host'],
+        port=config['port'],
+        user=config['user'],
+        password=config['password'],
+        database=config['database'],
+        charset=config['charset'],
+        connect_timeout=config['connect_timeout'],
+        read_timeout=config['read_timeout'],
+        write_timeout=config['write_timeout'],
+        cursorclass=cursorclass,
+        autocommit=autocommit
+    )
+
+
+def validate_consistency(value: Any) -> str:
+    """Validate a per-request consistency level"""
+    value = value or 'eventual'
+    if value not in CONSISTENCY_LEVELS:
+        raise ValueError(f"Unsupported consistency: {value}. Use one of {', '.join(CONSISTENCY_LEVELS)}")
+    return value
+
+
+def measure_replica_lag(connection) -> Optional[float]:
+    """
+    Return the replica lag in seconds
+
+    0 when the server is not a replica (no status row), None when the lag is
+    unknown (replication stopped or the status cannot be read).
+    """
+    statements = (('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+                  ('SHOW SLAVE STATUS', 'Seconds_Behind_Master'))
+    with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+        for statement, column in statements:
+            try:
+                cursor.execute(statement)
+                row = cursor.fetchone()
+            except pymysql.err.MySQLError as e:
+                logger.info(f"ℹ️ {statement} not available: {str(e)}")
+                continue
+            if row is None:
+                return 0.0
+            value = row.get(column)
+            return None if value is None else float(value)
+    return None
+
+
+class ReplicaRouter:
+    """Decide per read whether the replica may serve it, tracking the replica's lag"""
+
+    def __init__(self, replica_config: Optional[Dict[str, Any]], max_lag_seconds: float = 5.0,
+                 lag_check_interval: float = 10.0,
+                 connect_fn: Callable[[Dict[str, Any]], Any] = connect,
+                 clock: Callable[[], float] = time.monotonic):
+        self.replica_config = replica_config if replica_config and replica_config.get('host') else None
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_interval = lag_check_interval
+        self.connect_fn = connect_fn
+        self.clock = clock
+        self.last_lag: Optional[float] = None
+        self.last_check: Optional[float] = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.replica_config is not None
+
+    def lag_is_acceptable(self, lag: Optional[float]) -> bool:
+        return lag is not None and lag <= self.max_lag_seconds
+
+    def connect_for_read(self, consistency: str = 'eventual'):
+        """Return a replica connection for an eventually consistent read, or None to use the primary"""
+        if not self.enabled or consistency == 'strong':
+            return None
+
+        with self.lock:
+            check_due = self.last_check is None or self.clock() - self.last_check >= self.lag_check_interval
+            if not check_due and not self.lag_is_acceptable(self.last_lag):
+                return None
+
+        try:
+            connection = self.connect_fn(self.replica_config)
+        except Exception as e:
+            logger.warning(f"⚠️ Read replica unavailable, using primary: {str(e)}")
+            with self.lock:
+                self.last_lag, self.last_check = None, self.clock()
+            return None
+
+        if check_due:
+            try:
+                lag = measure_replica_lag(connection)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not measure replica lag: {str(e)}")
+                lag = None
+            with self.lock:
+                self.last_lag, self.last_check = lag, self.clock()
+            if not self.lag_is_acceptable(lag):
+                logger.warning(f"⚠️ Replica lag {lag}s over {self.max_lag_seconds}s, using primary")
+                connection.close()
+                return None
+
+        return connection
+
+
+def router_from_environment(**kwargs) -> ReplicaRouter:
+    """Create a ReplicaRouter for DB_READER_HOST (disabled when it is not set)"""
+    replica_config = build_db_config('DB_READER_HOST', 'DB_READER_PORT') if os.environ.get('DB_READER_HOST') else None
+    return ReplicaRouter(
+        replica_config,
+        max_lag_seconds=float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '5')),
+        lag_check_interval=float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', '10')),
+        **kwargs
+    )
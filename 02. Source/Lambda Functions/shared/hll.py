@@ -0,0 +1,95 @@
+"""
+HyperLogLog distinct-count sketches
+
+COUNT(DISTINCT user_id) over raw bedrock_requests rows does not compose: the
+distinct users of a week are not the sum of the distinct users of its days,
+so every wider range rescans the rows. A HyperLogLog sketch does compose. The
+sketch of a union is the register-wise maximum of the sketches. The rollup
+tables (see usage_rollups.py) therefore store one sketch per bucket, and any
+range or set of teams is answered by merging the bucket sketches.
+
+With the default precision of 12 (4096 one-byte registers), the standard
+error is about 1.6%. Below roughly 10k distinct values, linear counting
+gives nearly exact results. Values are hashed with 64-bit BLAKE2b, which is
+stable across processes (unlike hash()), so sketches built by different
+Lambdas merge correctly.
+
+Serialized form: version byte, precision byte, zlib-compressed registers.
+Sketches of small teams are mostly zero registers and compress to a few
+hundred bytes.
+"""
+
+import hashlib
+import math
+import zlib
+from typing import Iterable, Optional
+
+SERIAL_VERSION = 1
+DEFAULT_PRECISION = 12
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+
+def hash64(value) -> int:
+    """Stable 64-bit hash of a value's string form"""
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch"""
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[bytearray] = None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError("register count does not match the precision")
+
+    def add(self, value) -> None:
+        hashed = hash64(value)
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        rank = remaining_bits - (hashed & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable) -> 'HyperLogLog':
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Fold another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge precision {other.precision} into {self.precision}")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self) -> int:
+        """Estimated number of distinct values added"""
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        raw = alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * self.size and zeros:
+            return int(round(self.size * math.log(self.size / zeros)))
+        return int(round(raw))
+
+    def to_bytes(self) -> bytes:
+        return bytes([SERIAL_VERSION, self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        if not data or data[0] != SERIAL_VERSION:
+            raise ValueError("Unsupported HyperLogLog serialization")
+        return cls(data[1], bytearray(zlib.decompress(data[2:])))
+
+
+def merge_serialized(sketches: Iterable[Optional[bytes]], precision: int = DEFAULT_PRECISION) -> HyperLogLog:
+    """Merge serialized sketches, skipping missing ones"""
+    merged = HyperLogLog(precision)
+    for data in sketches:
+        if data:
+            merged.merge(HyperLogLog.from_bytes(data))
+    return merged
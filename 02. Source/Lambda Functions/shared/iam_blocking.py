@@ -0,0 +1,279 @@
+"""
+IAM blocking backends
+
+Blocking has always rewritten the user's inline `<user>_BedrockPolicy`:
+- read the document
+- insert or remove the DailyLimitBlock deny statement
+- write it back
+- read it again to verify
+
+That is three or four IAM calls per block. A concurrent edit of the same
+document between the read and the write is silently lost.
+
+IamBlocker keeps that "inline" backend and adds two that block with one
+idempotent call:
+- "managed_policy": attach/detach a pre-created managed deny policy
+  (deny_policy_document(), ARN in IAM_DENY_POLICY_ARN)
+- "group": add/remove the user to/from a group carrying that policy
+  (bedrock-blocked by default)
+
+The backends can be switched without stranding blocks made by another one.
+unblock() also clears the other mechanisms that are configured, so a user
+blocked inline is released after switching to managed_policy (while
+clear_inline is on). reconcile_blocks() moves every user to the active
+backend according to user_blocking_status. The bedrock-db-maintenance
+"iam_blocks" task runs it after a switch.
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger()
+
+BACKEND_INLINE = 'inline'
+BACKEND_MANAGED_POLICY = 'managed_policy'
+BACKEND_GROUP = 'group'
+BACKENDS = (BACKEND_INLINE, BACKEND_MANAGED_POLICY, BACKEND_GROUP)
+
+POLICY_SUFFIX = '_BedrockPolicy'
+DENY_STATEMENT_SID = 'DailyLimitBlock'
+DEFAULT_BLOCKED_GROUP = 'bedrock-blocked'
+DEFAULT_MAX_WORKERS = 8
+
+BEDROCK_ACTIONS = [
+    "bedrock:InvokeModel",
+    "bedrock:InvokeModelWithResponseStream",
+    "bedrock:Converse",
+    "bedrock:ConverseStream"
+]
+
+
+def deny_statement() -> Dict[str, Any]:
+    return {
+        "Sid": DENY_STATEMENT_SID,
+        "Effect": "Deny",
+        "Action": list(BEDROCK_ACTIONS),
+        "Resource": "*"
+    }
+
+
+def deny_policy_document() -> Dict[str, Any]:
+    """Document of the managed deny policy used by the managed_policy and group backends"""
+    return {"Version": "2012-10-17", "Statement": [deny_statement()]}
+
+
+def add_inline_deny(iam_client: Any, user_id: str) -> bool:
+    """Put the DailyLimitBlock statement first in the user's inline policy and verify it"""
+    policy_name = f"{user_id}{POLICY_SUFFIX}"
+    try:
+        current_policy = iam_client.get_user_policy(UserName=user_id, PolicyName=policy_name)['PolicyDocument']
+        removed = len(current_policy['Statement'])
+        current_policy['Statement'] = [stmt for stmt in current_policy['Statement']
+                                       if stmt.get('Sid') != DENY_STATEMENT_SID]
+        removed -= len(current_policy['Statement'])
+        if removed:
+            logger.info(f"🗑️ Removed {removed} existing deny statements for user {user_id}")
+        # Deny first (highest priority)
+        current_policy['Statement'].insert(0, deny_statement())
+    except iam_client.exceptions.NoSuchEntityException:
+        logger.info(f"📝 No existing policy found for user {user_id}, creating new policy")
+        current_policy = {
+            "Version": "2012-10-17",
+            "Statement": [
+                deny_statement(),
+                {"Sid": "BedrockAccess", "Effect": "Allow", "Action": list(BEDROCK_ACTIONS), "Resource": "*"}
+            ]
+        }
+
+    iam_client.put_user_policy(UserName=user_id, PolicyName=policy_name,
+                               PolicyDocument=json.dumps(current_policy, separators=(',', ':')))
+
+    applied_policy = iam_client.get_user_policy(UserName=user_id, PolicyName=policy_name)['PolicyDocument']
+    if any(stmt.get('Sid') == DENY_STATEMENT_SID for stmt in applied_policy['Statement']):
+        return True
+    logger.error(f"❌ Deny statement not found in applied policy for user {user_id}")
+    return False
+
+
+def remove_inline_deny(iam_client: Any, user_id: str) -> bool:
+    """Drop the DailyLimitBlock statement from the user's inline policy, writing only when needed"""
+    policy_name = f"{user_id}{POLICY_SUFFIX}"
+    try:
+        current_policy = iam_client.get_user_policy(UserName=user_id, PolicyName=policy_name)['PolicyDocument']
+    except iam_client.exceptions.NoSuchEntityException:
+        return True
+
+    statements = [stmt for stmt in current_policy['Statement'] if stmt.get('Sid') != DENY_STATEMENT_SID]
+    has_allow = any(stmt.get('Effect') == 'Allow' for stmt in statements)
+    if len(statements) == len(current_policy['Statement']) and has_allow:
+        return True
+
+    # Ensure there's at least an allow statement
+    if not has_allow:
+        statements.append({
+            "Sid": "BedrockAccess",
+            "Effect": "Allow",
+            "Action": ["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
+            "Resource": "*"
+        })
+    current_policy['Statement'] = statements
+    iam_client.put_user_policy(UserName=user_id, PolicyName=policy_name,
+                               PolicyDocument=json.dumps(current_policy, separators=(',', ':')))
+    return True
+
+
+class IamBlocker:
+    """Blocks and unblocks Bedrock access with the configured backend"""
+
+    def __init__(self, iam_client: Any, backend: str = BACKEND_INLINE, deny_policy_arn: Optional[str] = None,
+                 group_name: Optional[str] = None, clear_inline: bool = True):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown IAM blocking backend: {backend}. Use one of {', '.join(BACKENDS)}")
+        if backend == BACKEND_MANAGED_POLICY and not deny_policy_arn:
+            raise ValueError("The managed_policy backend needs the ARN of the deny policy")
+        self.iam = iam_client
+        self.backend = backend
+        self.deny_policy_arn = deny_policy_arn
+        self.group_name = group_name or (DEFAULT_BLOCKED_GROUP if backend == BACKEND_GROUP else None)
+        self.clear_inline = clear_inline
+
+    def other_mechanisms(self) -> List[str]:
+        """Configured mechanisms besides the active backend that may still hold a block"""
+        others = []
+        if self.backend != BACKEND_INLINE and self.clear_inline:
+            others.append(BACKEND_INLINE)
+        if self.backend != BACKEND_MANAGED_POLICY and self.deny_policy_arn:
+            others.append(BACKEND_MANAGED_POLICY)
+        if self.backend != BACKEND_GROUP and self.group_name:
+            others.append(BACKEND_GROUP)
+        return others
+
+    def apply(self, mechanism: str, user_id: str, blocked: bool) -> bool:
+        """Set or clear the block of one mechanism; one IAM call except for inline"""
+        if mechanism == BACKEND_INLINE:
+            return add_inline_deny(self.iam, user_id) if blocked else remove_inline_deny(self.iam, user_id)
+        try:
+            if mechanism == BACKEND_MANAGED_POLICY:
+                if blocked:
+                    self.iam.attach_user_policy(UserName=user_id, PolicyArn=self.deny_policy_arn)
+                else:
+                    self.iam.detach_user_policy(UserName=user_id, PolicyArn=self.deny_policy_arn)
+            elif blocked:
+                self.iam.add_user_to_group(GroupName=self.group_name, UserName=user_id)
+            else:
+                self.iam.remove_user_from_group(GroupName=self.group_name, UserName=user_id)
+        except self.iam.exceptions.NoSuchEntityException:
+            # Detaching / leaving something the user does not have is already the goal
+            if blocked:
+                raise
+        return True
+
+    def block(self, user_id: str) -> bool:
+        return self.apply(self.backend, user_id, True)
+
+    def unblock(self, user_id: str) -> bool:
+        success = self.apply(self.backend, user_id, False)
+        for mechanism in self.other_mechanisms():
+            success = self.apply(mechanism, user_id, False) and success
+        return success
+
+    def is_blocked(self, user_id: str, mechanism: Optional[str] = None) -> bool:
+        """Whether one mechanism (the active backend by default) currently blocks the user"""
+        mechanism = mechanism or self.backend
+        if mechanism == BACKEND_INLINE:
+            try:
+                document = self.iam.get_user_policy(UserName=user_id, PolicyName=f"{user_id}{POLICY_SUFFIX}")
+            except self.iam.exceptions.NoSuchEntityException:
+                return False
+            return any(stmt.get('Sid') == DENY_STATEMENT_SID for stmt in document['PolicyDocument']['Statement'])
+
+        request = {'UserName': user_id}
+        while True:
+            if mechanism == BACKEND_MANAGED_POLICY:
+                response = self.iam.list_attached_user_policies(**request)
+                if any(policy['PolicyArn'] == self.deny_policy_arn for policy in response['AttachedPolicies']):
+                    return True
+            else:
+                response = self.iam.list_groups_for_user(**request)
+                if any(group['GroupName'] == self.group_name for group in response['Groups']):
+                    return True
+            if not response.get('IsTruncated'):
+                return False
+            request['Marker'] = response['Marker']
+
+    def holders(self) -> Set[str]:
+        """Users the managed deny policy or the blocked group currently apply to"""
+        users = set()
+        if self.deny_policy_arn:
+            request = {'PolicyArn': self.deny_policy_arn, 'EntityFilter': 'User'}
+            while True:
+                response = self.iam.list_entities_for_policy(**request)
+                users.update(user['UserName'] for user in response['PolicyUsers'])
+                if not response.get('IsTruncated'):
+                    break
+                request['Marker'] = response['Marker']
+        if self.group_name:
+            request = {'GroupName': self.group_name}
+            try:
+                while True:
+                    response = self.iam.get_group(**request)
+                    users.update(user['UserName'] for user in response['Users'])
+                    if not response.get('IsTruncated'):
+                        break
+                    request['Marker'] = response['Marker']
+            except self.iam.exceptions.NoSuchEntityException:
+                logger.warning(f"⚠️ Group {self.group_name} does not exist")
+        return users
+
+    def reconcile(self, user_id: str, blocked: bool) -> bool:
+        """Hold the block (or not) in the active backend only; returns whether the active backend changed"""
+        changed = self.is_blocked(user_id) != blocked
+        if not blocked:
+            self.unblock(user_id)
+            return changed
+        if changed:
+            self.block(user_id)
+        for mechanism in self.other_mechanisms():
+            self.apply(mechanism, user_id, False)
+        return changed
+
+
+def load_block_states(conn) -> Dict[str, bool]:
+    """is_blocked of every user in user_blocking_status"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT user_id, is_blocked FROM user_blocking_status")
+        return {row['user_id']: row['is_blocked'] == 'Y' for row in cursor.fetchall()}
+
+
+def reconcile_blocks(conn, blocker: IamBlocker, max_workers: int = DEFAULT_MAX_WORKERS,
+                     dry_run: bool = False) -> Dict[str, Any]:
+    """Bring IAM in line with user_blocking_status using the blocker's active backend"""
+    desired = load_block_states(conn)
+    user_ids = sorted(set(desired) | blocker.holders())
+
+    def run(user_id: str) -> Optional[bool]:
+        blocked = desired.get(user_id, False)
+        try:
+            if dry_run:
+                return blocker.is_blocked(user_id) != blocked
+            return blocker.reconcile(user_id, blocked)
+        except Exception as e:
+            logger.error(f"❌ Could not reconcile IAM block of {user_id}: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        outcomes = list(pool.map(run, user_ids))
+
+    stats = {
+        'backend': blocker.backend,
+        'users': len(user_ids),
+        'blocked': sum(desired.values()),
+        'changed': sum(1 for outcome in outcomes if outcome),
+        'failed': sum(1 for outcome in outcomes if outcome is None),
+        'dry_run': dry_run
+    }
+    logger.info(f"🔐 IAM block reconcile ({blocker.backend}): {stats['users']} users, "
+                f"{stats['changed']} changed, {stats['failed']} failed")
+    return stats
@@ -0,0 +1,102 @@
+"""
+DDSketch latency quantile sketches
+
+AVG(response_time_ms) hides tail regressions, and exact percentiles need
+every raw row sorted. A DDSketch keeps one counter per logarithmic bucket, so
+any quantile it returns is within `relative_accuracy` of the true value
+(1% by default). Two sketches merge by adding their counters, with no loss.
+The request writer therefore keeps one sketch per (model, hour)
+(see usage_rollups.merge_latency_sketches), and the query executor merges
+the sketches of any range to answer p50/p95/p99.
+
+Latencies from 1 ms to 10 minutes fit in about 670 buckets at 1% accuracy.
+Values at or below `min_value` (unknown or zero latencies) are counted
+separately as zero.
+
+Serialized form: version byte, relative accuracy (float64), zero count, then
+(bucket index, count) pairs, zlib-compressed.
+"""
+
+import math
+import struct
+import zlib
+from typing import Dict, Iterable, Optional
+
+SERIAL_VERSION = 1
+DEFAULT_RELATIVE_ACCURACY = 0.01
+HEADER = struct.Struct('<BdQ')
+BIN = struct.Struct('<iQ')
+
+
+class DDSketch:
+    """Mergeable quantile sketch with relative-error guarantees"""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, min_value: float = 1e-9):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= self.min_value:
+            self.zero_count += count
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + count
+
+    def update(self, values: Iterable[float]) -> 'DDSketch':
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: 'DDSketch') -> 'DDSketch':
+        """Add another sketch of the same accuracy into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0..1), None for an empty sketch"""
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_bytes(self) -> bytes:
+        payload = HEADER.pack(SERIAL_VERSION, self.relative_accuracy, self.zero_count)
+        payload += b''.join(BIN.pack(key, count) for key, count in sorted(self.bins.items()))
+        return zlib.compress(payload)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'DDSketch':
+        payload = zlib.decompress(data)
+        version, relative_accuracy, zero_count = HEADER.unpack_from(payload)
+        if version != SERIAL_VERSION:
+            raise ValueError("Unsupported DDSketch serialization")
+        sketch = cls(relative_accuracy)
+        sketch.zero_count = zero_count
+        for offset in range(HEADER.size, len(payload), BIN.size):
+            key, count = BIN.unpack_from(payload, offset)
+            sketch.bins[key] = count
+        return sketch
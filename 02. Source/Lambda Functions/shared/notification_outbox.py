@@ -0,0 +1,405 @@
+"""
+Durable notification outbox
+
+Blocking and unblocking used to send their emails inline, so every SMTP
+handshake, timeout and retry sat on the CloudTrail ingest path. Now the
+workflows only insert a row into notification_outbox, in the same transaction
+as the user_blocking_status change. A notification therefore exists exactly
+when the state change committed, and no mail server is contacted while
+ingesting.
+
+A dispatcher (the controller's "dispatch_notifications" action, run on a
+schedule) delivers the rows:
+- claim_batch selects due rows with SELECT ... FOR UPDATE SKIP LOCKED. It
+  marks them SENDING with a lease and commits straight away, so concurrent
+  dispatchers never pick the same row and no lock is held while mailing. A
+  dispatcher that dies mid-batch leaves SENDING rows, which are claimed again
+  once their lease expires.
+- every message of a run goes through one SmtpSession, which logs in once and
+  reconnects only when the server drops the connection.
+- a failed delivery is retried with exponential backoff. After max_attempts
+  the row is FAILED and stays in the table for inspection.
+
+When a row is linked to its blocking_audit_log entry, a successful delivery
+sets that entry's email_sent to 'Y'.
+
+Deliveries handed to the email service Lambda with InvocationType='Event'
+are not known to have succeeded when the dispatcher moves on. For those,
+`deliver` returns DELIVERY_ACCEPTED, and the row stays SENDING under its
+lease with sent_at set to the hand-off time (mark_handed_off). The rate
+limits below count such rows as sends, since the email is most likely on its
+way. The email service then reports the outcome (record_delivery) through
+the controller's "email_delivery_status" action. If no report arrives before
+the lease expires, the row is claimed again, and that claim counts as another
+attempt. A row that has used up max_attempts this way is moved to FAILED by
+claim_batch instead of being handed off once more.
+
+Coalescing bounds the mail a recipient gets during bursts of state changes
+(block, admin unblock, re-block within minutes) and mass operations:
+- hold window: rows are enqueued due `hold_seconds` in the future, so
+  changes that follow each other closely are still pending together.
+- superseding: only a recipient's newest notification is sent. Older ones
+  become SUPERSEDED (superseded_by = the newest id), so block followed by
+  unblock leaves only the unblock.
+- digest: a notification that superseded others is delivered with their
+  history (row['superseded']) as one digest email instead of several.
+- rate limits: at most `recipient_limit` sends per recipient per
+  `recipient_window` seconds, and `global_limit_per_minute` sends overall.
+  Rows over a limit are deferred without using up an attempt. Because later
+  changes supersede them meanwhile, they end up folded into one digest.
+"""
+
+import json
+import logging
+import smtplib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger()
+
+OUTBOX_TABLE = 'notification_outbox'
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_LEASE_SECONDS = 300
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+DELIVERY_ACCEPTED = 'accepted'
+DEFAULT_HOLD_SECONDS = 120
+DEFAULT_RECIPIENT_LIMIT = 3
+DEFAULT_RECIPIENT_WINDOW = 3600
+DEFAULT_GLOBAL_LIMIT_PER_MINUTE = 60
+
+
+def enqueue_notification(connection, user_id: str, notification_type: str, payload: Dict[str, Any],
+                         now: datetime, hold_seconds: int = 0, audit_log_id: Optional[int] = None) -> int:
+    """Insert a PENDING notification, due after the hold window; commits with the caller's transaction"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {OUTBOX_TABLE}
+            (user_id, notification_type, payload, audit_log_id, status, attempts, next_attempt_at, created_at)
+            VALUES (%s, %s, %s, %s, 'PENDING', 0, %s, %s)
+        """, [user_id, notification_type, json.dumps(payload, default=str), audit_log_id,
+              now + timedelta(seconds=hold_seconds), now])
+        return cursor.lastrowid
+
+
+def attach_audit_log(connection, outbox_id: int, audit_log_id: int) -> None:
+    """Link a notification to its audit entry so delivery can set email_sent"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {OUTBOX_TABLE} SET audit_log_id = %s WHERE id = %s", [audit_log_id, outbox_id])
+        # The dispatcher may have delivered before the link existed
+        cursor.execute(f"""
+            UPDATE blocking_audit_log a
+            JOIN {OUTBOX_TABLE} o ON o.id = %s AND o.status = 'SENT'
+            SET a.email_sent = 'Y'
+            WHERE a.id = %s
+        """, [outbox_id, audit_log_id])
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff after the given number of failed attempts"""
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS))
+
+
+def claim_batch(connection, now: datetime, batch_size: int = DEFAULT_BATCH_SIZE,
+                lease_seconds: int = DEFAULT_LEASE_SECONDS,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> List[Dict[str, Any]]:
+    """Lease up to batch_size due notifications to this dispatcher; rows out of attempts become FAILED"""
+    connection.begin()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT id, user_id, notification_type, payload, attempts, audit_log_id, created_at
+                FROM {OUTBOX_TABLE}
+                WHERE status IN ('PENDING', 'SENDING') AND next_attempt_at <= %s
+                ORDER BY next_attempt_at, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, [now, batch_size])
+            rows = list(cursor.fetchall())
+            # Rows out of attempts only get here when a lease expired without a delivery report
+            exhausted = [row['id'] for row in rows if row['attempts'] >= max_attempts]
+            if exhausted:
+                cursor.execute(f"""
+                    UPDATE {OUTBOX_TABLE}
+                    SET status = 'FAILED', last_error = %s
+                    WHERE id IN ({', '.join(['%s'] * len(exhausted))})
+                """, [f"No delivery report after {max_attempts} attempts"] + exhausted)
+                logger.error(f"❌ Giving up on notifications {exhausted}: no delivery report "
+                             f"after {max_attempts} attempts")
+                rows = [row for row in rows if row['id'] not in exhausted]
+            if rows:
+                ids = [row['id'] for row in rows]
+                cursor.execute(f"""
+                    UPDATE {OUTBOX_TABLE}
+                    SET status = 'SENDING', attempts = attempts + 1, next_attempt_at = %s
+                    WHERE id IN ({', '.join(['%s'] * len(ids))})
+                """, [now + timedelta(seconds=lease_seconds)] + ids)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    for row in rows:
+        row['attempts'] += 1
+        if isinstance(row['payload'], (str, bytes)):
+            row['payload'] = json.loads(row['payload'])
+    return rows
+
+
+def placeholders(values: List[Any]) -> str:
+    return ', '.join(['%s'] * len(values))
+
+
+def coalesce_batch(connection, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Supersede all but each recipient's newest notification; returns the rows to deliver"""
+    if not rows:
+        return rows
+    users = sorted({row['user_id'] for row in rows})
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT user_id, MAX(id) AS latest_id
+            FROM {OUTBOX_TABLE}
+            WHERE user_id IN ({placeholders(users)}) AND status IN ('PENDING', 'SENDING')
+            GROUP BY user_id
+        """, users)
+        latest = {row['user_id']: row['latest_id'] for row in cursor.fetchall()}
+
+        kept = []
+        superseded_into: Dict[int, List[int]] = {}
+        for row in rows:
+            newest = latest.get(row['user_id'], row['id'])
+            if row['id'] >= newest:
+                kept.append(row)
+            else:
+                superseded_into.setdefault(newest, []).append(row['id'])
+        for newest, ids in superseded_into.items():
+            # Rows these superseded earlier move along, so the newest one carries the whole history
+            cursor.execute(f"""
+                UPDATE {OUTBOX_TABLE} SET status = 'SUPERSEDED', superseded_by = %s
+                WHERE id IN ({placeholders(ids)}) OR superseded_by IN ({placeholders(ids)})
+            """, [newest] + ids + ids)
+            logger.info(f"🧹 Notifications {ids} superseded by {newest}")
+
+        if kept:
+            kept_ids = [row['id'] for row in kept]
+            cursor.execute(f"""
+                SELECT superseded_by, notification_type, payload, created_at
+                FROM {OUTBOX_TABLE}
+                WHERE superseded_by IN ({placeholders(kept_ids)})
+                ORDER BY id
+            """, kept_ids)
+            history: Dict[int, List[Dict[str, Any]]] = {}
+            for entry in cursor.fetchall():
+                payload = entry['payload']
+                history.setdefault(entry['superseded_by'], []).append({
+                    'notification_type': entry['notification_type'],
+                    'payload': json.loads(payload) if isinstance(payload, (str, bytes)) else payload,
+                    'created_at': entry['created_at']
+                })
+            for row in kept:
+                row['superseded'] = history.get(row['id'], [])
+    return kept
+
+
+def defer(connection, row: Dict[str, Any], until: datetime) -> None:
+    """Release a claimed row until a later time without using up an attempt"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {OUTBOX_TABLE} SET status = 'PENDING', attempts = attempts - 1, next_attempt_at = %s
+            WHERE id = %s
+        """, [until, row['id']])
+
+
+def recipient_sends(connection, users: List[str], since: datetime) -> Dict[str, Dict[str, Any]]:
+    """Sends per recipient since a time, with the oldest one; accepted hand-offs count as sends"""
+    if not users:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT user_id, COUNT(*) AS sent, MIN(sent_at) AS first_sent_at
+            FROM {OUTBOX_TABLE}
+            WHERE user_id IN ({placeholders(users)}) AND status IN ('SENT', 'SENDING') AND sent_at >= %s
+            GROUP BY user_id
+        """, users + [since])
+        return {row['user_id']: row for row in cursor.fetchall()}
+
+
+def sends_since(connection, since: datetime) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT COUNT(*) AS sent FROM {OUTBOX_TABLE}
+            WHERE status IN ('SENT', 'SENDING') AND sent_at >= %s
+        """, [since])
+        row = cursor.fetchone()
+    return int(row['sent']) if row else 0
+
+
+def mark_handed_off(connection, row: Dict[str, Any], now: datetime) -> None:
+    """Stamp the hand-off of a SENDING row, unless its delivery report already arrived"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {OUTBOX_TABLE} SET sent_at = %s WHERE id = %s AND status = 'SENDING'
+        """, [now, row['id']])
+
+
+def mark_sent(connection, row: Dict[str, Any], now: datetime) -> None:
+    connection.begin()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {OUTBOX_TABLE} SET status = 'SENT', sent_at = %s, last_error = NULL WHERE id = %s
+            """, [now, row['id']])
+            if row.get('audit_log_id'):
+                cursor.execute("UPDATE blocking_audit_log SET email_sent = 'Y' WHERE id = %s", [row['audit_log_id']])
+            if row.get('superseded'):
+                # The digest also told the recipient about the changes it replaced
+                cursor.execute(f"""
+                    UPDATE blocking_audit_log a
+                    JOIN {OUTBOX_TABLE} o ON o.audit_log_id = a.id
+                    SET a.email_sent = 'Y'
+                    WHERE o.superseded_by = %s
+                """, [row['id']])
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def mark_failed(connection, row: Dict[str, Any], error: str, now: datetime,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> str:
+    """Schedule a retry, or give up after max_attempts; returns the new status"""
+    status = 'FAILED' if row['attempts'] >= max_attempts else 'PENDING'
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {OUTBOX_TABLE} SET status = %s, next_attempt_at = %s, last_error = %s WHERE id = %s
+        """, [status, now + retry_delay(row['attempts']), error[:1000], row['id']])
+    return status
+
+
+def record_delivery(connection, outbox_id: int, success: bool, error: Optional[str], now: datetime,
+                    max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Optional[str]:
+    """Apply an asynchronously reported delivery outcome; returns the new status"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT id, user_id, notification_type, status, attempts, audit_log_id
+            FROM {OUTBOX_TABLE} WHERE id = %s
+        """, [outbox_id])
+        row = cursor.fetchone()
+    if row is None or row['status'] in ('SENT', 'FAILED', 'SUPERSEDED'):
+        # Unknown row or a duplicate report
+        return None
+    if success:
+        mark_sent(connection, row, now)
+        return 'SENT'
+    return mark_failed(connection, row, error or 'email service reported a failure', now, max_attempts)
+
+
+class SmtpSession:
+    """One SMTP login reused for every message of a dispatch run"""
+
+    def __init__(self, config: Dict[str, Any], smtp_factory: Optional[Callable[..., Any]] = None):
+        self.config = config
+        self.smtp_factory = smtp_factory
+        self.server = None
+        self.connections = 0
+
+    def connect(self) -> None:
+        factory = self.smtp_factory or smtplib.SMTP
+        self.server = factory(self.config['server'], self.config['port'], timeout=10)
+        if self.config.get('use_tls'):
+            self.server.starttls()
+        self.server.login(self.config['user'], self.config['password'])
+        self.connections += 1
+
+    def send(self, message) -> None:
+        """Send over the open session, reconnecting once if the server dropped it"""
+        if self.server is None:
+            self.connect()
+        try:
+            self.server.send_message(message)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, OSError) as e:
+            logger.warning(f"⚠️ SMTP session lost ({e}), reconnecting")
+            self.close()
+            self.connect()
+            self.server.send_message(message)
+
+    def close(self) -> None:
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+    def __enter__(self) -> 'SmtpSession':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def dispatch_notifications(connection, deliver: Callable[[Dict[str, Any]], Union[bool, str]],
+                           now: Callable[[], datetime], batch_size: int = DEFAULT_BATCH_SIZE, max_batches: int = 20,
+                           max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                           lease_seconds: int = DEFAULT_LEASE_SECONDS,
+                           recipient_limit: int = DEFAULT_RECIPIENT_LIMIT,
+                           recipient_window: int = DEFAULT_RECIPIENT_WINDOW,
+                           global_limit_per_minute: int = DEFAULT_GLOBAL_LIMIT_PER_MINUTE,
+                           should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, int]:
+    """Claim, coalesce and deliver due notifications until the outbox is drained or max_batches is reached"""
+    stats = {'claimed': 0, 'sent': 0, 'accepted': 0, 'superseded': 0, 'deferred': 0, 'retried': 0,
+             'failed': 0, 'batches': 0}
+    budget = global_limit_per_minute - sends_since(connection, now() - timedelta(minutes=1))
+    for _ in range(max_batches):
+        if budget <= 0 or (should_stop is not None and should_stop()):
+            break
+        claimed = claim_batch(connection, now(), batch_size, lease_seconds, max_attempts)
+        if not claimed:
+            break
+        stats['batches'] += 1
+        stats['claimed'] += len(claimed)
+        rows = coalesce_batch(connection, claimed)
+        stats['superseded'] += len(claimed) - len(rows)
+
+        recent = recipient_sends(connection, sorted({row['user_id'] for row in rows}),
+                                 now() - timedelta(seconds=recipient_window))
+        for row in rows:
+            sent = recent.get(row['user_id'])
+            if sent and sent['sent'] >= recipient_limit:
+                defer(connection, row, sent['first_sent_at'] + timedelta(seconds=recipient_window))
+                stats['deferred'] += 1
+                logger.info(f"⏳ Rate limit for {row['user_id']}: notification {row['id']} deferred")
+                continue
+            if budget <= 0:
+                defer(connection, row, now() + timedelta(minutes=1))
+                stats['deferred'] += 1
+                continue
+            try:
+                delivered = deliver(row)
+                error = 'delivery returned False'
+            except Exception as e:
+                delivered = False
+                error = str(e)
+            if delivered:
+                budget -= 1
+                recent.setdefault(row['user_id'], {'sent': 0, 'first_sent_at': now()})['sent'] += 1
+            if delivered == DELIVERY_ACCEPTED:
+                # Outcome arrives later through record_delivery; the lease covers a lost report
+                mark_handed_off(connection, row, now())
+                stats['accepted'] += 1
+                logger.info(f"📨 Handed {row['notification_type']} notification {row['id']} to the email service")
+            elif delivered:
+                mark_sent(connection, row, now())
+                stats['sent'] += 1
+                logger.info(f"✅ Delivered {row['notification_type']} notification {row['id']} for {row['user_id']}")
+            elif mark_failed(connection, row, error, now(), max_attempts) == 'FAILED':
+                stats['failed'] += 1
+                logger.error(f"❌ Giving up on notification {row['id']} for {row['user_id']} "
+                             f"after {row['attempts']} attempts: {error}")
+            else:
+                stats['retried'] += 1
+                logger.warning(f"⚠️ Notification {row['id']} for {row['user_id']} failed "
+                               f"(attempt {row['attempts']}), retrying later: {error}")
+        if len(claimed) < batch_size:
+            break
+    return stats
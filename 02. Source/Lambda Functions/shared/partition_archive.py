@@ -0,0 +1,381 @@
+"""
+Cold-storage archive of closed bedrock_requests months
+
+A closed month, meaning one strictly before the current month, is exported to
+gzip-compressed NDJSON parts in S3 (or a local directory standing in for S3).
+Its rows are then removed from InnoDB. The month is read from either of these
+sources:
+- the detached <table>_archive_YYYY_MM table left by partition_manager's
+  'detach' retention action, or
+- the p_YYYY_MM partition of the live table.
+
+Parquet would need pyarrow in every Lambda package, so the archive stays on
+the standard library: one JSON object per row, one file per `rows_per_part`
+rows.
+
+Nothing is dropped unless the archive verifies:
+- the parts' row count and SUM(id) match the source, and
+- every part read back from the store matches the SHA-256 recorded when it
+  was written.
+
+The manifest is stored last, so a month only counts as archived once its
+manifest exists. Layout:
+
+    <prefix>/<table>/YYYY/MM/part-00001.ndjson.gz
+    <prefix>/<table>/YYYY/MM/manifest.json
+
+iter_archived_rows() and aggregate_archived() read archived months back for
+historical reports.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pymysql
+
+from partition_manager import (add_months, archive_table_name, existing_tables, expired_partitions,
+                               list_partitions, partition_name)
+
+logger = logging.getLogger()
+
+ARCHIVE_FORMAT = 'ndjson.gz'
+AGGREGATE_COLUMNS = ('user_id', 'team', 'model_id', 'model_name', 'date_only', 'hour_only',
+                     'request_type', 'region', 'status_code')
+
+
+class ArchiveVerificationError(Exception):
+    """The archived copy of a month does not match its source"""
+
+
+class LocalArchiveStore:
+    """Keep archive files in a local directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, *key.split('/'))
+
+    def put(self, local_path: str, key: str) -> str:
+        destination = self.path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.move(local_path, destination)
+        return destination
+
+    def read(self, key: str) -> bytes:
+        with open(self.path(key), 'rb') as archive_file:
+            return archive_file.read()
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+
+class S3ArchiveStore:
+    """Keep archive files in S3"""
+
+    def __init__(self, bucket: str, prefix: str = '', s3_client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        if s3_client is None:
+            import boto3
+            s3_client = boto3.client('s3')
+        self.s3_client = s3_client
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, local_path: str, key: str) -> str:
+        self.s3_client.upload_file(local_path, self.bucket, self.object_key(key))
+        os.remove(local_path)
+        return f"s3://{self.bucket}/{self.object_key(key)}"
+
+    def read(self, key: str) -> bytes:
+        return self.s3_client.get_object(Bucket=self.bucket, Key=self.object_key(key))['Body'].read()
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+
+def month_key(table: str, month: date) -> str:
+    return f"{table}/{month.year:04d}/{month.month:02d}"
+
+
+def manifest_key(table: str, month: date) -> str:
+    return f"{month_key(table, month)}/manifest.json"
+
+
+def to_archive_value(value: Any) -> Any:
+    """JSON value for a column; decimals are kept exact as strings"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def find_source(connection, table: str, month: date) -> Optional[Dict[str, str]]:
+    """Where the rows of a month live: the detached archive table, else the monthly partition"""
+    archive_table = archive_table_name(table, month)
+    if archive_table in existing_tables(connection, archive_table):
+        return {'kind': 'table', 'name': archive_table, 'from': archive_table,
+                'drop': f"DROP TABLE {archive_table}"}
+
+    name = partition_name(month)
+    if any(partition['name'] == name for partition in list_partitions(connection, table)):
+        return {'kind': 'partition', 'name': name, 'from': f"{table} PARTITION ({name})",
+                'drop': f"ALTER TABLE {table} DROP PARTITION {name}"}
+    return None
+
+
+def source_fingerprint(connection, source: Dict[str, str]) -> Dict[str, int]:
+    """Row count and SUM(id) of the source, compared with the archived copy"""
+    with connection.cursor(pymysql.cursors.Cursor) as cursor:
+        cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(id), 0) FROM {source['from']}")
+        rows, id_sum = cursor.fetchone()
+    return {'rows': int(rows), 'id_sum': int(id_sum)}
+
+
+def write_parts(connection, source: Dict[str, str], store, key_prefix: str, rows_per_part: int,
+                fetch_size: int, work_dir: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Stream the source into gzip NDJSON parts; returns the columns and part summaries"""
+    parts: List[Dict[str, Any]] = []
+    state: Dict[str, Any] = {'file': None}
+
+    def open_part():
+        handle, path = tempfile.mkstemp(dir=work_dir)
+        os.close(handle)
+        state.update(path=path, file=gzip.open(path, 'wt', encoding='utf-8'), rows=0, id_sum=0)
+
+    def close_part():
+        state['file'].close()
+        state['file'] = None
+        digest = hashlib.sha256()
+        with open(state['path'], 'rb') as part:
+            for block in iter(lambda: part.read(1024 * 1024), b''):
+                digest.update(block)
+        key = f"{key_prefix}/part-{len(parts) + 1:05d}.{ARCHIVE_FORMAT}"
+        size = os.path.getsize(state['path'])
+        location = store.put(state['path'], key)
+        parts.append({'key': key, 'location': location, 'rows': state['rows'], 'id_sum': state['id_sum'],
+                      'bytes': size, 'sha256': digest.hexdigest()})
+
+    try:
+        with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(f"SELECT * FROM {source['from']}")
+            columns = [column[0] for column in cursor.description]
+            id_index = columns.index('id')
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if state['file'] is None:
+                        open_part()
+                    state['file'].write(json.dumps(dict(zip(columns, map(to_archive_value, row))),
+                                                   separators=(',', ':')))
+                    state['file'].write('\n')
+                    state['rows'] += 1
+                    state['id_sum'] += int(row[id_index])
+                    if state['rows'] >= rows_per_part:
+                        close_part()
+        if state['file'] is not None:
+            close_part()
+    finally:
+        if state['file'] is not None:
+            state['file'].close()
+            if os.path.exists(state['path']):
+                os.remove(state['path'])
+
+    return columns, parts
+
+
+def read_part(store, part: Dict[str, Any]) -> bytes:
+    """Read one part back from the store, checking its SHA-256"""
+    data = store.read(part['key'])
+    if hashlib.sha256(data).hexdigest() != part['sha256']:
+        raise ArchiveVerificationError(f"Checksum mismatch for {part['key']}")
+    return data
+
+
+def verify_archive(store, manifest: Dict[str, Any]) -> None:
+    """Re-read every part and check checksums, row counts and id sums against the manifest"""
+    rows = id_sum = 0
+    for part in manifest['parts']:
+        part_rows = part_id_sum = 0
+        for line in gzip.decompress(read_part(store, part)).splitlines():
+            part_rows += 1
+            part_id_sum += int(json.loads(line)['id'])
+        if part_rows != part['rows'] or part_id_sum != part['id_sum']:
+            raise ArchiveVerificationError(f"Part {part['key']} holds {part_rows} rows, expected {part['rows']}")
+        rows += part_rows
+        id_sum += part_id_sum
+
+    source = manifest['source']
+    if rows != source['rows'] or id_sum != source['id_sum']:
+        raise ArchiveVerificationError(
+            f"Archive of {manifest['table']} {manifest['month']} holds {rows} rows (id sum {id_sum}), "
+            f"source has {source['rows']} (id sum {source['id_sum']})")
+
+
+def read_manifest(store, table: str, month: date) -> Optional[Dict[str, Any]]:
+    """Manifest of an archived month, or None when the month is not archived"""
+    key = manifest_key(table, month)
+    if not store.exists(key):
+        return None
+    return json.loads(store.read(key).decode('utf-8'))
+
+
+def archive_month(connection, store, month: date, table: str = 'bedrock_requests',
+                  today: Optional[date] = None, drop: bool = True, dry_run: bool = False,
+                  rows_per_part: int = 500000, fetch_size: int = 5000,
+                  work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Archive one closed month and, once the archive verifies, drop its rows from MySQL
+
+    A month whose manifest already exists is not exported again; only its
+    remaining source (if any) is dropped after re-verifying the stored copy.
+    """
+    month = month.replace(day=1)
+    today = today or date.today()
+    if month >= today.replace(day=1):
+        raise ValueError(f"{month.strftime('%Y-%m')} is not closed yet")
+
+    result = {'table': table, 'month': month.strftime('%Y-%m'), 'source': None, 'rows': 0,
+              'parts': 0, 'manifest': None, 'dropped': False, 'dry_run': dry_run}
+    source = find_source(connection, table, month)
+    manifest = read_manifest(store, table, month)
+    result['source'] = source['name'] if source else None
+
+    if source is None and manifest is None:
+        raise ValueError(f"No partition, archive table or archive found for {table} {result['month']}")
+    if dry_run:
+        result['rows'] = source_fingerprint(connection, source)['rows'] if source else manifest['source']['rows']
+        logger.info(f"📝 [DRY RUN] Would archive {result['rows']} rows of {table} {result['month']}"
+                    + (f" and run: {source['drop']}" if source and drop else ''))
+        return result
+
+    if manifest is None:
+        fingerprint = source_fingerprint(connection, source)
+        columns, parts = write_parts(connection, source, store, month_key(table, month), rows_per_part,
+                                     fetch_size, work_dir or tempfile.gettempdir())
+        manifest = {
+            'table': table,
+            'month': result['month'],
+            'format': ARCHIVE_FORMAT,
+            'columns': columns,
+            'source': dict(fingerprint, name=source['name'], kind=source['kind']),
+            'rows': sum(part['rows'] for part in parts),
+            'parts': parts,
+            'archived_at': datetime.now(timezone.utc).isoformat()
+        }
+        verify_archive(store, manifest)
+
+        handle, manifest_path = tempfile.mkstemp(dir=work_dir or tempfile.gettempdir())
+        with os.fdopen(handle, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        store.put(manifest_path, manifest_key(table, month))
+        logger.info(f"📦 Archived {manifest['rows']} rows of {table} {result['month']} in {len(parts)} parts")
+    else:
+        verify_archive(store, manifest)
+        if source and source_fingerprint(connection, source) != {'rows': manifest['source']['rows'],
+                                                                 'id_sum': manifest['source']['id_sum']}:
+            raise ArchiveVerificationError(f"{source['name']} changed since {result['month']} was archived")
+
+    result.update(rows=manifest['rows'], parts=len(manifest['parts']), manifest=manifest_key(table, month))
+    if source and drop:
+        logger.info(f"🗑️ Executing: {source['drop']}")
+        with connection.cursor() as cursor:
+            cursor.execute(source['drop'])
+        result['dropped'] = True
+    return result
+
+
+def months_to_archive(connection, table: str, today: date, archive_after_months: int) -> List[date]:
+    """Months older than `archive_after_months` that still have a partition or detached table"""
+    if archive_after_months < 1:
+        raise ValueError("archive_after_months must be at least 1")
+    cutoff = add_months(today, -archive_after_months)
+
+    months = {month for _, month in expired_partitions(list_partitions(connection, table), today,
+                                                       archive_after_months)}
+
+    prefix = f"{table}_archive_"
+    for name in existing_tables(connection, prefix):
+        suffix = name[len(prefix):]
+        try:
+            month = datetime.strptime(suffix, '%Y_%m').date()
+        except ValueError:
+            continue
+        if month < cutoff:
+            months.add(month)
+    return sorted(months)
+
+
+def run_archiving(connection, store, today: Optional[date] = None, table: str = 'bedrock_requests',
+                  archive_after_months: int = 13, dry_run: bool = True, **options) -> Dict[str, Any]:
+    """Archive every month past `archive_after_months`; stops at the first failure"""
+    today = today or date.today()
+    results = []
+    for month in months_to_archive(connection, table, today, archive_after_months):
+        results.append(archive_month(connection, store, month, table, today, dry_run=dry_run, **options))
+    return {'table': table, 'dry_run': dry_run, 'months': results}
+
+
+def iter_archived_rows(store, table: str, month: date) -> Iterator[Dict[str, Any]]:
+    """Yield the rows of an archived month, one verified part at a time"""
+    manifest = read_manifest(store, table, month.replace(day=1))
+    if manifest is None:
+        raise ValueError(f"{table} {month.strftime('%Y-%m')} is not archived")
+    for part in manifest['parts']:
+        for line in gzip.decompress(read_part(store, part)).splitlines():
+            yield json.loads(line)
+
+
+def aggregate_archived(store, table: str, months: List[date], group_by: List[str],
+                       filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Requests, tokens and cost of archived months grouped by the given columns
+
+    Returns columns plus row arrays, like the executor's named reports.
+    """
+    invalid = [column for column in list(group_by) + list(filters or {}) if column not in AGGREGATE_COLUMNS]
+    if invalid:
+        raise ValueError(f"Unsupported archive columns: {', '.join(invalid)}. Use {', '.join(AGGREGATE_COLUMNS)}")
+    filters = {column: str(value) for column, value in (filters or {}).items()}
+
+    groups: Dict[Tuple[Any, ...], List[Any]] = OrderedDict()
+    for month in months:
+        for row in iter_archived_rows(store, table, month):
+            if any(str(row.get(column)) != value for column, value in filters.items()):
+                continue
+            key = tuple(row.get(column) for column in group_by)
+            totals = groups.setdefault(key, [0, 0, 0, Decimal('0')])
+            totals[0] += 1
+            totals[1] += int(row.get('input_tokens') or 0)
+            totals[2] += int(row.get('output_tokens') or 0)
+            totals[3] += Decimal(str(row.get('cost_usd') or '0'))
+
+    return {
+        'columns': list(group_by) + ['request_count', 'input_tokens', 'output_tokens', 'cost_usd'],
+        'rows': [list(key) + totals[:3] + [float(totals[3])] for key, totals in groups.items()]
+    }
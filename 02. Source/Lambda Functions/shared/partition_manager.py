@@ -0,0 +1,244 @@
+"""
+Monthly partition maintenance for bedrock_requests
+
+bedrock_requests is partitioned by RANGE (TO_DAYS(date_only)) with one
+partition per month (p_YYYY_MM) and a catch-all p_future. Unless new months
+are split out of p_future ahead of time, every new request lands in
+p_future and monthly/daily queries stop pruning.
+
+Each run:
+- reorganizes p_future into monthly partitions up to `months_ahead` months
+  after the current one, as long as p_future is empty,
+- handles partitions older than `retention_months`: 'detach' exchanges the
+  partition into a standalone <table>_archive_YYYY_MM table and drops the
+  now empty partition, so the rows can be archived (or dropped) later
+  without touching the live table; 'drop' drops the partition outright.
+
+REORGANIZE PARTITION copies every row of p_future and blocks inserts while it
+runs, so it is only instant while p_future holds no rows. When maintenance was
+missed and requests already landed in p_future, a run refuses to split it
+(PopulatedFutureError) unless `allow_populated_future` is set. That catch-up
+belongs in a maintenance window, after which the scheduled runs only split
+empty future months again.
+
+plan_maintenance() only builds the DDL, so dry runs print exactly what a real
+run would execute.
+"""
+
+import logging
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger()
+
+PARTITION_NAME = re.compile(r'^p_(\d{4})_(\d{2})$')
+FUTURE_PARTITION = 'p_future'
+RETENTION_ACTIONS = ('detach', 'drop')
+
+# MySQL TO_DAYS() counts from year 0, Python ordinals from year 1
+TO_DAYS_OFFSET = 365
+
+
+class PopulatedFutureError(Exception):
+    """p_future holds rows, so splitting it would copy them while blocking inserts"""
+
+
+def to_days(day: date) -> int:
+    """Python equivalent of MySQL TO_DAYS()"""
+    return day.toordinal() + TO_DAYS_OFFSET
+
+
+def from_days(days: int) -> date:
+    """Inverse of to_days()"""
+    return date.fromordinal(days - TO_DAYS_OFFSET)
+
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month `months` after the month of `day`"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"p_{month.year:04d}_{month.month:02d}"
+
+
+def archive_table_name(table: str, month: date) -> str:
+    return f"{table}_archive_{month.year:04d}_{month.month:02d}"
+
+
+def list_partitions(connection, table: str = 'bedrock_requests') -> List[Dict[str, Any]]:
+    """Read the partitions of a table in order, with their upper bound as a date (None for MAXVALUE)"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS description, TABLE_ROWS AS table_rows
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """, [table])
+        rows = cursor.fetchall()
+
+    partitions = []
+    for row in rows:
+        description = str(row['description'])
+        partitions.append({
+            'name': row['name'],
+            'less_than': None if description.upper() == 'MAXVALUE' else from_days(int(description)),
+            'rows': row['table_rows']
+        })
+    return partitions
+
+
+def existing_tables(connection, prefix: str) -> Set[str]:
+    """Names of the tables starting with a prefix in the current schema"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT TABLE_NAME AS name FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE %s
+        """, [prefix.replace('_', '\\_') + '%'])
+        return {row['name'] for row in cursor.fetchall()}
+
+
+def future_lower_bound(partitions: List[Dict[str, Any]]) -> Optional[date]:
+    """First day stored in p_future (None when it is the only partition)"""
+    bounded = [partition['less_than'] for partition in partitions if partition['less_than']]
+    return max(bounded) if bounded else None
+
+
+def first_future_day(connection, partitions: List[Dict[str, Any]],
+                     table: str = 'bedrock_requests') -> Optional[date]:
+    """Earliest date_only stored in p_future, or None while it is empty"""
+    lower_bound = future_lower_bound(partitions)
+    with connection.cursor() as cursor:
+        if lower_bound:
+            cursor.execute(f"SELECT MIN(date_only) AS first_day FROM {table} WHERE date_only >= %s", [lower_bound])
+        else:
+            cursor.execute(f"SELECT MIN(date_only) AS first_day FROM {table}")
+        row = cursor.fetchone()
+    return row['first_day'] if row else None
+
+
+def months_to_add(partitions: List[Dict[str, Any]], today: date, months_ahead: int) -> List[date]:
+    """Months (first days) that must be split out of p_future"""
+    if not partitions or partitions[-1]['name'] != FUTURE_PARTITION:
+        raise ValueError(f"Expected {FUTURE_PARTITION} as the last partition")
+
+    next_month = future_lower_bound(partitions) or today.replace(day=1)
+    last_month = add_months(today, months_ahead)
+
+    months = []
+    while next_month <= last_month:
+        months.append(next_month)
+        next_month = add_months(next_month, 1)
+    return months
+
+
+def expired_partitions(partitions: List[Dict[str, Any]], today: date,
+                       retention_months: Optional[int]) -> List[Tuple[str, date]]:
+    """Monthly partitions whose data is entirely older than the retention window"""
+    if retention_months is None:
+        return []
+    if retention_months < 1:
+        raise ValueError("retention_months must be at least 1")
+
+    cutoff = add_months(today, -retention_months)
+    expired = []
+    for partition in partitions:
+        match = PARTITION_NAME.match(partition['name'])
+        if match and partition['less_than'] and partition['less_than'] <= cutoff:
+            expired.append((partition['name'], date(int(match.group(1)), int(match.group(2)), 1)))
+    return expired
+
+
+def reorganize_future_ddl(table: str, months: List[date]) -> Optional[str]:
+    if not months:
+        return None
+    definitions = [
+        f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{add_months(month, 1).isoformat()}'))"
+        for month in months
+    ]
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+    return (f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO (\n    "
+            + ",\n    ".join(definitions) + "\n)")
+
+
+def retention_ddl(table: str, name: str, month: date, action: str, tables: Set[str]) -> List[str]:
+    if action == 'drop':
+        return [f"ALTER TABLE {table} DROP PARTITION {name}"]
+
+    archive_table = archive_table_name(table, month)
+    statements = []
+    if archive_table not in tables:
+        statements += [f"CREATE TABLE {archive_table} LIKE {table}",
+                       f"ALTER TABLE {archive_table} REMOVE PARTITIONING"]
+    statements += [f"ALTER TABLE {table} EXCHANGE PARTITION {name} WITH TABLE {archive_table}",
+                   f"ALTER TABLE {table} DROP PARTITION {name}"]
+    return statements
+
+
+def plan_maintenance(partitions: List[Dict[str, Any]], today: date, table: str = 'bedrock_requests',
+                     months_ahead: int = 3, retention_months: Optional[int] = None,
+                     retention_action: str = 'detach', tables: Optional[Set[str]] = None,
+                     future_rows_from: Optional[date] = None, allow_populated_future: bool = False) -> Dict[str, Any]:
+    """
+    Build the DDL for one maintenance run without touching the database
+
+    `future_rows_from` is the earliest day stored in p_future (first_future_day);
+    splitting a populated p_future raises PopulatedFutureError unless
+    `allow_populated_future` is set.
+    """
+    if retention_action not in RETENTION_ACTIONS:
+        raise ValueError(f"Unsupported retention action: {retention_action}. Use one of {', '.join(RETENTION_ACTIONS)}")
+    if months_ahead < 0:
+        raise ValueError("months_ahead must not be negative")
+
+    months = months_to_add(partitions, today, months_ahead)
+    if months and future_rows_from and not allow_populated_future:
+        raise PopulatedFutureError(
+            f"{FUTURE_PARTITION} of {table} holds rows from {future_rows_from.isoformat()} on; splitting it copies "
+            f"them and blocks inserts. Run it once in a maintenance window with allow_populated_future")
+    expired = expired_partitions(partitions, today, retention_months)
+
+    statements = []
+    reorganize = reorganize_future_ddl(table, months)
+    if reorganize:
+        statements.append(reorganize)
+    for name, month in expired:
+        statements += retention_ddl(table, name, month, retention_action, tables or set())
+
+    return {
+        'table': table,
+        'added_partitions': [partition_name(month) for month in months],
+        'expired_partitions': [name for name, _ in expired],
+        'archive_tables': [archive_table_name(table, month) for _, month in expired] if retention_action == 'detach' else [],
+        'future_rows_from': future_rows_from.isoformat() if future_rows_from else None,
+        'statements': statements
+    }
+
+
+def run_partition_maintenance(connection, today: Optional[date] = None, table: str = 'bedrock_requests',
+                              months_ahead: int = 3, retention_months: Optional[int] = None,
+                              retention_action: str = 'detach', dry_run: bool = True,
+                              allow_populated_future: bool = False) -> Dict[str, Any]:
+    """Plan and (unless dry_run) execute partition maintenance; returns the plan with execution details"""
+    today = today or date.today()
+    partitions = list_partitions(connection, table)
+    tables = existing_tables(connection, f"{table}_archive_") if retention_months else set()
+    plan = plan_maintenance(partitions, today, table, months_ahead, retention_months, retention_action, tables,
+                            first_future_day(connection, partitions, table), allow_populated_future)
+    plan['dry_run'] = dry_run
+    plan['executed'] = 0
+
+    for statement in plan['statements']:
+        if dry_run:
+            logger.info(f"📝 [DRY RUN] {statement}")
+            continue
+        logger.info(f"🔧 Executing: {statement}")
+        with connection.cursor() as cursor:
+            cursor.execute(statement)
+        plan['executed'] += 1
+
+    logger.info(f"✅ Partition maintenance for {table}: {len(plan['added_partitions'])} added, "
+                f"{len(plan['expired_partitions'])} expired, {plan['executed']} statements executed")
+    return plan
@@ -0,0 +1,264 @@
+"""
+Chunked, lock-friendly retention purge
+
+One large `DELETE ... WHERE created_at < ...` holds row locks on everything it
+touches until it commits, and the realtime controller's inserts queue behind
+it. This purger removes expired rows in small primary-key-ordered chunks
+instead. Each chunk:
+- selects at most `chunk_size` expired ids after the last purged id,
+- deletes exactly that id range in its own short transaction with a low
+  innodb_lock_wait_timeout, so it gives way to the writers,
+- sleeps before the next chunk.
+
+Before every chunk the server is checked: replica lag (when a replica router
+is configured) and InnoDB row lock waits. While either is over its limit the
+purger backs off exponentially, and it stops after `max_backoffs` consecutive
+unhealthy checks (or a lock wait timeout), reporting why. A later run continues
+where it stopped since the purge is idempotent.
+
+For partitioned tables (bedrock_requests), retention works on whole monthly
+partitions: a partition that ends on or before the cutoff is dropped, which is
+instant and lock-free for the remaining partitions, but only once its month has
+a cold-storage archive (partition_archive) whose manifest verifies and whose
+row count and id sum still match the partition. Unarchived or changed months
+are kept and reported in `kept_partitions`; the archive task picks them up.
+Rows are never deleted from these tables in chunks, as that would remove them
+from a month before it is archived; the cutoff month goes once it ends.
+
+Progress is reported after every chunk through the `progress` callback
+(table, rows deleted, chunk time, backoffs) so the Lambda can publish metrics.
+"""
+
+import logging
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import pymysql
+
+from db_router import measure_replica_lag
+from partition_archive import ArchiveVerificationError, read_manifest, source_fingerprint, verify_archive
+from partition_manager import PARTITION_NAME, list_partitions, partition_name
+
+logger = logging.getLogger()
+
+# Table -> time column compared with the cutoff and whether it is partitioned by month
+RETENTION_TABLES: Dict[str, Dict[str, Any]] = {
+    'blocking_audit_log': {'time_column': 'created_at', 'partitioned': False},
+    'blocking_operations': {'time_column': 'created_at', 'partitioned': False},
+    'bedrock_requests': {'time_column': 'date_only', 'partitioned': True}
+}
+
+LOCK_WAIT_TIMEOUT_ERROR = 1205
+
+
+def retention_cutoff(today: date, retention_days: int) -> date:
+    """First day that is kept"""
+    if retention_days < 1:
+        raise ValueError("retention_days must be at least 1")
+    return today - timedelta(days=retention_days)
+
+
+def current_lock_waits(connection) -> int:
+    """Number of transactions currently waiting for an InnoDB row lock"""
+    with connection.cursor(pymysql.cursors.Cursor) as cursor:
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Innodb_row_lock_current_waits'")
+        row = cursor.fetchone()
+    return int(row[1]) if row else 0
+
+
+class RetentionPurger:
+    """Purge rows older than a cutoff from one table in small chunks"""
+
+    def __init__(self, connection, table: str, cutoff: date, chunk_size: int = 1000,
+                 sleep_seconds: float = 0.2, max_backoff_seconds: float = 30.0, max_backoffs: int = 5,
+                 max_replica_lag: float = 5.0, max_lock_waits: int = 2, lock_wait_timeout: int = 2,
+                 replica_connect: Optional[Callable[[], Any]] = None,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 max_chunks: Optional[int] = None, dry_run: bool = False, archive_store=None,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        if table not in RETENTION_TABLES:
+            raise ValueError(f"Unsupported table: {table}. Use one of {', '.join(RETENTION_TABLES)}")
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.connection = connection
+        self.table = table
+        self.time_column = RETENTION_TABLES[table]['time_column']
+        self.partitioned = RETENTION_TABLES[table]['partitioned']
+        self.cutoff = cutoff
+        self.chunk_size = chunk_size
+        self.sleep_seconds = sleep_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_backoffs = max_backoffs
+        self.max_replica_lag = max_replica_lag
+        self.max_lock_waits = max_lock_waits
+        self.lock_wait_timeout = lock_wait_timeout
+        self.replica_connect = replica_connect
+        self.progress = progress
+        self.max_chunks = max_chunks
+        self.dry_run = dry_run
+        self.archive_store = archive_store
+        self.sleep = sleep
+        self.clock = clock
+        self.stats = {'table': table, 'cutoff': cutoff.isoformat(), 'dropped_partitions': [], 'kept_partitions': [],
+                      'rows_deleted': 0,
+                      'chunks': 0, 'backoffs': 0, 'last_id': 0, 'stopped': None, 'dry_run': dry_run}
+
+    def archive_problem(self, month: date) -> Optional[str]:
+        """Why the partition of a month may not be dropped yet, or None once its archive verifies"""
+        if self.archive_store is None:
+            return "no archive store configured"
+        manifest = read_manifest(self.archive_store, self.table, month)
+        if manifest is None:
+            return "month not archived"
+        try:
+            verify_archive(self.archive_store, manifest)
+        except ArchiveVerificationError as e:
+            return str(e)
+        source = {'from': f"{self.table} PARTITION ({partition_name(month)})"}
+        if source_fingerprint(self.connection, source) != {'rows': manifest['source']['rows'],
+                                                           'id_sum': manifest['source']['id_sum']}:
+            return "partition changed since it was archived"
+        return None
+
+    def drop_expired_partitions(self) -> None:
+        """Drop monthly partitions that end on or before the cutoff and have a verified archive"""
+        expired = []
+        for partition in list_partitions(self.connection, self.table):
+            match = PARTITION_NAME.match(partition['name'])
+            if match and partition['less_than'] and partition['less_than'] <= self.cutoff:
+                expired.append((partition['name'], date(int(match.group(1)), int(match.group(2)), 1)))
+
+        for name, month in expired:
+            problem = self.archive_problem(month)
+            if problem:
+                logger.warning(f"⚠️ Keeping {self.table} partition {name}: {problem}")
+                self.stats['kept_partitions'].append({'name': name, 'reason': problem})
+                continue
+            statement = f"ALTER TABLE {self.table} DROP PARTITION {name}"
+            if self.dry_run:
+                logger.info(f"📝 [DRY RUN] {statement}")
+            else:
+                logger.info(f"🗑️ Executing: {statement}")
+                with self.connection.cursor() as cursor:
+                    cursor.execute(statement)
+            self.stats['dropped_partitions'].append(name)
+
+    def health_problem(self) -> Optional[str]:
+        """Describe why the server is too busy for another chunk, or None"""
+        waits = current_lock_waits(self.connection)
+        if waits > self.max_lock_waits:
+            return f"{waits} InnoDB lock waits"
+        if self.replica_connect is not None:
+            replica = self.replica_connect()
+            try:
+                lag = measure_replica_lag(replica)
+            finally:
+                replica.close()
+            if lag is None or lag > self.max_replica_lag:
+                return f"replica lag {lag}s"
+        return None
+
+    def wait_until_healthy(self) -> bool:
+        """Back off while the server is busy; False once max_backoffs is reached"""
+        delay = self.sleep_seconds or 0.5
+        for attempt in range(self.max_backoffs + 1):
+            problem = self.health_problem()
+            if problem is None:
+                return True
+            if attempt == self.max_backoffs:
+                self.stats['stopped'] = problem
+                logger.warning(f"⚠️ Stopping purge of {self.table}: {problem}")
+                return False
+            delay = min(delay * 2, self.max_backoff_seconds)
+            self.stats['backoffs'] += 1
+            logger.info(f"⏳ {problem}, backing off {delay}s")
+            self.sleep(delay)
+        return False
+
+    def next_chunk(self) -> List[int]:
+        """Ids of the next expired rows in primary key order"""
+        with self.connection.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(f"""
+                SELECT id FROM {self.table}
+                WHERE id > %s AND {self.time_column} < %s
+                ORDER BY id
+                LIMIT %s
+            """, [self.stats['last_id'], self.cutoff, self.chunk_size])
+            return [row[0] for row in cursor.fetchall()]
+
+    def delete_chunk(self, ids: List[int]) -> int:
+        """Delete one id range of expired rows in its own transaction"""
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"""
+                DELETE FROM {self.table}
+                WHERE id >= %s AND id <= %s AND {self.time_column} < %s
+            """, [ids[0], ids[-1], self.cutoff])
+            deleted = cursor.rowcount
+        self.connection.commit()
+        return deleted
+
+    def report(self, chunk_ms: float) -> None:
+        if self.progress is not None:
+            self.progress(dict(self.stats, chunk_ms=round(chunk_ms, 3)))
+
+    def run(self) -> Dict[str, Any]:
+        """Purge until no expired rows are left, the chunk limit is reached or the server is too busy"""
+        if self.partitioned:
+            self.drop_expired_partitions()
+            logger.info(f"✅ Dropped {len(self.stats['dropped_partitions'])} partitions of {self.table}, "
+                        f"kept {len(self.stats['kept_partitions'])} without a verified archive"
+                        f"{' (dry run)' if self.dry_run else ''}")
+            return self.stats
+
+        if not self.dry_run:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SET SESSION innodb_lock_wait_timeout = %s", [self.lock_wait_timeout])
+
+        while self.max_chunks is None or self.stats['chunks'] < self.max_chunks:
+            if not self.wait_until_healthy():
+                break
+            ids = self.next_chunk()
+            if not ids:
+                break
+
+            started = self.clock()
+            if self.dry_run:
+                deleted = len(ids)
+            else:
+                try:
+                    deleted = self.delete_chunk(ids)
+                except pymysql.err.OperationalError as e:
+                    self.connection.rollback()
+                    if e.args and e.args[0] == LOCK_WAIT_TIMEOUT_ERROR:
+                        self.stats['stopped'] = 'lock wait timeout'
+                        logger.warning(f"⚠️ Stopping purge of {self.table}: lock wait timeout on chunk {ids[0]}-{ids[-1]}")
+                        break
+                    raise
+            chunk_ms = (self.clock() - started) * 1000
+
+            self.stats['rows_deleted'] += deleted
+            self.stats['chunks'] += 1
+            self.stats['last_id'] = ids[-1]
+            self.report(chunk_ms)
+            if len(ids) < self.chunk_size:
+                break
+            self.sleep(self.sleep_seconds)
+
+        logger.info(f"✅ Purged {self.stats['rows_deleted']} rows from {self.table} in {self.stats['chunks']} chunks"
+                    f"{' (dry run)' if self.dry_run else ''}"
+                    f"{', stopped: ' + self.stats['stopped'] if self.stats['stopped'] else ''}")
+        return self.stats
+
+
+def purge_tables(connection, retention_days: Dict[str, int], today: Optional[date] = None,
+                 **options) -> List[Dict[str, Any]]:
+    """Purge each table past its retention (in days); a stopped table stops the run"""
+    today = today or date.today()
+    results = []
+    for table, days in retention_days.items():
+        stats = RetentionPurger(connection, table, retention_cutoff(today, days), **options).run()
+        results.append(stats)
+        if stats['stopped']:
+            break
+    return results
@@ -0,0 +1,418 @@
+"""
+Online, resumable schema migrations
+
+Applying DDL files directly (Scripts/execute_blocking_schema_changes.py) is
+fine for small tables. On bedrock_requests, however, a table-copying ALTER or
+a single UPDATE backfilling a new column blocks request logging for as long
+as it runs. This runner applies versioned migrations so that the realtime
+controller keeps inserting throughout.
+
+Migrations are files named V<version>__<name>.sql in Database/Migrations. They
+are applied in version order and recorded in schema_migrations together with
+a SHA-256 checksum. Editing a file that has already been applied is an error.
+Each statement is one of two kinds:
+
+- DDL. An ALTER TABLE without an explicit ALGORITHM is tried as
+  ALGORITHM=INSTANT first and then as ALGORITHM=INPLACE, LOCK=NONE. MySQL
+  refuses either one (errors 1845/1846) when the change cannot be made that
+  way, so the first accepted attempt is the cheapest algorithm. A change that
+  needs ALGORITHM=COPY is refused unless allow_copy is set. The session
+  lock_wait_timeout is kept low, so the ALTER gives up waiting for the
+  metadata lock (and is retried) rather than queueing inserts behind it.
+- Backfill. An UPDATE containing the {id_range} placeholder runs in
+  primary-key chunks up to the MAX(id) seen when the backfill started. Each
+  chunk commits together with its row in migration_progress, so an
+  interrupted migration resumes after the last committed chunk.
+
+Between chunks the runner samples the average INSERT INTO bedrock_requests
+latency from performance_schema's statement digests. While it is above
+max_ingest_latency_ms the runner backs off exponentially, and after
+max_backoffs consecutive slow samples it stops; a later run resumes.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pymysql
+
+logger = logging.getLogger()
+
+MIGRATION_FILE = re.compile(r'^V(\d+)__(\w+)\.sql$')
+ID_RANGE = '{id_range}'
+BACKFILL_TABLE = re.compile(r'^\s*UPDATE\s+`?(\w+)`?', re.IGNORECASE)
+ALTER_TABLE = re.compile(r'^\s*ALTER\s+TABLE\b', re.IGNORECASE)
+EXPLICIT_ALGORITHM = re.compile(r'\bALGORITHM\s*=', re.IGNORECASE)
+
+# MySQL errors: algorithm not supported for this change, metadata/row lock wait
+# timeout, and "already applied" errors tolerated when a statement is re-run on resume
+ALGORITHM_NOT_SUPPORTED_ERRORS = (1845, 1846)
+LOCK_WAIT_TIMEOUT_ERROR = 1205
+ALREADY_APPLIED_ERRORS = (1060, 1061, 1091)
+NO_SUCH_TABLE_ERROR = 1146
+
+ONLINE_ALGORITHMS = ('ALGORITHM=INSTANT', 'ALGORITHM=INPLACE, LOCK=NONE')
+COPY_ALGORITHM = 'ALGORITHM=COPY'
+
+INGEST_DIGEST_PATTERN = 'INSERT INTO `bedrock_requests`%'
+
+TRACKING_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        status ENUM('running', 'applied') NOT NULL,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        applied_at TIMESTAMP NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS migration_progress (
+        version INT NOT NULL,
+        statement_index INT NOT NULL,
+        last_id BIGINT NOT NULL DEFAULT 0,
+        max_id BIGINT NULL,
+        rows_affected BIGINT NOT NULL DEFAULT 0,
+        algorithm VARCHAR(50) NULL,
+        done BOOLEAN NOT NULL DEFAULT FALSE,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (version, statement_index)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """
+]
+
+
+class MigrationError(Exception):
+    """A migration cannot be applied safely"""
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a migration file on statement-ending semicolons, dropping comment lines"""
+    statements, current = [], []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('--'):
+            continue
+        current.append(line.rstrip())
+        if stripped.endswith(';'):
+            statements.append('\n'.join(current).strip().rstrip(';').strip())
+            current = []
+    if current:
+        statements.append('\n'.join(current).strip())
+    return statements
+
+
+def load_migrations(directory: str) -> List[Dict[str, Any]]:
+    """Migrations in a directory, ordered by version"""
+    migrations = []
+    for file_name in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(file_name)
+        if not match:
+            continue
+        with open(os.path.join(directory, file_name), 'rb') as migration_file:
+            content = migration_file.read()
+        migrations.append({
+            'version': int(match.group(1)),
+            'name': match.group(2),
+            'checksum': hashlib.sha256(content).hexdigest(),
+            'statements': split_statements(content.decode('utf-8'))
+        })
+    migrations.sort(key=lambda migration: migration['version'])
+    versions = [migration['version'] for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def statement_kind(statement: str) -> str:
+    """'backfill' for chunked UPDATEs, 'alter' for ALTER TABLE, otherwise 'ddl'"""
+    if ID_RANGE in statement:
+        if not BACKFILL_TABLE.match(statement):
+            raise MigrationError(f"{ID_RANGE} is only supported in UPDATE statements: {statement[:80]}")
+        return 'backfill'
+    if ALTER_TABLE.match(statement):
+        return 'alter'
+    return 'ddl'
+
+
+def alter_attempts(statement: str, allow_copy: bool = False) -> List[Tuple[str, str]]:
+    """(algorithm, ALTER TABLE) variants to try, cheapest algorithm first"""
+    if EXPLICIT_ALGORITHM.search(statement):
+        return [('as written', statement)]
+    algorithms = list(ONLINE_ALGORITHMS) + ([COPY_ALGORITHM] if allow_copy else [])
+    return [(algorithm, f"{statement},\n    {algorithm}") for algorithm in algorithms]
+
+
+def ingest_counters(connection) -> Tuple[int, int]:
+    """Executions and total wait (picoseconds) of bedrock_requests inserts since the digests were reset"""
+    with connection.cursor(pymysql.cursors.Cursor) as cursor:
+        cursor.execute("""
+            SELECT COALESCE(SUM(COUNT_STAR), 0), COALESCE(SUM(SUM_TIMER_WAIT), 0)
+            FROM performance_schema.events_statements_summary_by_digest
+            WHERE SCHEMA_NAME = DATABASE() AND DIGEST_TEXT LIKE %s
+        """, [INGEST_DIGEST_PATTERN])
+        count, wait = cursor.fetchone()
+    return int(count), int(wait)
+
+
+class IngestLatencyMonitor:
+    """Average insert latency between two samples of the statement digests"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.last = None
+
+    def sample(self) -> Optional[float]:
+        """Average insert latency in ms since the previous sample, None without inserts"""
+        try:
+            current = ingest_counters(self.connection)
+        except pymysql.err.MySQLError as e:
+            logger.warning(f"⚠️ Ingest latency unavailable (performance_schema): {str(e)}")
+            return None
+        previous, self.last = self.last, current
+        if previous is None or current[0] <= previous[0]:
+            return None
+        return (current[1] - previous[1]) / (current[0] - previous[0]) / 1e9
+
+
+class MigrationRunner:
+    """Apply pending migrations online, resuming interrupted ones"""
+
+    def __init__(self, connection, migrations_dir: str, chunk_size: int = 5000, sleep_seconds: float = 0.1,
+                 max_ingest_latency_ms: float = 50.0, max_backoffs: int = 10, max_backoff_seconds: float = 30.0,
+                 lock_wait_timeout: int = 5, ddl_retries: int = 5, allow_copy: bool = False,
+                 dry_run: bool = False, sleep: Callable[[float], None] = time.sleep):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.connection = connection
+        self.migrations_dir = migrations_dir
+        self.chunk_size = chunk_size
+        self.sleep_seconds = sleep_seconds
+        self.max_ingest_latency_ms = max_ingest_latency_ms
+        self.max_backoffs = max_backoffs
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lock_wait_timeout = lock_wait_timeout
+        self.ddl_retries = ddl_retries
+        self.allow_copy = allow_copy
+        self.dry_run = dry_run
+        self.sleep = sleep
+        self.monitor = IngestLatencyMonitor(connection)
+
+
+    def ensure_tracking_tables(self) -> None:
+        with self.connection.cursor() as cursor:
+            for statement in TRACKING_TABLES_SQL:
+                cursor.execute(statement)
+        self.connection.commit()
+
+    def recorded(self) -> Dict[int, Dict[str, Any]]:
+        """schema_migrations rows by version (none before the first run created the table)"""
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT version, name, checksum, status FROM schema_migrations")
+                return {row['version']: row for row in cursor.fetchall()}
+        except pymysql.err.ProgrammingError as e:
+            if e.args and e.args[0] == NO_SUCH_TABLE_ERROR:
+                return {}
+            raise
+
+    def progress(self, version: int) -> Dict[int, Dict[str, Any]]:
+        """migration_progress rows of one migration by statement index"""
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT statement_index, last_id, max_id, rows_affected, algorithm, done
+                FROM migration_progress WHERE version = %s
+            """, [version])
+            return {row['statement_index']: row for row in cursor.fetchall()}
+
+    def save_progress(self, version: int, index: int, commit: bool = True, **values) -> None:
+        columns = ['version', 'statement_index'] + list(values)
+        updates = ', '.join(f"{column} = VALUES({column})" for column in values)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO migration_progress ({', '.join(columns)})
+                VALUES ({', '.join(['%s'] * len(columns))})
+                ON DUPLICATE KEY UPDATE {updates}
+            """, [version, index] + list(values.values()))
+        if commit:
+            self.connection.commit()
+
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Migrations not applied yet; fails when an applied migration was edited"""
+        recorded = self.recorded()
+        pending = []
+        for migration in load_migrations(self.migrations_dir):
+            row = recorded.get(migration['version'])
+            if row and row['checksum'] != migration['checksum']:
+                raise MigrationError(f"Migration V{migration['version']} ({migration['name']}) changed "
+                                     f"after it was {row['status']}; add a new version instead")
+            if not row or row['status'] != 'applied':
+                migration['resuming'] = bool(row)
+                pending.append(migration)
+        return pending
+
+    def plan(self) -> List[Dict[str, Any]]:
+        """Pending migrations with the statements (or ALTER attempts) each would run"""
+        plan = []
+        for migration in self.pending():
+            steps = []
+            for statement in migration['statements']:
+                kind = statement_kind(statement)
+                attempts = ([attempt for _, attempt in alter_attempts(statement, self.allow_copy)]
+                            if kind == 'alter' else [statement])
+                steps.append({'kind': kind, 'attempts': attempts})
+            plan.append({'version': migration['version'], 'name': migration['name'],
+                         'resuming': migration['resuming'], 'steps': steps})
+        return plan
+
+
+    def wait_for_ingest(self) -> bool:
+        """Back off while inserts are slow; False once max_backoffs is reached"""
+        delay = self.sleep_seconds or 0.5
+        for attempt in range(self.max_backoffs + 1):
+            latency = self.monitor.sample()
+            if latency is None or latency <= self.max_ingest_latency_ms:
+                return True
+            if attempt == self.max_backoffs:
+                logger.warning(f"⚠️ Ingest latency {latency:.1f}ms above {self.max_ingest_latency_ms}ms, pausing migration")
+                return False
+            delay = min(delay * 2, self.max_backoff_seconds)
+            logger.info(f"⏳ Ingest latency {latency:.1f}ms, backing off {delay}s")
+            self.sleep(delay)
+        return False
+
+
+    def execute_with_lock_retries(self, statement: str) -> None:
+        """Run DDL, retrying metadata lock wait timeouts with backoff"""
+        delay = self.sleep_seconds or 0.5
+        for attempt in range(self.ddl_retries + 1):
+            try:
+                with self.connection.cursor() as cursor:
+                    cursor.execute(statement)
+                return
+            except pymysql.err.OperationalError as e:
+                if not e.args or e.args[0] != LOCK_WAIT_TIMEOUT_ERROR or attempt == self.ddl_retries:
+                    raise
+                delay = min(delay * 2, self.max_backoff_seconds)
+                logger.info(f"⏳ Metadata lock busy, retrying DDL in {delay}s")
+                self.sleep(delay)
+
+    def run_alter(self, statement: str) -> str:
+        """Run an ALTER TABLE with the cheapest algorithm MySQL accepts; returns that algorithm"""
+        for algorithm, attempt in alter_attempts(statement, self.allow_copy):
+            try:
+                self.execute_with_lock_retries(attempt)
+            except pymysql.err.MySQLError as e:
+                if e.args and e.args[0] in ALGORITHM_NOT_SUPPORTED_ERRORS:
+                    logger.info(f"ℹ️ {algorithm} not supported: {e.args[-1]}")
+                    continue
+                raise
+            return algorithm
+        raise MigrationError("ALTER TABLE needs ALGORITHM=COPY, which blocks writes; "
+                             f"rerun with allow_copy in a maintenance window: {statement[:120]}")
+
+    def run_backfill(self, version: int, index: int, statement: str, state: Optional[Dict[str, Any]]) -> bool:
+        """Run an {id_range} UPDATE in id chunks; False when paused by ingest latency"""
+        table = BACKFILL_TABLE.match(statement).group(1)
+        last_id = state['last_id'] if state else 0
+        rows_affected = state['rows_affected'] if state else 0
+        max_id = state['max_id'] if state and state['max_id'] is not None else None
+        if max_id is None:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"SELECT COALESCE(MAX(id), 0) AS max_id FROM {table}")
+                max_id = cursor.fetchone()['max_id']
+            self.save_progress(version, index, last_id=last_id, max_id=max_id, rows_affected=rows_affected)
+
+        chunk = statement.replace(ID_RANGE, 'id > %s AND id <= %s')
+        while last_id < max_id:
+            if not self.wait_for_ingest():
+                return False
+            upper = min(last_id + self.chunk_size, max_id)
+            with self.connection.cursor() as cursor:
+                cursor.execute(chunk, [last_id, upper])
+                rows_affected += cursor.rowcount
+            self.save_progress(version, index, commit=False, last_id=upper, rows_affected=rows_affected)
+            self.connection.commit()
+            last_id = upper
+            logger.info(f"🔄 V{version} backfill {table}: id {last_id}/{max_id}, {rows_affected} rows")
+            self.sleep(self.sleep_seconds)
+
+        self.save_progress(version, index, done=True)
+        return True
+
+
+    def apply_migration(self, migration: Dict[str, Any]) -> Dict[str, Any]:
+        version = migration['version']
+        result = {'version': version, 'name': migration['name'], 'statements': [], 'status': 'applied'}
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO schema_migrations (version, name, checksum, status)
+                VALUES (%s, %s, %s, 'running')
+                ON DUPLICATE KEY UPDATE status = 'running'
+            """, [version, migration['name'], migration['checksum']])
+        self.connection.commit()
+
+        progress = self.progress(version)
+        for index, statement in enumerate(migration['statements']):
+            state = progress.get(index)
+            if state and state['done']:
+                result['statements'].append({'index': index, 'skipped': True})
+                continue
+
+            kind = statement_kind(statement)
+            logger.info(f"🔧 V{version} statement {index} ({kind}): {statement.splitlines()[0][:100]}")
+            if kind == 'backfill':
+                if not self.run_backfill(version, index, statement, state):
+                    result['status'] = 'paused'
+                    return result
+                result['statements'].append({'index': index, 'kind': kind})
+                continue
+
+            try:
+                if kind == 'alter':
+                    algorithm = self.run_alter(statement)
+                else:
+                    self.execute_with_lock_retries(statement)
+                    algorithm = None
+            except pymysql.err.MySQLError as e:
+                # A statement interrupted after it took effect fails this way when re-run
+                if not (migration.get('resuming') and e.args and e.args[0] in ALREADY_APPLIED_ERRORS):
+                    raise
+                logger.warning(f"⚠️ V{version} statement {index} already applied: {str(e)}")
+                algorithm = 'already applied'
+            self.save_progress(version, index, algorithm=algorithm, done=True)
+            result['statements'].append({'index': index, 'kind': kind, 'algorithm': algorithm})
+
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE schema_migrations SET status = 'applied', applied_at = CURRENT_TIMESTAMP
+                WHERE version = %s
+            """, [version])
+        self.connection.commit()
+        logger.info(f"✅ Applied migration V{version} ({migration['name']})")
+        return result
+
+    def run(self, target_version: Optional[int] = None) -> Dict[str, Any]:
+        """Apply pending migrations up to target_version; dry runs only return the plan"""
+        if self.dry_run:
+            return {'dry_run': True, 'plan': self.plan()}
+        self.ensure_tracking_tables()
+
+        with self.connection.cursor() as cursor:
+            cursor.execute("SET SESSION lock_wait_timeout = %s", [self.lock_wait_timeout])
+        self.monitor.sample()
+
+        applied = []
+        for migration in self.pending():
+            if target_version is not None and migration['version'] > target_version:
+                break
+            result = self.apply_migration(migration)
+            applied.append(result)
+            if result['status'] != 'applied':
+                break
+        return {'dry_run': False, 'migrations': applied}
@@ -0,0 +1,130 @@
+"""
+Sargable usage queries for bedrock_requests
+
+Wrapping the timestamp in a function (`DATE(request_timestamp) = CURDATE()`,
+`YEAR(...) = ...`, `MONTH(...) = ...`) hides the column from the optimizer:
+every row of the user has to be read to evaluate the function, and MySQL
+cannot prune the monthly partitions (RANGE on TO_DAYS(date_only)).
+
+The builders here only emit half-open ranges on the bare column,
+`column >= start AND column < end`, with the bounds computed in Python.
+On `date_only` (the default) a per-user range is a seek on
+idx_user_date (user_id, date_only) and only touches the partitions of the
+months in range; `request_timestamp` ranges seek on idx_user_timestamp.
+
+Timestamps are stored in CET (Europe/Madrid), so callers pass the CET
+calendar date as "today".
+
+This module is shared by several Lambda functions and is deployed next to
+their lambda_function.py (or in a layer under /opt/python).
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, List, Optional, Tuple
+
+RANGE_COLUMNS = ('date_only', 'request_timestamp')
+
+
+def as_date(value: Any) -> date:
+    """Accept a date, a datetime or a YYYY-MM-DD string"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Expected a date in YYYY-MM-DD format, got {value!r}")
+
+
+def day_bounds(day: Any) -> Tuple[date, date]:
+    """Half-open [day, next day) range"""
+    start = as_date(day)
+    return start, start + timedelta(days=1)
+
+
+def month_bounds(month: Any) -> Tuple[date, date]:
+    """Half-open [first day, first day of next month) range for a YYYY-MM value or any day of the month"""
+    if not isinstance(month, date):
+        month = str(month)
+        month = month if len(month) > 7 else f"{month}-01"
+    start = as_date(month).replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def range_predicate(start: date, end: date, column: str = 'date_only',
+                    user_id: Optional[str] = None, alias: str = '') -> Tuple[str, List[Any]]:
+    """
+    Return `[user_id = %s AND] column >= %s AND column < %s` with its parameters
+
+    `end` is exclusive. Bounds on request_timestamp are midnights, so the same
+    calendar range is selected whichever column is used.
+    """
+    if column not in RANGE_COLUMNS:
+        raise ValueError(f"Unsupported range column: {column}. Use one of {', '.join(RANGE_COLUMNS)}")
+    if end <= start:
+        raise ValueError("The end of a range must be after its start")
+
+    prefix = f"{alias}." if alias else ''
+    if column == 'request_timestamp':
+        start, end = datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+
+    conditions = [f"{prefix}{column} >= %s", f"{prefix}{column} < %s"]
+    params: List[Any] = [start, end]
+    if user_id is not None:
+        conditions.insert(0, f"{prefix}user_id = %s")
+        params.insert(0, user_id)
+    return ' AND '.join(conditions), params
+
+
+def day_range(user_id: Optional[str], day: Any, column: str = 'date_only') -> Tuple[str, List[Any]]:
+    """Predicate selecting one calendar day (of one user, unless user_id is None)"""
+    start, end = day_bounds(day)
+    return range_predicate(start, end, column, user_id)
+
+
+def month_range(user_id: Optional[str], month: Any, column: str = 'date_only') -> Tuple[str, List[Any]]:
+    """Predicate selecting one calendar month (of one user, unless user_id is None)"""
+    start, end = month_bounds(month)
+    return range_predicate(start, end, column, user_id)
+
+
+def usage_counts_query(user_id: str, today: Any) -> Tuple[str, List[Any]]:
+    """
+    Daily and month-to-date request counts of one user in a single index range scan
+
+    Returns columns daily_requests_used and monthly_requests_used.
+    """
+    today = as_date(today)
+    month_start, _ = month_bounds(today)
+    predicate, params = range_predicate(month_start, today + timedelta(days=1), user_id=user_id)
+    query = f"""
+        SELECT COALESCE(SUM(date_only >= %s), 0) AS daily_requests_used,
+               COUNT(*) AS monthly_requests_used
+        FROM bedrock_requests
+        WHERE {predicate}
+    """
+    return query, [today] + params
+
+
+def usage_counts_many_query(user_ids: List[str], today: Any) -> Tuple[str, List[Any]]:
+    """
+    usage_counts_query for several users in one statement, grouped by user_id
+
+    `user_id IN (...)` is still one seek per user on idx_user_date. Users
+    without requests this month return no row.
+    """
+    if not user_ids:
+        raise ValueError("At least one user_id is required")
+    today = as_date(today)
+    month_start, _ = month_bounds(today)
+    predicate, params = range_predicate(month_start, today + timedelta(days=1))
+    query = f"""
+        SELECT user_id,
+               COALESCE(SUM(date_only >= %s), 0) AS daily_requests_used,
+               COUNT(*) AS monthly_requests_used
+        FROM bedrock_requests
+        WHERE user_id IN ({', '.join(['%s'] * len(user_ids))}) AND {predicate}
+        GROUP BY user_id
+    """
+    return query, [today] + list(user_ids) + params
@@ -0,0 +1,357 @@
+"""
+Hourly and daily usage rollups with distinct-count sketches
+
+The dashboard views count distinct users and models over raw bedrock_requests
+rows. Those counts do not add up across hours, days or teams, so every wider
+range rescans the rows. The rollups store one row per bucket instead:
+
+- usage_rollup_hourly (date_only, hour_only, team, model_id): requests, tokens,
+  cost and a HyperLogLog sketch of the users
+- usage_rollup_daily (date_only, team): the day's totals, a users sketch and
+  a models sketch, merged from the hourly rows
+
+A bucket is rebuilt from scratch (delete + insert in one transaction), so
+rebuilding an hour that is still receiving requests is safe. The
+bedrock-db-maintenance Lambda (task "rollups") rebuilds the last few hours
+and their days on a schedule.
+
+distinct_counts() answers active-user and unique-model counts for any
+hour-aligned range. It reads daily rows for the whole days and hourly rows
+for the partial days at either end, then merges their sketches, so its cost
+depends on the number of buckets, not the number of requests.
+
+Latency quantiles use latency_rollup_hourly (date_only, hour_only, model_id),
+which holds one DDSketch (latency_sketch.py) per model and hour. The request
+writer (the realtime controller) owns these rows. It collects a sketch per
+key while processing a batch of CloudTrail events, then merges each one into
+its row with merge_latency_sketches(). The rollup rebuild never touches them.
+latency_quantiles() merges the rows of a range to give p50/p95/p99.
+"""
+
+import logging
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from hll import HyperLogLog
+from latency_sketch import DDSketch
+
+logger = logging.getLogger()
+
+HOURLY_TABLE = 'usage_rollup_hourly'
+DAILY_TABLE = 'usage_rollup_daily'
+LATENCY_TABLE = 'latency_rollup_hourly'
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def truncate_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def as_hour(value: Any) -> datetime:
+    """Hour-aligned naive datetime from a date, datetime or ISO string"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.minute or value.second or value.microsecond:
+        raise ValueError(f"Rollup ranges are hour-aligned: {value.isoformat()}")
+    return value.replace(tzinfo=None)
+
+
+def build_hourly_rollup(connection, day: date, hour: int) -> int:
+    """Rebuild the hourly rollup rows of one hour; returns the number of rows"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT team, model_id, user_id, COUNT(*) AS request_count,
+                   SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens,
+                   SUM(cost_usd) AS cost_usd
+            FROM bedrock_requests
+            WHERE date_only = %s AND hour_only = %s
+            GROUP BY team, model_id, user_id
+        """, [day, hour])
+        groups = cursor.fetchall()
+
+    buckets = OrderedDict()
+    for group in groups:
+        bucket = buckets.setdefault((group['team'], group['model_id']), {
+            'request_count': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost_usd': Decimal('0'),
+            'users': HyperLogLog()
+        })
+        bucket['request_count'] += group['request_count']
+        bucket['input_tokens'] += int(group['input_tokens'] or 0)
+        bucket['output_tokens'] += int(group['output_tokens'] or 0)
+        bucket['cost_usd'] += Decimal(group['cost_usd'] or 0)
+        bucket['users'].add(group['user_id'])
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {HOURLY_TABLE} WHERE date_only = %s AND hour_only = %s", [day, hour])
+        if buckets:
+            cursor.executemany(f"""
+                INSERT INTO {HOURLY_TABLE}
+                    (date_only, hour_only, team, model_id, request_count, input_tokens, output_tokens,
+                     cost_usd, users_hll)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [(day, hour, team, model_id, bucket['request_count'], bucket['input_tokens'],
+                   bucket['output_tokens'], bucket['cost_usd'], bucket['users'].to_bytes())
+                  for (team, model_id), bucket in buckets.items()])
+    connection.commit()
+    return len(buckets)
+
+
+def build_daily_rollup(connection, day: date) -> int:
+    """Rebuild the daily rollup rows of one day from its hourly rows"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT team, model_id, request_count, input_tokens, output_tokens, cost_usd, users_hll
+            FROM {HOURLY_TABLE}
+            WHERE date_only = %s
+        """, [day])
+        hourly = cursor.fetchall()
+
+    teams = OrderedDict()
+    for row in hourly:
+        team = teams.setdefault(row['team'], {
+            'request_count': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost_usd': Decimal('0'),
+            'users': HyperLogLog(), 'models': HyperLogLog()
+        })
+        team['request_count'] += row['request_count']
+        team['input_tokens'] += row['input_tokens']
+        team['output_tokens'] += row['output_tokens']
+        team['cost_usd'] += Decimal(row['cost_usd'])
+        team['users'].merge(HyperLogLog.from_bytes(row['users_hll']))
+        team['models'].add(row['model_id'])
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {DAILY_TABLE} WHERE date_only = %s", [day])
+        if teams:
+            cursor.executemany(f"""
+                INSERT INTO {DAILY_TABLE}
+                    (date_only, team, request_count, input_tokens, output_tokens, cost_usd,
+                     users_hll, models_hll)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, [(day, name, team['request_count'], team['input_tokens'], team['output_tokens'],
+                   team['cost_usd'], team['users'].to_bytes(), team['models'].to_bytes())
+                  for name, team in teams.items()])
+    connection.commit()
+    return len(teams)
+
+
+def run_rollups(connection, now: datetime, hours: int = 3) -> Dict[str, Any]:
+    """Rebuild the last `hours` hours up to and including the current one, then their days"""
+    if hours < 1:
+        raise ValueError("hours must be at least 1")
+    current = truncate_hour(now)
+    rebuilt_hours, days, rows = [], [], 0
+    for offset in range(hours - 1, -1, -1):
+        moment = current - timedelta(hours=offset)
+        rows += build_hourly_rollup(connection, moment.date(), moment.hour)
+        rebuilt_hours.append(moment.isoformat())
+        if moment.date() not in days:
+            days.append(moment.date())
+    for day in days:
+        rows += build_daily_rollup(connection, day)
+    logger.info(f"📈 Rebuilt {len(rebuilt_hours)} hourly and {len(days)} daily rollups ({rows} rows)")
+    return {'hours': rebuilt_hours, 'days': [day.isoformat() for day in days], 'rows': rows}
+
+
+def rebuild_days(connection, start: date, end: date) -> Dict[str, Any]:
+    """Rebuild every hour and the daily rows of an inclusive day range (backfill)"""
+    if end < start:
+        raise ValueError("end must not be before start")
+    days, rows = [], 0
+    day = start
+    while day <= end:
+        for hour in range(24):
+            rows += build_hourly_rollup(connection, day, hour)
+        rows += build_daily_rollup(connection, day)
+        days.append(day.isoformat())
+        day += timedelta(days=1)
+    logger.info(f"📈 Rebuilt rollups of {len(days)} days ({rows} rows)")
+    return {'days': days, 'rows': rows}
+
+
+def split_range(start: datetime, end: datetime) -> Tuple[Optional[Tuple[date, date]], List[Tuple[date, int, int]]]:
+    """Split [start, end) into whole days (first, next) and partial-day hour ranges (day, from, to)"""
+    if end <= start:
+        raise ValueError("end must be after start")
+    first_full = start.date() if start.hour == 0 else start.date() + timedelta(days=1)
+    end_full = end.date()
+    if first_full >= end_full:
+        if start.date() == end.date():
+            return None, [(start.date(), start.hour, end.hour)]
+        partial = [(start.date(), start.hour, 24)]
+        if end.hour:
+            partial.append((end.date(), 0, end.hour))
+        return None, partial
+
+    partial = []
+    if start.hour:
+        partial.append((start.date(), start.hour, 24))
+    if end.hour:
+        partial.append((end.date(), 0, end.hour))
+    return (first_full, end_full), partial
+
+
+def team_filter(teams: Optional[List[str]]) -> Tuple[str, List[Any]]:
+    if not teams:
+        return '', []
+    return f" AND team IN ({', '.join(['%s'] * len(teams))})", list(teams)
+
+
+def distinct_counts(connection, start: Any, end: Any, teams: Optional[List[str]] = None,
+                    group_by_team: bool = False) -> Dict[str, Any]:
+    """Active users, unique models and totals for [start, end), overall or per team"""
+    start, end = as_hour(start), as_hour(end)
+    days, partial = split_range(start, end)
+    team_sql, team_params = team_filter(teams)
+
+    rows = []
+    with connection.cursor() as cursor:
+        if days:
+            cursor.execute(f"""
+                SELECT team, request_count, input_tokens, output_tokens, cost_usd, users_hll, models_hll,
+                       NULL AS model_id
+                FROM {DAILY_TABLE}
+                WHERE date_only >= %s AND date_only < %s{team_sql}
+            """, [days[0], days[1]] + team_params)
+            rows += cursor.fetchall()
+        for day, from_hour, to_hour in partial:
+            cursor.execute(f"""
+                SELECT team, request_count, input_tokens, output_tokens, cost_usd, users_hll, NULL AS models_hll,
+                       model_id
+                FROM {HOURLY_TABLE}
+                WHERE date_only = %s AND hour_only >= %s AND hour_only < %s{team_sql}
+            """, [day, from_hour, to_hour] + team_params)
+            rows += cursor.fetchall()
+
+    groups = OrderedDict()
+    for row in rows:
+        key = row['team'] if group_by_team else None
+        group = groups.setdefault(key, {
+            'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost_usd': Decimal('0'),
+            'users': HyperLogLog(), 'models': HyperLogLog(), 'buckets': 0
+        })
+        group['requests'] += row['request_count']
+        group['input_tokens'] += row['input_tokens']
+        group['output_tokens'] += row['output_tokens']
+        group['cost_usd'] += Decimal(row['cost_usd'])
+        group['users'].merge(HyperLogLog.from_bytes(row['users_hll']))
+        if row['models_hll']:
+            group['models'].merge(HyperLogLog.from_bytes(row['models_hll']))
+        else:
+            group['models'].add(row['model_id'])
+        group['buckets'] += 1
+
+    results = []
+    for key, group in groups.items():
+        result = {'team': key} if group_by_team else {}
+        result.update({
+            'active_users': group['users'].estimate(),
+            'unique_models': group['models'].estimate(),
+            'requests': group['requests'],
+            'input_tokens': group['input_tokens'],
+            'output_tokens': group['output_tokens'],
+            'cost_usd': float(group['cost_usd']),
+            'buckets': group['buckets']
+        })
+        results.append(result)
+    if not results and not group_by_team:
+        results.append({'active_users': 0, 'unique_models': 0, 'requests': 0, 'input_tokens': 0,
+                        'output_tokens': 0, 'cost_usd': 0.0, 'buckets': 0})
+    return {'start': start.isoformat(), 'end': end.isoformat(), 'rows': results}
+
+
+def add_latency(sketches: Dict[Tuple[date, int, str], DDSketch], model_id: str, moment: Any,
+                latency_ms: Optional[float]) -> None:
+    """Add one request's latency to the in-memory sketch of its (CET hour, model)"""
+    if not latency_ms or latency_ms <= 0:
+        return
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment)
+    key = (moment.date(), moment.hour, model_id)
+    if key not in sketches:
+        sketches[key] = DDSketch()
+    sketches[key].add(latency_ms)
+
+
+def merge_latency_sketches(connection, sketches: Dict[Tuple[date, int, str], DDSketch]) -> int:
+    """Merge collected sketches into latency_rollup_hourly, one short transaction per row"""
+    # Keys are locked in a fixed order so concurrent writers cannot deadlock
+    for (day, hour, model_id), sketch in sorted(sketches.items()):
+        connection.begin()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    INSERT IGNORE INTO {LATENCY_TABLE} (date_only, hour_only, model_id, request_count, latency_sketch)
+                    VALUES (%s, %s, %s, 0, %s)
+                """, [day, hour, model_id, DDSketch().to_bytes()])
+                cursor.execute(f"""
+                    SELECT latency_sketch FROM {LATENCY_TABLE}
+                    WHERE date_only = %s AND hour_only = %s AND model_id = %s
+                    FOR UPDATE
+                """, [day, hour, model_id])
+                merged = DDSketch.from_bytes(cursor.fetchone()['latency_sketch']).merge(sketch)
+                cursor.execute(f"""
+                    UPDATE {LATENCY_TABLE} SET request_count = %s, latency_sketch = %s
+                    WHERE date_only = %s AND hour_only = %s AND model_id = %s
+                """, [merged.count, merged.to_bytes(), day, hour, model_id])
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+    return len(sketches)
+
+
+def quantile_label(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+def latency_quantiles(connection, start: Any, end: Any, models: Optional[List[str]] = None,
+                      group_by_model: bool = False, quantiles=DEFAULT_QUANTILES) -> Dict[str, Any]:
+    """Latency quantiles (ms) for [start, end), overall or per model"""
+    if any(not 0 <= q <= 1 for q in quantiles):
+        raise ValueError("quantiles must be between 0 and 1")
+    start, end = as_hour(start), as_hour(end)
+    days, partial = split_range(start, end)
+    model_sql, model_params = '', []
+    if models:
+        model_sql = f" AND model_id IN ({', '.join(['%s'] * len(models))})"
+        model_params = list(models)
+
+    rows = []
+    with connection.cursor() as cursor:
+        if days:
+            cursor.execute(f"""
+                SELECT model_id, latency_sketch FROM {LATENCY_TABLE}
+                WHERE date_only >= %s AND date_only < %s{model_sql}
+            """, [days[0], days[1]] + model_params)
+            rows += cursor.fetchall()
+        for day, from_hour, to_hour in partial:
+            cursor.execute(f"""
+                SELECT model_id, latency_sketch FROM {LATENCY_TABLE}
+                WHERE date_only = %s AND hour_only >= %s AND hour_only < %s{model_sql}
+            """, [day, from_hour, to_hour] + model_params)
+            rows += cursor.fetchall()
+
+    groups = OrderedDict()
+    for row in rows:
+        key = row['model_id'] if group_by_model else None
+        if key not in groups:
+            groups[key] = {'sketch': DDSketch(), 'buckets': 0}
+        groups[key]['sketch'].merge(DDSketch.from_bytes(row['latency_sketch']))
+        groups[key]['buckets'] += 1
+    if not groups and not group_by_model:
+        groups[None] = {'sketch': DDSketch(), 'buckets': 0}
+
+    results = []
+    for key, group in groups.items():
+        result = {'model_id': key} if group_by_model else {}
+        result['count'] = group['sketch'].count
+        for q in quantiles:
+            value = group['sketch'].quantile(q)
+            result[quantile_label(q)] = round(value, 1) if value is not None else None
+        result['buckets'] = group['buckets']
+        results.append(result)
+    return {'start': start.isoformat(), 'end': end.isoformat(), 'rows': results}
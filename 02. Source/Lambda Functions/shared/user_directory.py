@@ -0,0 +1,214 @@
+"""
+User directory: IAM tags and groups mirrored into MySQL
+
+The realtime controller needs the Team, Person and Email tags of every user
+that calls Bedrock, and it used to ask IAM for them on the request path.
+IAM is slow, throttles hard, and the tags change rarely. The user_directory
+table keeps one row per IAM user instead:
+(user_id, team, person, email, groups, tags_hash, synced_at).
+
+sync_user_directory() is run on a schedule by the bedrock-db-maintenance
+Lambda (task "user_directory"). It pages through list_users and fetches each
+page's tags and groups concurrently. It then writes only the rows whose
+tags_hash changed, and removes users that no longer exist in IAM. Users whose
+lookup failed keep their current row.
+
+Readers use a DirectorySnapshot, which caches the whole table in the warm
+container for `ttl_seconds`. Team and Person are derived the same way the
+controller always has: the Team tag, else the first "yo_leo_" group, else
+"unknown"; the Person tag, else "Unknown".
+"""
+
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from user_tags import recipient_from_tags, tag_value
+
+logger = logging.getLogger()
+
+DIRECTORY_TABLE = 'user_directory'
+TEAM_GROUP_PREFIX = 'yo_leo_'
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_SNAPSHOT_TTL_SECONDS = 300
+DELETE_CHUNK_SIZE = 500
+
+
+def placeholders(values: List[Any]) -> str:
+    return ', '.join(['%s'] * len(values))
+
+
+def tags_hash(tags: Dict[str, str], groups: List[str]) -> str:
+    """Stable fingerprint of a user's tags and groups"""
+    document = json.dumps({'tags': tags, 'groups': sorted(groups)}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+
+def directory_row(user_id: str, tags: Dict[str, str], groups: List[str]) -> Dict[str, Any]:
+    """user_directory row for a user's tags and groups"""
+    team = tag_value(tags, 'Team')
+    if not team:
+        team = next((group for group in groups if group.startswith(TEAM_GROUP_PREFIX)), 'unknown')
+    return {
+        'user_id': user_id,
+        'team': team,
+        'person': tag_value(tags, 'Person') or 'Unknown',
+        'email': tag_value(tags, 'Email'),
+        'groups': sorted(groups),
+        'tags_hash': tags_hash(tags, groups)
+    }
+
+
+def recipient_from_entry(entry: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Email service recipient block for a directory row"""
+    return recipient_from_tags(entry['user_id'], {'Person': entry.get('person') or '', 'Email': entry.get('email') or ''})
+
+
+def iter_user_pages(iam_client: Any, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[List[str]]:
+    """User names from list_users, one page at a time"""
+    request = {'MaxItems': page_size}
+    while True:
+        response = iam_client.list_users(**request)
+        yield [user['UserName'] for user in response['Users']]
+        if not response.get('IsTruncated'):
+            return
+        request['Marker'] = response['Marker']
+
+
+def fetch_user(iam_client: Any, user_id: str) -> Tuple[Dict[str, str], List[str]]:
+    """All tags and group names of one user"""
+    tags = {}
+    request = {'UserName': user_id}
+    while True:
+        response = iam_client.list_user_tags(**request)
+        tags.update({tag['Key']: tag['Value'] for tag in response['Tags']})
+        if not response.get('IsTruncated'):
+            break
+        request['Marker'] = response['Marker']
+
+    groups = []
+    request = {'UserName': user_id}
+    while True:
+        response = iam_client.list_groups_for_user(**request)
+        groups.extend(group['GroupName'] for group in response['Groups'])
+        if not response.get('IsTruncated'):
+            break
+        request['Marker'] = response['Marker']
+    return tags, groups
+
+
+def load_hashes(conn) -> Dict[str, str]:
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT user_id, tags_hash FROM {DIRECTORY_TABLE}")
+        return {row['user_id']: row['tags_hash'] for row in cursor.fetchall()}
+
+
+def write_rows(conn, rows: List[Dict[str, Any]], now: datetime) -> None:
+    with conn.cursor() as cursor:
+        cursor.executemany(f"""
+            INSERT INTO {DIRECTORY_TABLE} (user_id, team, person, email, `groups`, tags_hash, synced_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE team = VALUES(team), person = VALUES(person), email = VALUES(email),
+                `groups` = VALUES(`groups`), tags_hash = VALUES(tags_hash), synced_at = VALUES(synced_at)
+        """, [[row['user_id'], row['team'], row['person'], row['email'], json.dumps(row['groups']),
+               row['tags_hash'], now] for row in rows])
+
+
+def delete_users(conn, user_ids: List[str]) -> int:
+    deleted = 0
+    with conn.cursor() as cursor:
+        for start in range(0, len(user_ids), DELETE_CHUNK_SIZE):
+            chunk = user_ids[start:start + DELETE_CHUNK_SIZE]
+            cursor.execute(f"DELETE FROM {DIRECTORY_TABLE} WHERE user_id IN ({placeholders(chunk)})", chunk)
+            deleted += cursor.rowcount
+    return deleted
+
+
+def sync_user_directory(conn, iam_client: Any, now: datetime, page_size: int = DEFAULT_PAGE_SIZE,
+                        max_workers: int = DEFAULT_MAX_WORKERS, remove_missing: bool = True,
+                        dry_run: bool = False) -> Dict[str, Any]:
+    """Bring user_directory in line with IAM, writing only changed users"""
+    known = load_hashes(conn)
+    stats = {'users': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'failed': 0, 'pages': 0, 'dry_run': dry_run}
+    seen = set()
+
+    def lookup(user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return directory_row(user_id, *fetch_user(iam_client, user_id))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read tags of {user_id}, keeping its directory row: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for user_ids in iter_user_pages(iam_client, page_size):
+            stats['pages'] += 1
+            stats['users'] += len(user_ids)
+            seen.update(user_ids)
+            changed = []
+            for row in pool.map(lookup, user_ids):
+                if row is None:
+                    stats['failed'] += 1
+                elif known.get(row['user_id']) == row['tags_hash']:
+                    stats['unchanged'] += 1
+                else:
+                    changed.append(row)
+            stats['changed'] += len(changed)
+            if changed and not dry_run:
+                write_rows(conn, changed, now)
+
+    missing = sorted(set(known) - seen)
+    if remove_missing and missing:
+        stats['removed'] = len(missing) if dry_run else delete_users(conn, missing)
+
+    logger.info(f"📇 User directory sync: {stats['users']} users, {stats['changed']} changed, "
+                f"{stats['removed']} removed, {stats['failed']} failed")
+    return stats
+
+
+def load_directory(conn) -> Dict[str, Dict[str, Any]]:
+    """Whole user_directory keyed by user_id"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT user_id, team, person, email, `groups` FROM {DIRECTORY_TABLE}")
+        rows = cursor.fetchall()
+    directory = {}
+    for row in rows:
+        groups = row.get('groups')
+        row['groups'] = json.loads(groups) if isinstance(groups, (str, bytes)) else (groups or [])
+        directory[row['user_id']] = row
+    return directory
+
+
+class DirectorySnapshot:
+    """user_directory cached in memory, reloaded every `ttl_seconds`"""
+
+    def __init__(self, loader: Callable[[], Dict[str, Dict[str, Any]]],
+                 ttl_seconds: int = DEFAULT_SNAPSHOT_TTL_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._expires_at = 0.0
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        now = self.clock()
+        if self._entries is None or now >= self._expires_at:
+            try:
+                self._entries = self.loader()
+            except Exception as e:
+                # A stale snapshot is better than none; retry on the next TTL
+                logger.warning(f"⚠️ Could not reload user directory: {str(e)}")
+                if self._entries is None:
+                    self._entries = {}
+            self._expires_at = now + self.ttl_seconds
+        return self._entries
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self.entries().get(user_id)
+
+    def invalidate(self) -> None:
+        self._expires_at = 0.0
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Index Advisor for bedrock_requests
+Every secondary index of bedrock_requests is maintained on each insert, so
+indexes that no query reads only cost write throughput. Commands:
+
+    explain     replay the known query catalog with EXPLAIN and show the index
+                each query uses
+    unused      list indexes with no reads in
+                performance_schema.table_io_waits_summary_by_index_usage
+                (counters start at server boot, so run it after a full
+                business cycle), redundant left prefixes and indexes the
+                catalog does not need
+    migrate     print (or --execute) the ALTER TABLE that moves the live
+                table to MINIMAL_INDEXES
+    benchmark   insert synthetic rows into scratch copies of the table with
+                the current and the minimal index set and compare rows/s
+
+Connection settings come from DB_HOST, DB_PORT, DB_NAME, DB_USER and DB_PASSWORD.
+
+Examples:
+    python index_advisor.py explain
+    python index_advisor.py unused
+    python index_advisor.py benchmark --rows 20000
+    python index_advisor.py migrate --execute
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..', 'Lambda Functions', 'shared'))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..', 'Lambda Functions', 'bedrock-mysql-query-executor-aws-20250923'))
+
+from db_router import build_db_config, connect
+from usage_queries import day_range, usage_counts_query
+from report_catalog import REPORTS, build_report_query
+from query_stats import summarize_plan
+
+# Secondary indexes every known query is served by (see query_catalog()).
+# Keep Database/Tables/bedrock_requests.sql and
+# Database/Indexes/minimal_index_set.sql in sync with this set.
+MINIMAL_INDEXES: Dict[str, List[str]] = {
+    'idx_user_date': ['user_id', 'date_only'],
+    'idx_user_timestamp': ['user_id', 'request_timestamp'],
+    'idx_team_date_hour': ['team', 'date_only', 'hour_only'],
+    'idx_date_hour': ['date_only', 'hour_only'],
+    'idx_timestamp': ['request_timestamp']
+}
+
+INDEX_USAGE_SQL = """
+    SELECT INDEX_NAME AS index_name, COUNT_READ AS count_read, COUNT_WRITE AS count_write,
+           COUNT_FETCH AS count_fetch, COUNT_INSERT AS count_insert
+    FROM performance_schema.table_io_waits_summary_by_index_usage
+    WHERE OBJECT_SCHEMA = DATABASE() AND OBJECT_NAME = %s AND INDEX_NAME IS NOT NULL
+"""
+
+
+def query_catalog(today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """Queries run against bedrock_requests by the Lambdas, reports and dashboard"""
+    today = today or date.today()
+    catalog = []
+
+    query, params = usage_counts_query('sample_user', today)
+    catalog.append({'name': 'controller.usage_counts', 'query': query, 'params': params})
+
+    predicate, params = day_range('sample_user', today)
+    catalog.append({'name': 'usage.day_range', 'query': f"SELECT COUNT(*) FROM bedrock_requests WHERE {predicate}",
+                    'params': params})
+
+    # The dashboard's loaders run named reports too, so the reports cover its queries
+    report_params = {'month': today.strftime('%Y-%m'), 'date': today.isoformat(), 'user_id': 'sample_user',
+                     'start_date': (today - timedelta(days=6)).isoformat(), 'end_date': today.isoformat()}
+    for name in REPORTS:
+        query, params = build_report_query(name, report_params)
+        catalog.append({'name': f"report.{name}", 'query': query, 'params': params})
+
+    return catalog
+
+
+def current_indexes(connection, table: str = 'bedrock_requests') -> Dict[str, List[str]]:
+    """Secondary indexes of a table with their columns in order"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT INDEX_NAME AS index_name, COLUMN_NAME AS column_name
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME <> 'PRIMARY'
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """, [table])
+        rows = cursor.fetchall()
+
+    indexes: Dict[str, List[str]] = {}
+    for row in rows:
+        indexes.setdefault(row['index_name'], []).append(row['column_name'])
+    return indexes
+
+
+def index_usage(connection, table: str = 'bedrock_requests') -> Dict[str, Dict[str, int]]:
+    """Read and write counters per index from performance_schema"""
+    with connection.cursor() as cursor:
+        cursor.execute(INDEX_USAGE_SQL, [table])
+        return {row['index_name']: {key: int(value or 0) for key, value in row.items() if key != 'index_name'}
+                for row in cursor.fetchall()}
+
+
+def explain_catalog(connection, catalog: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """EXPLAIN every catalog query and summarize the access path on bedrock_requests"""
+    results = []
+    for entry in catalog:
+        result = {'name': entry['name'], 'indexes': [], 'access_types': None, 'rows_examined': None, 'error': None}
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN FORMAT=JSON {entry['query']}", entry['params'] or None)
+                plan = json.loads(list(cursor.fetchone().values())[0])
+            summary = summarize_plan(plan)
+            result['indexes'] = [index.split('.', 1)[1] for index in (summary['index_used'] or '').split(', ')
+                                 if index.startswith('bedrock_requests.') or index.startswith('br.')]
+            result['access_types'] = summary['access_types']
+            result['rows_examined'] = summary['rows_examined']
+        except Exception as e:
+            result['error'] = str(e)
+        results.append(result)
+    return results
+
+
+def redundant_indexes(indexes: Dict[str, List[str]]) -> Dict[str, str]:
+    """Indexes whose columns are a left prefix of (or equal to) another index -> that index"""
+    redundant = {}
+    for name, columns in sorted(indexes.items()):
+        for other, other_columns in sorted(indexes.items()):
+            if other == name or other in redundant:
+                continue
+            if len(columns) <= len(other_columns) and other_columns[:len(columns)] == columns:
+                redundant[name] = other
+                break
+    return redundant
+
+
+def advise(indexes: Dict[str, List[str]], usage: Dict[str, Dict[str, int]],
+           explained: List[Dict[str, Any]], minimal: Dict[str, List[str]] = MINIMAL_INDEXES) -> Dict[str, Any]:
+    """Combine live index usage, catalog plans and the minimal set into a drop/keep/add recommendation"""
+    used_by_catalog: Dict[str, List[str]] = {}
+    for result in explained:
+        for index in result['indexes']:
+            used_by_catalog.setdefault(index, []).append(result['name'])
+
+    unread = sorted(name for name in indexes if usage.get(name, {}).get('count_read', 0) == 0)
+    drop = sorted(name for name in indexes if name not in minimal)
+    return {
+        'unread': unread,
+        'redundant': redundant_indexes(indexes),
+        'used_by_catalog': used_by_catalog,
+        'drop': drop,
+        'add': sorted(name for name in minimal if indexes.get(name) != minimal[name]),
+        # Indexes the migration drops although the live workload or the catalog reads them
+        'drop_but_read': sorted(name for name in drop
+                                if usage.get(name, {}).get('count_read', 0) > 0 or name in used_by_catalog)
+    }
+
+
+def migration_statement(indexes: Dict[str, List[str]], table: str = 'bedrock_requests',
+                        minimal: Dict[str, List[str]] = MINIMAL_INDEXES) -> Optional[str]:
+    """One online ALTER TABLE moving the table's secondary indexes to the minimal set"""
+    clauses = []
+    for name in sorted(indexes):
+        if indexes[name] != minimal.get(name):
+            clauses.append(f"DROP INDEX {name}")
+    for name, columns in minimal.items():
+        if indexes.get(name) != columns:
+            clauses.append(f"ADD INDEX {name} ({', '.join(columns)})")
+    if not clauses:
+        return None
+    return f"ALTER TABLE {table}\n    " + ",\n    ".join(clauses + ['ALGORITHM=INPLACE', 'LOCK=NONE'])
+
+
+def synthetic_rows(count: int, start: datetime, seed: int = 7) -> List[Tuple[Any, ...]]:
+    """Request rows spread over 50 users, 5 teams and 4 models"""
+    generator = random.Random(seed)
+    rows = []
+    for number in range(count):
+        rows.append((
+            f"bench_user_{generator.randrange(50)}", f"team_{generator.randrange(5)}",
+            start + timedelta(seconds=number * 3), f"model_{generator.randrange(4)}",
+            generator.randrange(50, 4000), generator.randrange(10, 2000),
+            round(generator.random() / 10, 6)
+        ))
+    return rows
+
+
+def measure_inserts(connection, table: str, rows: List[Tuple[Any, ...]], batch_size: int) -> float:
+    """Insert rows in committed batches and return rows per second"""
+    started = time.perf_counter()
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(
+                f"INSERT INTO {table} (user_id, team, request_timestamp, model_id, input_tokens, output_tokens, cost_usd) "
+                f"VALUES (%s, %s, %s, %s, %s, %s, %s)", rows[offset:offset + batch_size])
+            connection.commit()
+    elapsed = time.perf_counter() - started
+    return len(rows) / elapsed if elapsed > 0 else float('inf')
+
+
+def benchmark(connection, table: str = 'bedrock_requests', row_count: int = 20000,
+              batch_size: int = 500) -> Dict[str, Any]:
+    """Compare insert throughput of the current and the minimal index set on scratch copies"""
+    rows = synthetic_rows(row_count, datetime.combine(date.today(), datetime.min.time()))
+    results = {}
+    for variant in ('current', 'minimal'):
+        scratch = f"{table}_bench_{variant}"
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {scratch}")
+            cursor.execute(f"CREATE TABLE {scratch} LIKE {table}")
+        try:
+            if variant == 'minimal':
+                statement = migration_statement(current_indexes(connection, scratch), scratch)
+                if statement:
+                    with connection.cursor() as cursor:
+                        cursor.execute(statement)
+            results[variant] = {
+                'indexes': len(current_indexes(connection, scratch)),
+                'rows_per_second': round(measure_inserts(connection, scratch, rows, batch_size), 1)
+            }
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {scratch}")
+
+    results['speedup'] = round(results['minimal']['rows_per_second'] / results['current']['rows_per_second'], 2)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Index usage advisor for bedrock_requests')
+    parser.add_argument('command', choices=['explain', 'unused', 'migrate', 'benchmark'])
+    parser.add_argument('--table', default='bedrock_requests')
+    parser.add_argument('--rows', type=int, default=20000, help='Rows inserted per benchmark variant')
+    parser.add_argument('--batch-size', type=int, default=500, help='Rows per committed benchmark batch')
+    parser.add_argument('--execute', action='store_true', help='Execute the migration instead of printing it')
+    return parser.parse_args()
+
+def main():
+    """Main execution function"""
+    args = parse_args()
+
+    print(f"🚀 Index advisor: {args.command}")
+    print(f"⏰ Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    if not os.environ.get('DB_HOST'):
+        print("❌ Error: DB_HOST environment variable is required")
+        sys.exit(1)
+
+    try:
+        connection = connect(build_db_config(), autocommit=args.command != 'benchmark')
+    except Exception as e:
+        print(f"❌ Database connection failed: {str(e)}")
+        sys.exit(1)
+
+    try:
+        if args.command == 'explain':
+            for result in explain_catalog(connection, query_catalog()):
+                if result['error']:
+                    print(f"⚠️ {result['name']}: {result['error']}")
+                else:
+                    print(f"📊 {result['name']}: {', '.join(result['indexes']) or 'NO INDEX'} "
+                          f"({result['access_types']}, ~{result['rows_examined']} rows)")
+
+        elif args.command == 'unused':
+            indexes = current_indexes(connection, args.table)
+            advice = advise(indexes, index_usage(connection, args.table),
+                            explain_catalog(connection, query_catalog()))
+            print(f"\n📇 {len(indexes)} secondary indexes on {args.table}")
+            print(f"💤 No reads since server start: {', '.join(advice['unread']) or 'none'}")
+            for name, other in advice['redundant'].items():
+                print(f"♻️ {name} is a left prefix of {other}")
+            for name, users in sorted(advice['used_by_catalog'].items()):
+                print(f"✅ {name} used by {', '.join(users)}")
+            print(f"🗑️ Not in the minimal set: {', '.join(advice['drop']) or 'none'}")
+            if advice['drop_but_read']:
+                print(f"⚠️ Still read, check before dropping: {', '.join(advice['drop_but_read'])}")
+
+        elif args.command == 'migrate':
+            statement = migration_statement(current_indexes(connection, args.table), args.table)
+            if not statement:
+                print("✅ Table already has the minimal index set")
+            elif args.execute:
+                print(f"🔧 Executing:\n{statement};")
+                with connection.cursor() as cursor:
+                    cursor.execute(statement)
+                print("✅ Migration applied")
+            else:
+                print(f"\n📝 Migration:\n{statement};\n")
+                print("ℹ️ Dry run only, re-run with --execute to apply")
+
+        else:
+            results = benchmark(connection, args.table, args.rows, args.batch_size)
+            for variant in ('current', 'minimal'):
+                print(f"⏱️ {variant}: {results[variant]['indexes']} indexes, "
+                      f"{results[variant]['rows_per_second']} rows/s")
+            print(f"🚀 Insert speedup with the minimal set: x{results['speedup']}")
+    except Exception as e:
+        print(f"❌ Index advisor failed: {str(e)}")
+        sys.exit(1)
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    main()
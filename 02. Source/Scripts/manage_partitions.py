@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Partition Maintenance Script
+Creates monthly bedrock_requests partitions ahead of time and detaches or
+drops partitions past the retention window. Dry run by default: the DDL is
+printed and only executed with --execute.
+
+Splitting a p_future that already holds rows copies them and blocks inserts,
+so it is refused unless --allow-populated-future is given; run that catch-up
+once in a maintenance window.
+
+Connection settings come from DB_HOST, DB_PORT, DB_NAME, DB_USER and DB_PASSWORD.
+
+Examples:
+    python manage_partitions.py --months-ahead 3
+    python manage_partitions.py --retention-months 13 --retention-action detach --execute
+    python manage_partitions.py --allow-populated-future --execute
+"""
+
+import argparse
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Lambda Functions', 'shared'))
+
+from db_router import build_db_config, connect
+from partition_manager import run_partition_maintenance
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Monthly partition maintenance for bedrock_requests')
+    parser.add_argument('--table', default='bedrock_requests')
+    parser.add_argument('--months-ahead', type=int, default=3,
+                        help='Create partitions up to this many months after the current one')
+    parser.add_argument('--retention-months', type=int, default=None,
+                        help='Detach/drop partitions older than this many months (default: keep all)')
+    parser.add_argument('--retention-action', choices=['detach', 'drop'], default='detach')
+    parser.add_argument('--today', type=date.fromisoformat, default=None,
+                        help='Reference date (YYYY-MM-DD), defaults to today')
+    parser.add_argument('--allow-populated-future', action='store_true',
+                        help='Split p_future even when it holds rows (copies them, blocks inserts)')
+    parser.add_argument('--execute', action='store_true', help='Execute the DDL instead of printing it')
+    return parser.parse_args()
+
+def main():
+    """Main execution function"""
+    args = parse_args()
+    
+    print("🚀 Starting partition maintenance...")
+    print(f"⏰ Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"🧪 Mode: {'EXECUTE' if args.execute else 'DRY RUN'}")
+    
+    if not os.environ.get('DB_HOST'):
+        print("❌ Error: DB_HOST environment variable is required")
+        sys.exit(1)
+    
+    try:
+        connection = connect(build_db_config())
+    except Exception as e:
+        print(f"❌ Database connection failed: {str(e)}")
+        sys.exit(1)
+    
+    try:
+        plan = run_partition_maintenance(
+            connection,
+            today=args.today,
+            table=args.table,
+            months_ahead=args.months_ahead,
+            retention_months=args.retention_months,
+            retention_action=args.retention_action,
+            dry_run=not args.execute,
+            allow_populated_future=args.allow_populated_future
+        )
+    except Exception as e:
+        print(f"❌ Partition maintenance failed: {str(e)}")
+        sys.exit(1)
+    finally:
+        connection.close()
+    
+    print(f"\n➕ Partitions to add: {', '.join(plan['added_partitions']) or 'none'}")
+    print(f"🗄️ Expired partitions: {', '.join(plan['expired_partitions']) or 'none'}")
+    if plan['archive_tables']:
+        print(f"📦 Archive tables: {', '.join(plan['archive_tables'])}")
+    
+    print(f"\n📝 DDL ({len(plan['statements'])} statements):")
+    for statement in plan['statements']:
+        print(f"{statement};\n")
+    
+    if args.execute:
+        print(f"✅ Executed {plan['executed']} statements")
+    else:
+        print("ℹ️ Dry run only, re-run with --execute to apply")
+
+if __name__ == "__main__":
+    main()
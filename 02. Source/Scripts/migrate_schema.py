@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Online Schema Migration Script
+Applies the versioned migrations in Database/Migrations without stopping
+request logging: ALTER TABLE runs with the cheapest online algorithm MySQL
+accepts (INSTANT, then INPLACE), backfills run in resumable id chunks and
+pause while bedrock_requests inserts are slow. See Database/Migrations/README.md.
+
+Commands:
+    status    applied, running (with backfill progress) and pending migrations
+    apply     print the plan, or apply it with --execute; rerun to resume a
+              paused or interrupted migration
+
+Connection settings come from DB_HOST, DB_PORT, DB_NAME, DB_USER and DB_PASSWORD.
+
+Examples:
+    python migrate_schema.py status
+    python migrate_schema.py apply
+    python migrate_schema.py apply --execute --chunk-size 2000 --max-ingest-latency-ms 30
+"""
+
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Lambda Functions', 'shared'))
+
+from db_router import build_db_config, connect
+from schema_migrator import MigrationRunner, load_migrations
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Database', 'Migrations')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Online, resumable schema migrations')
+    parser.add_argument('command', choices=['status', 'apply'])
+    parser.add_argument('--migrations-dir', default=MIGRATIONS_DIR)
+    parser.add_argument('--target', type=int, default=None, help='Apply migrations up to this version')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per backfill chunk (id range)')
+    parser.add_argument('--sleep', type=float, default=0.1, help='Seconds between backfill chunks')
+    parser.add_argument('--max-ingest-latency-ms', type=float, default=50.0,
+                        help='Back off while average bedrock_requests insert latency is above this')
+    parser.add_argument('--allow-copy', action='store_true',
+                        help='Allow ALTER TABLE with ALGORITHM=COPY (blocks writes, maintenance window only)')
+    parser.add_argument('--execute', action='store_true', help='Apply the migrations instead of printing the plan')
+    return parser.parse_args()
+
+def print_status(runner: MigrationRunner, migrations_dir: str):
+    recorded = runner.recorded()
+    for migration in load_migrations(migrations_dir):
+        row = recorded.get(migration['version'])
+        label = f"V{migration['version']:03d} {migration['name']}"
+        if not row:
+            print(f"⏳ {label}: pending")
+            continue
+        changed = ' (file changed since!)' if row['checksum'] != migration['checksum'] else ''
+        print(f"{'✅' if row['status'] == 'applied' else '🔄'} {label}: {row['status']}{changed}")
+        if row['status'] == 'running':
+            for index, state in sorted(runner.progress(migration['version']).items()):
+                detail = 'done' if state['done'] else f"id {state['last_id']}/{state['max_id']}"
+                print(f"   statement {index}: {detail}, {state['rows_affected']} rows")
+
+def main():
+    """Main execution function"""
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    print(f"🚀 Schema migrations: {args.command}")
+    print(f"⏰ Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    if not os.environ.get('DB_HOST'):
+        print("❌ Error: DB_HOST environment variable is required")
+        sys.exit(1)
+
+    try:
+        connection = connect(build_db_config(), autocommit=False)
+    except Exception as e:
+        print(f"❌ Database connection failed: {str(e)}")
+        sys.exit(1)
+
+    runner = MigrationRunner(
+        connection, args.migrations_dir,
+        chunk_size=args.chunk_size,
+        sleep_seconds=args.sleep,
+        max_ingest_latency_ms=args.max_ingest_latency_ms,
+        allow_copy=args.allow_copy,
+        dry_run=not args.execute
+    )
+
+    try:
+        if args.command == 'status':
+            print_status(runner, args.migrations_dir)
+            return
+
+        result = runner.run(args.target)
+        if not args.execute:
+            if not result['plan']:
+                print("✅ No pending migrations")
+            for migration in result['plan']:
+                print(f"\n📝 V{migration['version']:03d} {migration['name']}"
+                      f"{' (resuming)' if migration['resuming'] else ''}")
+                for step in migration['steps']:
+                    print(f"-- {step['kind']}" + (' (first accepted of)' if len(step['attempts']) > 1 else ''))
+                    for attempt in step['attempts']:
+                        print(f"{attempt};")
+            print("\nℹ️ Dry run only, re-run with --execute to apply")
+            return
+
+        for migration in result['migrations']:
+            print(f"{'✅' if migration['status'] == 'applied' else '⏸️'} V{migration['version']:03d} "
+                  f"{migration['name']}: {migration['status']}")
+        if any(migration['status'] == 'paused' for migration in result['migrations']):
+            print("ℹ️ Paused on ingest latency, re-run later to resume")
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        sys.exit(1)
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ This Lambda function manages IAM policies for user blocking/unblocking by:
 3. Unblocking users during daily reset or manual intervention
 4. Maintaining audit trail of all policy modifications
 5. Sending enhanced email notifications for admin scenarios
+6. Bulk DynamoDB status updates for mass operations (action "bulk_update_status")
 
 Enhanced with comprehensive email delivery functionality for:
 - Admin blocking emails (manual admin block)
@@ -21,8 +22,9 @@ Version: 2.0.0
 import json
 import boto3
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import os
 
 # Import the enhanced email service
@@ -47,6 +49,11 @@ SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', f'arn:aws:sns:{REGION}:{ACCOUNT_
 # Email configuration
 EMAIL_NOTIFICATIONS_ENABLED = os.environ.get('EMAIL_NOTIFICATIONS_ENABLED', 'true').lower() == 'true'
 
+# Daily limit of a usage record created by a status change
+DEFAULT_DAILY_LIMIT = 250
+# Concurrent update_item calls of a bulk status change
+BULK_UPDATE_WORKERS = int(os.environ.get('BULK_UPDATE_WORKERS', '16'))
+
 # Policy configuration
 BEDROCK_POLICY_SUFFIX = "_BedrockPolicy"
 DENY_STATEMENT_SID = "DailyLimitBlock"
@@ -75,6 +82,20 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
         logger.info(f"Processing policy management event: {json.dumps(event, default=str)}")
         
+        # Mass status changes carry a list of users instead of a user_id
+        if event.get('action') == 'bulk_update_status':
+            updates = event.get('updates')
+            if not isinstance(updates, list) or not all(isinstance(update, dict) and update.get('user_id')
+                                                        and update.get('status') for update in updates):
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'updates must be a list of {user_id, status} objects'})
+                }
+            return {
+                'statusCode': 200,
+                'body': json.dumps(update_users_block_status(updates))
+            }
+        
         # Validate required parameters
         if 'action' not in event or 'user_id' not in event:
             logger.error("Missing required parameters: action and user_id")
@@ -554,10 +575,79 @@ def is_user_blocked(policy: Dict[str, Any]) -> bool:
             return True
     return False
 
+def build_status_attributes(status: str, reason: str, expires_at: str = None) -> Dict[str, Any]:
+    """
+    Attributes written for a status change
+    
+    Args:
+        status: New status (ACTIVE, BLOCKED)
+        reason: Reason for status change
+        expires_at: When the block expires (optional)
+        
+    Returns:
+        Dict of attribute name to value
+    """
+    now = datetime.utcnow().isoformat()
+    attributes = {
+        'status': status,
+        'last_status_change': now,
+        'last_status_reason': reason
+    }
+    
+    # Add specific timestamps based on status
+    if status == 'BLOCKED':
+        attributes['blocked_at'] = now + 'Z'
+        attributes['expires_at'] = expires_at if expires_at else 'Indefinite'
+    elif status == 'ACTIVE':
+        attributes['unblocked_at'] = now + 'Z'
+        # Clear expiration when unblocking
+        attributes['expires_at'] = None
+    
+    return attributes
+
+def apply_status_update(user_id: str, day: str, attributes: Dict[str, Any]) -> bool:
+    """
+    Write status attributes to a user's record with one update_item
+    
+    if_not_exists() only fills the usage counters of a new record, so a
+    concurrent request counter update is never overwritten.
+    
+    Args:
+        user_id: The user ID
+        day: Date of the record (YYYY-MM-DD)
+        attributes: Attributes from build_status_attributes
+        
+    Returns:
+        True if the update created the record
+    """
+    table = dynamodb.Table(TABLE_NAME)
+    names = {f'#a{index}': name for index, name in enumerate(attributes)}
+    values = {f':v{index}': value for index, value in enumerate(attributes.values())}
+    assignments = [f'#a{index} = :v{index}' for index in range(len(attributes))]
+    
+    # Defaults for a record created by this update
+    names.update({'#request_count': 'request_count', '#daily_limit': 'daily_limit'})
+    values.update({':zero': 0, ':default_limit': DEFAULT_DAILY_LIMIT})
+    assignments += ['#request_count = if_not_exists(#request_count, :zero)',
+                    '#daily_limit = if_not_exists(#daily_limit, :default_limit)']
+    
+    response = table.update_item(
+        Key={'user_id': user_id, 'date': day},
+        UpdateExpression='SET ' + ', '.join(assignments),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        ReturnValues='UPDATED_OLD'
+    )
+    # A record that existed always had request_count, which the update touches
+    return 'Attributes' not in response
+
 def update_user_block_status(user_id: str, status: str, reason: str, expires_at: str = None) -> None:
     """
     Update user block status in DynamoDB
     
+    A single update_item creates the day's record or updates it in place
+    (see apply_status_update).
+    
     Args:
         user_id: The user ID
         status: New status (ACTIVE, BLOCKED)
@@ -565,79 +655,50 @@ def update_user_block_status(user_id: str, status: str, reason: str, expires_at:
         expires_at: When the block expires (optional)
     """
     try:
-        table = dynamodb.Table(TABLE_NAME)
-        today = date.today().isoformat()
-        
-        # First try to get the item to see if it exists
-        try:
-            response = table.get_item(Key={'user_id': user_id, 'date': today})
-            item_exists = 'Item' in response
-        except Exception:
-            item_exists = False
-        
-        if not item_exists:
-            # Create new item if it doesn't exist
-            item = {
-                'user_id': user_id,
-                'date': today,
-                'status': status,
-                'last_status_change': datetime.utcnow().isoformat(),
-                'last_status_reason': reason,
-                'request_count': 0,
-                'daily_limit': 250  # Default limit
-            }
-            
-            # Add specific timestamps based on status
-            if status == 'BLOCKED':
-                item['blocked_at'] = datetime.utcnow().isoformat() + 'Z'
-                item['expires_at'] = expires_at if expires_at else 'Indefinite'
-            elif status == 'ACTIVE':
-                item['unblocked_at'] = datetime.utcnow().isoformat() + 'Z'
-                item['expires_at'] = None
-            
-            table.put_item(Item=item)
-            logger.info(f"Created new DynamoDB record for {user_id} with status {status}")
-        else:
-            # Update existing item
-            update_expression = 'SET #status = :status, last_status_change = :now, last_status_reason = :reason'
-            expression_values = {
-                ':status': status,
-                ':now': datetime.utcnow().isoformat(),
-                ':reason': reason
-            }
-            
-            # Add specific timestamps based on status
-            if status == 'BLOCKED':
-                update_expression += ', blocked_at = :blocked_at'
-                expression_values[':blocked_at'] = datetime.utcnow().isoformat() + 'Z'
-                
-                # Add expiration date if provided
-                if expires_at:
-                    update_expression += ', expires_at = :expires_at'
-                    expression_values[':expires_at'] = expires_at
-                else:
-                    update_expression += ', expires_at = :expires_at'
-                    expression_values[':expires_at'] = 'Indefinite'
-                    
-            elif status == 'ACTIVE':
-                update_expression += ', unblocked_at = :unblocked_at'
-                expression_values[':unblocked_at'] = datetime.utcnow().isoformat() + 'Z'
-                # Clear expiration when unblocking
-                update_expression += ', expires_at = :expires_at'
-                expression_values[':expires_at'] = None
-            
-            table.update_item(
-                Key={'user_id': user_id, 'date': today},
-                UpdateExpression=update_expression,
-                ExpressionAttributeNames={'#status': 'status'},
-                ExpressionAttributeValues=expression_values
-            )
-            logger.info(f"Updated DynamoDB status for {user_id} to {status} (expires: {expires_at})")
+        apply_status_update(user_id, date.today().isoformat(), build_status_attributes(status, reason, expires_at))
+        logger.info(f"Updated DynamoDB status for {user_id} to {status} (expires: {expires_at})")
         
     except Exception as e:
         logger.error(f"Error updating DynamoDB status for {user_id}: {str(e)}")
         # Don't raise exception as this is not critical for the blocking operation
 
+def update_users_block_status(updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Update the status of many users concurrently
+    
+    Each user gets the same update_item as a single status change, run on a
+    pool of BULK_UPDATE_WORKERS threads. BatchWriteItem would save round
+    trips but only supports whole-item puts: the read-modify-write would lose
+    request counter increments made between the read and the put.
+    
+    Args:
+        updates: List of {'user_id', 'status', 'reason', 'expires_at' (optional)}
+        
+    Returns:
+        Dict with the number of records updated, created and failed
+    """
+    today = date.today().isoformat()
+    
+    # Last update of a user wins, as it would with sequential update_item calls
+    pending = {update['user_id']: update for update in updates}
+    
+    def run(update: Dict[str, Any]) -> Optional[bool]:
+        try:
+            return apply_status_update(update['user_id'], today, build_status_attributes(
+                update['status'], update.get('reason', 'unspecified'), update.get('expires_at')))
+        except Exception as e:
+            logger.error(f"Error updating DynamoDB status for {update['user_id']}: {str(e)}")
+            return None
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(BULK_UPDATE_WORKERS, len(pending)))) as pool:
+        outcomes = list(pool.map(run, pending.values()))
+    
+    failed = sum(1 for outcome in outcomes if outcome is None)
+    created = sum(1 for outcome in outcomes if outcome)
+    logger.info(f"Bulk updated DynamoDB status for {len(pending) - failed} users ({created} new records, "
+                f"{failed} failed)")
+    return {'updated': len(pending) - failed, 'created': created, 'failed': failed}
+
 def send_block_notification(user_id: str, reason: str, usage_record: Dict[str, Any], performed_by: str) -> None:
     """
     Send notification when user is blocked (including enhanced email for all block types)
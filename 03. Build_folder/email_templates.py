@@ -0,0 +1,521 @@
+"""
+Precompiled email templates for the Bedrock notification service
+
+The HTML and text bodies used to be f-strings inside the
+_generate_*_email_* methods, so every message rebuilt several kilobytes of
+markup. Each template is now parsed once at import (container start) into
+literal chunks and field names; rendering only joins the chunks with the
+field values. The output of identical payloads is cached, so a batch of
+notifications with the same values renders once.
+
+Templates use str.format syntax: {field} is substituted and {{ }} is a
+literal brace (CSS rules).
+"""
+
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Dict, List, Tuple
+
+RENDER_CACHE_SIZE = 512
+
+
+class CompiledTemplate:
+    """Template parsed into alternating literal chunks and field names"""
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.literals: List[str] = []
+        self.fields: List[str] = []
+        pending = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            pending.append(literal)
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                raise ValueError(f"Template {name}: only plain {{field}} placeholders are supported, got {{{field}}}")
+            self.literals.append(''.join(pending))
+            self.fields.append(field)
+            pending = []
+        self.literals.append(''.join(pending))
+        self.key_fields: Tuple[str, ...] = tuple(sorted(set(self.fields)))
+
+    def render(self, values: Dict[str, Any]) -> str:
+        parts = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            try:
+                parts.append(str(values[field]))
+            except KeyError:
+                raise KeyError(f"Template {self.name} is missing field '{field}'") from None
+            parts.append(literal)
+        return ''.join(parts)
+
+
+WARNING_HTML = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>Aviso de Uso de Bedrock</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; margin: 0; padding: 0; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f9f9f9; }}
+                .header {{ background-color: #F4B860; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
+                .content {{ background-color: white; padding: 20px; border-radius: 0 0 5px 5px; }}
+                .usage-bar {{ background-color: #EFE6D5; height: 20px; border-radius: 10px; margin: 10px 0; }}
+                .usage-fill {{ background-color: #F4B860; height: 100%; border-radius: 10px; transition: width 0.3s ease; }}
+                .stats {{ display: flex; justify-content: space-between; margin: 20px 0; }}
+                .stat {{ text-align: center; }}
+                .stat-value {{ font-size: 24px; font-weight: bold; color: #F4B860; }}
+                .stat-label {{ font-size: 12px; color: #666; }}
+                .footer {{ margin-top: 20px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Aviso de Uso de Bedrock</h1>
+                    <p>Te estás acercando a tu límite diario</p>
+                </div>
+                <div class="content">
+                    <p>Hola <strong>{display_name}</strong>,</p>
+                    
+                    <p>Este es un aviso de que te estás acercando a tu límite diario de uso de AWS Bedrock.</p>
+                    
+                    <div class="usage-bar">
+                        <div class="usage-fill" style="width: {percentage}%;"></div>
+                    </div>
+                    
+                    <div class="stats">
+                        <div class="stat">
+                            <div class="stat-value">{current_usage}</div>
+                            <div class="stat-label">Solicitudes Usadas</div>
+                        </div>
+                        <div class="stat">
+                            <div class="stat-value">{remaining}</div>
+                            <div class="stat-label">Restantes</div>
+                        </div>
+                        <div class="stat">
+                            <div class="stat-value">{daily_limit}</div>
+                            <div class="stat-label">Límite Diario</div>
+                        </div>
+                    </div>
+                    
+                    <p><strong>Estado Actual:</strong></p>
+                    <ul>
+                        <li>Uso: {current_usage} de {daily_limit} solicitudes ({percentage}%)</li>
+                        <li>Equipo: {team}</li>
+                        <li>Umbral de aviso: 40 solicitudes</li>
+                        <li>Solicitudes restantes: {remaining}</li>
+                    </ul>
+                    
+                    <p><strong>¿Qué sucede después?</strong></p>
+                    <p>Si excedes tu límite diario de {daily_limit} solicitudes, tu acceso a AWS Bedrock será bloqueado temporalmente. El bloqueo expirará automáticamente y tu acceso será restaurado a las 00h de mañana.</p>
+                    
+                    <p>Por favor, regula el uso de este servicio para evitar interrupciones en tu trabajo.</p>
+                </div>
+                <div class="footer">
+                    <p>Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.</p>
+                    <p>Enviado desde: {sender}</p>
+                    <p>Fecha y hora: {sent_at}</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+WARNING_TEXT = """
+AVISO DE USO DE BEDROCK
+
+Hola {display_name},
+
+Este es un aviso de que te estás acercando a tu límite diario de uso de AWS Bedrock.
+
+ESTADO ACTUAL:
+- Uso: {current_usage} de {daily_limit} solicitudes ({percentage}%)
+- Equipo: {team}
+- Solicitudes restantes: {remaining}
+
+¿QUÉ SUCEDE DESPUÉS?
+Si excedes tu límite diario de {daily_limit} solicitudes, tu acceso a AWS Bedrock será bloqueado temporalmente. El bloqueo expirará automáticamente y tu acceso será restaurado a las 00h de mañana.
+
+Por favor, regula el uso de este servicio para evitar interrupciones en tu trabajo.
+
+---
+Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.
+Enviado desde: {sender}
+Fecha y hora: {sent_at}
+        """
+
+BLOCKING_HTML = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>Acceso a Bedrock Bloqueado</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; margin: 0; padding: 0; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f9f9f9; }}
+                .header {{ background-color: #EC7266; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
+                .content {{ background-color: white; padding: 20px; border-radius: 0 0 5px 5px; }}
+                .alert-box {{ background-color: #ffebee; border-left: 4px solid #EC7266; padding: 15px; margin: 20px 0; }}
+                .stats {{ display: flex; justify-content: space-between; margin: 20px 0; }}
+                .stat {{ text-align: center; }}
+                .stat-value {{ font-size: 24px; font-weight: bold; color: #EC7266; }}
+                .stat-label {{ font-size: 12px; color: #666; }}
+                .footer {{ margin-top: 20px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Acceso a Bedrock Bloqueado</h1>
+                    <p>Límite diario excedido</p>
+                </div>
+                <div class="content">
+                    <p>Hola <strong>{display_name}</strong>,</p>
+                    
+                    <div class="alert-box">
+                        <strong>Tu acceso a AWS Bedrock ha sido bloqueado temporalmente.</strong><br>
+                        Has excedido tu límite diario de uso y no puedes realizar solicitudes adicionales hasta que expire dicho bloqueo.
+                    </div>
+                    
+                    <div class="stats">
+                        <div class="stat">
+                            <div class="stat-value">{current_usage}</div>
+                            <div class="stat-label">Solicitudes Usadas</div>
+                        </div>
+                        <div class="stat">
+                            <div class="stat-value">{daily_limit}</div>
+                            <div class="stat-label">Límite Diario</div>
+                        </div>
+                        <div class="stat">
+                            <div class="stat-value">0</div>
+                            <div class="stat-label">Restantes</div>
+                        </div>
+                    </div>
+                    
+                    <p><strong>Detalles del Bloqueo:</strong></p>
+                    <ul>
+                        <li>Razón: Límite diario excedido ({current_usage}/{daily_limit} solicitudes)</li>
+                        <li>Equipo: {team}</li>
+                        <li>El bloqueo expira: 2025-09-17 a las 00:00:00 CET</li>
+                    </ul>
+                    
+                    <p><strong>¿Qué sucede después?</strong></p>
+                    <p>Tu acceso será restaurado automáticamente cuando expire el bloqueo. No necesitas realizar ninguna acción adicional.</p>
+                    
+                    <p><strong>¿Necesitas acceso inmediato?</strong></p>
+                    <p>Si tienes una necesidad urgente de negocio, por favor contacta a tu administrador de AWS quien podrá restaurar tu acceso manualmente.</p>
+                </div>
+                <div class="footer">
+                    <p>Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.</p>
+                    <p>Enviado desde: {sender}</p>
+                    <p>Fecha y hora: {sent_at}</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+BLOCKING_TEXT = """
+ACCESO A BEDROCK BLOQUEADO
+
+Hola {display_name},
+
+Tu acceso a AWS Bedrock ha sido bloqueado temporalmente.
+Has excedido tu límite diario de uso y no puedes realizar solicitudes adicionales hasta que expire dicho bloqueo.
+
+DETALLES DEL BLOQUEO:
+- Razón: Límite diario excedido ({current_usage}/{daily_limit} solicitudes)
+- Equipo: {team}
+- El bloqueo expira: 2025-09-17 a las 00:00:00 CET
+- Duración del bloqueo: 24 horas
+
+¿QUÉ SUCEDE DESPUÉS?
+Tu acceso será restaurado automáticamente cuando expire el bloqueo. No necesitas realizar ninguna acción adicional.
+
+¿NECESITAS ACCESO INMEDIATO?
+Si tienes una necesidad urgente de negocio, por favor contacta a tu administrador de AWS quien podrá restaurar tu acceso manualmente.
+
+---
+Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.
+Enviado desde: {sender}
+Fecha y hora: {sent_at}
+        """
+
+UNBLOCKING_HTML = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>Acceso a Bedrock Restaurado</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; margin: 0; padding: 0; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f9f9f9; }}
+                .header {{ background-color: #9CD286; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
+                .content {{ background-color: white; padding: 20px; border-radius: 0 0 5px 5px; }}
+                .success-box {{ background-color: #E8F5E8; border-left: 4px solid #9CD286; padding: 15px; margin: 20px 0; }}
+                .footer {{ margin-top: 20px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Acceso a Bedrock Restaurado</h1>
+                    <p>Ya puedes usar Bedrock nuevamente</p>
+                </div>
+                <div class="content">
+                    <p>Hola <strong>{user_id}</strong>,</p>
+                    
+                    <div class="success-box">
+                        <strong>¡Buenas noticias!</strong> Tu acceso a AWS Bedrock ha sido restaurado.<br>
+                        {reason_text}.
+                    </div>
+                    
+                    <p><strong>Esto significa que:</strong></p>
+                    <ul>
+                        <li>Ya puedes realizar llamadas a la API de AWS Bedrock nuevamente</li>
+                        <li>Tu contador de uso diario ha sido reiniciado</li>
+                        <li>Se aplican los límites de uso normales</li>
+                    </ul>
+                    
+                    <p><strong>De aquí en adelante:</strong></p>
+                    <p>Por favor, regula el uso de este servicio para evitar futuros bloqueos. Recibirás un aviso cuando te acerques a tu límite diario.</p>
+                    
+                    <p>¡Gracias por tu colaboración!</p>
+                </div>
+                <div class="footer">
+                    <p>Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.</p>
+                    <p>Enviado desde: {sender}</p>
+                    <p>Fecha y hora: {sent_at}</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+UNBLOCKING_TEXT = """
+ACCESO A BEDROCK RESTAURADO
+
+Hola {user_id},
+
+¡Buenas noticias! Tu acceso a AWS Bedrock ha sido restaurado.
+{reason_text}.
+
+ESTO SIGNIFICA QUE:
+- Ya puedes realizar llamadas a la API de AWS Bedrock nuevamente
+- Tu contador de uso diario ha sido reiniciado
+- Se aplican los límites de uso normales
+
+DE AQUÍ EN ADELANTE:
+Por favor, regula el uso de este servicio para evitar futuros bloqueos. Recibirás un aviso cuando te acerques a tu límite diario.
+
+¡Gracias por tu colaboración!
+
+---
+Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.
+Enviado desde: {sender}
+Fecha y hora: {sent_at}
+        """
+
+ADMIN_BLOCKING_HTML = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>Acceso a Bedrock Bloqueado por Administrador</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; margin: 0; padding: 0; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f9f9f9; }}
+                .header {{ background-color: #EC7266; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
+                .content {{ background-color: white; padding: 20px; border-radius: 0 0 5px 5px; }}
+                .alert-box {{ background-color: #ffebee; border-left: 4px solid #EC7266; padding: 15px; margin: 20px 0; }}
+                .footer {{ margin-top: 20px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Acceso a Bedrock Bloqueado</h1>
+                    <p>Bloqueado por Administrador</p>
+                </div>
+                <div class="content">
+                    <p>Hola <strong>{display_name}</strong>,</p>
+                    
+                    <div class="alert-box">
+                        <strong>Tu acceso a AWS Bedrock ha sido bloqueado por un administrador.</strong><br>
+                        Un administrador de AWS ha bloqueado tu cuenta intencionalmente.
+                    </div>
+                    
+                    <p><strong>Detalles del Bloqueo:</strong></p>
+                    <ul>
+                        <li>Razón: {reason}</li>
+                        <li>Bloqueado por: {admin_user}</li>
+                        <li>Fecha del bloqueo: {blocked_at}</li>
+                        <li>Fecha prevista de desbloqueo: {expiration_text}</li>
+                    </ul>
+                    
+                    <p><strong>¿Qué sucede después?</strong></p>
+                    <p>Tu acceso permanecerá bloqueado hasta que un administrador lo restaure manualmente. Este bloqueo no se restaurará automáticamente.</p>
+                    
+                    <p><strong>¿Necesitas más información?</strong></p>
+                    <p>Si tienes preguntas sobre este bloqueo, por favor contacta a tu administrador de AWS.</p>
+                </div>
+                <div class="footer">
+                    <p>Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.</p>
+                    <p>Enviado desde: {sender}</p>
+                    <p>Fecha y hora: {sent_at}</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+ADMIN_BLOCKING_TEXT = """
+ACCESO A BEDROCK BLOQUEADO POR ADMINISTRADOR
+
+Hola {display_name},
+
+Tu acceso a AWS Bedrock ha sido bloqueado por un administrador.
+Un administrador de AWS ha bloqueado tu cuenta intencionalmente o manualmente.
+
+DETALLES DEL BLOQUEO:
+- Razón: {reason}
+- Bloqueado por: {admin_user}
+- Fecha del bloqueo: {blocked_at}
+- Fecha prevista de desbloqueo: {expiration_text}
+
+¿QUÉ SUCEDE DESPUÉS?
+Tu acceso permanecerá bloqueado hasta que un administrador lo restaure manualmente. Este bloqueo no se restaurará automáticamente con el reinicio diario.
+
+¿NECESITAS MÁS INFORMACIÓN?
+Si tienes preguntas sobre este bloqueo, por favor contacta a tu administrador de AWS o al equipo de soporte técnico.
+
+---
+Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.
+Enviado desde: {sender}
+Fecha y hora: {sent_at}
+        """
+
+ADMIN_UNBLOCKING_HTML = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>Acceso a Bedrock Restaurado por Administrador</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; margin: 0; padding: 0; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f9f9f9; }}
+                .header {{ background-color: #9CD286; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
+                .content {{ background-color: white; padding: 20px; border-radius: 0 0 5px 5px; }}
+                .success-box {{ background-color: #E8F5E8; border-left: 4px solid #9CD286; padding: 15px; margin: 20px 0; }}
+                .footer {{ margin-top: 20px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Acceso a Bedrock Restaurado</h1>
+                    <p>Restaurado por Administrador</p>
+                </div>
+                <div class="content">
+                    <p>Hola <strong>{user_id}</strong>,</p>
+                    
+                    <div class="success-box">
+                        <strong>¡Buenas noticias!</strong> Tu acceso a AWS Bedrock ha sido restaurado por un administrador.<br>
+                        Un administrador ha desbloqueado tu cuenta manualmente, después de alcanzar el límite diario (tienes protección administrativa).
+                    </div>
+                    
+                    <p><strong>Detalles de la Restauración:</strong></p>
+                    <ul>
+                        <li>Restaurado por: {admin_user}</li>
+                        <li>Fecha de restauración: {sent_at}</li>
+                        <li>Tipo: Desbloqueo administrativo manual</li>
+                        <li>Protección: Tienes protección administrativa hasta mañana</li>
+                    </ul>
+                    
+                    <p><strong>Esto significa que:</strong></p>
+                    <ul>
+                        <li>Ya puedes realizar llamadas a la API de AWS Bedrock nuevamente</li>
+                        <li>Tienes protección administrativa contra bloqueos automáticos hasta mañana</li>
+                        <li>Tu contador de uso diario se reiniciará normalmente mañana</li>
+                    </ul>
+                    
+                    <p><strong>De aquí en adelante:</strong></p>
+                    <p>Aunque tienes protección administrativa temporal, por favor regula el uso de este servicio responsablemente.</p>
+                    
+                    <p>¡Gracias por tu colaboración!</p>
+                </div>
+                <div class="footer">
+                    <p>Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.</p>
+                    <p>Enviado desde: {sender}</p>
+                    <p>Fecha y hora: {sent_at}</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+ADMIN_UNBLOCKING_TEXT = """
+ACCESO A BEDROCK RESTAURADO POR ADMINISTRADOR
+
+Hola {user_id},
+
+¡Buenas noticias! Tu acceso a AWS Bedrock ha sido restaurado por un administrador.
+Un administrador ha desbloqueado tu cuenta manualmente, después de alcanzar el límite diario.
+
+DETALLES DE LA RESTAURACIÓN:
+- Fecha de restauración: {sent_at}
+- Tipo: Desbloqueo administrativo manual
+
+ESTO SIGNIFICA QUE:
+- Ya puedes realizar llamadas a la API de AWS Bedrock nuevamente
+- Tienes protección administrativa contra bloqueos automáticos hasta mañana a las 00h
+- Tu contador de uso diario se reiniciará normalmente mañana
+
+DE AQUÍ EN ADELANTE:
+Por favor, regula el uso de este servicio para evitar futuros bloqueos. Recibirás un aviso cuando te acerques a tu límite diario.
+
+¡Gracias por tu colaboración!
+
+---
+Esta es una notificación automática del Sistema de Control de Uso de AWS Bedrock.
+Enviado desde: {sender}
+Fecha y hora: {sent_at}
+        """
+
+TEMPLATES: Dict[str, CompiledTemplate] = {
+    name.lower(): CompiledTemplate(name.lower(), source)
+    for name, source in (
+        ('WARNING_HTML', WARNING_HTML),
+        ('WARNING_TEXT', WARNING_TEXT),
+        ('BLOCKING_HTML', BLOCKING_HTML),
+        ('BLOCKING_TEXT', BLOCKING_TEXT),
+        ('UNBLOCKING_HTML', UNBLOCKING_HTML),
+        ('UNBLOCKING_TEXT', UNBLOCKING_TEXT),
+        ('ADMIN_BLOCKING_HTML', ADMIN_BLOCKING_HTML),
+        ('ADMIN_BLOCKING_TEXT', ADMIN_BLOCKING_TEXT),
+        ('ADMIN_UNBLOCKING_HTML', ADMIN_UNBLOCKING_HTML),
+        ('ADMIN_UNBLOCKING_TEXT', ADMIN_UNBLOCKING_TEXT),
+    )
+}
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _render_cached(name: str, items: Tuple[Tuple[str, Any], ...]) -> str:
+    return TEMPLATES[name].render(dict(items))
+
+
+def render_template(name: str, **values: Any) -> str:
+    """Render a registered template; identical values are served from cache"""
+    template = TEMPLATES[name]
+    # Only the fields the template uses form the cache key
+    try:
+        items = tuple((field, values[field]) for field in template.key_fields)
+    except KeyError as e:
+        raise KeyError(f"Template {name} is missing field {e}") from None
+    return _render_cached(name, items)
+
+
+def render_cache_info():
+    return _render_cached.cache_info()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Lambda Handler for AWS Bedrock Email Service
+============================================
+
+This is the entry point for the bedrock-email-service Lambda function.
+It imports and uses the EnhancedEmailNotificationService from bedrock_email_service.py
+
+Callers that invoke it asynchronously (InvocationType='Event') cannot read the
+response, so they pass a `status_callback` ({'function', 'outbox_id',
+'audit_log_id'}). The outcome of the send is then reported to that function
+as an "email_delivery_status" event.
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import boto3
+
+from bedrock_email_service import create_email_service
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+lambda_client = boto3.client('lambda')
+
+def report_delivery_status(event: Dict[str, Any], success: bool, error: Optional[str] = None) -> None:
+    """Send the delivery outcome to the caller's status callback, if it asked for one"""
+    callback = event.get('status_callback')
+    if not callback:
+        return
+    
+    try:
+        lambda_client.invoke(
+            FunctionName=callback['function'],
+            InvocationType='Event',
+            Payload=json.dumps({
+                'action': 'email_delivery_status',
+                'user_id': event.get('user_id'),
+                'email_action': event.get('action'),
+                'outbox_id': callback.get('outbox_id'),
+                'audit_log_id': callback.get('audit_log_id'),
+                'success': success,
+                'error': error
+            })
+        )
+        logger.info(f"Reported delivery status ({success}) to {callback['function']}")
+    except Exception as e:
+        # The caller retries once its lease expires
+        logger.error(f"Failed to report delivery status to {callback.get('function')}: {str(e)}")
+
+def lambda_handler(event, context):
+    """
+    Lambda handler for email service requests
+    
+    Args:
+        event: Lambda event containing email action and parameters
+        context: Lambda context object
+        
+    Returns:
+        Dict with status code and response
+    """
+    try:
+        logger.info(f"Processing email service request: {json.dumps(event, default=str)}")
+        
+        # Validate required parameters
+        if 'action' not in event:
+            logger.error("Missing required parameter: action")
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Missing required parameter: action'})
+            }
+        
+        action = event['action']
+        user_id = event.get('user_id')
+        
+        if not user_id:
+            logger.error("Missing required parameter: user_id")
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Missing required parameter: user_id'})
+            }
+        
+        # Create email service instance
+        email_service = create_email_service()
+        # {'email', 'display_name'} resolved by the caller; without it the service reads IAM tags
+        recipient = event.get('recipient')
+        
+        # Route to appropriate email function
+        if action == 'send_warning_email':
+            usage_record = event.get('usage_record', {})
+            success = email_service.send_warning_email(user_id, usage_record, recipient=recipient)
+            
+        elif action == 'send_blocking_email':
+            usage_record = event.get('usage_record', {})
+            reason = event.get('reason', 'daily_limit_exceeded')
+            success = email_service.send_blocking_email(user_id, usage_record, reason, recipient=recipient)
+            
+        elif action == 'send_unblocking_email':
+            reason = event.get('reason', 'daily_reset')
+            success = email_service.send_unblocking_email(user_id, reason, recipient=recipient)
+            
+        elif action == 'send_admin_blocking_email':
+            admin_user = event.get('performed_by', 'admin')
+            reason = event.get('reason', 'manual_admin_block')
+            usage_record = event.get('usage_record')
+            success = email_service.send_admin_blocking_email(user_id, admin_user, reason, usage_record,
+                                                             recipient=recipient, blocked_at=event.get('blocked_at'))
+            
+        elif action == 'send_admin_unblocking_email':
+            admin_user = event.get('performed_by', 'admin')
+            reason = event.get('reason', 'manual_admin_unblock')
+            success = email_service.send_admin_unblocking_email(user_id, admin_user, reason, recipient=recipient)
+            
+        else:
+            logger.error(f"Invalid action: {action}")
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'Invalid action: {action}'})
+            }
+        
+        report_delivery_status(event, success, None if success else f'Failed to send {action}')
+        
+        # Return response
+        if success:
+            logger.info(f"Successfully processed {action} for user {user_id}")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': f'Email sent successfully',
+                    'action': action,
+                    'user_id': user_id,
+                    'success': True
+                })
+            }
+        else:
+            logger.error(f"Failed to process {action} for user {user_id}")
+            return {
+                'statusCode': 500,
+                'body': json.dumps({
+                    'error': f'Failed to send email',
+                    'action': action,
+                    'user_id': user_id,
+                    'success': False
+                })
+            }
+        
+    except Exception as e:
+        logger.error(f"Error processing email service request: {str(e)}", exc_info=True)
+        report_delivery_status(event, False, str(e))
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e),
+                'action': event.get('action', 'unknown'),
+                'user_id': event.get('user_id', 'unknown')
+            })
+        }
@@ -0,0 +1,105 @@
+"""
+TTL-cached IAM user tag resolution
+
+Team, Person and Email all come from the same list_user_tags response, but
+callers used to request it once per attribute: three calls per request in
+the realtime controller and two per message in the email service. A
+UserTagResolver fetches a user's tags once and keeps them for `ttl_seconds`
+in the warm container, and every attribute is read from that copy.
+
+Tag keys are matched case-insensitively ("Email" and "email" are the same).
+Failed lookups are not cached, so callers keep their own fallbacks and the
+next call retries.
+
+The email service ships a copy of this module in 03. Build_folder.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def tag_value(tags: Dict[str, str], key: str) -> Optional[str]:
+    """Value of a tag, matching the key case-insensitively"""
+    if key in tags:
+        return tags[key]
+    key = key.lower()
+    for name, value in tags.items():
+        if name.lower() == key:
+            return value
+    return None
+
+
+def display_name_from_tags(user_id: str, tags: Dict[str, str]) -> str:
+    """Person tag, else the Email local part, else the user id"""
+    person = tag_value(tags, 'Person')
+    if person and person.lower() != 'unknown':
+        return person
+    email = tag_value(tags, 'Email')
+    if email and '@' in email:
+        return email.split('@')[0]
+    return user_id
+
+
+def recipient_from_tags(user_id: str, tags: Dict[str, str]) -> Dict[str, Optional[str]]:
+    """Recipient block passed to the email service"""
+    return {'email': tag_value(tags, 'Email'), 'display_name': display_name_from_tags(user_id, tags)}
+
+
+class UserTagResolver:
+    """Per-container cache of list_user_tags responses"""
+
+    def __init__(self, iam_client: Any, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, clock: Callable[[], float] = time.monotonic):
+        self.iam_client = iam_client
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: Dict[str, Any] = {}
+
+    def get_tags(self, user_id: str) -> Dict[str, str]:
+        """Tags of a user; raises the IAM error when the lookup fails"""
+        now = self.clock()
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        tags = {}
+        request = {'UserName': user_id}
+        while True:
+            response = self.iam_client.list_user_tags(**request)
+            tags.update({tag['Key']: tag['Value'] for tag in response['Tags']})
+            if not response.get('IsTruncated'):
+                break
+            request['Marker'] = response['Marker']
+
+        self._store(user_id, tags, now)
+        return tags
+
+    def prime(self, user_id: str, tags: Dict[str, str]) -> None:
+        """Seed the cache with tags obtained elsewhere"""
+        self._store(user_id, dict(tags), self.clock())
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def get_tag(self, user_id: str, key: str) -> Optional[str]:
+        return tag_value(self.get_tags(user_id), key)
+
+    def get_recipient(self, user_id: str) -> Dict[str, Optional[str]]:
+        return recipient_from_tags(user_id, self.get_tags(user_id))
+
+    def _store(self, user_id: str, tags: Dict[str, str], now: float) -> None:
+        self._entries.pop(user_id, None)
+        if len(self._entries) >= self.max_entries:
+            for key in [key for key, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[key]
+            while len(self._entries) >= self.max_entries:
+                # Entries are kept in insertion order: drop the oldest
+                del self._entries[next(iter(self._entries))]
+        self._entries[user_id] = (now + self.ttl_seconds, tags)
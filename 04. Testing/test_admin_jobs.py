@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for asynchronous admin jobs
+======================================
+
+This test suite validates shared/admin_jobs.py and its use by the realtime
+usage controller:
+1. Admin block/unblock persist a job and answer 202 after one DB write and an
+   asynchronous self-invocation
+2. The asynchronous invocation claims the job once, records each workflow step
+   and stores the result; stale RUNNING jobs are claimed again after the lease
+3. The job_status action
+4. Failed self-invocations mark the job FAILED; "wait": true runs inline
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import importlib.util
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions')
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'shared'))
+
+import admin_jobs
+
+# The controller reads its settings at import; keep them out of the other suites' environment
+with patch.dict(os.environ, {'RDS_ENDPOINT': 'test-endpoint', 'RDS_USERNAME': 'test', 'RDS_PASSWORD': 'test',
+                             'RDS_DATABASE': 'bedrock_usage',
+                             'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'eu-west-1')}):
+    spec = importlib.util.spec_from_file_location("usage_controller", os.path.join(LAMBDA_DIR, 'lambda_function.py'))
+    usage_controller = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(usage_controller)
+
+NOW = datetime(2025, 9, 1, 10, 0, 0)
+
+
+class FakeJobsDatabase:
+    """admin_jobs rows behind the statements the module issues"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.statements = []
+
+    def cursor(self, cursor_class=None):
+        database = self
+        cursor = Mock()
+        cursor.__enter__ = Mock(return_value=cursor)
+        cursor.__exit__ = Mock(return_value=False)
+
+        def execute(query, params=None):
+            sql = ' '.join(query.split())
+            database.statements.append(sql)
+            cursor.rowcount = 0
+            if sql.startswith('INSERT INTO admin_jobs'):
+                job_id, action, user_id, params_json, created_at, updated_at = params
+                database.jobs[job_id] = {'job_id': job_id, 'action': action, 'user_id': user_id,
+                                         'params': params_json, 'status': 'QUEUED', 'step': None, 'attempts': 0,
+                                         'result': None, 'error': None, 'created_at': created_at,
+                                         'started_at': None, 'finished_at': None, 'updated_at': updated_at}
+            elif sql.startswith("UPDATE admin_jobs SET status = 'RUNNING'"):
+                started_at, updated_at, job_id, stale_before = params
+                job = database.jobs.get(job_id)
+                if job and (job['status'] == 'QUEUED' or (job['status'] == 'RUNNING' and job['updated_at'] < stale_before)):
+                    job.update(status='RUNNING', step=None, attempts=job['attempts'] + 1, started_at=started_at,
+                               updated_at=updated_at)
+                    cursor.rowcount = 1
+            elif sql.startswith('UPDATE admin_jobs SET step'):
+                step, updated_at, job_id = params
+                if database.jobs[job_id]['status'] == 'RUNNING':
+                    database.jobs[job_id].update(step=step, updated_at=updated_at)
+            elif sql.startswith('UPDATE admin_jobs SET status = %s'):
+                status, result, error, finished_at, updated_at, job_id = params
+                database.jobs[job_id].update(status=status, result=result, error=error, finished_at=finished_at,
+                                             updated_at=updated_at)
+            elif sql.startswith('SELECT job_id'):
+                job = database.jobs.get(params[0])
+                cursor.fetchone.return_value = dict(job) if job else None
+            else:
+                raise AssertionError(f"Unexpected SQL: {sql}")
+
+        cursor.execute = Mock(side_effect=execute)
+        return cursor
+
+
+class TestAdminJobStore(unittest.TestCase):
+    """Job lifecycle in shared/admin_jobs.py"""
+
+    def setUp(self):
+        self.database = FakeJobsDatabase()
+        self.job_id = admin_jobs.create_job(self.database, 'block', 'alice', {'reason': 'r'}, NOW)
+
+    def test_claim_once(self):
+        job = admin_jobs.claim_job(self.database, self.job_id, NOW)
+        self.assertEqual((job['status'], job['attempts'], job['params']), ('RUNNING', 1, {'reason': 'r'}))
+        self.assertIsNone(admin_jobs.claim_job(self.database, self.job_id, NOW + timedelta(seconds=60)))
+
+    def test_stale_running_job_is_claimed_again(self):
+        admin_jobs.claim_job(self.database, self.job_id, NOW)
+        later = NOW + timedelta(seconds=admin_jobs.DEFAULT_LEASE_SECONDS + 1)
+        self.assertEqual(admin_jobs.claim_job(self.database, self.job_id, later)['attempts'], 2)
+
+    def test_finished_jobs_are_not_claimed(self):
+        admin_jobs.finish_job(self.database, self.job_id, True, {'message': 'done'}, NOW)
+        self.assertIsNone(admin_jobs.claim_job(self.database, self.job_id, NOW + timedelta(days=1)))
+        view = admin_jobs.job_view(admin_jobs.get_job(self.database, self.job_id))
+        self.assertEqual((view['status'], view['result']), ('SUCCEEDED', {'message': 'done'}))
+        self.assertEqual(view['finished_at'], NOW.isoformat())
+        self.assertNotIn('params', view)
+
+
+class TestControllerAdminJobs(unittest.TestCase):
+    """202 + self-invocation, job execution and job_status"""
+
+    def setUp(self):
+        self.database = FakeJobsDatabase()
+        self.lambda_client = Mock()
+        self.lambda_client.invoke.return_value = {'StatusCode': 202}
+        for target, value in (('get_mysql_connection', Mock(return_value=self.database)),
+                              ('lambda_client', self.lambda_client),
+                              ('ADMIN_ASYNC_JOBS', True)):
+            patcher = patch.object(usage_controller, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def call(self, event):
+        response = usage_controller.lambda_handler(event, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_block_is_accepted_with_one_write(self):
+        with patch.object(usage_controller, 'execute_admin_blocking') as execute:
+            status, body = self.call({'action': 'block', 'user_id': 'alice', 'reason': 'Abuse',
+                                      'performed_by': 'ops'})
+
+        self.assertEqual(status, 202)
+        execute.assert_not_called()
+        self.assertEqual(len(self.database.statements), 1)
+        job = self.database.jobs[body['job_id']]
+        self.assertEqual((job['action'], job['user_id'], job['status']), ('block', 'alice', 'QUEUED'))
+        self.assertEqual(json.loads(job['params']), {'reason': 'Abuse', 'performed_by': 'ops'})
+        invoke = self.lambda_client.invoke.call_args.kwargs
+        self.assertEqual(invoke['InvocationType'], 'Event')
+        self.assertEqual(json.loads(invoke['Payload']), {'action': 'run_admin_job', 'job_id': body['job_id']})
+
+    def test_job_runs_with_progress_and_result(self):
+        status, body = self.call({'action': 'unblock', 'user_id': 'alice', 'reason': 'ticket 7'})
+        job_id = body['job_id']
+        steps = []
+
+        def unblock(connection, user_id, reason, performed_by, progress):
+            for step in ('blocking_status', 'iam_policy'):
+                progress(step)
+                steps.append(self.database.jobs[job_id]['step'])
+            return True
+
+        with patch.object(usage_controller, 'execute_admin_unblocking', side_effect=unblock) as execute:
+            status, _ = self.call({'action': 'run_admin_job', 'job_id': job_id})
+            duplicate, body = self.call({'action': 'run_admin_job', 'job_id': job_id})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(execute.call_args.args[1:4], ('alice', 'ticket 7', 'admin'))
+        self.assertEqual(steps, ['blocking_status', 'iam_policy'])
+        self.assertEqual(execute.call_count, 1)
+        self.assertTrue(body['skipped'])
+
+        status, body = self.call({'action': 'job_status', 'job_id': job_id})
+        self.assertEqual(status, 200)
+        self.assertEqual((body['status'], body['step'], body['attempts']), ('SUCCEEDED', 'iam_policy', 1))
+        self.assertEqual(body['result']['message'], 'User alice unblocked successfully')
+
+    def test_failed_workflow_marks_job_failed(self):
+        _, body = self.call({'action': 'block', 'user_id': 'alice'})
+        with patch.object(usage_controller, 'get_user_current_usage', return_value={'daily_requests_used': 0}), \
+                patch.object(usage_controller, 'execute_admin_blocking', return_value=False):
+            self.call({'action': 'run_admin_job', 'job_id': body['job_id']})
+
+        _, job = self.call({'action': 'job_status', 'job_id': body['job_id']})
+        self.assertEqual((job['status'], job['result']['message']), ('FAILED', 'Blocking failed'))
+
+    def test_rejected_self_invocation(self):
+        self.lambda_client.invoke.side_effect = RuntimeError('throttled')
+
+        status, body = self.call({'action': 'block', 'user_id': 'alice'})
+
+        self.assertEqual(status, 500)
+        job = self.database.jobs[body['job_id']]
+        self.assertEqual((job['status'], job['error']), ('FAILED', 'throttled'))
+
+    def test_wait_runs_inline(self):
+        with patch.object(usage_controller, 'execute_admin_unblocking', return_value=True):
+            status, body = self.call({'action': 'unblock', 'user_id': 'alice', 'wait': True})
+
+        self.assertEqual((status, body['action']), (200, 'unblock'))
+        self.assertEqual(self.database.jobs, {})
+        self.lambda_client.invoke.assert_not_called()
+
+    def test_job_status_errors(self):
+        self.assertEqual(self.call({'action': 'job_status'})[0], 400)
+        status, body = self.call({'action': 'job_status', 'job_id': 'missing'})
+        self.assertEqual(status, 404)
+        self.assertIn('Unknown job', body['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for bulk admin operations
+====================================
+
+This test suite validates the block_many, unblock_many and status_many actions
+of the realtime usage controller:
+1. Input validation (non-empty list, duplicates, MAX_BULK_USERS)
+2. One transaction with batched status / user_limits writes, an audit entry and
+   a queued notification per user
+3. IAM policy changes fanned out to a bounded pool with per-user results
+4. Status of many users from two queries
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions')
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'shared'))
+
+os.environ.update({'RDS_ENDPOINT': 'test-endpoint', 'RDS_USERNAME': 'test', 'RDS_PASSWORD': 'test',
+                   'RDS_DATABASE': 'bedrock_usage', 'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'eu-west-1')})
+spec = importlib.util.spec_from_file_location("usage_controller", os.path.join(LAMBDA_DIR, 'lambda_function.py'))
+usage_controller = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(usage_controller)
+
+
+class FakeAdminDatabase:
+    """Connection recording the statements of the bulk admin workflows"""
+
+    def __init__(self):
+        self.blocking_status = {}
+        self.limits = {}
+        self.usage = {}
+        self.audit_log = []
+        self.outbox = []
+        self.statements = []
+        self.in_transaction = False
+        self.begin = Mock(side_effect=lambda: setattr(self, 'in_transaction', True))
+        self.commit = Mock(side_effect=lambda: setattr(self, 'in_transaction', False))
+        self.rollback = Mock(side_effect=lambda: setattr(self, 'in_transaction', False))
+        self.fail_on = None
+
+    def cursor(self, cursor_class=None):
+        database = self
+        cursor = Mock()
+        cursor.__enter__ = Mock(return_value=cursor)
+        cursor.__exit__ = Mock(return_value=False)
+        result = []
+
+        def record(statement):
+            database.statements.append((statement, database.in_transaction))
+            if database.fail_on and database.fail_on in statement:
+                raise RuntimeError('database unavailable')
+
+        def execute(query, params=None):
+            statement = ' '.join(query.split())
+            record(statement)
+            result.clear()
+            if statement.startswith('SELECT user_id, is_blocked'):
+                result.extend(dict(database.blocking_status[user_id], user_id=user_id)
+                              for user_id in params if user_id in database.blocking_status)
+            elif statement.startswith('SELECT user_id, daily_request_limit'):
+                result.extend(dict(database.limits[user_id], user_id=user_id)
+                              for user_id in params if user_id in database.limits)
+            elif 'FROM bedrock_requests WHERE user_id IN' in statement:
+                result.extend(dict(database.usage[user_id], user_id=user_id)
+                              for user_id in params[1:-2] if user_id in database.usage)
+            elif statement.startswith('INSERT INTO blocking_audit_log'):
+                database.audit_log.append((params[0], statement.split("VALUES (%s, '")[1].split("'")[0]))
+                cursor.lastrowid = 100 + len(database.audit_log)
+            elif statement.startswith('INSERT INTO notification_outbox'):
+                database.outbox.append({'user_id': params[0], 'type': params[1], 'audit_log_id': params[3]})
+                cursor.lastrowid = len(database.outbox)
+            elif statement.startswith('UPDATE user_blocking_status'):
+                for user_id in params[2:]:
+                    if user_id in database.blocking_status:
+                        database.blocking_status[user_id]['is_blocked'] = 'N'
+            else:
+                raise AssertionError(f"Unexpected SQL: {statement}")
+
+        def executemany(query, rows):
+            statement = ' '.join(query.split())
+            record(statement)
+            if statement.startswith('INSERT INTO user_blocking_status'):
+                for row in rows:
+                    database.blocking_status[row[0]] = {'is_blocked': row[1], 'blocked_reason': row[2],
+                                                        'blocked_at': datetime(2025, 9, 1, 10, 0),
+                                                        'blocked_until': datetime(2025, 9, 2, 10, 0)}
+            elif statement.startswith('INSERT INTO user_limits'):
+                for row in rows:
+                    database.limits.setdefault(row[0], {'daily_request_limit': row[3], 'monthly_request_limit': row[4]})
+                    database.limits[row[0]]['administrative_safe'] = 'Y'
+            else:
+                raise AssertionError(f"Unexpected SQL: {statement}")
+
+        cursor.execute = Mock(side_effect=execute)
+        cursor.executemany = Mock(side_effect=executemany)
+        cursor.fetchall = Mock(side_effect=lambda: list(result))
+        return cursor
+
+
+class TestBulkAdminOperations(unittest.TestCase):
+    """block_many / unblock_many / status_many"""
+
+    def setUp(self):
+        self.database = FakeAdminDatabase()
+        self.database.limits['alice'] = {'daily_request_limit': 50, 'monthly_request_limit': 1000,
+                                         'administrative_safe': 'N'}
+        self.database.usage['alice'] = {'daily_requests_used': 12, 'monthly_requests_used': 300}
+        for target, value in (('get_mysql_connection', Mock(return_value=self.database)),
+                              ('implement_iam_blocking', Mock(return_value=True)),
+                              ('implement_iam_unblocking', Mock(return_value=True))):
+            patcher = patch.object(usage_controller, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def invoke(self, action, user_ids, **extra):
+        response = usage_controller.lambda_handler(dict(extra, action=action, user_ids=user_ids), None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_validation(self):
+        self.assertEqual(self.invoke('block_many', [])[0], 400)
+        self.assertEqual(self.invoke('block_many', 'alice')[0], 400)
+        self.assertEqual(self.invoke('status_many', ['alice', ''])[0], 400)
+        with patch.object(usage_controller, 'MAX_BULK_USERS', 2):
+            status, body = self.invoke('block_many', ['a', 'b', 'c'])
+        self.assertEqual(status, 400)
+        self.assertIn('At most 2 users', body['error'])
+        self.assertEqual(self.database.statements, [])
+
+    def test_block_many(self):
+        status, body = self.invoke('block_many', ['alice', 'bob', 'alice'], reason='Team cap', performed_by='ops')
+
+        self.assertEqual(status, 200)
+        self.assertEqual((body['total'], body['succeeded'], body['failed']), (2, 2, 0))
+        self.assertEqual([result['user_id'] for result in body['results']], ['alice', 'bob'])
+        writes = [statement for statement, in_transaction in self.database.statements
+                  if not statement.startswith('SELECT')]
+        self.assertTrue(all(in_transaction for statement, in_transaction in self.database.statements
+                            if statement in writes))
+        self.assertEqual(sum(statement.startswith('INSERT INTO user_blocking_status') for statement in writes), 1)
+        self.assertEqual(self.database.commit.call_count, 1)
+        self.assertEqual(self.database.blocking_status['alice']['blocked_reason'], 'Team cap')
+        self.assertEqual(self.database.audit_log, [('alice', 'BLOCK'), ('bob', 'BLOCK')])
+        self.assertEqual([(entry['user_id'], entry['type'], entry['audit_log_id']) for entry in self.database.outbox],
+                         [('alice', 'ADMIN_BLOCK', 101), ('bob', 'ADMIN_BLOCK', 102)])
+        self.assertEqual(sorted(call.args[0] for call in usage_controller.implement_iam_blocking.call_args_list),
+                         ['alice', 'bob'])
+
+    def test_iam_failures_are_reported_per_user(self):
+        usage_controller.implement_iam_unblocking.side_effect = lambda user_id: user_id != 'bob' or 1 / 0
+
+        status, body = self.invoke('unblock_many', ['alice', 'bob'])
+
+        self.assertEqual(status, 200)
+        self.assertEqual({result['user_id']: result['iam_updated'] for result in body['results']},
+                         {'alice': True, 'bob': False})
+        self.assertEqual(self.database.limits['bob']['administrative_safe'], 'Y')
+        self.assertEqual(self.database.limits['alice']['daily_request_limit'], 50)
+        self.assertEqual(self.database.audit_log, [('alice', 'UNBLOCK'), ('bob', 'UNBLOCK')])
+
+    def test_database_failure_rolls_back(self):
+        self.database.fail_on = 'INSERT INTO blocking_audit_log'
+
+        status, body = self.invoke('block_many', ['alice', 'bob'])
+
+        self.assertEqual(status, 500)
+        self.assertEqual(body['failed'], 2)
+        self.database.rollback.assert_called_once()
+        usage_controller.implement_iam_blocking.assert_not_called()
+
+    def test_iam_calls_are_bounded(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def slow_block(user_id):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return True
+
+        usage_controller.implement_iam_blocking.side_effect = slow_block
+        with patch.object(usage_controller, 'BULK_IAM_WORKERS', 3):
+            status, body = self.invoke('block_many', [f'user_{index}' for index in range(12)])
+
+        self.assertEqual((status, body['succeeded']), (200, 12))
+        self.assertLessEqual(peak[0], 3)
+        self.assertGreater(peak[0], 1)
+
+    def test_status_many(self):
+        self.invoke('block_many', ['alice'])
+
+        status, body = self.invoke('status_many', ['alice', 'carol'])
+
+        self.assertEqual(status, 200)
+        self.assertEqual([(user['user_id'], user['is_blocked'], user['block_type']) for user in body['users']],
+                         [('alice', True, 'Manual'), ('carol', False, 'None')])
+        selects = [statement for statement, _ in self.database.statements[-2:]]
+        self.assertTrue(all('WHERE user_id IN (%s, %s)' in statement for statement in selects))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for bedrock-db-maintenance
+=====================================
+
+This test suite validates the database maintenance Lambda and its shared modules:
+1. Monthly partition planning (TO_DAYS bounds, months ahead, p_future reorganization)
+2. Retention handling (detach into archive tables or drop)
+3. Dry-run versus execution
+4. Cold-storage archiving of closed months (row count / checksum verification,
+   partition drop, reading archived months back)
+5. Chunked retention purge (primary key chunks, backoff on lock waits and
+   replica lag, lock wait timeouts, dropping only archived partitions, progress
+   metrics)
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import importlib.util
+import json
+import sys
+import os
+import shutil
+import gzip
+import hashlib
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+MAINTENANCE_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions',
+                               'bedrock-db-maintenance')
+SHARED_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions', 'shared')
+
+# Import the function under test from the Lambda directory
+sys.path.insert(0, SHARED_DIR)
+spec = importlib.util.spec_from_file_location("db_maintenance", os.path.join(MAINTENANCE_DIR, 'lambda_function.py'))
+db_maintenance = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(db_maintenance)
+sys.modules['db_maintenance'] = db_maintenance
+
+import partition_manager
+import partition_archive
+import retention_purger
+import pymysql
+
+
+def monthly_partitions(last_month, count):
+    """Partitions p_YYYY_MM for `count` months ending at `last_month`, followed by p_future"""
+    partitions = []
+    for offset in range(count - 1, -1, -1):
+        month = partition_manager.add_months(last_month, -offset)
+        partitions.append({'name': partition_manager.partition_name(month),
+                           'less_than': partition_manager.add_months(month, 1), 'rows': 100})
+    partitions.append({'name': 'p_future', 'less_than': None, 'rows': 5000})
+    return partitions
+
+
+def create_maintenance_connection(partitions, archive_tables=(), future_rows_from=None):
+    """Create a mock connection answering the information_schema and p_future queries"""
+    connection = Mock()
+    connection.executed = []
+
+    def make_cursor():
+        cursor = Mock()
+
+        def execute(query, params=None):
+            connection.executed.append(query)
+            if 'information_schema.PARTITIONS' in query:
+                cursor.fetchall.return_value = [
+                    {'name': partition['name'], 'table_rows': partition['rows'],
+                     'description': 'MAXVALUE' if partition['less_than'] is None
+                     else str(partition_manager.to_days(partition['less_than']))}
+                    for partition in partitions
+                ]
+            elif 'information_schema.TABLES' in query:
+                cursor.fetchall.return_value = [{'name': name} for name in archive_tables]
+            elif 'MIN(date_only)' in query:
+                connection.future_bound = params[0] if params else None
+                cursor.fetchone.return_value = {'first_day': future_rows_from}
+
+        cursor.execute.side_effect = execute
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        return context
+
+    connection.cursor.side_effect = lambda *args: make_cursor()
+    return connection
+
+
+class FakeArchiveSource:
+    """Connection double serving one month of bedrock_requests rows for the archiver"""
+
+    COLUMNS = ['id', 'user_id', 'team', 'model_id', 'request_timestamp', 'input_tokens', 'output_tokens', 'cost_usd']
+
+    def __init__(self, rows, partitions, archive_tables=(), fingerprint=None):
+        self.rows = rows
+        self.partitions = partitions
+        self.archive_tables = list(archive_tables)
+        self.fingerprint = fingerprint
+        self.executed = []
+        self.close = Mock()
+
+    def cursor(self, cursor_class=None):
+        source = self
+        cursor = Mock()
+        cursor.description = None
+
+        def execute(query, params=None):
+            source.executed.append(query)
+            if 'information_schema.PARTITIONS' in query:
+                cursor.fetchall.return_value = [
+                    {'name': partition['name'], 'table_rows': partition['rows'],
+                     'description': 'MAXVALUE' if partition['less_than'] is None
+                     else str(partition_manager.to_days(partition['less_than']))}
+                    for partition in source.partitions
+                ]
+            elif 'information_schema.TABLES' in query:
+                cursor.fetchall.return_value = [{'name': name} for name in source.archive_tables]
+            elif query.startswith('SELECT COUNT(*)'):
+                cursor.fetchone.return_value = source.fingerprint or (len(source.rows),
+                                                                      sum(row[0] for row in source.rows))
+            elif query.startswith('SELECT *'):
+                chunks = [source.rows[index:index + 2] for index in range(0, len(source.rows), 2)]
+                cursor.description = [(column,) for column in source.COLUMNS]
+                cursor.fetchmany.side_effect = chunks + [[]]
+
+        cursor.execute.side_effect = execute
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        return context
+
+
+def archive_rows():
+    """Five requests of January 2025"""
+    return [
+        (101, 'alice', 'team_a', 'claude', datetime(2025, 1, 3, 9, 0), 100, 50, Decimal('0.001500')),
+        (102, 'alice', 'team_a', 'claude', datetime(2025, 1, 3, 10, 0), 200, 80, Decimal('0.002500')),
+        (103, 'bob', 'team_b', 'titan', datetime(2025, 1, 9, 11, 0), 10, 5, Decimal('0.000100')),
+        (104, 'bob', 'team_b', 'claude', datetime(2025, 1, 20, 8, 0), 300, 90, Decimal('0.004000')),
+        (105, 'carol', 'team_a', 'titan', datetime(2025, 1, 31, 23, 0), 20, 10, Decimal('0.000200'))
+    ]
+
+
+class TestPartitionPlanning(unittest.TestCase):
+    """Test suite for partition planning"""
+
+    def test_to_days_matches_mysql(self):
+        """TO_DAYS values match the MySQL documentation examples"""
+        self.assertEqual(partition_manager.to_days(date(1995, 5, 1)), 728779)
+        self.assertEqual(partition_manager.from_days(733321), date(2007, 10, 7))
+
+    def test_reorganizes_p_future_up_to_months_ahead(self):
+        """Missing months up to months_ahead are split out of an empty p_future"""
+        partitions = monthly_partitions(date(2025, 12, 1), 12)
+
+        plan = partition_manager.plan_maintenance(partitions, date(2026, 2, 10), months_ahead=2)
+
+        self.assertEqual(plan['added_partitions'], ['p_2026_01', 'p_2026_02', 'p_2026_03', 'p_2026_04'])
+        statement = plan['statements'][0]
+        self.assertTrue(statement.startswith('ALTER TABLE bedrock_requests REORGANIZE PARTITION p_future INTO'))
+        self.assertIn("PARTITION p_2026_01 VALUES LESS THAN (TO_DAYS('2026-02-01'))", statement)
+        self.assertIn("PARTITION p_2026_04 VALUES LESS THAN (TO_DAYS('2026-05-01'))", statement)
+        self.assertTrue(statement.rstrip().endswith('PARTITION p_future VALUES LESS THAN MAXVALUE\n)'))
+
+    def test_nothing_to_do_when_partitions_exist(self):
+        """No DDL is generated when enough months already exist"""
+        partitions = monthly_partitions(date(2026, 6, 1), 6)
+
+        plan = partition_manager.plan_maintenance(partitions, date(2026, 3, 1), months_ahead=3)
+
+        self.assertEqual(plan['statements'], [])
+
+    def test_detach_expired_partitions_into_archive_tables(self):
+        """Expired partitions are exchanged into archive tables and dropped"""
+        partitions = monthly_partitions(date(2026, 6, 1), 18)
+
+        plan = partition_manager.plan_maintenance(partitions, date(2026, 4, 15), months_ahead=2,
+                                                  retention_months=13,
+                                                  tables={'bedrock_requests_archive_2025_01'})
+
+        self.assertEqual(plan['expired_partitions'], ['p_2025_01', 'p_2025_02'])
+        self.assertEqual(plan['statements'], [
+            'ALTER TABLE bedrock_requests EXCHANGE PARTITION p_2025_01 WITH TABLE bedrock_requests_archive_2025_01',
+            'ALTER TABLE bedrock_requests DROP PARTITION p_2025_01',
+            'CREATE TABLE bedrock_requests_archive_2025_02 LIKE bedrock_requests',
+            'ALTER TABLE bedrock_requests_archive_2025_02 REMOVE PARTITIONING',
+            'ALTER TABLE bedrock_requests EXCHANGE PARTITION p_2025_02 WITH TABLE bedrock_requests_archive_2025_02',
+            'ALTER TABLE bedrock_requests DROP PARTITION p_2025_02'
+        ])
+
+    def test_populated_future_is_only_split_when_allowed(self):
+        """Splitting a p_future that holds rows is refused unless allow_populated_future is set"""
+        partitions = monthly_partitions(date(2025, 12, 1), 12)
+
+        with self.assertRaises(partition_manager.PopulatedFutureError) as raised:
+            partition_manager.plan_maintenance(partitions, date(2026, 2, 10), months_ahead=2,
+                                               future_rows_from=date(2026, 1, 2))
+        self.assertIn('p_future of bedrock_requests holds rows from 2026-01-02', str(raised.exception))
+
+        plan = partition_manager.plan_maintenance(partitions, date(2026, 2, 10), months_ahead=2,
+                                                  future_rows_from=date(2026, 1, 2), allow_populated_future=True)
+        self.assertEqual(plan['added_partitions'], ['p_2026_01', 'p_2026_02', 'p_2026_03', 'p_2026_04'])
+        self.assertEqual(plan['future_rows_from'], '2026-01-02')
+
+    def test_populated_future_does_not_block_retention(self):
+        """Rows in p_future only matter when months have to be split out of it"""
+        partitions = monthly_partitions(date(2026, 6, 1), 18)
+
+        plan = partition_manager.plan_maintenance(partitions, date(2026, 4, 15), months_ahead=0,
+                                                  retention_months=14, retention_action='drop',
+                                                  future_rows_from=date(2026, 7, 1))
+
+        self.assertEqual(plan['statements'], ['ALTER TABLE bedrock_requests DROP PARTITION p_2025_01'])
+
+    def test_drop_action_and_validation(self):
+        """The drop action drops partitions directly; invalid options are rejected"""
+        partitions = monthly_partitions(date(2026, 6, 1), 18)
+
+        plan = partition_manager.plan_maintenance(partitions, date(2026, 4, 15), months_ahead=0,
+                                                  retention_months=14, retention_action='drop')
+
+        self.assertEqual(plan['statements'], ['ALTER TABLE bedrock_requests DROP PARTITION p_2025_01'])
+        with self.assertRaises(ValueError):
+            partition_manager.plan_maintenance(partitions, date(2026, 4, 15), retention_action='truncate')
+        with self.assertRaises(ValueError):
+            partition_manager.plan_maintenance(partitions[:-1], date(2026, 4, 15))
+
+
+class TestDatabaseMaintenanceLambda(unittest.TestCase):
+    """Test suite for the maintenance Lambda handler"""
+
+    def test_dry_run_only_reads_partition_state(self):
+        """Dry runs return the DDL without executing it"""
+        connection = create_maintenance_connection(monthly_partitions(date(2025, 12, 1), 12))
+
+        with patch.object(db_maintenance, 'get_db_connection', return_value=connection):
+            response = db_maintenance.lambda_handler({'task': 'partitions', 'dry_run': True,
+                                                      'today': '2026-01-20', 'months_ahead': 1}, None)
+
+        result = json.loads(response['body'])['result']
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(result['added_partitions'], ['p_2026_01', 'p_2026_02'])
+        self.assertEqual(result['executed'], 0)
+        self.assertFalse(any(query.startswith('ALTER') for query in connection.executed))
+        connection.close.assert_called_once()
+
+    def test_execution_runs_every_statement(self):
+        """Real runs execute the reorganize and retention DDL"""
+        connection = create_maintenance_connection(monthly_partitions(date(2026, 1, 1), 14))
+
+        with patch.object(db_maintenance, 'get_db_connection', return_value=connection):
+            response = db_maintenance.lambda_handler({'task': 'partitions', 'today': '2026-01-20',
+                                                      'months_ahead': 1, 'retention_months': 12,
+                                                      'retention_action': 'drop'}, None)
+
+        result = json.loads(response['body'])['result']
+        self.assertEqual(result['executed'], 2)
+        self.assertIn('ALTER TABLE bedrock_requests DROP PARTITION p_2024_12', connection.executed)
+
+    def test_populated_future_fails_the_run_until_allowed(self):
+        """A p_future holding rows returns a 500 without DDL; allow_populated_future runs the catch-up"""
+        partitions = monthly_partitions(date(2025, 12, 1), 12)
+        connection = create_maintenance_connection(partitions, future_rows_from=date(2026, 1, 1))
+
+        with patch.object(db_maintenance, 'get_db_connection', return_value=connection):
+            response = db_maintenance.lambda_handler({'task': 'partitions', 'today': '2026-01-20',
+                                                      'months_ahead': 1}, None)
+
+        self.assertEqual(response['statusCode'], 500)
+        self.assertIn('allow_populated_future', json.loads(response['body'])['error'])
+        self.assertEqual(connection.future_bound, date(2026, 1, 1))
+        self.assertFalse(any(query.startswith('ALTER') for query in connection.executed))
+
+        connection = create_maintenance_connection(partitions, future_rows_from=date(2026, 1, 1))
+        with patch.object(db_maintenance, 'get_db_connection', return_value=connection):
+            response = db_maintenance.lambda_handler({'task': 'partitions', 'today': '2026-01-20',
+                                                      'months_ahead': 1, 'allow_populated_future': True}, None)
+
+        self.assertEqual(json.loads(response['body'])['result']['executed'], 1)
+
+    def test_unknown_task_is_rejected(self):
+        """Unknown tasks return a 500 with the list of supported tasks"""
+        response = db_maintenance.lambda_handler({'task': 'vacuum'}, None)
+
+        self.assertEqual(response['statusCode'], 500)
+        self.assertIn('Unsupported task', json.loads(response['body'])['error'])
+
+
+class TestPartitionArchive(unittest.TestCase):
+    """Test suite for the cold-storage archiver"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = partition_archive.LocalArchiveStore(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def archive(self, connection, **options):
+        return partition_archive.archive_month(connection, self.store, date(2025, 1, 1), today=date(2026, 3, 2),
+                                               rows_per_part=2, work_dir=self.directory, **options)
+
+    def test_archives_verifies_and_drops_partition(self):
+        """Rows are written to checksummed parts, verified and the partition is dropped"""
+        connection = FakeArchiveSource(archive_rows(), monthly_partitions(date(2025, 3, 1), 3))
+
+        result = self.archive(connection)
+
+        self.assertEqual(result['source'], 'p_2025_01')
+        self.assertEqual((result['rows'], result['parts']), (5, 3))
+        self.assertTrue(result['dropped'])
+        self.assertEqual(connection.executed[-1], 'ALTER TABLE bedrock_requests DROP PARTITION p_2025_01')
+        self.assertIn('SELECT * FROM bedrock_requests PARTITION (p_2025_01)', connection.executed)
+
+        manifest = partition_archive.read_manifest(self.store, 'bedrock_requests', date(2025, 1, 1))
+        self.assertEqual(manifest['source']['id_sum'], 515)
+        rows = list(partition_archive.iter_archived_rows(self.store, 'bedrock_requests', date(2025, 1, 15)))
+        self.assertEqual([row['id'] for row in rows], [101, 102, 103, 104, 105])
+        self.assertEqual(rows[0]['cost_usd'], '0.001500')
+
+    def test_count_mismatch_keeps_the_source(self):
+        """A source that does not match the exported rows is neither dropped nor marked archived"""
+        connection = FakeArchiveSource(archive_rows(), monthly_partitions(date(2025, 3, 1), 3), fingerprint=(6, 620))
+
+        with self.assertRaises(partition_archive.ArchiveVerificationError):
+            self.archive(connection)
+
+        self.assertFalse(any(query.startswith('ALTER') for query in connection.executed))
+        self.assertIsNone(partition_archive.read_manifest(self.store, 'bedrock_requests', date(2025, 1, 1)))
+
+    def test_detached_table_and_rerun_after_partial_run(self):
+        """Detached tables are preferred; an archived month is not exported twice"""
+        connection = FakeArchiveSource(archive_rows(), monthly_partitions(date(2025, 3, 1), 2),
+                                       archive_tables=['bedrock_requests_archive_2025_01'])
+        self.archive(connection, drop=False)
+
+        connection.executed.clear()
+        result = self.archive(connection)
+
+        self.assertEqual(result['source'], 'bedrock_requests_archive_2025_01')
+        self.assertFalse(any(query.startswith('SELECT *') for query in connection.executed))
+        self.assertEqual(connection.executed[-1], 'DROP TABLE bedrock_requests_archive_2025_01')
+
+    def test_corrupted_part_is_rejected_on_read(self):
+        """Parts whose checksum changed cannot be read back"""
+        connection = FakeArchiveSource(archive_rows(), monthly_partitions(date(2025, 3, 1), 3))
+        self.archive(connection)
+        with open(self.store.path('bedrock_requests/2025/01/part-00002.ndjson.gz'), 'ab') as part:
+            part.write(b'x')
+
+        with self.assertRaises(partition_archive.ArchiveVerificationError):
+            list(partition_archive.iter_archived_rows(self.store, 'bedrock_requests', date(2025, 1, 1)))
+
+    def test_open_month_is_refused(self):
+        """The current month cannot be archived"""
+        connection = FakeArchiveSource(archive_rows(), monthly_partitions(date(2026, 3, 1), 3))
+
+        with self.assertRaises(ValueError):
+            partition_archive.archive_month(connection, self.store, date(2026, 3, 1), today=date(2026, 3, 2))
+
+    def test_aggregate_archived_groups_and_filters(self):
+        """Archived months can be grouped by request columns for historical reports"""
+        self.archive(FakeArchiveSource(archive_rows(), monthly_partitions(date(2025, 3, 1), 3)))
+
+        result = partition_archive.aggregate_archived(self.store, 'bedrock_requests', [date(2025, 1, 1)],
+                                                      ['user_id'], {'team': 'team_a'})
+
+        self.assertEqual(result['columns'], ['user_id', 'request_count', 'input_tokens', 'output_tokens', 'cost_usd'])
+        self.assertEqual(result['rows'], [['alice', 2, 300, 130, 0.004], ['carol', 1, 20, 10, 0.0002]])
+        with self.assertRaises(ValueError):
+            partition_archive.aggregate_archived(self.store, 'bedrock_requests', [date(2025, 1, 1)], ['cost_usd'])
+
+    def test_archive_task_dry_run(self):
+        """The archive task lists months past ARCHIVE_AFTER_MONTHS without writing or dropping"""
+        connection = FakeArchiveSource(archive_rows(), monthly_partitions(date(2025, 3, 1), 3))
+
+        with patch.object(db_maintenance, 'get_db_connection', return_value=connection), \
+                patch.object(db_maintenance, 'ARCHIVE_DIR', self.directory):
+            response = db_maintenance.lambda_handler({'task': 'archive', 'dry_run': True, 'today': '2026-03-02',
+                                                      'archive_after_months': 13}, None)
+
+        result = json.loads(response['body'])['result']
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual([month['month'] for month in result['months']], ['2025-01'])
+        self.assertEqual(result['months'][0]['rows'], 5)
+        self.assertFalse(any(query.startswith(('ALTER', 'DROP')) for query in connection.executed))
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+
+class FakePurgeTarget:
+    """Connection over one table of (id, created_at) rows answering the purger's statements"""
+
+    def __init__(self, rows, lock_waits=(), partitions=(), lock_timeout_on_delete=False):
+        self.rows = dict(rows)
+        self.lock_waits = list(lock_waits)
+        self.partitions = list(partitions)
+        self.lock_timeout_on_delete = lock_timeout_on_delete
+        self.executed = []
+        self.commit = Mock()
+        self.rollback = Mock()
+        self.close = Mock()
+
+    def cursor(self, cursor_class=None):
+        target = self
+        cursor = Mock()
+
+        def execute(query, params=None):
+            target.executed.append(' '.join(query.split()))
+            if 'Innodb_row_lock_current_waits' in query:
+                waits = target.lock_waits.pop(0) if target.lock_waits else 0
+                cursor.fetchone.return_value = ('Innodb_row_lock_current_waits', str(waits))
+            elif 'information_schema.PARTITIONS' in query:
+                cursor.fetchall.return_value = [
+                    {'name': partition['name'], 'table_rows': partition['rows'],
+                     'description': 'MAXVALUE' if partition['less_than'] is None
+                     else str(partition_manager.to_days(partition['less_than']))}
+                    for partition in target.partitions
+                ]
+            elif query.lstrip().startswith('SELECT COUNT(*)'):
+                year, month = map(int, query.split('PARTITION (p_')[1].rstrip(')').split('_'))
+                ids = [row_id for row_id, created in target.rows.items() if (created.year, created.month) == (year, month)]
+                cursor.fetchone.return_value = (len(ids), sum(ids))
+            elif query.lstrip().startswith('SELECT id'):
+                last_id, cutoff, limit = params
+                ids = sorted(row_id for row_id, created in target.rows.items()
+                             if row_id > last_id and created < cutoff)
+                cursor.fetchall.return_value = [(row_id,) for row_id in ids[:limit]]
+            elif query.lstrip().startswith('DELETE'):
+                if target.lock_timeout_on_delete:
+                    raise pymysql.err.OperationalError(1205, 'Lock wait timeout exceeded')
+                first, last, cutoff = params
+                doomed = [row_id for row_id, created in target.rows.items()
+                          if first <= row_id <= last and created < cutoff]
+                for row_id in doomed:
+                    del target.rows[row_id]
+                cursor.rowcount = len(doomed)
+
+        cursor.execute.side_effect = execute
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        return context
+
+
+def archive_month_ids(store, month, ids):
+    """Write a one-part archive with a manifest for `ids` of a bedrock_requests month"""
+    data = gzip.compress(''.join(json.dumps({'id': row_id}) + '\n' for row_id in ids).encode('utf-8'))
+    key = partition_archive.month_key('bedrock_requests', month) + '/part-00001.ndjson.gz'
+    with tempfile.NamedTemporaryFile(delete=False) as part:
+        part.write(data)
+    store.put(part.name, key)
+    manifest = {'table': 'bedrock_requests', 'month': month.strftime('%Y-%m'),
+                'source': {'rows': len(ids), 'id_sum': sum(ids)}, 'rows': len(ids),
+                'parts': [{'key': key, 'rows': len(ids), 'id_sum': sum(ids),
+                           'sha256': hashlib.sha256(data).hexdigest()}]}
+    with tempfile.NamedTemporaryFile('w', delete=False) as manifest_file:
+        json.dump(manifest, manifest_file)
+    store.put(manifest_file.name, partition_archive.manifest_key('bedrock_requests', month))
+
+
+def audit_rows(expired, kept):
+    """`expired` rows from 2023 followed by `kept` rows from 2026 (created_at as a date), ids from 1"""
+    rows = {row_id: date(2023, 5, 1) for row_id in range(1, expired + 1)}
+    rows.update({row_id: date(2026, 5, 1) for row_id in range(expired + 1, expired + kept + 1)})
+    return rows
+
+
+class TestRetentionPurger(unittest.TestCase):
+    """Test suite for the chunked retention purge"""
+
+    def purger(self, target, **options):
+        options.setdefault('sleep', Mock())
+        return retention_purger.RetentionPurger(target, 'blocking_audit_log', date(2024, 10, 19), **options)
+
+    def test_deletes_in_primary_key_chunks(self):
+        """Expired rows go in chunk_size id ranges, each committed, with progress after every chunk"""
+        target = FakePurgeTarget(audit_rows(expired=25, kept=5))
+        progress = Mock()
+        sleep = Mock()
+
+        stats = self.purger(target, chunk_size=10, progress=progress, sleep=sleep).run()
+
+        self.assertEqual(stats['rows_deleted'], 25)
+        self.assertEqual(stats['chunks'], 3)
+        self.assertEqual(stats['last_id'], 25)
+        self.assertIsNone(stats['stopped'])
+        self.assertEqual(sorted(target.rows), list(range(26, 31)))
+        self.assertEqual(target.commit.call_count, 3)
+        self.assertEqual([call.args[0]['rows_deleted'] for call in progress.call_args_list], [10, 20, 25])
+        self.assertIn('chunk_ms', progress.call_args.args[0])
+        self.assertEqual(sleep.call_count, 2)
+        self.assertIn('SET SESSION innodb_lock_wait_timeout = %s', target.executed)
+
+    def test_max_chunks_limits_a_run(self):
+        """A run stops after max_chunks and a later run resumes from the remaining rows"""
+        target = FakePurgeTarget(audit_rows(expired=25, kept=0))
+
+        first = self.purger(target, chunk_size=10, max_chunks=1).run()
+        second = self.purger(target, chunk_size=10).run()
+
+        self.assertEqual(first['rows_deleted'], 10)
+        self.assertEqual(second['rows_deleted'], 15)
+        self.assertEqual(target.rows, {})
+
+    def test_backs_off_on_lock_waits_then_stops(self):
+        """Lock waits above the limit back off exponentially and stop after max_backoffs"""
+        target = FakePurgeTarget(audit_rows(expired=5, kept=0), lock_waits=[9] * 10)
+        sleep = Mock()
+
+        stats = self.purger(target, max_backoffs=3, sleep_seconds=1, max_backoff_seconds=5, sleep=sleep).run()
+
+        self.assertEqual(stats['rows_deleted'], 0)
+        self.assertEqual(stats['backoffs'], 3)
+        self.assertEqual(stats['stopped'], '9 InnoDB lock waits')
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [2, 4, 5])
+        self.assertEqual(len(target.rows), 5)
+
+    def test_resumes_after_transient_lock_waits(self):
+        """A busy check followed by a healthy one continues the purge"""
+        target = FakePurgeTarget(audit_rows(expired=5, kept=0), lock_waits=[9, 0])
+
+        stats = self.purger(target).run()
+
+        self.assertEqual(stats['backoffs'], 1)
+        self.assertEqual(stats['rows_deleted'], 5)
+        self.assertIsNone(stats['stopped'])
+
+    def test_stops_on_replica_lag(self):
+        """Replica lag over the limit stops the purge and closes each replica connection"""
+        target = FakePurgeTarget(audit_rows(expired=5, kept=0))
+        replica = Mock()
+
+        with patch.object(retention_purger, 'measure_replica_lag', return_value=30.0):
+            stats = self.purger(target, replica_connect=lambda: replica, max_backoffs=1).run()
+
+        self.assertEqual(stats['stopped'], 'replica lag 30.0s')
+        self.assertEqual(replica.close.call_count, 2)
+        self.assertEqual(len(target.rows), 5)
+
+    def test_lock_wait_timeout_rolls_back_and_stops(self):
+        """A chunk that times out on a row lock is rolled back and ends the run"""
+        target = FakePurgeTarget(audit_rows(expired=5, kept=0), lock_timeout_on_delete=True)
+
+        stats = self.purger(target).run()
+
+        self.assertEqual(stats['stopped'], 'lock wait timeout')
+        target.rollback.assert_called_once()
+        target.commit.assert_not_called()
+
+    def test_dry_run_only_counts(self):
+        """Dry runs select the chunks without deleting"""
+        target = FakePurgeTarget(audit_rows(expired=12, kept=3))
+
+        stats = self.purger(target, chunk_size=5, dry_run=True).run()
+
+        self.assertEqual(stats['rows_deleted'], 12)
+        self.assertEqual(len(target.rows), 15)
+        self.assertFalse(any(query.startswith(('DELETE', 'SET')) for query in target.executed))
+
+    def partitioned_purge(self, rows, store):
+        target = FakePurgeTarget(rows, partitions=monthly_partitions(date(2024, 12, 1), 5))
+        stats = retention_purger.RetentionPurger(target, 'bedrock_requests', date(2024, 10, 19),
+                                                 archive_store=store, sleep=Mock()).run()
+        return target, stats
+
+    def test_partitioned_table_drops_only_archived_months(self):
+        """bedrock_requests drops expired partitions with a verified archive and deletes no rows in chunks"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        store = partition_archive.LocalArchiveStore(directory)
+        rows = {1: date(2024, 8, 5), 2: date(2024, 9, 2), 3: date(2024, 10, 2), 4: date(2024, 11, 3)}
+        archive_month_ids(store, date(2024, 9, 1), [2])
+
+        target, stats = self.partitioned_purge(rows, store)
+
+        self.assertEqual(stats['dropped_partitions'], ['p_2024_09'])
+        self.assertIn('ALTER TABLE bedrock_requests DROP PARTITION p_2024_09', target.executed)
+        self.assertEqual(stats['kept_partitions'], [{'name': 'p_2024_08', 'reason': 'month not archived'}])
+        self.assertNotIn('ALTER TABLE bedrock_requests DROP PARTITION p_2024_08', target.executed)
+        self.assertEqual(stats['rows_deleted'], 0)
+        self.assertFalse(any(query.startswith(('SELECT id', 'DELETE')) for query in target.executed))
+
+    def test_partition_changed_since_archive_is_kept(self):
+        """A partition whose rows no longer match its manifest, or with no archive store, is not dropped"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        store = partition_archive.LocalArchiveStore(directory)
+        rows = {2: date(2024, 9, 2), 3: date(2024, 9, 20)}
+        archive_month_ids(store, date(2024, 9, 1), [2])
+
+        target, stats = self.partitioned_purge(rows, store)
+        self.assertEqual(stats['kept_partitions'][1], {'name': 'p_2024_09',
+                                                       'reason': 'partition changed since it was archived'})
+
+        target, stats = self.partitioned_purge(rows, None)
+        self.assertEqual(stats['kept_partitions'][1], {'name': 'p_2024_09', 'reason': 'no archive store configured'})
+        self.assertEqual(stats['dropped_partitions'], [])
+        self.assertFalse(any(query.startswith('ALTER') for query in target.executed))
+
+    def test_purge_tables_stops_after_a_stopped_table(self):
+        """Later tables are left alone once one table stops on server load"""
+        target = FakePurgeTarget(audit_rows(expired=3, kept=0), lock_waits=[9] * 10)
+
+        results = retention_purger.purge_tables(
+            target, {'blocking_audit_log': 365, 'blocking_operations': 365},
+            today=date(2026, 10, 19), max_backoffs=0, sleep=Mock())
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['cutoff'], '2025-10-19')
+
+    def test_rejects_unknown_tables_and_retention(self):
+        """Only the known tables and positive retention are accepted"""
+        with self.assertRaises(ValueError):
+            retention_purger.RetentionPurger(Mock(), 'user_limits', date(2026, 1, 1))
+        with self.assertRaises(ValueError):
+            retention_purger.retention_cutoff(date(2026, 1, 1), 0)
+
+    def test_purge_task_emits_metrics(self):
+        """The purge task runs every configured table and prints an embedded metric per chunk"""
+        target = FakePurgeTarget(audit_rows(expired=3, kept=2))
+        get_connection = Mock(return_value=target)
+
+        with patch.object(db_maintenance, 'get_db_connection', get_connection), \
+                patch.object(retention_purger.time, 'sleep'), \
+                patch('builtins.print') as printed:
+            response = db_maintenance.lambda_handler({'task': 'purge', 'today': '2026-10-19',
+                                                      'retention_days': {'blocking_audit_log': 730}}, None)
+
+        result = json.loads(response['body'])['result']
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(result['rows_deleted'], 3)
+        get_connection.assert_called_once_with(autocommit=False)
+        target.close.assert_called_once()
+        metric = json.loads(printed.call_args.args[0])
+        self.assertEqual(metric['Table'], 'blocking_audit_log')
+        self.assertEqual(metric['RowsDeleted'], 3)
+        self.assertEqual(metric['_aws']['CloudWatchMetrics'][0]['Namespace'], db_maintenance.METRICS_NAMESPACE)
+
+
+if __name__ == '__main__':
+    unittest.main()
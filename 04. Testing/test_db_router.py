@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the shared db_router module
+==========================================
+
+This test suite validates read-replica routing:
+1. Replica lag measurement (SHOW REPLICA STATUS / SHOW SLAVE STATUS)
+2. Fallback to the primary on lag, stopped replication or connection errors
+3. Lag check caching
+4. Optional integration run against two local MySQL instances
+   (set TEST_PRIMARY_DB_HOST and TEST_REPLICA_DB_HOST, plus DB_USER/DB_PASSWORD)
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+
+import pymysql
+
+SHARED_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions', 'shared')
+sys.path.insert(0, SHARED_DIR)
+
+import db_router
+
+
+def create_replica_connection(status_rows):
+    """Create a mock connection answering the replica status statements in order"""
+    cursor = Mock()
+    responses = list(status_rows)
+
+    def execute(statement):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        cursor.fetchone.return_value = response
+
+    cursor.execute.side_effect = execute
+    context = Mock()
+    context.__enter__ = Mock(return_value=cursor)
+    context.__exit__ = Mock(return_value=None)
+    connection = Mock()
+    connection.cursor.return_value = context
+    return connection
+
+
+class TestReplicaLag(unittest.TestCase):
+    """Test suite for replica lag measurement"""
+
+    def test_reads_seconds_behind_source(self):
+        """SHOW REPLICA STATUS reports the lag on MySQL 8.0.22+"""
+        connection = create_replica_connection([{'Seconds_Behind_Source': 3}])
+        self.assertEqual(db_router.measure_replica_lag(connection), 3.0)
+
+    def test_falls_back_to_show_slave_status(self):
+        """Older servers only understand SHOW SLAVE STATUS"""
+        connection = create_replica_connection([
+            pymysql.err.ProgrammingError(1064, 'syntax error'),
+            {'Seconds_Behind_Master': 7}
+        ])
+        self.assertEqual(db_router.measure_replica_lag(connection), 7.0)
+
+    def test_stopped_replication_has_unknown_lag(self):
+        """A NULL lag means replication is not running"""
+        connection = create_replica_connection([{'Seconds_Behind_Source': None}])
+        self.assertIsNone(db_router.measure_replica_lag(connection))
+
+    def test_standalone_reader_has_no_lag(self):
+        """A server without replication status is treated as an up to date reader"""
+        connection = create_replica_connection([None])
+        self.assertEqual(db_router.measure_replica_lag(connection), 0.0)
+
+
+class TestReplicaRouter(unittest.TestCase):
+    """Test suite for routing decisions"""
+
+    def setUp(self):
+        self.now = [0.0]
+        self.config = {'host': 'replica.local'}
+
+    def make_router(self, connect_fn):
+        return db_router.ReplicaRouter(self.config, max_lag_seconds=5, lag_check_interval=10,
+                                       connect_fn=connect_fn, clock=lambda: self.now[0])
+
+    def test_disabled_without_reader_host(self):
+        """No replica configuration means every read uses the primary"""
+        router = db_router.ReplicaRouter({'host': None})
+        self.assertFalse(router.enabled)
+        self.assertIsNone(router.connect_for_read())
+
+    def test_strong_consistency_never_uses_replica(self):
+        """consistency=strong skips the replica without connecting"""
+        connect_fn = Mock()
+        router = self.make_router(connect_fn)
+
+        self.assertIsNone(router.connect_for_read('strong'))
+        connect_fn.assert_not_called()
+
+    def test_lagging_replica_falls_back_until_next_check(self):
+        """Reads use the primary while the replica lags, and retry after the interval"""
+        lagging = create_replica_connection([{'Seconds_Behind_Source': 30}])
+        healthy = create_replica_connection([{'Seconds_Behind_Source': 1}])
+        connect_fn = Mock(side_effect=[lagging, healthy])
+        router = self.make_router(connect_fn)
+
+        self.assertIsNone(router.connect_for_read())
+        lagging.close.assert_called_once()
+
+        self.now[0] = 5
+        self.assertIsNone(router.connect_for_read())
+        self.assertEqual(connect_fn.call_count, 1)
+
+        self.now[0] = 11
+        self.assertIs(router.connect_for_read(), healthy)
+
+    def test_lag_is_checked_once_per_interval(self):
+        """Healthy replicas are not re-checked on every read"""
+        first = create_replica_connection([{'Seconds_Behind_Source': 0}])
+        second = create_replica_connection([])
+        router = self.make_router(Mock(side_effect=[first, second]))
+
+        self.assertIs(router.connect_for_read(), first)
+        self.now[0] = 3
+        self.assertIs(router.connect_for_read(), second)
+
+    def test_unreachable_replica_falls_back(self):
+        """Connection errors fall back to the primary"""
+        router = self.make_router(Mock(side_effect=pymysql.err.OperationalError(2003, "Can't connect")))
+        self.assertIsNone(router.connect_for_read())
+
+    def test_router_from_environment(self):
+        """DB_READER_HOST enables the replica with the configured lag threshold"""
+        with patch.dict(os.environ, {'DB_READER_HOST': 'reader.local', 'DB_READER_PORT': '3307',
+                                     'REPLICA_MAX_LAG_SECONDS': '2'}):
+            router = db_router.router_from_environment()
+
+        self.assertEqual(router.replica_config['host'], 'reader.local')
+        self.assertEqual(router.replica_config['port'], 3307)
+        self.assertEqual(router.max_lag_seconds, 2.0)
+
+
+@unittest.skipUnless(os.environ.get('TEST_PRIMARY_DB_HOST') and os.environ.get('TEST_REPLICA_DB_HOST'),
+                     'Set TEST_PRIMARY_DB_HOST and TEST_REPLICA_DB_HOST to run against local MySQL instances')
+class TestReplicaRoutingIntegration(unittest.TestCase):
+    """Routing against two local MySQL instances"""
+
+    def config(self, host_variable, port_variable):
+        with patch.dict(os.environ, {'DB_NAME': os.environ.get('TEST_DB_NAME', 'bedrock_usage')}):
+            return db_router.build_db_config(host_variable, port_variable)
+
+    def server_identity(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT @@hostname AS hostname, @@port AS port, @@server_uuid AS server_uuid')
+            return cursor.fetchone()
+
+    def test_reads_and_strong_reads_hit_different_servers(self):
+        primary_config = self.config('TEST_PRIMARY_DB_HOST', 'TEST_PRIMARY_DB_PORT')
+        router = db_router.ReplicaRouter(self.config('TEST_REPLICA_DB_HOST', 'TEST_REPLICA_DB_PORT'))
+
+        primary = db_router.connect(primary_config)
+        replica = router.connect_for_read('eventual')
+        try:
+            self.assertIsNotNone(replica)
+            self.assertIsNone(router.connect_for_read('strong'))
+            self.assertNotEqual(self.server_identity(primary), self.server_identity(replica))
+        finally:
+            primary.close()
+            if replica:
+                replica.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the precompiled email templates
+==============================================
+
+This test suite validates 03. Build_folder/email_templates.py and its use by
+EnhancedEmailNotificationService:
+1. Templates are compiled into literal chunks and plain fields
+2. Rendering matches str.format and identical payloads are served from cache
+3. The service methods fill every field, including the Madrid timestamp and
+   the admin block expiration date
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import patch
+import os
+import sys
+from datetime import datetime, timezone
+
+BUILD_DIR = os.path.join(os.path.dirname(__file__), '..', '03. Build_folder')
+sys.path.append(BUILD_DIR)
+
+import email_templates
+from email_templates import CompiledTemplate, TEMPLATES, render_template
+
+with patch('boto3.client'):
+    import bedrock_email_service
+
+
+class TestCompiledTemplate(unittest.TestCase):
+    """Parsing and rendering of a single template"""
+
+    def test_render_matches_str_format(self):
+        source = "a {{ b }} {x} c {y} {x}"
+        template = CompiledTemplate('t', source)
+        self.assertEqual(template.fields, ['x', 'y', 'x'])
+        self.assertEqual(template.key_fields, ('x', 'y'))
+        self.assertEqual(template.render({'x': 1, 'y': 'z'}), source.format(x=1, y='z'))
+
+    def test_rejects_expressions(self):
+        with self.assertRaises(ValueError):
+            CompiledTemplate('t', "{self.gmail_user}")
+        with self.assertRaises(ValueError):
+            CompiledTemplate('t', "{value:.2f}")
+
+    def test_registered_templates_render_with_str_format(self):
+        for name, template in TEMPLATES.items():
+            values = {field: f'<{field}>' for field in template.key_fields}
+            source = getattr(email_templates, name.upper())
+            self.assertEqual(template.render(values), source.format(**values), name)
+            self.assertIn('sent_at', template.key_fields)
+
+    def test_missing_field(self):
+        with self.assertRaises(KeyError):
+            render_template('unblocking_text', user_id='u1')
+
+
+class TestRenderCache(unittest.TestCase):
+    """Identical payloads render once"""
+
+    def setUp(self):
+        email_templates._render_cached.cache_clear()
+
+    def test_identical_payloads_hit_cache(self):
+        values = {'user_id': 'u1', 'admin_user': 'admin', 'sender': 's@x', 'sent_at': '2025-01-01 10:00:00 CET'}
+        first = render_template('admin_unblocking_html', **values)
+        second = render_template('admin_unblocking_html', unused='ignored', **values)
+        self.assertIs(first, second)
+        info = email_templates.render_cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+        render_template('admin_unblocking_html', **dict(values, user_id='u2'))
+        self.assertEqual(email_templates.render_cache_info().misses, 2)
+
+
+class TestEmailServiceTemplates(unittest.TestCase):
+    """EnhancedEmailNotificationService renders through the registry"""
+
+    def setUp(self):
+        self.service = bedrock_email_service.EnhancedEmailNotificationService.__new__(
+            bedrock_email_service.EnhancedEmailNotificationService)
+        self.service.gmail_user = 'noreply@example.com'
+
+    def test_warning_email_fields(self):
+        with patch.object(self.service, '_get_madrid_time', return_value='2025-01-01 10:00:00 CET'):
+            body = self.service._generate_warning_email_text('Ana', {'request_count': 40, 'daily_limit': 50})
+        self.assertIn('Hola Ana', body)
+        self.assertIn('80%', body)
+        self.assertIn('desconocido', body)
+        self.assertIn('noreply@example.com', body)
+        self.assertIn('2025-01-01 10:00:00 CET', body)
+
+    def test_admin_blocking_expiration(self):
+        body = self.service._generate_admin_blocking_email_text(
+            'Ana', 'admin', 'manual', {'expires_at': '2025-07-01T10:00:00Z'})
+        self.assertIn('2025-07-01 a las 12:00:00 CEST', body)
+        body = self.service._generate_admin_blocking_email_text('Ana', 'admin', 'manual', {'expires_at': 'Indefinite'})
+        self.assertIn('Indefinida', body)
+
+    def test_admin_blocking_date_is_the_block_time(self):
+        with patch.object(self.service, '_get_madrid_time', return_value='2025-07-01 12:30:00 CEST'):
+            body = self.service._generate_admin_blocking_email_text('Ana', 'admin', 'manual', None, '2025-07-01 12:00:00')
+            self.assertIn('Fecha del bloqueo: 2025-07-01 12:00:00 CEST', body)
+            self.assertIn('Fecha y hora: 2025-07-01 12:30:00 CEST', body)
+            body = self.service._generate_admin_blocking_email_text('Ana', 'admin', 'manual')
+        self.assertIn('Fecha del bloqueo: 2025-07-01 12:30:00 CEST', body)
+
+    def test_madrid_time_fallback_rules(self):
+        with patch.object(bedrock_email_service, 'MADRID_TZ', None):
+            summer, summer_name = bedrock_email_service.to_madrid_time(datetime(2025, 7, 1, 10, tzinfo=timezone.utc))
+            winter, winter_name = bedrock_email_service.to_madrid_time(datetime(2025, 1, 1, 10, tzinfo=timezone.utc))
+        self.assertEqual((summer.hour, summer_name), (12, 'CEST'))
+        self.assertEqual((winter.hour, winter_name), (11, 'CET'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the IAM blocking backends
+========================================
+
+This test suite validates shared/iam_blocking.py against moto's IAM:
+1. The inline backend keeps the DailyLimitBlock statement behaviour of
+   <user>_BedrockPolicy
+2. The managed_policy and group backends block with one idempotent call
+3. Unblocking clears blocks left by the other configured backends
+4. reconcile_blocks moves every block to the active backend according to
+   user_blocking_status, and the bedrock-db-maintenance "iam_blocks" task
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import importlib.util
+import json
+import os
+import sys
+
+import boto3
+from moto import mock_aws
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions')
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'shared'))
+
+import iam_blocking
+from iam_blocking import IamBlocker, deny_policy_document, reconcile_blocks
+
+spec = importlib.util.spec_from_file_location("db_maintenance", os.path.join(LAMBDA_DIR, 'bedrock-db-maintenance',
+                                                                             'lambda_function.py'))
+db_maintenance = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(db_maintenance)
+
+ALLOW_POLICY = {"Version": "2012-10-17", "Statement": [
+    {"Sid": "BedrockAccess", "Effect": "Allow", "Action": ["bedrock:InvokeModel"], "Resource": "*"}]}
+
+
+class FakeStatusDatabase:
+    """user_blocking_status behind load_block_states"""
+
+    def __init__(self, states):
+        self.states = states
+
+    def cursor(self, cursor_class=None):
+        cursor = Mock()
+        cursor.__enter__ = Mock(return_value=cursor)
+        cursor.__exit__ = Mock(return_value=False)
+        cursor.fetchall = Mock(return_value=[{'user_id': user_id, 'is_blocked': 'Y' if blocked else 'N'}
+                                             for user_id, blocked in self.states.items()])
+        return cursor
+
+    def close(self):
+        pass
+
+
+class IamTestCase(unittest.TestCase):
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.iam = boto3.client('iam', region_name='us-east-1')
+        self.policy_arn = self.iam.create_policy(PolicyName='BedrockDailyLimitDeny',
+                                                 PolicyDocument=json.dumps(deny_policy_document()))['Policy']['Arn']
+        self.iam.create_group(GroupName=iam_blocking.DEFAULT_BLOCKED_GROUP)
+        for user_id in ('alice', 'bob', 'carol'):
+            self.iam.create_user(UserName=user_id)
+            self.iam.put_user_policy(UserName=user_id, PolicyName=f'{user_id}_BedrockPolicy',
+                                     PolicyDocument=json.dumps(ALLOW_POLICY))
+
+    def inline_sids(self, user_id):
+        document = self.iam.get_user_policy(UserName=user_id, PolicyName=f'{user_id}_BedrockPolicy')['PolicyDocument']
+        return [statement.get('Sid') for statement in document['Statement']]
+
+    def counting(self, blocker):
+        """Wrap the blocker's client so every IAM call is counted"""
+        calls = []
+
+        class Counter:
+            def __getattr__(inner, name):
+                attribute = getattr(self.iam, name)
+                if callable(attribute):
+                    return lambda *args, **kwargs: calls.append(name) or attribute(*args, **kwargs)
+                return attribute
+
+        blocker.iam = Counter()
+        return calls
+
+
+class TestBackends(IamTestCase):
+    """Blocking and unblocking per backend"""
+
+    def test_inline_backend(self):
+        blocker = IamBlocker(self.iam)
+        self.assertTrue(blocker.block('alice'))
+        self.assertTrue(blocker.block('alice'))
+        self.assertEqual(self.inline_sids('alice'), ['DailyLimitBlock', 'BedrockAccess'])
+        self.assertTrue(blocker.is_blocked('alice'))
+
+        self.assertTrue(blocker.unblock('alice'))
+        self.assertEqual(self.inline_sids('alice'), ['BedrockAccess'])
+        self.iam.create_user(UserName='newcomer')
+        self.assertTrue(blocker.block('newcomer'))
+        self.assertEqual(self.inline_sids('newcomer'), ['DailyLimitBlock', 'BedrockAccess'])
+
+    def test_managed_policy_backend_uses_one_call(self):
+        blocker = IamBlocker(self.iam, 'managed_policy', deny_policy_arn=self.policy_arn, clear_inline=False)
+        calls = self.counting(blocker)
+
+        self.assertTrue(blocker.block('alice'))
+        self.assertTrue(blocker.block('alice'))
+        self.assertEqual(calls, ['attach_user_policy', 'attach_user_policy'])
+        self.assertTrue(blocker.is_blocked('alice'))
+        self.assertEqual(self.inline_sids('alice'), ['BedrockAccess'])
+
+        del calls[:]
+        self.assertTrue(blocker.unblock('alice'))
+        self.assertTrue(blocker.unblock('alice'))
+        self.assertEqual(calls, ['detach_user_policy', 'detach_user_policy'])
+        self.assertFalse(blocker.is_blocked('alice'))
+
+    def test_group_backend(self):
+        blocker = IamBlocker(self.iam, 'group', clear_inline=False)
+        calls = self.counting(blocker)
+
+        self.assertTrue(blocker.block('bob'))
+        self.assertEqual(calls, ['add_user_to_group'])
+        self.assertEqual(blocker.holders(), {'bob'})
+        self.assertTrue(blocker.unblock('bob'))
+        self.assertTrue(blocker.unblock('bob'))
+        self.assertFalse(blocker.is_blocked('bob'))
+
+    def test_configuration_errors(self):
+        with self.assertRaises(ValueError):
+            IamBlocker(self.iam, 'scp')
+        with self.assertRaises(ValueError):
+            IamBlocker(self.iam, 'managed_policy')
+
+    def test_unblock_clears_blocks_of_other_backends(self):
+        IamBlocker(self.iam).block('alice')
+        self.iam.add_user_to_group(GroupName='bedrock-blocked', UserName='alice')
+
+        blocker = IamBlocker(self.iam, 'managed_policy', deny_policy_arn=self.policy_arn, group_name='bedrock-blocked')
+        blocker.block('alice')
+        self.assertTrue(blocker.unblock('alice'))
+
+        self.assertEqual(self.inline_sids('alice'), ['BedrockAccess'])
+        self.assertFalse(blocker.is_blocked('alice'))
+        self.assertFalse(blocker.is_blocked('alice', 'group'))
+
+
+class TestReconcile(IamTestCase):
+    """Moving blocks between backends"""
+
+    def test_reconcile_to_managed_policy(self):
+        inline = IamBlocker(self.iam)
+        inline.block('alice')
+        inline.block('bob')
+        blocker = IamBlocker(self.iam, 'managed_policy', deny_policy_arn=self.policy_arn)
+        blocker.block('carol')
+        database = FakeStatusDatabase({'alice': True, 'bob': False})
+
+        preview = reconcile_blocks(database, blocker, max_workers=2, dry_run=True)
+        self.assertEqual((preview['users'], preview['changed']), (3, 2))
+        self.assertEqual(self.inline_sids('alice')[0], 'DailyLimitBlock')
+
+        stats = reconcile_blocks(database, blocker, max_workers=2)
+
+        self.assertEqual((stats['users'], stats['blocked'], stats['changed'], stats['failed']), (3, 1, 2, 0))
+        self.assertEqual(blocker.holders(), {'alice'})
+        for user_id in ('alice', 'bob', 'carol'):
+            self.assertEqual(self.inline_sids(user_id), ['BedrockAccess'])
+        self.assertEqual(reconcile_blocks(database, blocker)['changed'], 0)
+
+    def test_maintenance_task(self):
+        IamBlocker(self.iam).block('alice')
+        database = FakeStatusDatabase({'alice': False})
+        with patch.object(db_maintenance, 'get_db_connection', return_value=database), \
+                patch.object(db_maintenance, 'IAM_BLOCKING_BACKEND', 'group'), \
+                patch('boto3.client', return_value=self.iam):
+            response = db_maintenance.lambda_handler({'task': 'iam_blocks'}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(json.loads(response['body'])['result']['backend'], 'group')
+        self.assertEqual(self.inline_sids('alice'), ['BedrockAccess'])
+
+
+if __name__ == '__main__':
+    unittest.main()
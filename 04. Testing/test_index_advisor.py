@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the bedrock_requests index advisor
+=================================================
+
+This test suite validates Scripts/index_advisor.py:
+1. The query catalog (sargable, parameters bound)
+2. Unused / redundant index detection from performance_schema counters
+3. Migration to the minimal index set, and the live-table migration in
+   Database/Indexes/minimal_index_set.sql
+4. The insert benchmark on scratch tables
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock
+import importlib.util
+import re
+import sys
+import os
+from datetime import date
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Scripts')
+DATABASE_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Database')
+
+spec = importlib.util.spec_from_file_location("index_advisor", os.path.join(SCRIPTS_DIR, 'index_advisor.py'))
+index_advisor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(index_advisor)
+sys.modules['index_advisor'] = index_advisor
+
+# Secondary indexes of bedrock_requests before the minimal set
+# (Tables/bedrock_requests.sql plus the former Indexes/additional_indexes.sql)
+LEGACY_INDEXES = {
+    'idx_user_timestamp': ['user_id', 'request_timestamp'],
+    'idx_user_date': ['user_id', 'date_only'],
+    'idx_team_timestamp': ['team', 'request_timestamp'],
+    'idx_team_date': ['team', 'date_only'],
+    'idx_model_timestamp': ['model_id', 'request_timestamp'],
+    'idx_timestamp': ['request_timestamp'],
+    'idx_date_hour': ['date_only', 'hour_only'],
+    'idx_user_date_hour': ['user_id', 'date_only', 'hour_only'],
+    'idx_team_date_hour': ['team', 'date_only', 'hour_only'],
+    'idx_model_date': ['model_id', 'date_only'],
+    'idx_cost': ['cost_usd'],
+    'idx_tokens': ['total_tokens'],
+    'idx_requests_user_recent': ['user_id', 'request_timestamp'],
+    'idx_requests_team_recent': ['team', 'request_timestamp'],
+    'idx_requests_model_recent': ['model_id', 'request_timestamp'],
+    'idx_requests_cost_recent': ['cost_usd', 'request_timestamp']
+}
+
+
+def create_cursor_connection(fetchall_results=(), fetchone_results=()):
+    """Create a mock connection whose cursor returns the given results in order"""
+    cursor = Mock()
+    cursor.fetchall.side_effect = list(fetchall_results)
+    cursor.fetchone.side_effect = list(fetchone_results)
+    context = Mock()
+    context.__enter__ = Mock(return_value=cursor)
+    context.__exit__ = Mock(return_value=None)
+    connection = Mock()
+    connection.cursor.return_value = context
+    return connection, cursor
+
+
+class TestQueryCatalog(unittest.TestCase):
+    """Test suite for the replayed query catalog"""
+
+    def test_catalog_is_sargable_and_bound(self):
+        """No catalog query wraps a bedrock_requests date column in a function"""
+        catalog = index_advisor.query_catalog(date(2026, 10, 19))
+
+        names = [entry['name'] for entry in catalog]
+        self.assertIn('controller.usage_counts', names)
+        self.assertIn('report.team_hourly', names)
+        for entry in catalog:
+            self.assertIsNone(re.search(r'\b(DATE|HOUR|YEAR|MONTH)\((request_timestamp|date_only)', entry['query']),
+                              entry['name'])
+            self.assertEqual(entry['query'].count('%s'), len(entry['params']), entry['name'])
+
+    def test_explain_catalog_keeps_bedrock_requests_indexes(self):
+        """Plans are summarized to the indexes chosen on bedrock_requests"""
+        plan = ('{"query_block": {"nested_loop": ['
+                '{"table": {"table_name": "ul", "key": "PRIMARY", "access_type": "index"}},'
+                '{"table": {"table_name": "br", "key": "idx_user_timestamp", "access_type": "ref",'
+                ' "rows_examined_per_scan": 12}}]}}')
+        connection, _ = create_cursor_connection(fetchone_results=[{'EXPLAIN': plan}, Exception('no table')])
+
+        results = index_advisor.explain_catalog(connection, [{'name': 'a', 'query': 'SELECT 1', 'params': []},
+                                                             {'name': 'b', 'query': 'SELECT 2', 'params': []}])
+
+        self.assertEqual(results[0]['indexes'], ['idx_user_timestamp'])
+        self.assertEqual(results[0]['rows_examined'], 12)
+        self.assertEqual(results[1]['error'], 'no table')
+
+
+class TestIndexAdvice(unittest.TestCase):
+    """Test suite for unused/redundant detection and the migration"""
+
+    def test_redundant_left_prefixes(self):
+        """Left prefixes and duplicates point at the index covering them"""
+        redundant = index_advisor.redundant_indexes(LEGACY_INDEXES)
+
+        self.assertEqual(redundant['idx_team_date'], 'idx_team_date_hour')
+        self.assertEqual(redundant['idx_user_date'], 'idx_user_date_hour')
+        self.assertEqual(redundant['idx_requests_user_recent'], 'idx_user_timestamp')
+        self.assertNotIn('idx_team_date_hour', redundant)
+
+    def test_advise_flags_unread_and_still_read_drops(self):
+        """Indexes without reads are listed; drops that are still read are called out"""
+        usage = {name: {'count_read': 0} for name in LEGACY_INDEXES}
+        usage['idx_user_date']['count_read'] = 900
+        usage['idx_model_date']['count_read'] = 3
+        explained = [{'name': 'controller.usage_counts', 'indexes': ['idx_user_date']}]
+
+        advice = index_advisor.advise(LEGACY_INDEXES, usage, explained)
+
+        self.assertIn('idx_cost', advice['unread'])
+        self.assertNotIn('idx_user_date', advice['unread'])
+        self.assertEqual(advice['used_by_catalog'], {'idx_user_date': ['controller.usage_counts']})
+        self.assertEqual(advice['drop_but_read'], ['idx_model_date'])
+        self.assertEqual(advice['add'], [])
+        self.assertEqual(len(advice['drop']), len(LEGACY_INDEXES) - len(index_advisor.MINIMAL_INDEXES))
+
+    def test_migration_drops_only_existing_indexes(self):
+        """Only indexes the table has are dropped; the minimal set needs no migration"""
+        statement = index_advisor.migration_statement(LEGACY_INDEXES)
+
+        dropped = re.findall(r'DROP INDEX (\w+)', statement)
+        self.assertEqual(dropped, sorted(set(LEGACY_INDEXES) - set(index_advisor.MINIMAL_INDEXES)))
+        without_recent = {name: columns for name, columns in LEGACY_INDEXES.items() if 'recent' not in name}
+        self.assertNotIn('recent', index_advisor.migration_statement(without_recent))
+        self.assertIsNone(index_advisor.migration_statement(dict(index_advisor.MINIMAL_INDEXES)))
+
+    def test_shipped_sql_builds_the_migration_from_the_live_table(self):
+        """Database/Indexes/minimal_index_set.sql keeps the minimal set and has no hand-written drops"""
+        with open(os.path.join(DATABASE_DIR, 'Indexes', 'minimal_index_set.sql')) as sql_file:
+            shipped = sql_file.read()
+
+        kept = dict(re.findall(r"SELECT '(\w+)', '([\w, ]+)'", shipped))
+        self.assertEqual({name: columns.split(', ') for name, columns in kept.items()},
+                         index_advisor.MINIMAL_INDEXES)
+        self.assertIn('FROM information_schema.STATISTICS', shipped)
+        self.assertNotRegex(shipped, r'DROP INDEX \w+')
+
+    def test_create_table_has_the_minimal_set(self):
+        """Tables/bedrock_requests.sql creates exactly the minimal secondary indexes"""
+        with open(os.path.join(DATABASE_DIR, 'Tables', 'bedrock_requests.sql')) as sql_file:
+            declared = dict(re.findall(r'^\s+INDEX (\w+) \(([^)]*)\)', sql_file.read(), re.MULTILINE))
+
+        self.assertEqual({name: columns.split(', ') for name, columns in declared.items()},
+                         index_advisor.MINIMAL_INDEXES)
+
+    def test_changed_columns_are_rebuilt(self):
+        """A minimal index with different columns is dropped and re-added"""
+        statement = index_advisor.migration_statement({'idx_date_hour': ['date_only']}, 'scratch')
+
+        self.assertIn('DROP INDEX idx_date_hour', statement)
+        self.assertIn('ADD INDEX idx_date_hour (date_only, hour_only)', statement)
+        self.assertIn('ADD INDEX idx_timestamp (request_timestamp)', statement)
+        self.assertTrue(statement.startswith('ALTER TABLE scratch'))
+
+
+class TestInsertBenchmark(unittest.TestCase):
+    """Test suite for the insert benchmark"""
+
+    def test_benchmark_uses_and_drops_scratch_tables(self):
+        """Both variants insert into scratch copies that are dropped afterwards"""
+        statistics = [{'index_name': name, 'column_name': column}
+                      for name, columns in LEGACY_INDEXES.items() for column in columns]
+        minimal = [{'index_name': name, 'column_name': column}
+                   for name, columns in index_advisor.MINIMAL_INDEXES.items() for column in columns]
+        connection, cursor = create_cursor_connection(fetchall_results=[statistics, statistics, minimal])
+
+        results = index_advisor.benchmark(connection, row_count=1200, batch_size=500)
+
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertIn('CREATE TABLE bedrock_requests_bench_current LIKE bedrock_requests', statements)
+        self.assertIn('DROP TABLE IF EXISTS bedrock_requests_bench_minimal', statements)
+        self.assertEqual(cursor.executemany.call_count, 6)
+        self.assertEqual(results['current']['indexes'], 16)
+        self.assertEqual(results['minimal']['indexes'], 5)
+        self.assertIn('speedup', results)
+
+
+if __name__ == '__main__':
+    unittest.main()
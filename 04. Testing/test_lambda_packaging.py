@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the Lambda packaging lists
+=========================================
+
+This test suite validates that the deployment packages ship every shared module
+their Lambda imports:
+1. The *_SHARED_MODULES lists of 04_Complete_Deployment_Script.sh match the
+   modules each function folder imports from 02. Source/Lambda Functions/shared,
+   including the modules those import in turn
+2. The shared module table of the installation guide matches the same lists
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import ast
+import os
+import re
+import unittest
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), '..')
+LAMBDA_DIR = os.path.join(ROOT_DIR, '02. Source', 'Lambda Functions')
+SHARED_DIR = os.path.join(LAMBDA_DIR, 'shared')
+MANUAL_DIR = os.path.join(ROOT_DIR, '01. Project documents', 'Installation Manual')
+
+# Deploy script list -> function folder
+PACKAGES = {
+    'CONTROLLER_SHARED_MODULES': 'bedrock-realtime-usage-controller-aws-20250923',
+    'QUERY_EXECUTOR_SHARED_MODULES': 'bedrock-mysql-query-executor-aws-20250923',
+    'DAILY_RESET_SHARED_MODULES': 'bedrock-daily-reset-aws-20250923',
+    'DB_MAINTENANCE_SHARED_MODULES': 'bedrock-db-maintenance'
+}
+
+
+def imported_names(path):
+    """Top-level module names imported anywhere in a file"""
+    with open(path, encoding='utf-8') as source:
+        tree = ast.parse(source.read())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return names
+
+
+def required_shared_modules(folder):
+    """Shared modules a function folder needs, following imports between shared modules"""
+    shared = {name[:-3] for name in os.listdir(SHARED_DIR) if name.endswith('.py')}
+    directory = os.path.join(LAMBDA_DIR, folder)
+    pending = set()
+    for name in os.listdir(directory):
+        if name.endswith('.py'):
+            pending |= imported_names(os.path.join(directory, name)) & shared
+
+    required = set()
+    while pending:
+        module = pending.pop()
+        if module not in required:
+            required.add(module)
+            pending |= imported_names(os.path.join(SHARED_DIR, f'{module}.py')) & shared
+    return required
+
+
+class TestLambdaPackaging(unittest.TestCase):
+    """Test suite for the shared module lists"""
+
+    def test_deploy_script_lists_every_imported_module(self):
+        """Each package list is exactly the shared modules its function imports"""
+        with open(os.path.join(MANUAL_DIR, '04_Complete_Deployment_Script.sh'), encoding='utf-8') as script:
+            lists = dict(re.findall(r'^(\w+_SHARED_MODULES)="([^"]*)"$', script.read(), re.MULTILINE))
+
+        self.assertEqual(set(lists), set(PACKAGES))
+        for variable, folder in PACKAGES.items():
+            self.assertEqual(set(lists[variable].split()), required_shared_modules(folder), variable)
+
+    def test_installation_guide_table_matches(self):
+        """The installation guide lists the same modules per function folder"""
+        with open(os.path.join(MANUAL_DIR, '01_Complete_Installation_Guide.md'), encoding='utf-8') as guide:
+            rows = re.findall(r'^\| [\w-]+ \| `([\w-]+)` \| ([\w, ]+) \|$', guide.read(), re.MULTILINE)
+
+        self.assertEqual({folder for folder, _ in rows}, set(PACKAGES.values()))
+        for folder, modules in rows:
+            self.assertEqual({module.strip() for module in modules.split(',')}, required_shared_modules(folder), folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
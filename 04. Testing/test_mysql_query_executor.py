@@ -0,0 +1,817 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for bedrock-mysql-query-executor
+===========================================
+
+This test suite validates the query executor Lambda used by the dashboard:
+1. Single query execution
+2. Batch execution (sequential and parallel)
+3. Per-entry error reporting
+4. Named report catalog and the admin alias for arbitrary SQL
+5. Result cache with TTL, LRU cap and watermark invalidation
+6. Columnar, compressed and keyset-paginated responses
+7. Streaming exports to a local directory and S3
+8. Slow-query log with EXPLAIN plan capture
+9. Read-replica routing
+10. Historical reports over months archived to cold storage
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import importlib.util
+import sys
+import os
+import csv
+import gzip
+import hashlib
+import json
+import tempfile
+import boto3
+from moto import mock_aws
+from datetime import date, datetime
+from decimal import Decimal
+
+EXECUTOR_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions',
+                            'bedrock-mysql-query-executor-aws-20250923')
+SHARED_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions', 'shared')
+
+# Import the function under test from the Lambda directory
+sys.path.insert(0, EXECUTOR_DIR)
+sys.path.insert(0, SHARED_DIR)
+# Raw SQL is off by default; most tests exercise it through the admin alias
+with patch.dict(os.environ, {'RAW_SQL_ENABLED': 'true'}):
+    spec = importlib.util.spec_from_file_location("query_executor", os.path.join(EXECUTOR_DIR, 'lambda_function.py'))
+    query_executor = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(query_executor)
+sys.modules['query_executor'] = query_executor
+
+import report_catalog
+import result_cache
+import result_encoding
+import export_writer
+import query_stats
+import partition_archive
+
+FUNCTION_ARN = 'arn:aws:lambda:eu-west-1:123456789012:function:bedrock-mysql-query-executor'
+ADMIN_CONTEXT = Mock(invoked_function_arn=f'{FUNCTION_ARN}:admin')
+
+
+def create_mock_connection(rows_by_query=None, failing_queries=(), watermark=1):
+    """Create a mock connection whose cursor returns rows based on the executed query
+
+    `watermark` is what every fetchone returns: a single value or a whole row.
+    """
+    rows_by_query = rows_by_query or {}
+    connection = Mock()
+    connection.executed = []
+
+    def make_cursor():
+        cursor = Mock()
+        state = {}
+
+        def execute(query, params=None):
+            if any(failing in query for failing in failing_queries):
+                raise Exception(f"Query failed: {query}")
+            state['query'] = query
+            connection.executed.append((query, params))
+            cursor.rowcount = 1
+
+        def fetchall():
+            for fragment, rows in rows_by_query.items():
+                if fragment in state['query']:
+                    return rows
+            return []
+
+        cursor.execute.side_effect = execute
+        cursor.fetchall.side_effect = fetchall
+        cursor.fetchone.return_value = watermark if isinstance(watermark, tuple) else (watermark,)
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        return context
+
+    connection.cursor.side_effect = lambda *args: make_cursor()
+    return connection
+
+
+class TestQueryExecutorBatch(unittest.TestCase):
+    """Test suite for the batch action"""
+
+    def setUp(self):
+        query_executor.RESULT_CACHE.clear()
+
+    def test_single_query_action_still_supported(self):
+        """The original single query action keeps its response format"""
+        connection = create_mock_connection({'FROM user_limits': [{'user_id': 'user1'}]})
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection):
+            response = query_executor.lambda_handler({
+                'action': 'query',
+                'query': 'SELECT user_id FROM user_limits'
+            }, ADMIN_CONTEXT)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['data'], [{'user_id': 'user1'}])
+        connection.close.assert_called_once()
+
+    def test_batch_returns_results_keyed_by_id(self):
+        """All batch entries run on one connection and are keyed by their id"""
+        connection = create_mock_connection({
+            'monthly': [{'user_id': 'user1', 'monthly_requests': 10}],
+            'daily': [{'request_date': '2025-09-20', 'daily_requests': 3}]
+        })
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection) as get_connection:
+            response = query_executor.lambda_handler({
+                'action': 'batch',
+                'queries': [
+                    {'id': 'monthly:user1', 'query': 'SELECT 1 AS monthly WHERE user_id = ?', 'params': ['user1']},
+                    {'id': 'daily:user1', 'query': 'SELECT 1 AS daily WHERE user_id = ?', 'params': ['user1']}
+                ]
+            }, ADMIN_CONTEXT)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(response['data']['monthly:user1'][0]['monthly_requests'], 10)
+        self.assertEqual(response['data']['daily:user1'][0]['daily_requests'], 3)
+        self.assertEqual(response['errors'], {})
+
+    def test_batch_reports_per_entry_errors(self):
+        """A failing entry does not fail the whole batch"""
+        connection = create_mock_connection({'good': [{'value': 1}]}, failing_queries=('broken',))
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection):
+            response = query_executor.lambda_handler({
+                'action': 'batch',
+                'queries': [
+                    {'id': 'ok', 'query': 'SELECT 1 AS good'},
+                    {'id': 'bad', 'query': 'SELECT broken'}
+                ]
+            }, ADMIN_CONTEXT)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['data'], {'ok': [{'value': 1}]})
+        self.assertIn('bad', response['errors'])
+
+    def test_parallel_batch_uses_one_connection_per_worker(self):
+        """Parallel batches never use more connections than workers"""
+        connections = []
+
+        def new_connection():
+            connection = create_mock_connection({'SELECT': [{'value': 1}]})
+            connections.append(connection)
+            return connection
+
+        queries = [{'id': f'q{i}', 'query': 'SELECT 1'} for i in range(20)]
+
+        with patch.object(query_executor, 'get_db_connection', side_effect=new_connection):
+            response = query_executor.lambda_handler({
+                'action': 'batch',
+                'queries': queries,
+                'parallel': True,
+                'max_workers': 3
+            }, ADMIN_CONTEXT)
+
+        self.assertEqual(len(response['data']), 20)
+        self.assertLessEqual(len(connections), 3)
+        for connection in connections:
+            connection.close.assert_called_once()
+
+    def test_batch_validation_errors(self):
+        """Invalid batches are rejected before connecting"""
+        with patch.object(query_executor, 'get_db_connection') as get_connection:
+            empty = query_executor.lambda_handler({'action': 'batch', 'queries': []}, None)
+            duplicate = query_executor.lambda_handler({
+                'action': 'batch',
+                'queries': [{'id': 'a', 'query': 'SELECT 1'}, {'id': 'a', 'query': 'SELECT 2'}]
+            }, None)
+
+        self.assertEqual(empty['statusCode'], 500)
+        self.assertEqual(duplicate['statusCode'], 500)
+        self.assertIn('Duplicate batch entry id', duplicate['errorMessage'])
+        get_connection.assert_not_called()
+
+
+class TestQueryExecutorReports(unittest.TestCase):
+    """Test suite for the named report catalog"""
+
+    def setUp(self):
+        query_executor.RESULT_CACHE.clear()
+
+    def test_report_returns_compact_columns_and_rows(self):
+        """Reports return column names once and rows as arrays"""
+        cursor = Mock()
+        cursor.fetchall.return_value = [('user1', 12), ('user2', 3)]
+        cursor.description = [('user_id',), ('monthly_requests',)]
+        cursor.fetchone.return_value = (100,)
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        connection = Mock()
+        connection.cursor.return_value = context
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection):
+            response = query_executor.lambda_handler({
+                'action': 'report',
+                'report': 'user_monthly_totals',
+                'params': {'month': '2025-09'}
+            }, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['data']['columns'], ['user_id', 'monthly_requests'])
+        self.assertEqual(response['data']['rows'], [['user1', 12], ['user2', 3]])
+        query, params = [call[0] for call in cursor.execute.call_args_list if len(call[0]) == 2][0]
+        self.assertIn('GROUP BY user_id', query)
+        self.assertEqual(params, [date(2025, 9, 1), date(2025, 10, 1)])
+
+    def test_reports_use_half_open_date_ranges(self):
+        """Report ranges are half-open on date_only and cross year boundaries"""
+        query, params = report_catalog.build_report_query('user_monthly_totals', {'month': '2025-12-15'})
+        self.assertEqual(params, [date(2025, 12, 1), date(2026, 1, 1)])
+        self.assertIn('date_only >= %s AND date_only < %s', query)
+        self.assertNotIn('DATE(', query)
+
+        _, params = report_catalog.build_report_query('user_daily_range',
+                                                      {'start_date': '2025-09-10', 'end_date': '2025-09-20'})
+        self.assertEqual(params, [date(2025, 9, 10), date(2025, 9, 21)])
+
+    def test_every_report_documents_its_index_path(self):
+        """All catalog entries describe their access path"""
+        names = {report['name'] for report in report_catalog.list_reports()}
+        self.assertEqual(names, {'user_monthly_totals', 'user_daily_range', 'team_hourly',
+                                 'model_breakdown', 'blocking_overview', 'teams', 'user_limits',
+                                 'user_activity', 'user_hourly_models', 'hourly_requests', 'daily_activity',
+                                 'model_usage', 'recent_blocking_changes', 'user_status', 'blocking_history'})
+        for report in report_catalog.list_reports():
+            self.assertTrue(report['index_path'])
+
+    def test_dashboard_reports_bind_their_parameters(self):
+        """Dashboard loaders pass values as bound parameters, never as SQL text"""
+        query, params = report_catalog.build_report_query('user_limits', {'user_id': "x' OR '1'='1"})
+        self.assertEqual(params, ["x' OR '1'='1"])
+        self.assertNotIn("OR '1'", query)
+
+        query, params = report_catalog.build_report_query('model_usage', {'hours': 168, 'user_id': 'alice'})
+        self.assertEqual(params, [168, 'alice'])
+        self.assertEqual(report_catalog.build_report_query('model_usage', {})[1], [24])
+
+        query, params = report_catalog.build_report_query('user_hourly_models', {'tz_offset': '+02:00'})
+        self.assertEqual(params, ['+02:00', '+02:00', 24, '+02:00', '+02:00'])
+
+        _, params = report_catalog.build_report_query('daily_activity', {'date': '2025-09-20'})
+        self.assertEqual(params, [date(2025, 9, 20), date(2025, 9, 21)])
+
+        for name, params in (('user_hourly_models', {'tz_offset': "+01:00') --"}),
+                             ('blocking_history', {'limit': 10 ** 6}),
+                             ('model_usage', {'hours': '24; DROP TABLE user_limits'}),
+                             ('user_status', {})):
+            with self.assertRaises(ValueError):
+                report_catalog.build_report_query(name, params)
+
+    def test_unknown_report_and_bad_params_are_rejected(self):
+        """Invalid report requests fail with a clear error"""
+        with self.assertRaises(ValueError):
+            report_catalog.build_report_query('drop_everything')
+        with self.assertRaises(ValueError):
+            report_catalog.build_report_query('user_daily_range', {'start_date': '2025-09-20', 'end_date': '2025-09-10'})
+
+    def test_raw_sql_requires_admin_alias(self):
+        """Arbitrary SQL outside the admin alias is rejected with 403, whatever the event says"""
+        contexts = [None, Mock(invoked_function_arn=FUNCTION_ARN), Mock(invoked_function_arn=f'{FUNCTION_ARN}:live')]
+        with patch.object(query_executor, 'get_db_connection') as get_connection:
+            for context in contexts:
+                query_response = query_executor.lambda_handler({'action': 'query', 'query': 'SELECT 1',
+                                                                'admin': True}, context)
+                batch_response = query_executor.lambda_handler({
+                    'action': 'batch',
+                    'queries': [{'id': 'raw', 'query': 'SELECT 1'}],
+                    'admin': True
+                }, context)
+
+                self.assertEqual(query_response['statusCode'], 403)
+                self.assertEqual(batch_response['statusCode'], 403)
+        get_connection.assert_not_called()
+
+    def test_raw_sql_can_be_disabled(self):
+        """RAW_SQL_ENABLED=false restricts the executor to named reports"""
+        with patch.object(query_executor, 'RAW_SQL_ENABLED', False):
+            response = query_executor.lambda_handler({'action': 'query', 'query': 'SELECT 1'}, ADMIN_CONTEXT)
+
+        self.assertEqual(response['statusCode'], 403)
+
+    def test_raw_sql_is_disabled_by_default(self):
+        """Without RAW_SQL_ENABLED even the admin alias only runs named reports"""
+        with patch.dict(os.environ):
+            os.environ.pop('RAW_SQL_ENABLED', None)
+            default_spec = importlib.util.spec_from_file_location("query_executor_default",
+                                                                  os.path.join(EXECUTOR_DIR, 'lambda_function.py'))
+            default_executor = importlib.util.module_from_spec(default_spec)
+            default_spec.loader.exec_module(default_executor)
+
+        self.assertFalse(default_executor.RAW_SQL_ENABLED)
+        response = default_executor.lambda_handler({'action': 'query', 'query': 'SELECT 1'}, ADMIN_CONTEXT)
+        self.assertEqual(response['statusCode'], 403)
+
+
+class TestQueryExecutorCache(unittest.TestCase):
+    """Test suite for the result cache"""
+
+    def setUp(self):
+        query_executor.RESULT_CACHE.clear()
+
+    def run_query(self, connection, query='SELECT user_id FROM user_limits', **extra):
+        with patch.object(query_executor, 'get_db_connection', return_value=connection) as get_connection:
+            response = query_executor.lambda_handler(dict({'action': 'query', 'query': query}, **extra), ADMIN_CONTEXT)
+        return response, get_connection.call_count
+
+    def test_repeated_query_is_served_without_connecting(self):
+        """A repeated SELECT within TTL and watermark interval never reaches RDS"""
+        connection = create_mock_connection({'FROM user_limits': [{'user_id': 'user1'}]})
+
+        first, first_connects = self.run_query(connection)
+        second, second_connects = self.run_query(connection, query='  SELECT user_id\n FROM user_limits; ')
+
+        self.assertEqual(first['cache'], 'miss')
+        self.assertEqual(first_connects, 1)
+        self.assertEqual(second['cache'], 'hit')
+        self.assertEqual(second_connects, 0)
+        self.assertEqual(second['data'], [{'user_id': 'user1'}])
+
+    def test_changed_watermark_invalidates_entry(self):
+        """A new watermark value after the check interval forces a re-read"""
+        self.run_query(create_mock_connection({'FROM user_limits': [{'user_id': 'user1'}]}, watermark=1))
+
+        changed = create_mock_connection({'FROM user_limits': [{'user_id': 'user2'}]}, watermark=2)
+        with patch.object(query_executor.RESULT_CACHE, 'watermark_interval', 0):
+            response, _ = self.run_query(changed)
+
+        self.assertEqual(response['cache'], 'miss')
+        self.assertEqual(response['data'], [{'user_id': 'user2'}])
+
+    def test_purge_with_same_max_id_invalidates_entry(self):
+        """Deleting the oldest rows keeps MAX(id) but raises MIN(id), which invalidates the entry"""
+        query = 'SELECT COUNT(*) AS requests FROM bedrock_requests'
+        first = create_mock_connection({'FROM bedrock_requests': [{'requests': 10}]}, watermark=(491, 500))
+        self.run_query(first, query=query)
+        self.assertIn(('SELECT MIN(id), MAX(id) FROM bedrock_requests', None), first.executed)
+
+        purged = create_mock_connection({'FROM bedrock_requests': [{'requests': 9}]}, watermark=(492, 500))
+        with patch.object(query_executor.RESULT_CACHE, 'watermark_interval', 0):
+            response, _ = self.run_query(purged, query=query)
+
+        self.assertEqual(response['cache'], 'miss')
+        self.assertEqual(response['data'], [{'requests': 9}])
+
+    def test_per_user_tables_use_a_table_checksum(self):
+        """In-place updates within one second still change the user_limits watermark"""
+        connection = create_mock_connection({'FROM user_limits': [{'user_id': 'user1'}]},
+                                            watermark=('bedrock_usage.user_limits', 1234))
+
+        self.run_query(connection)
+
+        self.assertIn(('CHECKSUM TABLE user_limits', None), connection.executed)
+        self.assertEqual(query_executor.load_watermarks(connection, ['user_limits']),
+                         {'user_limits': ['bedrock_usage.user_limits', 1234]})
+
+    def test_cache_ttl_zero_and_writes_bypass_cache(self):
+        """cache_ttl=0 bypasses the cache and writes clear it"""
+        connection = create_mock_connection({'FROM user_limits': [{'user_id': 'user1'}]})
+        self.run_query(connection)
+
+        bypassed, _ = self.run_query(connection, cache_ttl=0)
+        write, _ = self.run_query(connection, query="UPDATE user_limits SET team = 'x'")
+        after_write, connects = self.run_query(connection)
+
+        self.assertEqual(bypassed['cache'], 'bypass')
+        self.assertEqual(write['cache'], 'bypass')
+        self.assertEqual(after_write['cache'], 'miss')
+        self.assertEqual(connects, 1)
+
+    def test_batch_reports_cache_counts(self):
+        """Batch responses count hits and misses"""
+        connection = create_mock_connection({'SELECT': [{'value': 1}]})
+        event = {'action': 'batch',
+                 'queries': [{'id': 'a', 'query': 'SELECT 1 FROM user_limits'},
+                             {'id': 'b', 'query': 'SELECT 2 FROM user_limits'}]}
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection):
+            first = query_executor.lambda_handler(event, ADMIN_CONTEXT)
+            second = query_executor.lambda_handler(event, ADMIN_CONTEXT)
+
+        self.assertEqual(first['cache'], {'hit': 0, 'miss': 2, 'bypass': 0})
+        self.assertEqual(second['cache'], {'hit': 2, 'miss': 0, 'bypass': 0})
+
+    def test_ttl_expiry_and_lru_eviction(self):
+        """Entries expire after their TTL and the least recently used entry is evicted first"""
+        now = [0.0]
+        cache = result_cache.ResultCache(max_bytes=100, watermark_interval=1000, clock=lambda: now[0])
+        loader = lambda tables: {table: 1 for table in tables}
+        tables = ['bedrock_requests']
+
+        cache.put('a', 'A', tables, 10, loader, 40)
+        cache.put('b', 'B', tables, 60, loader, 40)
+        self.assertEqual(cache.get('a', tables, loader), 'A')
+        cache.put('c', 'C', tables, 60, loader, 40)
+
+        self.assertIsNone(cache.get('b', tables, loader))
+        self.assertEqual(cache.get('a', tables, loader), 'A')
+        now[0] = 11
+        self.assertIsNone(cache.get('a', tables, loader))
+        self.assertEqual(cache.get('c', tables, loader), 'C')
+        self.assertLessEqual(cache.stats()['size_bytes'], 100)
+
+    def test_referenced_tables(self):
+        """Queries depend on the watermarks of the tables they read"""
+        self.assertEqual(result_cache.referenced_tables(
+            'SELECT * FROM user_limits ul LEFT JOIN user_blocking_status ubs ON ubs.user_id = ul.user_id'),
+            ['user_blocking_status', 'user_limits'])
+        self.assertEqual(result_cache.referenced_tables('SELECT * FROM v_user_realtime_usage'),
+                         sorted(result_cache.WATERMARK_QUERIES))
+
+
+class TestQueryExecutorEncoding(unittest.TestCase):
+    """Test suite for large response encoding"""
+
+    def setUp(self):
+        query_executor.RESULT_CACHE.clear()
+
+    def columnar_connection(self, rows, columns):
+        cursor = Mock()
+        cursor.fetchall.return_value = rows
+        cursor.fetchone.return_value = (1,)
+        cursor.description = [(name,) for name in columns]
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        connection = Mock()
+        connection.cursor.return_value = context
+        return connection, cursor
+
+    def test_single_pass_encoding_converts_database_types(self):
+        """Decimal and datetime values are converted without a JSON round trip"""
+        data, size = result_encoding.encode_results(
+            [{'cost': Decimal('1.25'), 'at': datetime(2025, 9, 20, 10, 30), 'day': date(2025, 9, 20)}])
+
+        self.assertEqual(data, [{'cost': 1.25, 'at': '2025-09-20T10:30:00', 'day': '2025-09-20'}])
+        self.assertGreater(size, 0)
+
+    def test_columnar_format_sends_column_names_once(self):
+        """The columnar format returns column names once and rows as arrays"""
+        connection, _ = self.columnar_connection([(1, 'user1'), (2, 'user2')], ['id', 'user_id'])
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection):
+            response = query_executor.lambda_handler({
+                'action': 'query', 'query': 'SELECT id, user_id FROM bedrock_requests',
+                'format': 'columnar'
+            }, ADMIN_CONTEXT)
+
+        self.assertEqual(response['data'], {'columns': ['id', 'user_id'], 'rows': [[1, 'user1'], [2, 'user2']]})
+
+    def test_large_payloads_are_compressed_on_request(self):
+        """compress=true gzip+base64 encodes data above the threshold"""
+        rows = [(i, 'user%d' % (i % 5)) for i in range(2000)]
+        connection, _ = self.columnar_connection(rows, ['id', 'user_id'])
+        event = {'action': 'query', 'query': 'SELECT id, user_id FROM bedrock_requests',
+                 'format': 'columnar', 'compress': True}
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection), \
+                patch.object(query_executor, 'COMPRESS_MIN_BYTES', 1024):
+            response = query_executor.lambda_handler(event, ADMIN_CONTEXT)
+
+        self.assertEqual(response['encoding'], 'gzip+base64')
+        decoded = result_encoding.decompress_payload(response['data'])
+        self.assertEqual(len(decoded['rows']), 2000)
+        self.assertLess(len(response['data']), len(str(decoded)) / 3)
+
+    def test_keyset_pagination_with_continuation_token(self):
+        """Pages fetch one look-ahead row and continue after the last key"""
+        query = 'SELECT id, user_id FROM bedrock_requests WHERE user_id = ?'
+        connection, cursor = self.columnar_connection([(1, 'u'), (2, 'u'), (3, 'u')], ['id', 'user_id'])
+        event = {'action': 'query', 'query': query, 'params': ['u'], 'format': 'columnar',
+                 'page_size': 2, 'key_column': 'id'}
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection):
+            first = query_executor.lambda_handler(event, ADMIN_CONTEXT)
+            cursor.fetchall.return_value = [(3, 'u')]
+            second = query_executor.lambda_handler(dict(event, page_token=first['next_page_token']), ADMIN_CONTEXT)
+
+        self.assertEqual(first['data']['rows'], [[1, 'u'], [2, 'u']])
+        self.assertIsNotNone(first['next_page_token'])
+        self.assertEqual(second['data']['rows'], [[3, 'u']])
+        self.assertIsNone(second['next_page_token'])
+
+        page_query, page_params = cursor.execute.call_args_list[-1][0]
+        self.assertIn('WHERE keyset_page.`id` > %s ORDER BY keyset_page.`id` LIMIT %s', page_query)
+        self.assertEqual(page_params, ['u', 2, 3])
+
+    def test_page_token_is_bound_to_its_query(self):
+        """A token issued for one query is rejected for another"""
+        token = result_encoding.make_page_token('SELECT id FROM a', [], 'id', 10)
+
+        with self.assertRaises(ValueError):
+            result_encoding.build_page_query('SELECT id FROM b', [], 'id', 10, token)
+        with self.assertRaises(ValueError):
+            result_encoding.build_page_query('SELECT id FROM a', [], 'id; DROP', 10)
+
+
+def create_streaming_connection(rows, columns):
+    """Create a mock connection whose cursor serves rows through fetchmany"""
+    cursor = Mock()
+    cursor.description = [(name,) for name in columns]
+    remaining = list(rows)
+
+    def fetchmany(size):
+        chunk = remaining[:size]
+        del remaining[:size]
+        return chunk
+
+    cursor.fetchmany.side_effect = fetchmany
+    context = Mock()
+    context.__enter__ = Mock(return_value=cursor)
+    context.__exit__ = Mock(return_value=None)
+    connection = Mock()
+    connection.cursor.return_value = context
+    return connection, cursor
+
+
+class TestQueryExecutorExport(unittest.TestCase):
+    """Test suite for streaming exports"""
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.rows = [(i, 'user%d' % (i % 3), Decimal('0.5'), datetime(2025, 9, 1, 12, 0)) for i in range(25)]
+        self.columns = ['id', 'user_id', 'cost_usd', 'request_timestamp']
+
+    def test_export_streams_rows_into_bounded_parts(self):
+        """Rows are fetched in chunks and split into parts listed in the manifest"""
+        connection, cursor = create_streaming_connection(self.rows, self.columns)
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection), \
+                patch.object(query_executor, 'EXPORT_BUCKET', None), \
+                patch.object(query_executor, 'EXPORT_DIR', self.export_dir), \
+                patch.object(query_executor, 'EXPORT_FETCH_SIZE', 4):
+            response = query_executor.lambda_handler({
+                'action': 'export', 'start_date': '2025-09-01', 'end_date': '2025-09-30',
+                'format': 'ndjson', 'rows_per_part': 10
+            }, None)
+
+        manifest = response['data']
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(manifest['total_rows'], 25)
+        self.assertEqual([part['rows'] for part in manifest['parts']], [10, 10, 5])
+        self.assertTrue(all(call[0][0] == 4 for call in cursor.fetchmany.call_args_list))
+
+        query, params = cursor.execute.call_args_list[-1][0]
+        self.assertIn('date_only >= %s AND date_only < %s', query)
+        self.assertEqual(params, [date(2025, 9, 1), date(2025, 10, 1)])
+
+        with gzip.open(manifest['parts'][0]['location'], 'rt') as part:
+            first = json.loads(part.readline())
+        self.assertEqual(first, {'id': 0, 'user_id': 'user0', 'cost_usd': 0.5,
+                                 'request_timestamp': '2025-09-01T12:00:00'})
+        with open(manifest['manifest_location']) as stored:
+            self.assertEqual(json.load(stored)['total_rows'], 25)
+
+    def test_csv_parts_repeat_the_header(self):
+        """Every CSV part starts with the column header"""
+        connection, _ = create_streaming_connection(self.rows, self.columns)
+        target = export_writer.LocalExportTarget(self.export_dir)
+
+        manifest = export_writer.stream_export(connection, 'SELECT 1', [], target, 'csv-export',
+                                               export_format='csv', rows_per_part=20, compress=False)
+
+        with open(manifest['parts'][1]['location'], newline='') as part:
+            lines = list(csv.reader(part))
+        self.assertEqual(lines[0], self.columns)
+        self.assertEqual(len(lines), 6)
+
+    def test_raw_query_export_requires_admin(self):
+        """Exports of arbitrary SQL need the admin alias"""
+        with patch.object(query_executor, 'get_db_connection') as get_connection:
+            response = query_executor.lambda_handler({'action': 'export', 'query': 'SELECT * FROM user_limits',
+                                                      'admin': True}, None)
+
+        self.assertEqual(response['statusCode'], 403)
+        get_connection.assert_not_called()
+
+    @mock_aws
+    def test_export_to_s3(self):
+        """Parts and manifest are uploaded under the export prefix"""
+        s3 = boto3.client('s3', region_name='eu-west-1')
+        s3.create_bucket(Bucket='exports', CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'})
+        connection, _ = create_streaming_connection(self.rows, self.columns)
+        target = export_writer.S3ExportTarget('exports', 'finance', s3)
+
+        manifest = export_writer.stream_export(connection, 'SELECT 1', [], target, 'sept',
+                                               rows_per_part=20, work_dir=self.export_dir)
+
+        keys = sorted(item['Key'] for item in s3.list_objects_v2(Bucket='exports')['Contents'])
+        self.assertEqual(keys, ['finance/sept/manifest.json', 'finance/sept/part-00001.ndjson.gz',
+                                'finance/sept/part-00002.ndjson.gz'])
+        self.assertEqual(manifest['parts'][0]['location'], 's3://exports/finance/sept/part-00001.ndjson.gz')
+        self.assertEqual(os.listdir(self.export_dir), [])
+
+
+SAMPLE_PLAN = {
+    'query_block': {
+        'select_id': 1,
+        'nested_loop': [
+            {'table': {'table_name': 'ul', 'access_type': 'ALL', 'rows_examined_per_scan': 40}},
+            {'table': {'table_name': 'br', 'access_type': 'ref', 'key': 'idx_user_date',
+                       'rows_examined_per_scan': 120}}
+        ]
+    }
+}
+
+
+class TestQueryExecutorSlowQueryLog(unittest.TestCase):
+    """Test suite for slow-query capture"""
+
+    def setUp(self):
+        query_executor.RESULT_CACHE.clear()
+
+    def test_fingerprint_ignores_literals_and_parameters(self):
+        """Executions that differ only in values share a fingerprint"""
+        first = "SELECT * FROM bedrock_requests WHERE user_id = 'alice' AND date_only >= '2025-09-01' LIMIT 10"
+        second = "SELECT *  FROM bedrock_requests\nWHERE user_id = %s AND date_only >= ? LIMIT 500;"
+
+        self.assertEqual(query_stats.fingerprint(first), query_stats.fingerprint(second))
+        self.assertEqual(query_stats.normalize_fingerprint("SELECT 1 FROM t WHERE id IN (1, 2, 3)"),
+                         'SELECT ? FROM t WHERE id IN (?)')
+
+    def test_plan_summary_reports_indexes_and_rows_examined(self):
+        """The plan summary lists the chosen index per table and the examined rows"""
+        summary = query_stats.summarize_plan(SAMPLE_PLAN)
+
+        self.assertEqual(summary['index_used'], 'ul.<none>, br.idx_user_date')
+        self.assertEqual(summary['access_types'], 'ALL, ref')
+        self.assertEqual(summary['rows_examined'], 160)
+
+    def test_slow_query_is_explained_and_recorded(self):
+        """Queries over the threshold run EXPLAIN FORMAT=JSON and insert into query_stats"""
+        connection = create_mock_connection({'FROM user_limits': [{'user_id': 'user1'}]},
+                                            watermark=json.dumps(SAMPLE_PLAN))
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection), \
+                patch.object(query_executor, 'SLOW_QUERY_MS', 0):
+            response = query_executor.lambda_handler({
+                'action': 'query', 'query': 'SELECT user_id FROM user_limits WHERE team = ?',
+                'params': ['team_a'], 'cache_ttl': 0
+            }, ADMIN_CONTEXT)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['data'], [{'user_id': 'user1'}])
+
+        explain = [params for query, params in connection.executed if query.startswith('EXPLAIN FORMAT=JSON')]
+        inserts = [params for query, params in connection.executed if 'INSERT INTO query_stats' in query]
+        self.assertEqual(explain, [['team_a']])
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(inserts[0][0], query_stats.fingerprint('SELECT user_id FROM user_limits WHERE team = ?'))
+        self.assertEqual(inserts[0][6], 'ul.<none>, br.idx_user_date')
+        self.assertEqual(inserts[0][5], 160)
+
+    def test_fast_queries_are_not_recorded(self):
+        """Queries under the threshold only get a timing log line"""
+        connection = Mock()
+        record = query_stats.observe_query(connection, 'SELECT 1', [], 5.0, 1, 'query', 500)
+
+        self.assertIsNone(record)
+        connection.cursor.assert_not_called()
+
+    def test_query_stats_action_returns_top_fingerprints(self):
+        """The aggregation action orders fingerprints by total time"""
+        connection = create_mock_connection({'FROM query_stats': [
+            {'fingerprint': 'abc', 'total_ms': Decimal('1500.5'), 'slow_executions': 3}
+        ]})
+
+        with patch.object(query_executor, 'get_db_connection', return_value=connection):
+            response = query_executor.lambda_handler({'action': 'query_stats', 'limit': 5}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['data'], [{'fingerprint': 'abc', 'total_ms': 1500.5, 'slow_executions': 3}])
+
+
+class TestQueryExecutorReplicaRouting(unittest.TestCase):
+    """Test suite for read-replica routing in the executor"""
+
+    def setUp(self):
+        query_executor.RESULT_CACHE.clear()
+        self.primary = create_mock_connection({'SELECT': [{'source': 'primary'}]})
+        self.replica = create_mock_connection({'SELECT': [{'source': 'replica'}]})
+        self.router = Mock()
+        self.router.connect_for_read.side_effect = \
+            lambda consistency: None if consistency == 'strong' else self.replica
+
+    def run_event(self, event):
+        with patch.object(query_executor, 'get_db_connection', return_value=self.primary), \
+                patch.object(query_executor, 'REPLICA_ROUTER', self.router):
+            return query_executor.lambda_handler(event, ADMIN_CONTEXT)
+
+    def test_selects_are_routed_to_the_replica(self):
+        """Eventually consistent SELECTs read from the replica"""
+        response = self.run_event({'action': 'query', 'query': 'SELECT 1 FROM user_limits'})
+
+        self.assertEqual(response['routed_to'], 'replica')
+        self.assertEqual(response['data'], [{'source': 'replica'}])
+
+    def test_strong_consistency_uses_primary_and_skips_cache(self):
+        """consistency=strong reads from the primary and bypasses the cache"""
+        self.run_event({'action': 'query', 'query': 'SELECT 1 FROM user_limits'})
+        response = self.run_event({'action': 'query', 'query': 'SELECT 1 FROM user_limits', 'consistency': 'strong'})
+
+        self.assertEqual(response['routed_to'], 'primary')
+        self.assertEqual(response['cache'], 'bypass')
+        self.assertEqual(response['data'], [{'source': 'primary'}])
+
+    def test_writes_always_use_primary(self):
+        """Writes and batches containing writes never touch the replica"""
+        write = self.run_event({'action': 'query', 'query': "UPDATE user_limits SET team = 'x'"})
+        batch = self.run_event({'action': 'batch', 'queries': [
+            {'id': 'read', 'query': 'SELECT 1 FROM user_limits'},
+            {'id': 'write', 'query': "DELETE FROM user_blocking_status WHERE user_id = 'x'"}
+        ]})
+
+        self.assertEqual(write['routed_to'], 'primary')
+        self.assertEqual(batch['data']['read'], [{'source': 'primary'}])
+        self.router.connect_for_read.assert_not_called()
+
+    def test_invalid_consistency_is_rejected(self):
+        """Only eventual and strong consistency are accepted"""
+        response = self.run_event({'action': 'query', 'query': 'SELECT 1', 'consistency': 'sometimes'})
+
+        self.assertEqual(response['statusCode'], 500)
+        self.assertIn('Unsupported consistency', response['errorMessage'])
+
+
+def store_archived_month(store, month, rows, work_dir):
+    """Write rows as one archived month part plus its manifest"""
+    part_path = os.path.join(work_dir, 'part')
+    with gzip.open(part_path, 'wt', encoding='utf-8') as part:
+        for row in rows:
+            part.write(json.dumps(row) + '\n')
+    with open(part_path, 'rb') as part:
+        digest = hashlib.sha256(part.read()).hexdigest()
+    key = f"{partition_archive.month_key('bedrock_requests', month)}/part-00001.ndjson.gz"
+    store.put(part_path, key)
+
+    manifest_path = os.path.join(work_dir, 'manifest')
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump({'table': 'bedrock_requests', 'month': month.strftime('%Y-%m'), 'rows': len(rows),
+                   'source': {'rows': len(rows), 'id_sum': sum(row['id'] for row in rows)},
+                   'parts': [{'key': key, 'rows': len(rows), 'id_sum': sum(row['id'] for row in rows),
+                              'sha256': digest}]}, manifest_file)
+    store.put(manifest_path, partition_archive.manifest_key('bedrock_requests', month))
+
+
+class TestQueryExecutorArchive(unittest.TestCase):
+    """Test suite for historical reports over archived months"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.months = {
+            date(2024, 1, 1): [{'id': 1, 'user_id': 'alice', 'team': 'team_a', 'model_id': 'claude',
+                                'input_tokens': 100, 'output_tokens': 10, 'cost_usd': '0.001000'},
+                               {'id': 2, 'user_id': 'bob', 'team': 'team_b', 'model_id': 'claude',
+                                'input_tokens': 50, 'output_tokens': 5, 'cost_usd': '0.000500'}],
+            date(2024, 2, 1): [{'id': 3, 'user_id': 'alice', 'team': 'team_a', 'model_id': 'titan',
+                                'input_tokens': 10, 'output_tokens': 1, 'cost_usd': '0.000100'}]
+        }
+
+    @mock_aws
+    def test_archive_action_aggregates_months_from_s3(self):
+        """Archived months are grouped and filtered without touching MySQL"""
+        s3 = boto3.client('s3', region_name='eu-west-1')
+        s3.create_bucket(Bucket='bedrock-archive', CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'})
+        store = partition_archive.S3ArchiveStore('bedrock-archive', 'archive', s3_client=s3)
+        for month, rows in self.months.items():
+            store_archived_month(store, month, rows, self.work_dir)
+
+        with patch.object(query_executor, 'ARCHIVE_BUCKET', 'bedrock-archive'), \
+                patch.object(query_executor, 'get_db_connection') as get_connection:
+            response = query_executor.lambda_handler({
+                'action': 'archive', 'start_month': '2024-01', 'end_month': '2024-02',
+                'group_by': ['user_id'], 'filters': {'team': 'team_a'}
+            }, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['data']['rows'], [['alice', 2, 110, 11, 0.0011]])
+        get_connection.assert_not_called()
+
+    def test_missing_month_and_long_ranges_are_rejected(self):
+        """Months that were never archived and ranges over the limit return errors"""
+        with patch.object(query_executor, 'ARCHIVE_BUCKET', None), \
+                patch.object(query_executor, 'ARCHIVE_DIR', self.work_dir):
+            missing = query_executor.lambda_handler({'action': 'archive', 'month': '2023-05'}, None)
+            too_long = query_executor.lambda_handler({'action': 'archive', 'start_month': '2020-01',
+                                                      'end_month': '2024-01'}, None)
+
+        self.assertEqual(missing['statusCode'], 500)
+        self.assertIn('is not archived', missing['errorMessage'])
+        self.assertIn('At most', too_long['errorMessage'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the notification outbox
+======================================
+
+This test suite validates shared/notification_outbox.py and its use by the
+realtime usage controller:
+1. Claiming due rows with FOR UPDATE SKIP LOCKED and leasing them
+2. Delivery, retries with exponential backoff and giving up after max attempts
+3. email_sent write-back to blocking_audit_log
+4. One SMTP login per dispatch run, reconnecting when the server drops it
+5. Blocking/unblocking workflows queueing notifications in the status transaction
+   instead of sending email inline
+6. Asynchronous email service invocations whose outcome is reported back
+   through the email_delivery_status action
+7. Coalescing per recipient: hold window, superseded notifications, digests
+   and per-recipient / global rate limits
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import importlib.util
+import json
+import os
+import smtplib
+import sys
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions')
+BUILD_DIR = os.path.join(os.path.dirname(__file__), '..', '03. Build_folder')
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'shared'))
+sys.path.append(BUILD_DIR)
+
+import notification_outbox
+
+os.environ.update({'RDS_ENDPOINT': 'test-endpoint', 'RDS_USERNAME': 'test', 'RDS_PASSWORD': 'test',
+                   'RDS_DATABASE': 'bedrock_usage', 'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'eu-west-1')})
+spec = importlib.util.spec_from_file_location("usage_controller", os.path.join(
+    LAMBDA_DIR, 'bedrock-realtime-usage-controller-aws-20250923', 'lambda_function.py'))
+usage_controller = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(usage_controller)
+
+spec = importlib.util.spec_from_file_location("email_service_handler", os.path.join(BUILD_DIR, 'lambda_handler.py'))
+email_service_handler = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(email_service_handler)
+
+NOW = datetime(2025, 9, 1, 10, 0, 0)
+
+
+class FakeOutboxDatabase:
+    """Connection over in-memory notification_outbox and blocking_audit_log tables"""
+
+    def __init__(self):
+        self.outbox = {}
+        self.audit_log = {}
+        self.statements = []
+        self.in_transaction = False
+        self.begin = Mock(side_effect=self._begin)
+        self.commit = Mock(side_effect=self._end)
+        self.rollback = Mock(side_effect=self._end)
+        self.fail_on = None
+
+    def _begin(self):
+        self.in_transaction = True
+
+    def _end(self):
+        self.in_transaction = False
+
+    def add(self, user_id='alice', notification_type='BLOCK', next_attempt_at=NOW, status='PENDING', attempts=0,
+            audit_log_id=None, created_at=None, sent_at=None):
+        row_id = len(self.outbox) + 1
+        self.outbox[row_id] = {'id': row_id, 'user_id': user_id, 'notification_type': notification_type,
+                               'payload': json.dumps({'reason': 'test'}), 'status': status, 'attempts': attempts,
+                               'next_attempt_at': next_attempt_at, 'audit_log_id': audit_log_id,
+                               'created_at': created_at or next_attempt_at, 'superseded_by': None,
+                               'last_error': None, 'sent_at': sent_at}
+        return row_id
+
+    @staticmethod
+    def counts_as_sent(row, since):
+        return row['status'] in ('SENT', 'SENDING') and row['sent_at'] is not None and row['sent_at'] >= since
+
+    def cursor(self, cursor_class=None):
+        database = self
+        cursor = Mock()
+
+        def execute(query, params=None):
+            statement = ' '.join(query.split())
+            database.statements.append((statement, database.in_transaction))
+            if database.fail_on and database.fail_on in statement:
+                raise RuntimeError('database unavailable')
+            if statement.startswith('INSERT INTO notification_outbox'):
+                user_id, notification_type, payload, audit_log_id, next_attempt_at, created_at = params
+                cursor.lastrowid = database.add(user_id, notification_type, next_attempt_at,
+                                                audit_log_id=audit_log_id, created_at=created_at)
+                database.outbox[cursor.lastrowid]['payload'] = payload
+            elif statement.startswith('INSERT INTO blocking_audit_log'):
+                cursor.lastrowid = 100 + len(database.audit_log)
+                database.audit_log[cursor.lastrowid] = {'user_id': params[0], 'email_sent': 'N'}
+            elif statement.startswith('SELECT id, user_id, notification_type, status'):
+                row = database.outbox.get(params[0])
+                cursor.fetchone.return_value = dict(row) if row else None
+            elif statement.startswith('SELECT id, user_id, notification_type'):
+                now, limit = params
+                due = sorted((row for row in database.outbox.values()
+                              if row['status'] in ('PENDING', 'SENDING') and row['next_attempt_at'] <= now),
+                             key=lambda row: (row['next_attempt_at'], row['id']))
+                cursor.fetchall.return_value = [dict(row) for row in due[:limit]]
+            elif statement.startswith('SELECT user_id, MAX(id)'):
+                latest = {}
+                for row in database.outbox.values():
+                    if row['user_id'] in params and row['status'] in ('PENDING', 'SENDING'):
+                        latest[row['user_id']] = max(latest.get(row['user_id'], 0), row['id'])
+                cursor.fetchall.return_value = [{'user_id': user_id, 'latest_id': latest_id}
+                                                for user_id, latest_id in latest.items()]
+            elif "SET status = 'SUPERSEDED'" in statement:
+                newest, ids = params[0], params[1:(len(params) + 1) // 2]
+                for row in database.outbox.values():
+                    if row['id'] in ids or row['superseded_by'] in ids:
+                        row.update(status='SUPERSEDED', superseded_by=newest)
+            elif statement.startswith('SELECT superseded_by'):
+                cursor.fetchall.return_value = [dict(row) for row in sorted(database.outbox.values(),
+                                                                            key=lambda row: row['id'])
+                                                if row['superseded_by'] in params]
+            elif statement.startswith('SELECT user_id, COUNT(*)'):
+                users, since = params[:-1], params[-1]
+                sent = {}
+                for row in database.outbox.values():
+                    if row['user_id'] in users and database.counts_as_sent(row, since):
+                        entry = sent.setdefault(row['user_id'], {'user_id': row['user_id'], 'sent': 0,
+                                                                 'first_sent_at': row['sent_at']})
+                        entry['sent'] += 1
+                        entry['first_sent_at'] = min(entry['first_sent_at'], row['sent_at'])
+                cursor.fetchall.return_value = list(sent.values())
+            elif statement.startswith('SELECT COUNT(*) AS sent'):
+                cursor.fetchone.return_value = {'sent': sum(1 for row in database.outbox.values()
+                                                            if database.counts_as_sent(row, params[0]))}
+            elif 'attempts = attempts - 1' in statement:
+                row = database.outbox[params[1]]
+                row.update(status='PENDING', attempts=row['attempts'] - 1, next_attempt_at=params[0])
+            elif "SET status = 'FAILED'" in statement:
+                for row_id in params[1:]:
+                    database.outbox[row_id].update(status='FAILED', last_error=params[0])
+            elif "SET status = 'SENDING'" in statement:
+                for row_id in params[1:]:
+                    database.outbox[row_id].update(status='SENDING', next_attempt_at=params[0],
+                                                   attempts=database.outbox[row_id]['attempts'] + 1)
+            elif statement.startswith('UPDATE notification_outbox SET sent_at'):
+                if database.outbox[params[1]]['status'] == 'SENDING':
+                    database.outbox[params[1]]['sent_at'] = params[0]
+            elif "SET status = 'SENT'" in statement:
+                database.outbox[params[1]].update(status='SENT', sent_at=params[0])
+            elif statement.startswith('UPDATE notification_outbox SET status = %s'):
+                status, next_attempt_at, error, row_id = params
+                database.outbox[row_id].update(status=status, next_attempt_at=next_attempt_at, last_error=error)
+            elif statement.startswith('UPDATE notification_outbox SET audit_log_id'):
+                database.outbox[params[1]]['audit_log_id'] = params[0]
+            elif statement.startswith('UPDATE blocking_audit_log a JOIN notification_outbox o ON o.audit_log_id'):
+                for row in database.outbox.values():
+                    if row['superseded_by'] == params[0] and row['audit_log_id']:
+                        database.audit_log[row['audit_log_id']]['email_sent'] = 'Y'
+            elif statement.startswith('UPDATE blocking_audit_log a JOIN'):
+                if database.outbox[params[0]]['status'] == 'SENT':
+                    database.audit_log[params[1]]['email_sent'] = 'Y'
+            elif statement.startswith("UPDATE blocking_audit_log SET email_sent = 'Y'"):
+                database.audit_log[params[0]]['email_sent'] = 'Y'
+
+        cursor.execute.side_effect = execute
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        return context
+
+
+class TestOutboxDispatch(unittest.TestCase):
+    """Test suite for claiming and delivering outbox rows"""
+
+    def test_claim_leases_due_rows_with_skip_locked(self):
+        """Only due rows are claimed, in one committed transaction, and leased"""
+        database = FakeOutboxDatabase()
+        due = database.add()
+        later = database.add(next_attempt_at=NOW + timedelta(minutes=5))
+        expired_lease = database.add(status='SENDING', attempts=1, next_attempt_at=NOW - timedelta(seconds=1))
+
+        rows = notification_outbox.claim_batch(database, NOW, batch_size=10, lease_seconds=300)
+
+        self.assertEqual([row['id'] for row in rows], [expired_lease, due])
+        self.assertEqual(rows[1]['payload'], {'reason': 'test'})
+        self.assertEqual([row['attempts'] for row in rows], [2, 1])
+        self.assertEqual(database.outbox[due]['status'], 'SENDING')
+        self.assertEqual(database.outbox[due]['next_attempt_at'], NOW + timedelta(seconds=300))
+        self.assertEqual(database.outbox[later]['status'], 'PENDING')
+        select = [statement for statement, _ in database.statements if statement.startswith('SELECT')][0]
+        self.assertIn('FOR UPDATE SKIP LOCKED', select)
+        self.assertTrue(all(in_transaction for _, in_transaction in database.statements))
+        database.commit.assert_called_once()
+
+    def test_delivery_marks_sent_and_writes_back_email_sent(self):
+        """Delivered rows are SENT and their audit entry records the email"""
+        database = FakeOutboxDatabase()
+        database.audit_log[7] = {'user_id': 'alice', 'email_sent': 'N'}
+        row_id = database.add(audit_log_id=7)
+        database.add(user_id='bob', notification_type='UNBLOCK')
+        deliver = Mock(return_value=True)
+
+        stats = notification_outbox.dispatch_notifications(database, deliver, lambda: NOW)
+
+        self.assertEqual(stats['sent'], 2)
+        self.assertEqual(deliver.call_count, 2)
+        self.assertEqual(database.outbox[row_id]['status'], 'SENT')
+        self.assertEqual(database.audit_log[7]['email_sent'], 'Y')
+
+    def test_failures_back_off_then_give_up(self):
+        """Failed rows are retried later with growing delays and FAILED after max attempts"""
+        database = FakeOutboxDatabase()
+        row_id = database.add()
+        deliver = Mock(side_effect=smtplib.SMTPException('421 try again'))
+        clock = [NOW]
+
+        delays = []
+        for _ in range(3):
+            stats = notification_outbox.dispatch_notifications(database, deliver, lambda: clock[0], max_attempts=3)
+            row = database.outbox[row_id]
+            delays.append(row['next_attempt_at'] - clock[0])
+            clock[0] = row['next_attempt_at']
+
+        self.assertEqual(delays[:2], [timedelta(seconds=30), timedelta(seconds=60)])
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(database.outbox[row_id]['status'], 'FAILED')
+        self.assertIn('421', database.outbox[row_id]['last_error'])
+        self.assertEqual(notification_outbox.dispatch_notifications(database, deliver, lambda: clock[0])['claimed'], 0)
+
+    def test_retry_delay_is_capped(self):
+        """Backoff doubles per attempt up to an hour"""
+        self.assertEqual(notification_outbox.retry_delay(1), timedelta(seconds=30))
+        self.assertEqual(notification_outbox.retry_delay(3), timedelta(seconds=120))
+        self.assertEqual(notification_outbox.retry_delay(20), timedelta(hours=1))
+
+    def test_late_audit_link_still_records_delivery(self):
+        """Linking the audit entry after delivery still sets email_sent"""
+        database = FakeOutboxDatabase()
+        database.audit_log[9] = {'user_id': 'alice', 'email_sent': 'N'}
+        row_id = database.add()
+        notification_outbox.dispatch_notifications(database, Mock(return_value=True), lambda: NOW)
+
+        notification_outbox.attach_audit_log(database, row_id, 9)
+
+        self.assertEqual(database.audit_log[9]['email_sent'], 'Y')
+
+
+class TestSmtpSession(unittest.TestCase):
+    """Test suite for the pooled SMTP session"""
+
+    def setUp(self):
+        self.config = {'server': 'smtp.example.com', 'port': 587, 'user': 'noreply', 'password': 'secret',
+                       'use_tls': True}
+
+    def test_one_login_for_many_messages(self):
+        """Messages of a run share one connection and login"""
+        factory = Mock()
+        with notification_outbox.SmtpSession(self.config, factory) as session:
+            for n in range(5):
+                session.send(MIMEText(f'message {n}'))
+
+        factory.assert_called_once_with('smtp.example.com', 587, timeout=10)
+        server = factory.return_value
+        server.login.assert_called_once_with('noreply', 'secret')
+        self.assertEqual(server.send_message.call_count, 5)
+        server.quit.assert_called_once()
+
+    def test_reconnects_after_disconnect(self):
+        """A dropped session is reopened once and the message resent"""
+        first, second = Mock(), Mock()
+        first.send_message.side_effect = smtplib.SMTPServerDisconnected('idle timeout')
+        session = notification_outbox.SmtpSession(self.config, Mock(side_effect=[first, second]))
+
+        session.send(MIMEText('hello'))
+
+        self.assertEqual(session.connections, 2)
+        second.send_message.assert_called_once()
+
+    def test_unused_session_never_connects(self):
+        """A run with nothing to send does not contact the mail server"""
+        factory = Mock()
+        with notification_outbox.SmtpSession(self.config, factory):
+            pass
+        factory.assert_not_called()
+
+
+class TestControllerOutbox(unittest.TestCase):
+    """Test suite for the controller's use of the outbox"""
+
+    def setUp(self):
+        self.usage = {'daily_requests_used': 350, 'daily_limit': 350, 'daily_percent': 100.0,
+                      'monthly_requests_used': 900, 'monthly_limit': 5000, 'monthly_percent': 18.0}
+
+    def test_blocking_queues_notification_instead_of_sending(self):
+        """The status change and the outbox row share a transaction and no SMTP happens inline"""
+        database = FakeOutboxDatabase()
+
+        with patch.object(usage_controller, 'implement_iam_blocking', return_value=True), \
+                patch.object(usage_controller, 'get_cet_timestamp_string', return_value='2025-09-01 10:00:00'), \
+                patch.object(usage_controller.smtplib, 'SMTP') as smtp, \
+                patch.object(usage_controller.lambda_client, 'invoke') as invoke:
+            self.assertTrue(usage_controller.execute_user_blocking(database, 'alice', 'Daily limit exceeded',
+                                                                   self.usage))
+
+        smtp.assert_not_called()
+        invoke.assert_not_called()
+        transactional = [statement.split(' (')[0] for statement, in_transaction in database.statements
+                         if in_transaction]
+        self.assertEqual(transactional, ['INSERT INTO user_blocking_status', 'INSERT INTO notification_outbox'])
+        row = database.outbox[1]
+        self.assertEqual(row['notification_type'], 'BLOCK')
+        payload = json.loads(row['payload'])
+        self.assertEqual(payload['usage_info'], self.usage)
+        self.assertEqual(payload['blocked_at'], '2025-09-01 10:00:00')
+        self.assertEqual(row['audit_log_id'], 100)
+        self.assertEqual(database.audit_log[100]['email_sent'], 'N')
+
+    def test_blocking_email_shows_the_block_time(self):
+        """A notification delivered after the hold window still says when the block happened"""
+        row = {'id': 1, 'user_id': 'alice', 'notification_type': 'BLOCK',
+               'payload': {'reason': 'Daily limit exceeded', 'usage_info': self.usage,
+                           'blocked_at': '2025-09-01 10:00:00', 'blocked_until': '2025-09-02 00:00:00'}}
+
+        with patch.object(usage_controller, 'get_user_email', return_value='alice@corp'), \
+                patch.object(usage_controller, 'get_cet_timestamp_string', return_value='2025-09-01 10:05:00'), \
+                patch.object(usage_controller, 'send_gmail_email', return_value=True) as send:
+            self.assertTrue(usage_controller.deliver_notification(row, Mock()))
+
+        body_text = send.call_args.args[2]
+        self.assertIn('Bloqueado el: 2025-09-01 10:00:00 CET', body_text)
+        self.assertNotIn('10:05:00', body_text)
+
+    def test_failed_enqueue_rolls_back_the_block(self):
+        """Without its notification the status change is not committed"""
+        database = FakeOutboxDatabase()
+        database.fail_on = 'INSERT INTO notification_outbox'
+
+        with patch.object(usage_controller, 'implement_iam_blocking') as iam_blocking:
+            self.assertFalse(usage_controller.execute_user_blocking(database, 'alice', 'Daily limit exceeded',
+                                                                    self.usage))
+
+        database.rollback.assert_called_once()
+        database.commit.assert_not_called()
+        iam_blocking.assert_not_called()
+
+    def test_admin_unblocking_queues_notification(self):
+        """Admin unblocks queue an ADMIN_UNBLOCK notification"""
+        database = FakeOutboxDatabase()
+
+        with patch.object(usage_controller, 'implement_iam_unblocking', return_value=True), \
+                patch.object(usage_controller, 'send_enhanced_unblocking_email') as send:
+            self.assertTrue(usage_controller.execute_admin_unblocking(database, 'alice', 'ticket 42', 'admin@corp'))
+
+        send.assert_not_called()
+        self.assertEqual(database.outbox[1]['notification_type'], 'ADMIN_UNBLOCK')
+        self.assertEqual(json.loads(database.outbox[1]['payload']), {'reason': 'ticket 42', 'performed_by': 'admin@corp'})
+
+    def test_dispatch_action_delivers_over_one_session(self):
+        """The dispatch_notifications action sends every due row through one SMTP login"""
+        database = FakeOutboxDatabase()
+        for user_id in ('alice', 'bob', 'carol'):
+            row_id = database.add(user_id=user_id)
+            database.outbox[row_id]['payload'] = json.dumps({'reason': 'Daily limit exceeded',
+                                                             'usage_info': self.usage,
+                                                             'blocked_until': '2025-09-02 00:00:00'})
+
+        with patch.object(usage_controller, 'get_mysql_connection', return_value=database), \
+                patch.object(usage_controller, 'get_user_email', side_effect=lambda user_id: f'{user_id}@corp'), \
+                patch.object(notification_outbox.smtplib, 'SMTP') as smtp:
+            response = usage_controller.lambda_handler({'action': 'dispatch_notifications'}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(json.loads(response['body'])['sent'], 3)
+        smtp.return_value.login.assert_called_once()
+        self.assertEqual(smtp.return_value.send_message.call_count, 3)
+        self.assertEqual({row['status'] for row in database.outbox.values()}, {'SENT'})
+
+
+class TestAsyncEmailDelivery(unittest.TestCase):
+    """Test suite for InvocationType='Event' sends with status write-back"""
+
+    def setUp(self):
+        self.database = FakeOutboxDatabase()
+        self.database.audit_log[5] = {'user_id': 'alice', 'email_sent': 'N'}
+        self.row_id = self.database.add(notification_type='ADMIN_UNBLOCK', audit_log_id=5)
+        self.database.outbox[self.row_id]['payload'] = json.dumps({'reason': 'ticket 42', 'performed_by': 'admin'})
+
+    def test_accepted_rows_stay_leased(self):
+        """A handed-off row is neither SENT nor retried until its outcome is reported"""
+        stats = notification_outbox.dispatch_notifications(
+            self.database, Mock(return_value=notification_outbox.DELIVERY_ACCEPTED), lambda: NOW)
+
+        self.assertEqual(stats['accepted'], 1)
+        self.assertEqual(self.database.outbox[self.row_id]['status'], 'SENDING')
+        self.assertEqual(self.database.outbox[self.row_id]['sent_at'], NOW)
+        self.assertEqual(self.database.audit_log[5]['email_sent'], 'N')
+
+    def test_handoffs_count_against_the_recipient_limit(self):
+        """Accepted hand-offs awaiting their report use up the recipient's sends"""
+        database = FakeOutboxDatabase()
+        deliver = Mock(return_value=notification_outbox.DELIVERY_ACCEPTED)
+        for minutes in (20, 10):
+            database.add(status='SENDING', sent_at=NOW - timedelta(minutes=minutes),
+                         next_attempt_at=NOW + timedelta(minutes=1))
+        row_id = database.add()
+
+        stats = notification_outbox.dispatch_notifications(database, deliver, lambda: NOW,
+                                                           recipient_limit=2, recipient_window=3600)
+
+        self.assertEqual((stats['deferred'], stats['accepted']), (1, 0))
+        deliver.assert_not_called()
+        self.assertEqual(database.outbox[row_id]['next_attempt_at'], NOW + timedelta(minutes=40))
+
+    def test_unreported_handoffs_stop_after_max_attempts(self):
+        """Every expired lease costs an attempt; the last one ends FAILED instead of another hand-off"""
+        deliver = Mock(return_value=notification_outbox.DELIVERY_ACCEPTED)
+        lease = timedelta(seconds=notification_outbox.DEFAULT_LEASE_SECONDS)
+
+        for run in range(3):
+            notification_outbox.dispatch_notifications(self.database, deliver, lambda: NOW + run * lease,
+                                                       max_attempts=2)
+
+        row = self.database.outbox[self.row_id]
+        self.assertEqual(deliver.call_count, 2)
+        self.assertEqual((row['status'], row['attempts']), ('FAILED', 2))
+        self.assertIn('No delivery report', row['last_error'])
+        self.assertEqual(self.database.audit_log[5]['email_sent'], 'N')
+
+    def test_record_delivery_applies_the_reported_outcome(self):
+        """Success marks SENT with email_sent; failures back off; duplicate reports are ignored"""
+        failed = self.database.add(status='SENDING', attempts=1)
+
+        self.assertEqual(notification_outbox.record_delivery(self.database, self.row_id, True, None, NOW), 'SENT')
+        self.assertIsNone(notification_outbox.record_delivery(self.database, self.row_id, False, 'late', NOW))
+        self.assertEqual(notification_outbox.record_delivery(self.database, failed, False, '550', NOW), 'PENDING')
+
+        self.assertEqual(self.database.audit_log[5]['email_sent'], 'Y')
+        self.assertEqual(self.database.outbox[failed]['next_attempt_at'], NOW + timedelta(seconds=30))
+        self.assertIsNone(notification_outbox.record_delivery(self.database, 999, True, None, NOW))
+
+    def test_controller_invokes_email_service_as_event(self):
+        """In async mode the dispatcher does not wait for the email service and the callback completes the row"""
+        invoke = Mock(return_value={'StatusCode': 202})
+        tags = {'Email': 'alice@corp', 'Person': 'Alice'}
+        with patch.object(usage_controller, 'EMAIL_INVOCATION_MODE', 'async'), \
+                patch.object(usage_controller, 'get_mysql_connection', return_value=self.database), \
+                patch.object(usage_controller.tag_resolver, 'get_tags', return_value=tags), \
+                patch.object(usage_controller.lambda_client, 'invoke', invoke):
+            dispatched = usage_controller.lambda_handler({'action': 'dispatch_notifications'}, None)
+            self.assertEqual(self.database.outbox[self.row_id]['status'], 'SENDING')
+            reported = usage_controller.lambda_handler({'action': 'email_delivery_status', 'user_id': 'alice',
+                                                        'outbox_id': self.row_id, 'audit_log_id': 5,
+                                                        'success': True}, None)
+
+        self.assertEqual(json.loads(dispatched['body'])['accepted'], 1)
+        self.assertEqual(invoke.call_args.kwargs['InvocationType'], 'Event')
+        payload = json.loads(invoke.call_args.kwargs['Payload'])
+        self.assertEqual(payload['action'], 'send_admin_unblocking_email')
+        self.assertEqual(payload['status_callback']['outbox_id'], self.row_id)
+        self.assertEqual(payload['status_callback']['audit_log_id'], 5)
+        self.assertEqual(payload['recipient'], {'email': 'alice@corp', 'display_name': 'Alice'})
+        self.assertEqual(json.loads(reported['body'])['status'], 'SENT')
+        self.assertEqual(self.database.audit_log[5]['email_sent'], 'Y')
+
+    def test_admin_block_carries_its_expiration(self):
+        """ADMIN_BLOCK rows store blocked_until and the email service gets it as expires_at"""
+        database = FakeOutboxDatabase()
+        usage = {'daily_requests_used': 3}
+        with patch.object(usage_controller, 'get_cet_timestamp_string', return_value='2025-09-01 10:00:00'), \
+                patch.object(usage_controller, 'get_current_cet_time',
+                             return_value=usage_controller.CET.localize(datetime(2025, 9, 1, 10, 0, 0))), \
+                patch.object(usage_controller, 'implement_iam_blocking', return_value=True):
+            self.assertTrue(usage_controller.execute_admin_blocking(database, 'alice', 'Abuse', 'ops', usage))
+
+        row = dict(database.outbox[1], payload=json.loads(database.outbox[1]['payload']))
+        self.assertEqual(row['payload']['blocked_until'], '2025-09-02 10:00:00')
+
+        invoke = Mock(return_value={'StatusCode': 202})
+        with patch.object(usage_controller, 'EMAIL_INVOCATION_MODE', 'async'), \
+                patch.object(usage_controller, 'get_email_recipient', return_value=None), \
+                patch.object(usage_controller.lambda_client, 'invoke', invoke):
+            self.assertEqual(usage_controller.deliver_notification(row, Mock()), notification_outbox.DELIVERY_ACCEPTED)
+
+        payload = json.loads(invoke.call_args.kwargs['Payload'])
+        self.assertEqual(payload['usage_record']['expires_at'], '2025-09-02T10:00:00+02:00')
+        self.assertEqual(payload['blocked_at'], '2025-09-01 10:00:00')
+
+    def test_rejected_event_falls_back_to_gmail(self):
+        """If the email service cannot be invoked, the message goes out over SMTP directly"""
+        with patch.object(usage_controller, 'EMAIL_INVOCATION_MODE', 'async'), \
+                patch.object(usage_controller.lambda_client, 'invoke', side_effect=RuntimeError('throttled')), \
+                patch.object(usage_controller, 'send_unblocking_email_gmail', return_value=True) as gmail:
+            result = usage_controller.send_enhanced_unblocking_email('alice', 'ticket 42', 'admin',
+                                                                     delivery={'outbox_id': 1})
+
+        self.assertIs(result, True)
+        gmail.assert_called_once()
+
+    def test_email_service_reports_to_the_callback(self):
+        """The email service Lambda reports success or failure to the status callback"""
+        service = Mock()
+        service.send_admin_unblocking_email.side_effect = [True, False]
+        callback = {'function': 'bedrock-realtime-usage-controller', 'outbox_id': 3, 'audit_log_id': 5}
+        event = {'action': 'send_admin_unblocking_email', 'user_id': 'alice', 'performed_by': 'admin',
+                 'status_callback': callback}
+
+        with patch.object(email_service_handler, 'create_email_service', return_value=service), \
+                patch.object(email_service_handler.lambda_client, 'invoke') as invoke:
+            self.assertEqual(email_service_handler.lambda_handler(event, None)['statusCode'], 200)
+            self.assertEqual(email_service_handler.lambda_handler(event, None)['statusCode'], 500)
+            email_service_handler.lambda_handler({'action': 'send_unblocking_email', 'user_id': 'bob'}, None)
+
+        self.assertEqual(invoke.call_count, 2)
+        reports = [json.loads(call.kwargs['Payload']) for call in invoke.call_args_list]
+        self.assertEqual([report['success'] for report in reports], [True, False])
+        self.assertEqual(reports[0]['action'], 'email_delivery_status')
+        self.assertEqual(reports[0]['outbox_id'], 3)
+        self.assertEqual(invoke.call_args.kwargs['FunctionName'], 'bedrock-realtime-usage-controller')
+
+
+class TestCoalescing(unittest.TestCase):
+    """Test suite for per-recipient coalescing and rate limits"""
+
+    def setUp(self):
+        self.database = FakeOutboxDatabase()
+        self.deliver = Mock(return_value=True)
+
+    def dispatch(self, at=NOW, **limits):
+        return notification_outbox.dispatch_notifications(self.database, self.deliver, lambda: at, **limits)
+
+    def test_hold_window_delays_delivery(self):
+        """A new notification is only due once its hold window has passed"""
+        notification_outbox.enqueue_notification(self.database, 'alice', 'BLOCK', {'reason': 'limit'}, NOW,
+                                                 hold_seconds=120)
+
+        self.assertEqual(self.dispatch(NOW)['claimed'], 0)
+        self.assertEqual(self.dispatch(NOW + timedelta(seconds=120))['sent'], 1)
+        self.assertEqual(self.database.outbox[1]['created_at'], NOW)
+
+    def test_final_state_supersedes_earlier_changes(self):
+        """Block, admin unblock and re-block within the window produce one digest of the final block"""
+        self.database.audit_log.update({11: {'email_sent': 'N'}, 12: {'email_sent': 'N'}, 13: {'email_sent': 'N'}})
+        for offset, notification_type in enumerate(('BLOCK', 'ADMIN_UNBLOCK', 'BLOCK')):
+            self.database.add(notification_type=notification_type, audit_log_id=11 + offset,
+                              next_attempt_at=NOW + timedelta(minutes=offset))
+
+        self.assertEqual(self.dispatch(NOW)['superseded'], 1)
+        self.deliver.assert_not_called()
+        stats = self.dispatch(NOW + timedelta(minutes=2))
+
+        self.assertEqual((stats['sent'], stats['superseded']), (1, 1))
+        delivered = self.deliver.call_args.args[0]
+        self.assertEqual(delivered['id'], 3)
+        self.assertEqual([entry['notification_type'] for entry in delivered['superseded']],
+                         ['BLOCK', 'ADMIN_UNBLOCK'])
+        self.assertEqual({row['id']: row['status'] for row in self.database.outbox.values()},
+                         {1: 'SUPERSEDED', 2: 'SUPERSEDED', 3: 'SENT'})
+        self.assertEqual({entry['email_sent'] for entry in self.database.audit_log.values()}, {'Y'})
+
+    def test_single_notification_has_no_digest(self):
+        """Unrelated recipients are delivered individually"""
+        self.database.add(user_id='alice')
+        self.database.add(user_id='bob')
+
+        self.dispatch()
+
+        self.assertEqual([call.args[0]['superseded'] for call in self.deliver.call_args_list], [[], []])
+
+    def test_recipient_rate_limit_defers_without_using_attempts(self):
+        """A recipient over its limit waits for the window to free up"""
+        for minutes in (50, 40, 30):
+            self.database.add(status='SENT', sent_at=NOW - timedelta(minutes=minutes))
+        row_id = self.database.add()
+
+        stats = self.dispatch(recipient_limit=3, recipient_window=3600)
+
+        self.assertEqual(stats['deferred'], 1)
+        self.deliver.assert_not_called()
+        row = self.database.outbox[row_id]
+        self.assertEqual((row['status'], row['attempts']), ('PENDING', 0))
+        self.assertEqual(row['next_attempt_at'], NOW + timedelta(minutes=10))
+
+    def test_global_rate_limit(self):
+        """Sends per minute across recipients are capped and the rest wait a minute"""
+        self.database.add(user_id='zed', status='SENT', sent_at=NOW - timedelta(seconds=30))
+        for user_id in ('alice', 'bob', 'carol', 'dave'):
+            self.database.add(user_id=user_id)
+
+        stats = self.dispatch(global_limit_per_minute=3)
+
+        self.assertEqual((stats['sent'], stats['deferred']), (2, 2))
+        deferred = [row for row in self.database.outbox.values() if row['status'] == 'PENDING']
+        self.assertEqual({row['next_attempt_at'] for row in deferred}, {NOW + timedelta(minutes=1)})
+
+    def test_digest_email_lists_changes_and_current_state(self):
+        """The controller renders superseded history as one digest email"""
+        row = {'id': 3, 'user_id': 'alice', 'notification_type': 'BLOCK', 'created_at': NOW,
+               'payload': {'reason': 'Daily limit exceeded', 'blocked_until': '2025-09-02 00:00:00'},
+               'superseded': [{'notification_type': 'ADMIN_UNBLOCK', 'created_at': NOW - timedelta(minutes=3),
+                               'payload': {'reason': 'ticket 42', 'performed_by': 'admin'}}]}
+
+        with patch.object(usage_controller, 'get_user_email', return_value='alice@corp'), \
+                patch.object(usage_controller, 'send_gmail_email', return_value=True) as send:
+            self.assertTrue(usage_controller.deliver_notification(row, Mock()))
+
+        to_email, subject, body_text, body_html = send.call_args.args[:4]
+        self.assertIn('Resumen', subject)
+        self.assertIn('Estado actual: Bloqueado', body_text)
+        self.assertLess(body_text.index('Desbloqueo por administrador - ticket 42 (admin)'),
+                        body_text.index('Bloqueo automático - Daily limit exceeded'))
+        self.assertIn('2025-09-02 00:00:00', body_html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the enhanced policy manager's DynamoDB status writes
+===================================================================
+
+This test suite validates the status updates of
+03. Build_folder/bedrock_policy_manager_enhanced.py against moto's DynamoDB:
+1. update_user_block_status creates or updates the day's record with a
+   single update_item, without overwriting the usage counters
+2. update_users_block_status runs the same update_item per user on a thread
+   pool, so concurrent request counter updates are kept
+3. The "bulk_update_status" action
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import patch
+import json
+import os
+import sys
+from datetime import date
+
+import boto3
+from moto import mock_aws
+
+BUILD_DIR = os.path.join(os.path.dirname(__file__), '..', '03. Build_folder')
+sys.path.append(BUILD_DIR)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+os.environ['EMAIL_NOTIFICATIONS_ENABLED'] = 'false'
+with patch('boto3.client'), patch('boto3.resource'):
+    import bedrock_policy_manager_enhanced as policy_manager
+os.environ.pop('EMAIL_NOTIFICATIONS_ENABLED')
+
+TABLE_NAME = policy_manager.TABLE_NAME
+
+
+class TestDynamoDBStatusUpdates(unittest.TestCase):
+    """Status writes against a moto DynamoDB table"""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.dynamodb = boto3.resource('dynamodb', region_name='eu-west-1')
+        self.table = self.dynamodb.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[{'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                       {'AttributeName': 'date', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'user_id', 'AttributeType': 'S'},
+                                  {'AttributeName': 'date', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        patcher = patch.object(policy_manager, 'dynamodb', self.dynamodb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.mock.stop)
+        self.today = date.today().isoformat()
+
+    def item(self, user_id):
+        return self.table.get_item(Key={'user_id': user_id, 'date': self.today}).get('Item')
+
+    def test_creates_record_with_defaults(self):
+        policy_manager.update_user_block_status('alice', 'BLOCKED', 'manual_admin_block', '2025-09-02T00:00:00Z')
+
+        item = self.item('alice')
+        self.assertEqual(item['status'], 'BLOCKED')
+        self.assertEqual(item['request_count'], 0)
+        self.assertEqual(item['daily_limit'], policy_manager.DEFAULT_DAILY_LIMIT)
+        self.assertEqual(item['expires_at'], '2025-09-02T00:00:00Z')
+        self.assertTrue(item['blocked_at'].endswith('Z'))
+
+    def test_updates_existing_record_in_one_call(self):
+        self.table.put_item(Item={'user_id': 'alice', 'date': self.today, 'status': 'BLOCKED',
+                                  'request_count': 42, 'daily_limit': 50, 'expires_at': 'Indefinite'})
+        table = self.dynamodb.Table(TABLE_NAME)
+
+        with patch.object(self.dynamodb, 'Table', return_value=table), \
+                patch.object(table, 'get_item') as get_item, \
+                patch.object(table, 'put_item') as put_item, \
+                patch.object(table, 'update_item', wraps=table.update_item) as update_item:
+            policy_manager.update_user_block_status('alice', 'ACTIVE', 'manual_admin_unblock')
+
+        get_item.assert_not_called()
+        put_item.assert_not_called()
+        update_item.assert_called_once()
+        item = self.item('alice')
+        self.assertEqual((item['status'], item['request_count'], item['daily_limit']), ('ACTIVE', 42, 50))
+        self.assertIsNone(item['expires_at'])
+        self.assertEqual(item['last_status_reason'], 'manual_admin_unblock')
+
+    def test_bulk_update(self):
+        self.table.put_item(Item={'user_id': 'user_000', 'date': self.today, 'status': 'ACTIVE',
+                                  'request_count': 7, 'daily_limit': 80, 'team': 'team_a'})
+        updates = [{'user_id': f'user_{index:03d}', 'status': 'BLOCKED', 'reason': 'team_block'}
+                   for index in range(130)]
+        updates.append({'user_id': 'user_001', 'status': 'ACTIVE', 'reason': 'changed_mind'})
+
+        result = policy_manager.update_users_block_status(updates)
+
+        self.assertEqual(result, {'updated': 130, 'created': 129, 'failed': 0})
+        existing = self.item('user_000')
+        self.assertEqual((existing['status'], existing['request_count'], existing['team']), ('BLOCKED', 7, 'team_a'))
+        self.assertEqual(existing['expires_at'], 'Indefinite')
+        self.assertEqual(self.item('user_001')['status'], 'ACTIVE')
+        self.assertEqual(self.item('user_129')['daily_limit'], policy_manager.DEFAULT_DAILY_LIMIT)
+
+    def test_bulk_update_keeps_concurrent_counter_updates(self):
+        """No read-modify-write: a request counted during the bulk update is not lost"""
+        self.table.put_item(Item={'user_id': 'alice', 'date': self.today, 'status': 'ACTIVE', 'request_count': 7})
+        apply_status_update = policy_manager.apply_status_update
+
+        def counted_meanwhile(user_id, day, attributes):
+            self.table.update_item(Key={'user_id': user_id, 'date': day}, UpdateExpression='ADD request_count :one',
+                                   ExpressionAttributeValues={':one': 1})
+            return apply_status_update(user_id, day, attributes)
+
+        with patch.object(policy_manager, 'apply_status_update', side_effect=counted_meanwhile):
+            result = policy_manager.update_users_block_status([{'user_id': 'alice', 'status': 'BLOCKED'}])
+
+        self.assertEqual(result, {'updated': 1, 'created': 0, 'failed': 0})
+        self.assertEqual((self.item('alice')['status'], self.item('alice')['request_count']), ('BLOCKED', 8))
+
+    def test_bulk_update_reports_failures(self):
+        apply_status_update = policy_manager.apply_status_update
+
+        def flaky(user_id, day, attributes):
+            if user_id == 'bob':
+                raise RuntimeError('throttled')
+            return apply_status_update(user_id, day, attributes)
+
+        with patch.object(policy_manager, 'apply_status_update', side_effect=flaky):
+            result = policy_manager.update_users_block_status([{'user_id': 'alice', 'status': 'BLOCKED'},
+                                                                {'user_id': 'bob', 'status': 'BLOCKED'}])
+
+        self.assertEqual(result, {'updated': 1, 'created': 1, 'failed': 1})
+        self.assertIsNone(self.item('bob'))
+
+    def test_bulk_update_action(self):
+        response = policy_manager.lambda_handler({'action': 'bulk_update_status', 'updates': [
+            {'user_id': 'alice', 'status': 'BLOCKED', 'reason': 'r'},
+            {'user_id': 'bob', 'status': 'ACTIVE', 'reason': 'r'}]}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(json.loads(response['body'])['updated'], 2)
+        self.assertEqual(self.item('bob')['status'], 'ACTIVE')
+
+        invalid = policy_manager.lambda_handler({'action': 'bulk_update_status', 'updates': [{'status': 'X'}]}, None)
+        self.assertEqual(invalid['statusCode'], 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
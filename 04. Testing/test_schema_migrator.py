@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the online schema migration runner
+=================================================
+
+This test suite validates shared/schema_migrator.py:
+1. Versioned migration files (ordering, checksums, statement kinds)
+2. ALGORITHM=INSTANT / INPLACE detection and refusal of COPY
+3. Chunked, resumable backfills tracked in migration_progress
+4. Throttling on bedrock_requests insert latency
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock
+import ast
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+import pymysql
+
+SHARED_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions', 'shared')
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Database', 'Migrations')
+CONTROLLER_PATH = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions', 'lambda_function.py')
+sys.path.insert(0, SHARED_DIR)
+
+import schema_migrator
+
+
+class FakeMigrationDatabase:
+    """Connection keeping schema_migrations, migration_progress and one table of ids in memory"""
+
+    def __init__(self, max_id=0, unsupported=(), digest_samples=(), fail_update_after=None):
+        self.migrations = {}
+        self.progress = {}
+        self.ids = set(range(1, max_id + 1))
+        self.updated = set()
+        self.unsupported = unsupported
+        self.digest_samples = list(digest_samples)
+        self.fail_update_after = fail_update_after
+        self.executed = []
+        self.pending_progress = []
+        self.commit = Mock(side_effect=self.apply_pending)
+        self.close = Mock()
+
+    def apply_pending(self):
+        for key, values in self.pending_progress:
+            self.progress.setdefault(key, {'last_id': 0, 'max_id': None, 'rows_affected': 0,
+                                           'algorithm': None, 'done': False}).update(values)
+        self.pending_progress = []
+
+    def cursor(self, cursor_class=None):
+        database = self
+        cursor = Mock()
+
+        def execute(query, params=None):
+            statement = ' '.join(query.split())
+            database.executed.append(statement)
+            if 'events_statements_summary_by_digest' in statement:
+                cursor.fetchone.return_value = database.digest_samples.pop(0) if database.digest_samples else (0, 0)
+            elif statement.startswith('SELECT version, name, checksum, status'):
+                cursor.fetchall.return_value = list(database.migrations.values())
+            elif statement.startswith('INSERT INTO schema_migrations'):
+                version, name, checksum = params
+                row = database.migrations.setdefault(version, {'version': version, 'name': name,
+                                                               'checksum': checksum})
+                row['status'] = 'running'
+            elif statement.startswith("UPDATE schema_migrations SET status = 'applied'"):
+                database.migrations[params[0]]['status'] = 'applied'
+            elif statement.startswith('SELECT statement_index'):
+                cursor.fetchall.return_value = [dict(state, statement_index=index)
+                                                for (version, index), state in database.progress.items()
+                                                if version == params[0]]
+            elif statement.startswith('INSERT INTO migration_progress'):
+                columns = re.search(r'\(([^)]*)\) VALUES', statement).group(1).split(', ')
+                values = dict(zip(columns, params))
+                key = (values.pop('version'), values.pop('statement_index'))
+                database.pending_progress.append((key, values))
+            elif statement.startswith('SELECT COALESCE(MAX(id), 0)'):
+                cursor.fetchone.return_value = {'max_id': max(database.ids, default=0)}
+            elif statement.startswith('UPDATE bedrock_requests'):
+                if database.fail_update_after is not None and len(database.updated) >= database.fail_update_after:
+                    raise pymysql.err.OperationalError(2013, 'Lost connection to MySQL server during query')
+                low, high = params
+                chunk = {row_id for row_id in database.ids if low < row_id <= high}
+                database.updated |= chunk
+                cursor.rowcount = len(chunk)
+            elif statement.startswith('ALTER TABLE'):
+                for algorithm in database.unsupported:
+                    if algorithm in statement:
+                        raise pymysql.err.InternalError(1845, f'{algorithm} is not supported for this operation')
+
+        cursor.execute.side_effect = execute
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        return context
+
+
+class TestMigrationFiles(unittest.TestCase):
+    """Test suite for loading versioned migration files"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, file_name, content):
+        with open(os.path.join(self.directory, file_name), 'w') as migration_file:
+            migration_file.write(content)
+
+    def test_migrations_are_ordered_and_split(self):
+        """Files load in numeric version order with comments dropped"""
+        self.write('V10__later.sql', 'ALTER TABLE t ADD COLUMN b INT;')
+        self.write('V2__first.sql', '-- comment\nALTER TABLE t\n    ADD COLUMN a INT;\n\nCREATE INDEX i ON t (a);\n')
+        self.write('notes.txt', 'ignored')
+
+        migrations = schema_migrator.load_migrations(self.directory)
+
+        self.assertEqual([migration['version'] for migration in migrations], [2, 10])
+        self.assertEqual(migrations[0]['statements'], ['ALTER TABLE t\n    ADD COLUMN a INT',
+                                                       'CREATE INDEX i ON t (a)'])
+        self.assertEqual(len(migrations[0]['checksum']), 64)
+
+    def test_duplicate_versions_are_rejected(self):
+        """Two files with the same version number are an error"""
+        self.write('V1__a.sql', 'SELECT 1;')
+        self.write('V001__b.sql', 'SELECT 2;')
+
+        with self.assertRaises(schema_migrator.MigrationError):
+            schema_migrator.load_migrations(self.directory)
+
+    def test_statement_kinds_and_alter_attempts(self):
+        """{id_range} UPDATEs are backfills; ALTERs get INSTANT then INPLACE unless explicit"""
+        self.assertEqual(schema_migrator.statement_kind('UPDATE t SET a = 1 WHERE {id_range}'), 'backfill')
+        self.assertEqual(schema_migrator.statement_kind('ALTER TABLE t ADD COLUMN a INT'), 'alter')
+        self.assertEqual(schema_migrator.statement_kind('CREATE TABLE x (id INT)'), 'ddl')
+        with self.assertRaises(schema_migrator.MigrationError):
+            schema_migrator.statement_kind('DELETE FROM t WHERE {id_range}')
+
+        attempts = schema_migrator.alter_attempts('ALTER TABLE t ADD COLUMN a INT')
+        self.assertEqual([algorithm for algorithm, _ in attempts], list(schema_migrator.ONLINE_ALGORITHMS))
+        self.assertTrue(attempts[0][1].endswith('ALGORITHM=INSTANT'))
+        self.assertEqual(len(schema_migrator.alter_attempts('ALTER TABLE t ADD COLUMN a INT', allow_copy=True)), 3)
+        self.assertEqual(schema_migrator.alter_attempts('ALTER TABLE t DROP INDEX i, ALGORITHM=INPLACE'),
+                         [('as written', 'ALTER TABLE t DROP INDEX i, ALGORITHM=INPLACE')])
+
+    def test_shipped_migrations_load(self):
+        """Database/Migrations parses and every backfill targets a table"""
+        migrations = schema_migrator.load_migrations(MIGRATIONS_DIR)
+
+        self.assertGreaterEqual(len(migrations), 1)
+        for migration in migrations:
+            for statement in migration['statements']:
+                schema_migrator.statement_kind(statement)
+                # Chunks are executed with bound ids, so a literal % would break the statement
+                self.assertNotIn('%', statement)
+
+    def test_model_name_backfill_matches_controller_mapping(self):
+        """V001 names models exactly as the controller's MODEL_NAME_MAPPING does"""
+        with open(CONTROLLER_PATH, encoding='utf-8') as source:
+            tree = ast.parse(source.read())
+        mapping = next(ast.literal_eval(node.value) for node in tree.body
+                       if isinstance(node, ast.Assign) and getattr(node.targets[0], 'id', None) == 'MODEL_NAME_MAPPING')
+        migration = next(migration for migration in schema_migrator.load_migrations(MIGRATIONS_DIR)
+                         if migration['version'] == 1)
+
+        names = dict(re.findall(r"WHEN '([^']+)' THEN '([^']+)'", migration['statements'][1]))
+        self.assertEqual(names, mapping)
+        self.assertIn('model_name IS NULL', migration['statements'][0])
+
+
+class TestMigrationRunner(unittest.TestCase):
+    """Test suite for applying migrations online"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sleep = Mock()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, file_name, content):
+        with open(os.path.join(self.directory, file_name), 'w') as migration_file:
+            migration_file.write(content)
+
+    def runner(self, database, **options):
+        options.setdefault('sleep', self.sleep)
+        return schema_migrator.MigrationRunner(database, self.directory, **options)
+
+    def test_alter_uses_cheapest_supported_algorithm(self):
+        """INSTANT is tried first and INPLACE used when MySQL refuses it"""
+        self.write('V1__index.sql', 'ALTER TABLE bedrock_requests ADD INDEX idx_x (region);')
+        database = FakeMigrationDatabase(unsupported=['ALGORITHM=INSTANT'])
+
+        result = self.runner(database).run()
+
+        migration = result['migrations'][0]
+        self.assertEqual(migration['status'], 'applied')
+        self.assertEqual(migration['statements'][0]['algorithm'], 'ALGORITHM=INPLACE, LOCK=NONE')
+        self.assertEqual(database.migrations[1]['status'], 'applied')
+        self.assertIn('SET SESSION lock_wait_timeout = %s', database.executed)
+
+    def test_copy_only_alter_is_refused(self):
+        """A change neither INSTANT nor INPLACE can make fails instead of blocking writes"""
+        self.write('V1__type.sql', 'ALTER TABLE bedrock_requests MODIFY COLUMN region VARCHAR(10);')
+        database = FakeMigrationDatabase(unsupported=['ALGORITHM=INSTANT', 'ALGORITHM=INPLACE'])
+
+        with self.assertRaises(schema_migrator.MigrationError):
+            self.runner(database).run()
+        self.assertEqual(database.migrations[1]['status'], 'running')
+
+    def test_backfill_runs_in_chunks(self):
+        """A backfill covers 1..MAX(id) in chunk_size ranges, committing progress with each chunk"""
+        self.write('V1__backfill.sql', 'UPDATE bedrock_requests SET model_name = model_id '
+                                       'WHERE {id_range} AND model_name IS NULL;')
+        database = FakeMigrationDatabase(max_id=25)
+
+        result = self.runner(database, chunk_size=10).run()
+
+        self.assertEqual(result['migrations'][0]['status'], 'applied')
+        self.assertEqual(database.updated, set(range(1, 26)))
+        state = database.progress[(1, 0)]
+        self.assertEqual((state['last_id'], state['max_id'], state['rows_affected'], state['done']),
+                         (25, 25, 25, True))
+        updates = [statement for statement in database.executed if statement.startswith('UPDATE bedrock_requests')]
+        self.assertEqual(len(updates), 3)
+        self.assertIn('WHERE id > %s AND id <= %s AND model_name IS NULL', updates[0])
+
+    def test_interrupted_backfill_resumes(self):
+        """After a failure the next run continues from the last committed chunk"""
+        self.write('V1__add.sql', 'ALTER TABLE bedrock_requests ADD COLUMN x INT NULL;\n'
+                                  'UPDATE bedrock_requests SET x = 0 WHERE {id_range};')
+        database = FakeMigrationDatabase(max_id=30, fail_update_after=20)
+
+        with self.assertRaises(pymysql.err.OperationalError):
+            self.runner(database, chunk_size=10).run()
+        self.assertEqual(database.progress[(1, 1)]['last_id'], 20)
+        self.assertTrue(database.progress[(1, 0)]['done'])
+
+        database.fail_update_after = None
+        database.executed = []
+        result = self.runner(database, chunk_size=10).run()
+
+        self.assertEqual(result['migrations'][0]['statements'][0], {'index': 0, 'skipped': True})
+        self.assertFalse(any(statement.startswith('ALTER') for statement in database.executed))
+        updates = [statement for statement in database.executed if statement.startswith('UPDATE bedrock_requests')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(database.migrations[1]['status'], 'applied')
+
+    def test_backfill_pauses_on_slow_ingest(self):
+        """Insert latency above the limit backs off and pauses the migration"""
+        self.write('V1__backfill.sql', 'UPDATE bedrock_requests SET x = 0 WHERE {id_range};')
+        # (executions, total wait in ps): every 100 inserts take 200ms each
+        samples = [(1000, 0), (1100, 2 * 10**13), (1200, 4 * 10**13), (1300, 6 * 10**13)]
+        database = FakeMigrationDatabase(max_id=10, digest_samples=samples)
+
+        result = self.runner(database, max_backoffs=2, max_ingest_latency_ms=50).run()
+
+        self.assertEqual(result['migrations'][0]['status'], 'paused')
+        self.assertEqual(database.updated, set())
+        self.assertEqual(database.migrations[1]['status'], 'running')
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_edited_applied_migration_is_rejected(self):
+        """Changing an applied file fails instead of silently skipping it"""
+        self.write('V1__a.sql', 'CREATE TABLE x (id INT);')
+        database = FakeMigrationDatabase()
+        self.runner(database).run()
+
+        self.write('V1__a.sql', 'CREATE TABLE x (id BIGINT);')
+        with self.assertRaises(schema_migrator.MigrationError):
+            self.runner(database).run()
+
+    def test_dry_run_plans_without_writing(self):
+        """Dry runs list the attempts and do not create the tracking tables"""
+        self.write('V1__a.sql', 'ALTER TABLE bedrock_requests ADD COLUMN y INT NULL;')
+        database = FakeMigrationDatabase()
+
+        result = self.runner(database, dry_run=True).run()
+
+        self.assertEqual(result['plan'][0]['steps'][0]['kind'], 'alter')
+        self.assertEqual(len(result['plan'][0]['steps'][0]['attempts']), 2)
+        self.assertFalse(any(statement.startswith(('CREATE', 'ALTER', 'INSERT')) for statement in database.executed))
+
+    def test_target_version_stops_early(self):
+        """Only migrations up to the target version are applied"""
+        self.write('V1__a.sql', 'CREATE TABLE a (id INT);')
+        self.write('V2__b.sql', 'CREATE TABLE b (id INT);')
+        database = FakeMigrationDatabase()
+
+        result = self.runner(database).run(target_version=1)
+
+        self.assertEqual([migration['version'] for migration in result['migrations']], [1])
+        self.assertNotIn(2, database.migrations)
+
+
+class TestIngestLatencyMonitor(unittest.TestCase):
+    """Test suite for the insert latency sampling"""
+
+    def test_latency_between_samples(self):
+        """Average latency is the wait delta over the execution delta, in milliseconds"""
+        database = FakeMigrationDatabase(digest_samples=[(10, 0), (20, 10 * 3 * 10**9), (20, 10 * 3 * 10**9)])
+        monitor = schema_migrator.IngestLatencyMonitor(database)
+
+        self.assertIsNone(monitor.sample())
+        self.assertAlmostEqual(monitor.sample(), 3.0)
+        self.assertIsNone(monitor.sample())
+
+
+if __name__ == '__main__':
+    unittest.main()
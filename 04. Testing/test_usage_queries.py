@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the shared usage_queries module
+==============================================
+
+This test suite validates the sargable usage query builders:
+1. Half-open day and month ranges on the bare date_only / request_timestamp column
+2. The single-scan daily + monthly usage count query used by the controller
+3. Optional EXPLAIN checks against a local MySQL instance (set TEST_DB_HOST,
+   plus DB_USER/DB_PASSWORD): usage queries must seek on idx_user_date and
+   read only the partitions of the requested month
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import patch
+import json
+import re
+import sys
+import os
+from datetime import date, datetime
+
+SHARED_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions', 'shared')
+sys.path.insert(0, SHARED_DIR)
+
+import usage_queries
+
+FUNCTION_ON_COLUMN = re.compile(r'\b(DATE|YEAR|MONTH|HOUR|DATE_FORMAT)\s*\(\s*(\w+\.)?(request_timestamp|date_only)',
+                                re.IGNORECASE)
+
+
+class TestRangeBuilders(unittest.TestCase):
+    """Test suite for the day and month range builders"""
+
+    def test_day_range_is_half_open_on_date_only(self):
+        """A day is [day, next day) on the bare column, user first for idx_user_date"""
+        predicate, params = usage_queries.day_range('alice', '2026-02-28')
+
+        self.assertEqual(predicate, 'user_id = %s AND date_only >= %s AND date_only < %s')
+        self.assertEqual(params, ['alice', date(2026, 2, 28), date(2026, 3, 1)])
+        self.assertIsNone(FUNCTION_ON_COLUMN.search(predicate))
+
+    def test_month_range_accepts_month_or_any_day(self):
+        """YYYY-MM, a day of the month and date objects select the same calendar month"""
+        expected = [date(2025, 12, 1), date(2026, 1, 1)]
+
+        for month in ('2025-12', '2025-12-17', date(2025, 12, 31), datetime(2025, 12, 5, 13, 0)):
+            predicate, params = usage_queries.month_range(None, month)
+            self.assertEqual(predicate, 'date_only >= %s AND date_only < %s')
+            self.assertEqual(params, expected)
+
+    def test_request_timestamp_ranges_use_midnights(self):
+        """Ranges on request_timestamp select the same days with datetime bounds"""
+        predicate, params = usage_queries.day_range('alice', date(2026, 10, 19), column='request_timestamp')
+
+        self.assertEqual(predicate, 'user_id = %s AND request_timestamp >= %s AND request_timestamp < %s')
+        self.assertEqual(params, ['alice', datetime(2026, 10, 19), datetime(2026, 10, 20)])
+
+    def test_invalid_ranges_are_rejected(self):
+        """Unknown columns, empty ranges and bad dates raise ValueError"""
+        with self.assertRaises(ValueError):
+            usage_queries.day_range('alice', '2026-10-19', column='created_at')
+        with self.assertRaises(ValueError):
+            usage_queries.range_predicate(date(2026, 10, 19), date(2026, 10, 19))
+        with self.assertRaises(ValueError):
+            usage_queries.month_range('alice', 'October')
+
+    def test_usage_counts_query_scans_month_to_date_once(self):
+        """Daily and monthly counts come from one month-to-date range"""
+        query, params = usage_queries.usage_counts_query('alice', date(2026, 10, 19))
+
+        self.assertIn('WHERE user_id = %s AND date_only >= %s AND date_only < %s', query)
+        self.assertEqual(params, [date(2026, 10, 19), 'alice', date(2026, 10, 1), date(2026, 10, 20)])
+        self.assertEqual(query.count('%s'), len(params))
+        self.assertIsNone(FUNCTION_ON_COLUMN.search(query))
+
+    def test_usage_counts_many_query_groups_by_user(self):
+        """Several users share one statement, grouped by user_id"""
+        query, params = usage_queries.usage_counts_many_query(['alice', 'bob'], date(2026, 10, 19))
+
+        self.assertIn('WHERE user_id IN (%s, %s) AND date_only >= %s AND date_only < %s', query)
+        self.assertIn('GROUP BY user_id', query)
+        self.assertEqual(params, [date(2026, 10, 19), 'alice', 'bob', date(2026, 10, 1), date(2026, 10, 20)])
+        self.assertEqual(query.count('%s'), len(params))
+        with self.assertRaises(ValueError):
+            usage_queries.usage_counts_many_query([], date(2026, 10, 19))
+
+
+@unittest.skipUnless(os.environ.get('TEST_DB_HOST'), 'Set TEST_DB_HOST to check EXPLAIN plans against a local MySQL')
+class TestUsageQueryPlans(unittest.TestCase):
+    """EXPLAIN plans of the usage queries on a partitioned copy of bedrock_requests"""
+
+    @classmethod
+    def setUpClass(cls):
+        import db_router
+
+        database = os.environ.get('TEST_DB_NAME', 'bedrock_usage_explain_test')
+        with patch.dict(os.environ, {'DB_NAME': 'mysql'}):
+            config = db_router.build_db_config('TEST_DB_HOST', 'TEST_DB_PORT')
+        cls.connection = db_router.connect(config)
+        with cls.connection.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+            cursor.execute(f"USE {database}")
+            cursor.execute("DROP TABLE IF EXISTS bedrock_requests")
+            cursor.execute("""
+                CREATE TABLE bedrock_requests (
+                    id BIGINT AUTO_INCREMENT,
+                    user_id VARCHAR(255) NOT NULL,
+                    team VARCHAR(100) NOT NULL,
+                    request_timestamp TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3),
+                    date_only DATE GENERATED ALWAYS AS (DATE(request_timestamp)) STORED,
+                    PRIMARY KEY (id, date_only),
+                    INDEX idx_user_timestamp (user_id, request_timestamp),
+                    INDEX idx_user_date (user_id, date_only)
+                ) PARTITION BY RANGE (TO_DAYS(date_only)) (
+                    PARTITION p_2026_08 VALUES LESS THAN (TO_DAYS('2026-09-01')),
+                    PARTITION p_2026_09 VALUES LESS THAN (TO_DAYS('2026-10-01')),
+                    PARTITION p_2026_10 VALUES LESS THAN (TO_DAYS('2026-11-01')),
+                    PARTITION p_future VALUES LESS THAN MAXVALUE
+                )
+            """)
+            rows = [(f"user{n % 50}", 'team', f"2026-{8 + n % 3:02d}-{1 + n % 28:02d} 10:00:00")
+                    for n in range(3000)]
+            cursor.executemany("INSERT INTO bedrock_requests (user_id, team, request_timestamp) VALUES (%s, %s, %s)",
+                               rows)
+            cursor.execute("ANALYZE TABLE bedrock_requests")
+            cursor.fetchall()
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS bedrock_requests")
+        cls.connection.close()
+
+    def explain(self, query, params):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN FORMAT=JSON {query}", params)
+            plan = json.loads(list(cursor.fetchone().values())[0])
+        return plan['query_block']['table']
+
+    def test_day_range_seeks_and_prunes(self):
+        predicate, params = usage_queries.day_range('user7', date(2026, 10, 5))
+        table = self.explain(f"SELECT COUNT(*) FROM bedrock_requests WHERE {predicate}", params)
+
+        self.assertEqual(table['partitions'], ['p_2026_10'])
+        self.assertEqual(table['key'], 'idx_user_date')
+        self.assertEqual(table['access_type'], 'range')
+
+    def test_usage_counts_query_seeks_and_prunes(self):
+        table = self.explain(*usage_queries.usage_counts_query('user7', date(2026, 10, 19)))
+
+        self.assertEqual(table['partitions'], ['p_2026_10'])
+        self.assertEqual(table['key'], 'idx_user_date')
+        self.assertTrue(table.get('using_index'))
+
+    def test_function_on_column_reads_every_partition(self):
+        """The previous form, for comparison: no pruning"""
+        table = self.explain("SELECT COUNT(*) FROM bedrock_requests WHERE user_id = %s "
+                             "AND DATE(request_timestamp) = %s", ['user7', date(2026, 10, 5)])
+
+        self.assertEqual(len(table['partitions']), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the usage rollups and HyperLogLog sketches
+=========================================================
+
+This test suite validates shared/hll.py, shared/latency_sketch.py and shared/usage_rollups.py:
+1. HyperLogLog accuracy, merging and serialization
+2. Rebuilding hourly and daily rollup rows from bedrock_requests
+3. Distinct counts over ranges made of whole days and partial-day hours
+4. The "rollups" maintenance task and the executor's "distinct_counts" action
+5. DDSketch latency quantiles: accuracy, merging, the realtime controller
+   collecting sketches per (model, hour) and the "latency_quantiles" action
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import importlib.util
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions')
+SHARED_DIR = os.path.join(LAMBDA_DIR, 'shared')
+EXECUTOR_DIR = os.path.join(LAMBDA_DIR, 'bedrock-mysql-query-executor-aws-20250923')
+sys.path.insert(0, SHARED_DIR)
+sys.path.insert(0, EXECUTOR_DIR)
+
+import hll
+import latency_sketch
+import usage_rollups
+
+spec = importlib.util.spec_from_file_location("db_maintenance", os.path.join(LAMBDA_DIR, 'bedrock-db-maintenance',
+                                                                             'lambda_function.py'))
+db_maintenance = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(db_maintenance)
+
+os.environ.update({'RDS_ENDPOINT': 'test-endpoint', 'RDS_USERNAME': 'test', 'RDS_PASSWORD': 'test',
+                   'RDS_DATABASE': 'bedrock_usage', 'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'eu-west-1')})
+spec = importlib.util.spec_from_file_location("usage_controller", os.path.join(
+    LAMBDA_DIR, 'bedrock-realtime-usage-controller-aws-20250923', 'lambda_function.py'))
+usage_controller = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(usage_controller)
+
+spec = importlib.util.spec_from_file_location("query_executor", os.path.join(EXECUTOR_DIR, 'lambda_function.py'))
+query_executor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(query_executor)
+
+
+class FakeRollupDatabase:
+    """Connection over in-memory bedrock_requests rows and the two rollup tables"""
+
+    def __init__(self, requests=()):
+        self.requests = list(requests)
+        self.hourly = {}
+        self.daily = {}
+        self.executed = []
+        self.commit = Mock()
+        self.close = Mock()
+
+    def cursor(self, cursor_class=None):
+        database = self
+        cursor = Mock()
+
+        def execute(query, params=None):
+            statement = ' '.join(query.split())
+            database.executed.append(statement)
+            if 'FROM bedrock_requests' in statement:
+                day, hour = params
+                groups = defaultdict(lambda: {'request_count': 0, 'input_tokens': 0, 'output_tokens': 0,
+                                              'cost_usd': Decimal('0')})
+                for row in database.requests:
+                    if row['date_only'] == day and row['hour_only'] == hour:
+                        group = groups[(row['team'], row['model_id'], row['user_id'])]
+                        group['request_count'] += 1
+                        group['input_tokens'] += row['input_tokens']
+                        group['output_tokens'] += row['output_tokens']
+                        group['cost_usd'] += row['cost_usd']
+                cursor.fetchall.return_value = [dict(group, team=team, model_id=model_id, user_id=user_id)
+                                                for (team, model_id, user_id), group in groups.items()]
+            elif statement.startswith('DELETE FROM usage_rollup_hourly'):
+                for key in [key for key in database.hourly if key[:2] == tuple(params)]:
+                    del database.hourly[key]
+            elif statement.startswith('DELETE FROM usage_rollup_daily'):
+                for key in [key for key in database.daily if key[0] == params[0]]:
+                    del database.daily[key]
+            elif statement.startswith('SELECT team, model_id, request_count') and 'FROM usage_rollup_hourly' in statement:
+                cursor.fetchall.return_value = [row for key, row in database.hourly.items() if key[0] == params[0]]
+            elif 'FROM usage_rollup_daily' in statement:
+                first, next_day = params[:2]
+                teams = params[2:]
+                cursor.fetchall.return_value = [dict(row, model_id=None) for key, row in database.daily.items()
+                                                if first <= key[0] < next_day and (not teams or key[1] in teams)]
+            elif 'FROM usage_rollup_hourly' in statement:
+                day, from_hour, to_hour = params[:3]
+                teams = params[3:]
+                cursor.fetchall.return_value = [dict(row, models_hll=None) for key, row in database.hourly.items()
+                                                if key[0] == day and from_hour <= key[1] < to_hour
+                                                and (not teams or key[2] in teams)]
+
+        def executemany(query, rows):
+            statement = ' '.join(query.split())
+            if 'INSERT INTO usage_rollup_hourly' in statement:
+                for day, hour, team, model_id, count, input_tokens, output_tokens, cost, users in rows:
+                    database.hourly[(day, hour, team, model_id)] = {
+                        'team': team, 'model_id': model_id, 'request_count': count, 'input_tokens': input_tokens,
+                        'output_tokens': output_tokens, 'cost_usd': cost, 'users_hll': users}
+            else:
+                for day, team, count, input_tokens, output_tokens, cost, users, models in rows:
+                    database.daily[(day, team)] = {
+                        'team': team, 'request_count': count, 'input_tokens': input_tokens,
+                        'output_tokens': output_tokens, 'cost_usd': cost, 'users_hll': users, 'models_hll': models}
+
+        cursor.execute.side_effect = execute
+        cursor.executemany.side_effect = executemany
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        return context
+
+
+def request(day, hour, team, model_id, user_id, tokens=100, cost='0.010000'):
+    return {'date_only': day, 'hour_only': hour, 'team': team, 'model_id': model_id, 'user_id': user_id,
+            'input_tokens': tokens, 'output_tokens': tokens // 2, 'cost_usd': Decimal(cost)}
+
+
+def sample_requests():
+    """Three days of traffic: team_a users u0-u9 on model m1, team_b users u5-u14 on m1/m2"""
+    rows = []
+    for day in (date(2025, 9, 1), date(2025, 9, 2), date(2025, 9, 3)):
+        for hour in (9, 15):
+            rows += [request(day, hour, 'team_a', 'm1', f'u{n}') for n in range(10)]
+            rows += [request(day, hour, 'team_b', 'm2' if n % 2 else 'm1', f'u{n}') for n in range(5, 15)]
+    rows.append(request(date(2025, 9, 4), 2, 'team_a', 'm3', 'u99'))
+    return rows
+
+
+class TestHyperLogLog(unittest.TestCase):
+    """Test suite for the HyperLogLog sketch"""
+
+    def test_estimates_are_accurate(self):
+        """Small sets are nearly exact and large ones within a few standard errors"""
+        for count in (0, 1, 50, 1000, 50000):
+            sketch = hll.HyperLogLog().update(f'user-{n}' for n in range(count))
+            self.assertLessEqual(abs(sketch.estimate() - count), max(1, count * 0.05), count)
+
+    def test_merge_equals_union(self):
+        """Merging two sketches estimates the union, not the sum"""
+        first = hll.HyperLogLog().update(range(0, 3000))
+        second = hll.HyperLogLog().update(range(2000, 5000))
+        union = hll.HyperLogLog().update(range(0, 5000))
+
+        first.merge(second)
+
+        self.assertEqual(first.registers, union.registers)
+        self.assertLess(abs(first.estimate() - 5000), 250)
+
+    def test_serialization_round_trip(self):
+        """Sketches survive to_bytes/from_bytes and small ones compress well"""
+        sketch = hll.HyperLogLog().update(['alice', 'bob', 'carol'])
+
+        data = sketch.to_bytes()
+        restored = hll.HyperLogLog.from_bytes(data)
+
+        self.assertEqual(restored.registers, sketch.registers)
+        self.assertLess(len(data), 200)
+        self.assertEqual(hll.merge_serialized([data, None, data]).estimate(), 3)
+        with self.assertRaises(ValueError):
+            hll.HyperLogLog.from_bytes(b'\x09\x0c')
+        with self.assertRaises(ValueError):
+            hll.HyperLogLog(8).merge(hll.HyperLogLog(12))
+
+
+class TestUsageRollups(unittest.TestCase):
+    """Test suite for building and querying the rollups"""
+
+    def setUp(self):
+        self.database = FakeRollupDatabase(sample_requests())
+        usage_rollups.rebuild_days(self.database, date(2025, 9, 1), date(2025, 9, 4))
+
+    def test_rollup_rows_per_bucket(self):
+        """Hourly rows are per team and model, daily rows per team"""
+        self.assertEqual(len(self.database.hourly), 3 * 2 * 3 + 1)
+        row = self.database.hourly[(date(2025, 9, 1), 9, 'team_b', 'm2')]
+        self.assertEqual(row['request_count'], 5)
+        self.assertEqual(hll.HyperLogLog.from_bytes(row['users_hll']).estimate(), 5)
+
+        daily = self.database.daily[(date(2025, 9, 1), 'team_b')]
+        self.assertEqual(daily['request_count'], 20)
+        self.assertEqual(daily['input_tokens'], 2000)
+        self.assertEqual(hll.HyperLogLog.from_bytes(daily['models_hll']).estimate(), 2)
+
+    def test_distinct_counts_over_whole_days(self):
+        """Users shared by teams and days are counted once"""
+        result = usage_rollups.distinct_counts(self.database, '2025-09-01', '2025-09-04')
+
+        self.assertEqual(result['rows'], [{'active_users': 15, 'unique_models': 2, 'requests': 120,
+                                           'input_tokens': 12000, 'output_tokens': 6000, 'cost_usd': 1.2,
+                                           'buckets': 6}])
+        self.assertFalse(any('usage_rollup_hourly' in statement and 'hour_only >=' in statement
+                             for statement in self.database.executed))
+
+    def test_distinct_counts_with_partial_days_per_team(self):
+        """Edge hours come from hourly rows; grouping by team keeps teams apart"""
+        result = usage_rollups.distinct_counts(self.database, '2025-09-01T12:00', '2025-09-04T03:00',
+                                               group_by_team=True)
+
+        rows = {row['team']: row for row in result['rows']}
+        self.assertEqual(rows['team_a']['active_users'], 11)
+        self.assertEqual(rows['team_a']['unique_models'], 2)
+        self.assertEqual(rows['team_a']['requests'], 10 + 40 + 1)
+        self.assertEqual(rows['team_b']['unique_models'], 2)
+
+    def test_team_filter_and_single_hour(self):
+        """A range within one day reads only the requested hours and teams"""
+        result = usage_rollups.distinct_counts(self.database, datetime(2025, 9, 2, 9), datetime(2025, 9, 2, 10),
+                                               teams=['team_b'])
+
+        self.assertEqual(result['rows'][0]['active_users'], 10)
+        self.assertEqual(result['rows'][0]['requests'], 10)
+
+    def test_split_range(self):
+        """Ranges split into whole days plus hour ranges at the edges"""
+        self.assertEqual(usage_rollups.split_range(datetime(2025, 9, 1), datetime(2025, 9, 3)),
+                         ((date(2025, 9, 1), date(2025, 9, 3)), []))
+        self.assertEqual(usage_rollups.split_range(datetime(2025, 9, 1, 20), datetime(2025, 9, 2, 4)),
+                         (None, [(date(2025, 9, 1), 20, 24), (date(2025, 9, 2), 0, 4)]))
+        self.assertEqual(usage_rollups.split_range(datetime(2025, 9, 1, 20), datetime(2025, 9, 3, 4)),
+                         ((date(2025, 9, 2), date(2025, 9, 3)),
+                          [(date(2025, 9, 1), 20, 24), (date(2025, 9, 3), 0, 4)]))
+        with self.assertRaises(ValueError):
+            usage_rollups.as_hour('2025-09-01T10:30')
+
+    def test_rebuild_replaces_rows(self):
+        """Rebuilding an hour after more requests replaces its rows"""
+        self.database.requests.append(request(date(2025, 9, 4), 2, 'team_a', 'm3', 'u100'))
+
+        usage_rollups.run_rollups(self.database, datetime(2025, 9, 4, 2, 40), hours=1)
+
+        row = self.database.hourly[(date(2025, 9, 4), 2, 'team_a', 'm3')]
+        self.assertEqual(row['request_count'], 2)
+        self.assertEqual(hll.HyperLogLog.from_bytes(self.database.daily[(date(2025, 9, 4), 'team_a')]['users_hll'])
+                         .estimate(), 2)
+
+
+class TestRollupEntryPoints(unittest.TestCase):
+    """Test suite for the maintenance task and the executor action"""
+
+    def test_rollups_task_rebuilds_recent_hours(self):
+        """The task rebuilds the last hours up to the given CET time"""
+        database = FakeRollupDatabase(sample_requests())
+
+        with patch.object(db_maintenance, 'get_db_connection', return_value=database) as get_connection:
+            response = db_maintenance.lambda_handler({'task': 'rollups', 'now': '2025-09-01T16:05', 'hours': 2}, None)
+
+        result = json.loads(response['body'])['result']
+        self.assertEqual(result['hours'], ['2025-09-01T15:00:00', '2025-09-01T16:00:00'])
+        self.assertEqual(result['days'], ['2025-09-01'])
+        get_connection.assert_called_once_with(autocommit=False)
+        database.close.assert_called_once()
+
+    def test_distinct_counts_action(self):
+        """The executor merges the sketches on a read connection"""
+        database = FakeRollupDatabase(sample_requests())
+        usage_rollups.rebuild_days(database, date(2025, 9, 1), date(2025, 9, 3))
+
+        with patch.object(query_executor, 'get_db_connection', return_value=database):
+            response = query_executor.lambda_handler({'action': 'distinct_counts', 'start': '2025-09-01',
+                                                      'end': '2025-09-02', 'group_by': 'team'}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual({row['team']: row['active_users'] for row in response['data']['rows']},
+                         {'team_a': 10, 'team_b': 10})
+
+    def test_distinct_counts_action_validates_range(self):
+        """Missing bounds, unaligned hours and oversized ranges are rejected before connecting"""
+        with patch.object(query_executor, 'get_db_connection') as get_connection:
+            for event in ({'start': '2025-09-01'},
+                          {'start': '2025-09-01T10:15', 'end': '2025-09-02'},
+                          {'start': '2020-01-01', 'end': '2025-01-01'},
+                          {'start': '2025-09-01', 'end': '2025-09-02', 'group_by': 'model_id'}):
+                response = query_executor.lambda_handler(dict(event, action='distinct_counts'), None)
+                self.assertEqual(response['statusCode'], 500)
+        get_connection.assert_not_called()
+
+
+class FakeLatencyDatabase:
+    """Connection over an in-memory latency_rollup_hourly table"""
+
+    def __init__(self):
+        self.rows = {}
+        self.begin = Mock()
+        self.commit = Mock()
+        self.rollback = Mock()
+        self.close = Mock()
+
+    def cursor(self, cursor_class=None):
+        database = self
+        cursor = Mock()
+
+        def execute(query, params=None):
+            statement = ' '.join(query.split())
+            if statement.startswith('INSERT IGNORE INTO latency_rollup_hourly'):
+                day, hour, model_id, sketch = params
+                database.rows.setdefault((day, hour, model_id), {'model_id': model_id, 'request_count': 0,
+                                                                 'latency_sketch': sketch})
+            elif statement.startswith('SELECT latency_sketch FROM latency_rollup_hourly WHERE date_only = %s AND hour_only = %s AND model_id'):
+                cursor.fetchone.return_value = database.rows[tuple(params)]
+            elif statement.startswith('UPDATE latency_rollup_hourly'):
+                count, sketch, day, hour, model_id = params
+                database.rows[(day, hour, model_id)].update(request_count=count, latency_sketch=sketch)
+            elif 'date_only >= %s AND date_only < %s' in statement:
+                first, next_day = params[:2]
+                models = params[2:]
+                cursor.fetchall.return_value = [row for key, row in database.rows.items()
+                                                if first <= key[0] < next_day and (not models or key[2] in models)]
+            else:
+                day, from_hour, to_hour = params[:3]
+                models = params[3:]
+                cursor.fetchall.return_value = [row for key, row in database.rows.items()
+                                                if key[0] == day and from_hour <= key[1] < to_hour
+                                                and (not models or key[2] in models)]
+
+        cursor.execute.side_effect = execute
+        context = Mock()
+        context.__enter__ = Mock(return_value=cursor)
+        context.__exit__ = Mock(return_value=None)
+        return context
+
+
+class TestLatencySketches(unittest.TestCase):
+    """Test suite for the DDSketch latency quantiles"""
+
+    def test_quantiles_within_relative_accuracy(self):
+        """p50/p95/p99 are within 1% of the exact values"""
+        values = [1 + (n * 7919) % 5000 for n in range(20000)]
+        sketch = latency_sketch.DDSketch().update(values)
+        exact = sorted(values)
+
+        for q in (0.5, 0.95, 0.99):
+            expected = exact[int(q * (len(exact) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - expected), expected * 0.01 + 1e-9, q)
+        self.assertIsNone(latency_sketch.DDSketch().quantile(0.5))
+
+    def test_merge_and_serialization(self):
+        """Merged sketches equal one sketch over all values and survive serialization"""
+        first = latency_sketch.DDSketch().update([10, 20, 0])
+        second = latency_sketch.DDSketch().update([30, 4000])
+        combined = latency_sketch.DDSketch().update([10, 20, 0, 30, 4000])
+
+        restored = latency_sketch.DDSketch.from_bytes(first.merge(second).to_bytes())
+
+        self.assertEqual(restored.bins, combined.bins)
+        self.assertEqual(restored.zero_count, 1)
+        self.assertEqual(restored.count, 5)
+        self.assertEqual(restored.quantile(0), 0.0)
+        with self.assertRaises(ValueError):
+            latency_sketch.DDSketch(0.02).merge(latency_sketch.DDSketch())
+
+    def test_writer_merges_into_hourly_rows(self):
+        """Sketches collected per (CET hour, model) merge into existing rows across batches"""
+        database = FakeLatencyDatabase()
+        for batch in ([120, 80, 0], [400]):
+            sketches = {}
+            for latency in batch:
+                usage_rollups.add_latency(sketches, 'm1', '2025-09-01 10:15:00', latency)
+            usage_rollups.add_latency(sketches, 'm2', '2025-09-01 11:59:59', 50)
+            usage_rollups.merge_latency_sketches(database, sketches)
+
+        row = database.rows[(date(2025, 9, 1), 10, 'm1')]
+        self.assertEqual(row['request_count'], 3)
+        self.assertEqual(database.rows[(date(2025, 9, 1), 11, 'm2')]['request_count'], 2)
+        self.assertEqual(database.begin.call_count, 4)
+        self.assertEqual(database.commit.call_count, 4)
+
+        result = usage_rollups.latency_quantiles(database, '2025-09-01', '2025-09-02', group_by_model=True)
+
+        rows = {row['model_id']: row for row in result['rows']}
+        self.assertEqual(rows['m1']['count'], 3)
+        self.assertAlmostEqual(rows['m1']['p50'], 120, delta=1.2)
+        self.assertAlmostEqual(latency_sketch.DDSketch.from_bytes(row['latency_sketch']).quantile(1), 400, delta=4)
+        self.assertAlmostEqual(rows['m2']['p50'], 50, delta=0.5)
+
+    def test_partial_range_and_model_filter(self):
+        """Hour ranges only read their hours; an empty range has no quantiles"""
+        database = FakeLatencyDatabase()
+        sketches = {}
+        usage_rollups.add_latency(sketches, 'm1', datetime(2025, 9, 1, 10), 100)
+        usage_rollups.add_latency(sketches, 'm1', datetime(2025, 9, 1, 12), 900)
+        usage_rollups.merge_latency_sketches(database, sketches)
+
+        result = usage_rollups.latency_quantiles(database, '2025-09-01T11:00', '2025-09-01T13:00', models=['m1'])
+        empty = usage_rollups.latency_quantiles(database, '2025-09-02', '2025-09-03')
+
+        self.assertEqual(result['rows'][0]['count'], 1)
+        self.assertAlmostEqual(result['rows'][0]['p50'], 900, delta=9)
+        self.assertEqual(empty['rows'], [{'count': 0, 'p50': None, 'p95': None, 'p99': None, 'buckets': 0}])
+
+    def test_controller_collects_latency_per_batch(self):
+        """The CloudTrail handler adds each logged request's latency and merges once per batch"""
+        event = {'Records': [{'eventName': 'InvokeModel', 'eventTime': '2025-09-01T08:15:00Z',
+                              'userIdentity': {'arn': 'arn:aws:iam::123456789012:user/alice', 'userName': 'alice'},
+                              'requestParameters': {'modelId': 'anthropic.claude-3-haiku-20240307-v1:0'},
+                              'responseTime': latency} for latency in (120, 340)]}
+        usage = {'daily_requests_used': 1, 'daily_limit': 250, 'daily_percent': 0.4,
+                 'monthly_requests_used': 1, 'monthly_limit': 5000, 'monthly_percent': 0.0}
+
+        with patch.object(usage_controller, 'get_mysql_connection', return_value=Mock()), \
+                patch.object(usage_controller, 'get_user_team', return_value='team_a'), \
+                patch.object(usage_controller, 'get_user_person_tag', return_value='Alice'), \
+                patch.object(usage_controller, 'ensure_user_exists'), \
+                patch.object(usage_controller, 'check_user_blocking_status', return_value=(False, None)), \
+                patch.object(usage_controller, 'check_user_limits_with_protection', return_value=(False, '', usage)), \
+                patch.object(usage_controller, 'log_bedrock_request_cet'), \
+                patch.object(usage_controller, 'merge_latency_sketches', return_value=1) as merge:
+            response = usage_controller.handle_cloudtrail_event(event, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        merge.assert_called_once()
+        sketches = merge.call_args.args[1]
+        self.assertEqual(list(sketches), [(date(2025, 9, 1), 10, 'anthropic.claude-3-haiku-20240307-v1:0')])
+        self.assertEqual(next(iter(sketches.values())).count, 2)
+
+    def test_latency_quantiles_action(self):
+        """The executor answers percentiles per model from the sketches"""
+        database = FakeLatencyDatabase()
+        sketches = {}
+        for latency in range(1, 101):
+            usage_rollups.add_latency(sketches, 'm1', datetime(2025, 9, 1, 9), latency)
+        usage_rollups.merge_latency_sketches(database, sketches)
+
+        with patch.object(query_executor, 'get_db_connection', return_value=database):
+            response = query_executor.lambda_handler({'action': 'latency_quantiles', 'start': '2025-09-01',
+                                                      'end': '2025-09-02', 'group_by': 'model',
+                                                      'quantiles': [0.5, 0.999]}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        row = response['data']['rows'][0]
+        self.assertEqual(row['model_id'], 'm1')
+        self.assertAlmostEqual(row['p50'], 50, delta=1)
+        self.assertAlmostEqual(row['p99.9'], 99, delta=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the user directory sync
+======================================
+
+This test suite validates shared/user_directory.py and its callers:
+1. Paging through list_users and deriving team/person/email like the controller
+2. Rewriting only users whose tags or groups changed, removing deleted users
+   and keeping the rows of users whose lookup failed
+3. The cached DirectorySnapshot (TTL, stale data on reload errors)
+4. The bedrock-db-maintenance "user_directory" task and the realtime
+   controller reading the directory instead of IAM
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import importlib.util
+import json
+import os
+import sys
+from datetime import datetime
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions')
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'shared'))
+
+import user_directory
+from user_directory import DirectorySnapshot, load_directory, sync_user_directory
+
+spec = importlib.util.spec_from_file_location("db_maintenance", os.path.join(LAMBDA_DIR, 'bedrock-db-maintenance',
+                                                                             'lambda_function.py'))
+db_maintenance = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(db_maintenance)
+
+os.environ.update({'RDS_ENDPOINT': 'test-endpoint', 'RDS_USERNAME': 'test', 'RDS_PASSWORD': 'test',
+                   'RDS_DATABASE': 'bedrock_usage', 'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'eu-west-1')})
+spec = importlib.util.spec_from_file_location("usage_controller", os.path.join(LAMBDA_DIR, 'lambda_function.py'))
+usage_controller = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(usage_controller)
+
+NOW = datetime(2025, 9, 1, 10, 0, 0)
+
+
+class FakeIam:
+    """list_users / list_user_tags / list_groups_for_user over a dict of users"""
+
+    def __init__(self, users, page_size=2):
+        self.users = users
+        self.page_size = page_size
+        self.failing = set()
+        self.tag_calls = 0
+
+    def list_users(self, MaxItems, Marker=None):
+        names = sorted(self.users)
+        start = int(Marker or 0)
+        page = names[start:start + self.page_size]
+        response = {'Users': [{'UserName': name} for name in page], 'IsTruncated': start + self.page_size < len(names)}
+        if response['IsTruncated']:
+            response['Marker'] = str(start + self.page_size)
+        return response
+
+    def list_user_tags(self, UserName):
+        self.tag_calls += 1
+        if UserName in self.failing:
+            raise RuntimeError('Throttling')
+        tags = self.users[UserName]['tags']
+        return {'Tags': [{'Key': key, 'Value': value} for key, value in tags.items()], 'IsTruncated': False}
+
+    def list_groups_for_user(self, UserName):
+        return {'Groups': [{'GroupName': group} for group in self.users[UserName].get('groups', [])],
+                'IsTruncated': False}
+
+
+class FakeDirectoryDatabase:
+    """user_directory rows behind the statements the module issues"""
+
+    def __init__(self):
+        self.rows = {}
+        self.writes = []
+
+    def cursor(self, cursor_class=None):
+        database = self
+        cursor = Mock()
+        cursor.__enter__ = Mock(return_value=cursor)
+        cursor.__exit__ = Mock(return_value=False)
+        result = []
+
+        def execute(query, params=None):
+            sql = ' '.join(query.split())
+            result.clear()
+            if sql.startswith('SELECT user_id, tags_hash FROM user_directory'):
+                result.extend({'user_id': key, 'tags_hash': row['tags_hash']} for key, row in database.rows.items())
+            elif sql.startswith('SELECT user_id, team, person, email, `groups` FROM user_directory'):
+                result.extend(dict(row) for row in database.rows.values())
+            elif sql.startswith('DELETE FROM user_directory WHERE user_id IN'):
+                cursor.rowcount = sum(database.rows.pop(user_id, None) is not None for user_id in params)
+            else:
+                raise AssertionError(f"Unexpected SQL: {sql}")
+
+        def executemany(query, rows):
+            assert ' '.join(query.split()).startswith('INSERT INTO user_directory')
+            for user_id, team, person, email, groups, tags_hash, synced_at in rows:
+                database.writes.append(user_id)
+                database.rows[user_id] = {'user_id': user_id, 'team': team, 'person': person, 'email': email,
+                                          'groups': groups, 'tags_hash': tags_hash, 'synced_at': synced_at}
+
+        cursor.execute = Mock(side_effect=execute)
+        cursor.executemany = Mock(side_effect=executemany)
+        cursor.fetchall = Mock(side_effect=lambda: list(result))
+        return cursor
+
+    def close(self):
+        pass
+
+
+def iam_users():
+    return {
+        'alice': {'tags': {'Team': 'team_a', 'Person': 'Alice', 'Email': 'alice@corp.com'}},
+        'bob': {'tags': {'email': 'bob.smith@corp.com'}, 'groups': ['developers', 'yo_leo_team_b']},
+        'carol': {'tags': {'Team': 'team_c', 'Person': 'Carol'}},
+    }
+
+
+class TestUserDirectorySync(unittest.TestCase):
+    """sync_user_directory against fake IAM and MySQL"""
+
+    def setUp(self):
+        self.iam = FakeIam(iam_users())
+        self.database = FakeDirectoryDatabase()
+
+    def sync(self, **options):
+        return sync_user_directory(self.database, self.iam, NOW, max_workers=4, **options)
+
+    def test_first_sync_writes_every_user(self):
+        stats = self.sync()
+
+        self.assertEqual((stats['users'], stats['changed'], stats['pages']), (3, 3, 2))
+        directory = load_directory(self.database)
+        self.assertEqual(directory['bob']['team'], 'yo_leo_team_b')
+        self.assertEqual(directory['bob']['person'], 'Unknown')
+        self.assertEqual(directory['bob']['email'], 'bob.smith@corp.com')
+        self.assertEqual(directory['bob']['groups'], ['developers', 'yo_leo_team_b'])
+        self.assertEqual(directory['carol']['email'], None)
+        self.assertEqual(user_directory.recipient_from_entry(directory['bob']),
+                         {'email': 'bob.smith@corp.com', 'display_name': 'bob.smith'})
+
+    def test_only_changed_users_are_rewritten(self):
+        self.sync()
+        self.database.writes.clear()
+        self.iam.users['carol']['tags']['Email'] = 'carol@corp.com'
+        self.iam.users['bob']['groups'] = ['yo_leo_team_b']
+
+        stats = self.sync()
+
+        self.assertEqual((stats['changed'], stats['unchanged']), (2, 1))
+        self.assertEqual(sorted(self.database.writes), ['bob', 'carol'])
+        self.assertEqual(self.database.rows['carol']['email'], 'carol@corp.com')
+
+    def test_removed_and_failed_users(self):
+        self.sync()
+        del self.iam.users['carol']
+        self.iam.failing.add('alice')
+        self.iam.users['alice']['tags']['Team'] = 'team_z'
+
+        stats = self.sync()
+
+        self.assertEqual((stats['removed'], stats['failed']), (1, 1))
+        self.assertNotIn('carol', self.database.rows)
+        self.assertEqual(self.database.rows['alice']['team'], 'team_a')
+
+    def test_dry_run_writes_nothing(self):
+        stats = self.sync(dry_run=True)
+        self.assertEqual(stats['changed'], 3)
+        self.assertEqual(self.database.rows, {})
+
+
+class TestDirectorySnapshot(unittest.TestCase):
+    """Cached reads of the directory"""
+
+    def test_reloads_after_ttl_and_keeps_stale_data_on_errors(self):
+        clock = Mock(return_value=0.0)
+        loader = Mock(side_effect=[{'alice': {'team': 'team_a'}}, RuntimeError('db down'),
+                                   {'alice': {'team': 'team_b'}}])
+        snapshot = DirectorySnapshot(loader, ttl_seconds=60, clock=clock)
+
+        self.assertEqual(snapshot.get('alice')['team'], 'team_a')
+        clock.return_value = 30.0
+        self.assertIsNone(snapshot.get('bob'))
+        self.assertEqual(loader.call_count, 1)
+
+        clock.return_value = 61.0
+        self.assertEqual(snapshot.get('alice')['team'], 'team_a')
+        clock.return_value = 122.0
+        self.assertEqual(snapshot.get('alice')['team'], 'team_b')
+        self.assertEqual(loader.call_count, 3)
+
+
+class TestDirectoryCallers(unittest.TestCase):
+    """Maintenance task and controller lookups"""
+
+    def test_maintenance_task(self):
+        database = FakeDirectoryDatabase()
+        iam = FakeIam(iam_users())
+        with patch.object(db_maintenance, 'get_db_connection', return_value=database), \
+                patch('boto3.client', return_value=iam):
+            response = db_maintenance.lambda_handler({'task': 'user_directory'}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(json.loads(response['body'])['result']['changed'], 3)
+        self.assertEqual(sorted(database.rows), ['alice', 'bob', 'carol'])
+
+    def test_controller_reads_directory_instead_of_iam(self):
+        entries = {'alice': {'user_id': 'alice', 'team': 'team_a', 'person': 'Alice', 'email': 'alice@corp.com',
+                             'groups': []}}
+        snapshot = DirectorySnapshot(lambda: entries)
+        with patch.object(usage_controller, 'user_directory', snapshot), \
+                patch.object(usage_controller, 'tag_resolver') as resolver:
+            self.assertEqual(usage_controller.get_user_team('alice'), 'team_a')
+            self.assertEqual(usage_controller.get_user_person_tag('alice'), 'Alice')
+            self.assertEqual(usage_controller.get_email_recipient('alice'),
+                             {'email': 'alice@corp.com', 'display_name': 'Alice'})
+            resolver.get_tag.assert_not_called()
+            resolver.get_recipient.assert_not_called()
+
+            resolver.get_tag.return_value = 'team_new'
+            self.assertEqual(usage_controller.get_user_team('newcomer'), 'team_new')
+            with patch.object(usage_controller, 'USER_DIRECTORY_IAM_FALLBACK', False):
+                self.assertEqual(usage_controller.get_user_team('newcomer'), 'unknown')
+                self.assertIsNone(usage_controller.get_user_email('newcomer'))
+            self.assertEqual(resolver.get_tag.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
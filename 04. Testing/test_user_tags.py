@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the cached IAM user tag resolver
+===============================================
+
+This test suite validates shared/user_tags.py and its use by the email service:
+1. One list_user_tags call per user per TTL, with pagination and eviction
+2. Failed lookups are not cached
+3. Display name rules (Person, Email local part, user id)
+4. The email service uses the recipient from the payload (0 IAM calls) or a
+   single tag lookup (1 IAM call) per message
+
+Author: AWS Bedrock Usage Control System
+Version: 1.0.0
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import filecmp
+import os
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions')
+BUILD_DIR = os.path.join(os.path.dirname(__file__), '..', '03. Build_folder')
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'shared'))
+sys.path.append(BUILD_DIR)
+
+from user_tags import UserTagResolver, display_name_from_tags, recipient_from_tags
+
+with patch('boto3.client'):
+    import bedrock_email_service
+
+
+def tags_response(tags, marker=None):
+    response = {'Tags': [{'Key': key, 'Value': value} for key, value in tags.items()], 'IsTruncated': bool(marker)}
+    if marker:
+        response['Marker'] = marker
+    return response
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestUserTagResolver(unittest.TestCase):
+    """Caching behaviour of UserTagResolver"""
+
+    def setUp(self):
+        self.iam = Mock()
+        self.iam.list_user_tags.return_value = tags_response({'Team': 'team_a', 'person': 'Alice',
+                                                              'Email': 'alice@corp.com'})
+        self.clock = FakeClock()
+        self.resolver = UserTagResolver(self.iam, ttl_seconds=60, clock=self.clock)
+
+    def test_attributes_share_one_lookup(self):
+        self.assertEqual(self.resolver.get_tag('alice', 'team'), 'team_a')
+        self.assertEqual(self.resolver.get_tag('alice', 'Person'), 'Alice')
+        self.assertEqual(self.resolver.get_recipient('alice'), {'email': 'alice@corp.com', 'display_name': 'Alice'})
+        self.iam.list_user_tags.assert_called_once_with(UserName='alice')
+
+    def test_entries_expire_after_ttl(self):
+        self.resolver.get_tags('alice')
+        self.clock.now += 59
+        self.resolver.get_tags('alice')
+        self.clock.now += 2
+        self.resolver.get_tags('alice')
+        self.assertEqual(self.iam.list_user_tags.call_count, 2)
+
+    def test_paginated_tags(self):
+        self.iam.list_user_tags.side_effect = [tags_response({'Team': 'team_a'}, marker='m1'),
+                                               tags_response({'Email': 'a@corp.com'})]
+        self.assertEqual(self.resolver.get_tags('alice'), {'Team': 'team_a', 'Email': 'a@corp.com'})
+        self.assertEqual(self.iam.list_user_tags.call_args.kwargs, {'UserName': 'alice', 'Marker': 'm1'})
+
+    def test_failures_are_not_cached(self):
+        self.iam.list_user_tags.side_effect = [RuntimeError('throttled'), tags_response({'Team': 'team_a'})]
+        with self.assertRaises(RuntimeError):
+            self.resolver.get_tags('alice')
+        self.assertEqual(self.resolver.get_tag('alice', 'Team'), 'team_a')
+
+    def test_oldest_entries_are_evicted(self):
+        resolver = UserTagResolver(self.iam, ttl_seconds=60, max_entries=2, clock=self.clock)
+        for user_id in ('a', 'b', 'c'):
+            resolver.get_tags(user_id)
+        resolver.get_tags('c')
+        resolver.get_tags('a')
+        self.assertEqual(self.iam.list_user_tags.call_count, 4)
+
+    def test_prime_and_invalidate(self):
+        self.resolver.prime('alice', {'Email': 'primed@corp.com'})
+        self.assertEqual(self.resolver.get_tag('alice', 'email'), 'primed@corp.com')
+        self.iam.list_user_tags.assert_not_called()
+        self.resolver.invalidate('alice')
+        self.assertEqual(self.resolver.get_tag('alice', 'email'), 'alice@corp.com')
+
+
+class TestDisplayName(unittest.TestCase):
+    """Display name priority"""
+
+    def test_priority(self):
+        self.assertEqual(display_name_from_tags('u1', {'Person': 'Ana', 'Email': 'ana.g@corp.com'}), 'Ana')
+        self.assertEqual(display_name_from_tags('u1', {'Person': 'Unknown', 'Email': 'ana.g@corp.com'}), 'ana.g')
+        self.assertEqual(display_name_from_tags('u1', {}), 'u1')
+        self.assertEqual(recipient_from_tags('u1', {}), {'email': None, 'display_name': 'u1'})
+
+
+class TestEmailServiceRecipient(unittest.TestCase):
+    """IAM calls per message in EnhancedEmailNotificationService"""
+
+    def setUp(self):
+        self.iam = Mock()
+        self.iam.list_user_tags.return_value = tags_response({'Person': 'Ana', 'Email': 'ana@corp.com'})
+        self.service = bedrock_email_service.EnhancedEmailNotificationService.__new__(
+            bedrock_email_service.EnhancedEmailNotificationService)
+        self.service.gmail_user = 'noreply@example.com'
+        self.service.tag_resolver = UserTagResolver(self.iam)
+
+    def test_payload_recipient_skips_iam(self):
+        with patch.object(self.service, '_send_email', return_value=True) as send:
+            sent = self.service.send_admin_blocking_email('u1', 'admin', recipient={'email': 'ana@corp.com',
+                                                                                    'display_name': 'Ana'})
+        self.assertTrue(sent)
+        self.iam.list_user_tags.assert_not_called()
+        self.assertEqual(send.call_args.kwargs['to_email'], 'ana@corp.com')
+        self.assertIn('Hola Ana', send.call_args.kwargs['text_body'])
+
+    def test_single_lookup_without_payload_recipient(self):
+        with patch.object(self.service, '_send_email', return_value=True) as send:
+            self.service.send_admin_unblocking_email('u1', 'admin')
+            self.service.send_blocking_email('u1', {'request_count': 50, 'daily_limit': 50})
+        self.iam.list_user_tags.assert_called_once_with(UserName='u1')
+        self.assertIn('Hola Ana', send.call_args.kwargs['text_body'])
+
+    def test_no_email_tag(self):
+        self.iam.list_user_tags.return_value = tags_response({'Person': 'Ana'})
+        with patch.object(self.service, '_send_email') as send:
+            self.assertFalse(self.service.send_unblocking_email('u1'))
+        send.assert_not_called()
+
+    def test_build_folder_copy_matches_shared_module(self):
+        self.assertTrue(filecmp.cmp(os.path.join(LAMBDA_DIR, 'shared', 'user_tags.py'),
+                                    os.path.join(BUILD_DIR, 'user_tags.py'), shallow=False))
+
+
+if __name__ == '__main__':
+    unittest.main()